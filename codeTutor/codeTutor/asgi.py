@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'codeTutor.settings')
 
 application = get_asgi_application()
+
+# After the app registry is ready: warm the process up before the first
+# request, and the event loop at lifespan startup (tutor/warmup.py)
+from tutor.warmup import WarmupLifespan, warm_up  # noqa: E402
+
+warm_up()
+application = WarmupLifespan(application)
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tutor.middleware.MetricsMiddleware',
+    'tutor.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +54,11 @@ MIDDLEWARE = [
 
 import os
 
+from dotenv import load_dotenv
+
+# .env values for the os.getenv() calls below (OPENAI_API_KEY, OPENAI_RPM_LIMIT, ...)
+load_dotenv()
+
 ROOT_URLCONF = 'codeTutor.urls'
 
 TEMPLATES = [
@@ -75,10 +82,25 @@ WSGI_APPLICATION = 'codeTutor.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite runs in WAL mode so readers don't block the background writer
+# (tutor/persistence.py); IMMEDIATE transactions take the write lock up front
+# instead of failing on lock upgrade under concurrency.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA busy_timeout=5000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -123,3 +145,250 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Analysis cache
+# Repeat submissions are answered from an in-process LRU tier backed by the
+# tutor_analysiscacheentry table. TTL is in seconds.
+
+ANALYSIS_CACHE = {
+    'ENABLED': True,
+    'MEMORY_MAX_ENTRIES': 512,
+    'MEMORY_MAX_BYTES': 32 * 1024 * 1024,
+    'PERSISTENT': True,
+    'PERSISTENT_MAX_ENTRIES': 20000,
+    'TTL': 7 * 24 * 60 * 60,
+}
+
+
+# Near-duplicate reuse (tutor/fingerprint.py)
+# Submissions that differ from an analyzed one only in names, comments,
+# string literals or layout reuse its analysis, remapped to the new code.
+# THRESHOLD is the token-sequence similarity (0-1) required; any operator,
+# number, keyword, builtin or library name that differs rules a match out.
+
+NEAR_DUPLICATE_CACHE = {
+    'ENABLED': True,
+    'THRESHOLD': 0.95,
+    'MIN_TOKENS': 40,
+    'MAX_ENTRIES': 5000,
+}
+
+
+# Background database writer (tutor/persistence.py)
+# Submissions, analyses, issues, hints and cache entries are queued and
+# written in batches, one transaction per FLUSH_INTERVAL seconds.
+
+PERSISTENCE = {
+    'BACKGROUND': True,
+    'FLUSH_INTERVAL': 0.05,
+    'BATCH_SIZE': 500,
+}
+
+
+# Background analysis jobs (tutor/jobs.py)
+# POST /api/analyze/jobs/ queues an analysis for a pool of WORKERS and
+# returns a job ID to poll; beyond MAX_QUEUED queued jobs it answers 503.
+
+ANALYSIS_JOBS = {
+    'WORKERS': 8,
+    'MAX_QUEUED': 1000,
+    'RETENTION': 60 * 60,
+}
+
+
+# Batch analysis of assignment sets (tutor/batch.py)
+# POST /api/analyze/batch/ and `manage.py grade_submissions` analyze up to
+# MAX_FILES submissions with CONCURRENCY analyses in flight.
+
+BATCH_ANALYSIS = {
+    'CONCURRENCY': 16,
+    'MAX_FILES': 2000,
+    'MAX_FILE_BYTES': 256 * 1024,
+    'MAX_ARCHIVE_BYTES': 64 * 1024 * 1024,
+}
+
+
+# Shared AsyncOpenAI client (tutor/llm.py)
+# Connection pool sizing for the httpx client and per-endpoint limits on
+# concurrent upstream calls. Serve through codeTutor/asgi.py so all requests
+# share one pool.
+# For offline load tests set LLM_PROVIDER=tutor.llm.StandInProvider, or run
+# `manage.py llm_standin` and set OPENAI_BASE_URL=http://127.0.0.1:8765/v1.
+
+LLM_CLIENT = {
+    'PROVIDER': os.getenv('LLM_PROVIDER', 'tutor.llm.OpenAIProvider'),
+    'BASE_URL': os.getenv('OPENAI_BASE_URL') or None,
+    'RECORD_PATH': os.getenv('LLM_RECORD_PATH') or None,
+    'STANDIN': {
+        'LATENCY': 0.4,
+        'TOKENS_PER_SECOND': 80.0,
+        'RATE_LIMIT_RATE': 0.0,
+        'ERROR_RATE': 0.0,
+        'MALFORMED_RATE': 0.0,
+    },
+    'MAX_CONNECTIONS': 200,
+    'MAX_KEEPALIVE_CONNECTIONS': 50,
+    'KEEPALIVE_EXPIRY': 30.0,
+    'CONNECT_TIMEOUT': 10.0,
+    'READ_TIMEOUT': 120.0,
+    'CONCURRENCY': {
+        'analyze': 100,
+        'hint': 200,
+        'correction_strategy': 50,
+        'corrected_code': 50,
+    },
+}
+
+
+# Upstream scheduler (tutor/scheduler.py)
+# Keeps LLM calls within the account's rate limits: calls that don't fit the
+# per-minute budgets are queued (lower priority number first) and retried
+# with jittered exponential backoff. Set these to your OpenAI tier's limits.
+
+LLM_SCHEDULER = {
+    'ENABLED': True,
+    'REQUESTS_PER_MINUTE': int(os.getenv('OPENAI_RPM_LIMIT', 500)),
+    'TOKENS_PER_MINUTE': int(os.getenv('OPENAI_TPM_LIMIT', 200000)),
+    'PRIORITIES': {
+        'hint': 0,
+        'corrected_code': 1,
+        'correction_strategy': 1,
+        'analyze': 2,
+    },
+    'MAX_RETRIES': 4,
+    'BACKOFF_BASE': 0.5,
+    'BACKOFF_MAX': 20.0,
+    'MAX_QUEUE_WAIT': 60.0,
+}
+
+
+# Local static pre-analysis (tutor/static_analysis.py)
+# Syntax errors found locally are answered without an LLM call; code that
+# compiles cleanly is sent with a prompt that skips syntax checking.
+
+STATIC_ANALYSIS = {
+    'ENABLED': True,
+    'ANSWER_SYNTAX_ERRORS': True,
+}
+
+
+# Chunked analysis of large submissions (tutor/chunking.py)
+# Token counts are estimated locally; code over MAX_CODE_TOKENS is split on
+# function/class boundaries and the chunks are analyzed in parallel.
+
+ANALYSIS_CHUNKING = {
+    'MAX_CODE_TOKENS': 2500,
+    'CHUNK_TOKENS': 1500,
+    'MAX_CHUNKS': 8,
+}
+
+
+# Incremental re-analysis (tutor/incremental.py)
+# Resubmissions are diffed against the session's previous analysis; only the
+# changed scopes are sent to the LLM and the other issues are carried over.
+
+INCREMENTAL_ANALYSIS = {
+    'ENABLED': True,
+    'MAX_REANALYZED_RATIO': 0.6,
+    'MAX_SCOPE_LINES': 60,
+}
+
+
+# Analysis depth modes (tutor/depth.py)
+# Requests may ask for "depth": quick (syntax and obvious logic errors only),
+# standard or deep (the full analysis). Below deep, correction strategies and
+# corrected code are generated only when requested. Each depth has its own
+# model and completion budget.
+
+ANALYSIS_DEPTHS = {
+    'DEFAULT': 'standard',
+    'QUICK_MODEL': 'gpt-4o-mini',
+    'QUICK_MAX_TOKENS': 1200,
+    'STANDARD_MODEL': 'gpt-4o-mini',
+    'STANDARD_MAX_TOKENS': 3000,
+    'DEEP_MODEL': 'gpt-4o-mini',
+    'DEEP_MAX_TOKENS': 6000,
+}
+
+
+# Frontend delivery (tutor/frontend.py)
+# coder.html is compiled once into a small shell and fingerprinted CSS/JS
+# bundles, precompressed and served with ETags. Bundles are cached by browsers
+# for ASSET_MAX_AGE seconds; the shell is revalidated on every load.
+
+FRONTEND = {
+    'ASSET_URL': '/assets/',
+    'ASSET_MAX_AGE': 365 * 24 * 60 * 60,
+}
+
+
+# Sandboxed execution (tutor/sandbox.py, tutor/execution.py)
+# Python submissions that compile are run by a pool of warm worker processes,
+# each run in a forked child with rlimits, no network and a temporary
+# directory of its own. Plain runtime errors are answered from the traceback;
+# other exceptions are added to the LLM's issues, and corrected code is run
+# to check that it works. Off by default: the sandbox isn't a hardened
+# boundary, so only enable it where the server itself runs jailed (container
+# with seccomp, or namespaces and a uid of its own). As root, it refuses to
+# start unless USER names an unprivileged account (e.g. 'nobody'). Runs never
+# queue: when all POOL_SIZE workers are busy, the analysis goes on without one.
+
+SANDBOX = {
+    'ENABLED': False,
+    'POOL_SIZE': 2,
+    'TIMEOUT': 2.0,
+    'CPU_SECONDS': 2,
+    'MEMORY_MB': 256,
+    'USER': None,
+    'ANSWER_RUNTIME_ERRORS': True,
+    'CHECK_CORRECTED_CODE': True,
+}
+
+
+# Monitoring endpoints (tutor/metrics.py)
+# /metrics and /api/analyze/cache-stats/ answer 404 except to requests with
+# "Authorization: Bearer <TOKEN>", from ALLOWED_IPS, or by staff users.
+
+MONITORING = {
+    'TOKEN': os.getenv('TUTOR_MONITORING_TOKEN', ''),
+    'ALLOWED_IPS': (),
+    'STAFF': True,
+}
+
+
+# Response transport (tutor/transport.py)
+# JSON and text responses of at least MIN_BYTES are compressed with gzip or
+# brotli (when installed), as negotiated with the client. Analysis endpoints
+# also accept "fields" to return only part of the analysis.
+
+RESPONSE_COMPRESSION = {
+    'ENABLED': True,
+    'MIN_BYTES': 1024,
+    'BROTLI_QUALITY': 5,
+}
+
+
+# Worker warm-up (tutor/warmup.py)
+# codeTutor/asgi.py and wsgi.py preload the LLM libraries, the compiled page,
+# the sandbox workers and recent analyses before the first request; under
+# ASGI, LLM_CONNECTIONS pooled connections are opened at lifespan startup.
+
+WARMUP = {
+    'ENABLED': True,
+    'LLM_CONNECTIONS': 2,
+    'CACHE_ENTRIES': 256,
+    'NEAR_DUPLICATE_ENTRIES': 512,
+}
+
+
+# Concept analytics (tutor/analytics.py)
+# Submissions labelled with a classroom and an exercise are rolled up into
+# per-day concept counters, served by GET /api/analytics/concepts/.
+
+ANALYTICS = {
+    'ENABLED': True,
+    'MAX_DAYS': 366,
+    'DEFAULT_DAYS': 30,
+    'MAX_CONCEPTS': 100,
+}
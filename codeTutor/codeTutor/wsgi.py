@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'codeTutor.settings')
 
 application = get_wsgi_application()
+
+# After the app registry is ready: warm the process up before the first
+# request (tutor/warmup.py)
+from tutor.warmup import warm_up  # noqa: E402
+
+warm_up()
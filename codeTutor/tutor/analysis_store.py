@@ -0,0 +1,291 @@
+# analysis_store.py
+"""
+Store of completed analyses, addressed by analysis ID.
+
+Every analysis returned to the frontend carries an analysis_id. Follow-up
+requests (hints, strategies, corrected code) use it to reuse the stored
+result instead of asking the LLM again. Recent analyses are held in an
+in-process LRU; all of them are persisted in the Analysis table, with their
+issues and generated hints in the Issue and Hint tables. Writes go through
+the background writer (tutor/persistence.py), so saving an analysis doesn't
+wait for the database. Writing a submission, or the analysis it was waiting
+for, also rolls it up into the concept analytics (tutor/analytics.py).
+"""
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .analytics import get_analytics_settings, roll_up
+from .cache import normalize_code
+from .persistence import db_writer
+
+logger = logging.getLogger(__name__)
+
+MEMORY_MAX_ENTRIES = 2048
+
+
+def make_analysis_id(cache_key):
+    """
+    Analyses are content-addressed: identical submissions share an ID
+    """
+    return cache_key[:32]
+
+
+def find_issue(result, issue_id):
+    """
+    Find an issue by id among the errors and warnings of a frontend response
+    """
+    for issue in result.get('errors', []) + result.get('warnings', []):
+        if str(issue.get('id')) == str(issue_id):
+            return issue
+    return None
+
+
+class AnalysisStore:
+    """
+    Memory LRU in front of the Analysis table
+    """
+
+    def __init__(self, memory_max_entries=MEMORY_MAX_ENTRIES):
+        self.memory_max_entries = memory_max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # analysis_id -> {'code', 'language', 'result'}
+
+    async def asave(self, analysis_id, code, language, result):
+        """
+        Store an analysis result under analysis_id
+        """
+        record = {'code': code, 'language': language, 'result': copy.deepcopy(result)}
+        self._remember(analysis_id, record)
+        await db_writer.aput('analysis', {'analysis_id': analysis_id, 'issues': True, **record})
+
+    async def aget(self, analysis_id):
+        """
+        Return {'code', 'language', 'result'} for analysis_id, or None
+        """
+        with self._lock:
+            record = self._entries.get(analysis_id)
+            if record is not None:
+                self._entries.move_to_end(analysis_id)
+                return record
+
+        record = await sync_to_async(self._load)(analysis_id)
+        if record is not None:
+            self._remember(analysis_id, record)
+        return record
+
+    async def aset_hint(self, analysis_id, issue_id, level, hint):
+        """
+        Record a generated hint on a stored issue so later requests reuse it
+        """
+        record = await self.aget(analysis_id)
+        if record is None:
+            return
+        with self._lock:
+            issue = find_issue(record['result'], issue_id)
+            if issue is None:
+                return
+            issue.setdefault('hints', {})[f'level{level}'] = hint
+            snapshot = copy.deepcopy(record)
+        await db_writer.aput('analysis', {'analysis_id': analysis_id, 'issues': False, **snapshot})
+        await db_writer.aput('hint', {
+            'analysis_id': analysis_id, 'issue_id': issue_id, 'level': level, 'text': hint, 'source': 'generated',
+        })
+
+    async def aset_artifact(self, analysis_id, key, value, issue_id=None):
+        """
+        Record a lazily generated part of an analysis (correction strategies,
+        corrected code) on the stored result, or on one of its issues
+        """
+        record = await self.aget(analysis_id)
+        if record is None:
+            return
+        with self._lock:
+            target = record['result'] if issue_id is None else find_issue(record['result'], issue_id)
+            if target is None:
+                return
+            target[key] = value
+            snapshot = copy.deepcopy(record)
+        await db_writer.aput('analysis', {'analysis_id': analysis_id, 'issues': False, **snapshot})
+
+    async def arecord_submission(self, analysis_id, code, language, source, session_key='', user_id=None,
+                                 classroom='', exercise=''):
+        """
+        Record a submission answered by analysis_id, for history and analytics
+        """
+        await db_writer.aput('submission', {
+            'analysis_id': analysis_id,
+            'code_hash': hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest(),
+            'code': code,
+            'language': language,
+            'source': source,
+            'session_key': session_key or '',
+            'user_id': user_id,
+            'classroom': classroom,
+            'exercise': exercise,
+            'created_at': timezone.now(),
+        })
+
+    def clear(self):
+        """
+        Drop the in-process entries; persisted analyses are kept
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, analysis_id, record):
+        with self._lock:
+            self._entries[analysis_id] = record
+            self._entries.move_to_end(analysis_id)
+            while len(self._entries) > self.memory_max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, analysis_id):
+        from .models import Analysis
+
+        try:
+            analysis = Analysis.objects.filter(analysis_id=analysis_id).first()
+        except DatabaseError:
+            logger.exception('Could not load analysis %s', analysis_id)
+            return None
+        if analysis is None:
+            return None
+        return {'code': analysis.code, 'language': analysis.language, 'result': analysis.result}
+
+
+analysis_store = AnalysisStore()
+
+
+def issue_rows(analysis_id, language, result):
+    """
+    Issue rows for the errors and warnings of a frontend result
+    """
+    from .models import Issue
+
+    rows = []
+    for kind, issues in (('error', result.get('errors', [])), ('warning', result.get('warnings', []))):
+        for issue in issues:
+            try:
+                issue_id = int(issue.get('id'))
+            except (TypeError, ValueError):
+                continue
+            line = issue.get('line')
+            rows.append(Issue(
+                analysis_id=analysis_id,
+                issue_id=issue_id,
+                kind=kind,
+                category=str(issue.get('type') or '')[:64],
+                title=str(issue.get('title') or '')[:255],
+                severity=str(issue.get('severity') or '')[:16],
+                line=line if isinstance(line, int) and line >= 0 else None,
+                language=language[:32],
+            ))
+    return rows
+
+
+@db_writer.handler('analysis')
+def _write_analyses(rows):
+    from .models import Analysis, Issue
+
+    now = timezone.now()
+    latest = {row['analysis_id']: row for row in rows}
+    Analysis.objects.bulk_create(
+        [
+            Analysis(
+                analysis_id=analysis_id,
+                code=row['code'],
+                language=row['language'][:32],
+                result=row['result'],
+                created_at=now,
+                updated_at=now,
+            )
+            for analysis_id, row in latest.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['analysis_id'],
+        update_fields=['code', 'language', 'result', 'updated_at'],
+    )
+    replaced = [analysis_id for analysis_id, row in latest.items() if row['issues']]
+    if replaced:
+        Issue.objects.filter(analysis_id__in=replaced).delete()
+        Issue.objects.bulk_create([
+            issue
+            for analysis_id in replaced
+            for issue in issue_rows(analysis_id, latest[analysis_id]['language'], latest[analysis_id]['result'])
+        ])
+        _roll_up_waiting(latest, replaced)
+
+
+def _roll_up_waiting(latest, analysis_ids):
+    """
+    Roll up the submissions recorded before their analysis was written
+    """
+    from .models import Submission
+
+    if not get_analytics_settings()['ENABLED']:
+        return
+    waiting = list(
+        Submission.objects.filter(analysis_id__in=analysis_ids, rolled_up=False)
+        .values_list('id', 'analysis_id', 'classroom', 'exercise', 'created_at')
+    )
+    if waiting and roll_up([
+        (classroom, exercise, created_at, latest[analysis_id]['result'])
+        for _, analysis_id, classroom, exercise, created_at in waiting
+    ]):
+        Submission.objects.filter(id__in=[row[0] for row in waiting]).update(rolled_up=True)
+
+
+@db_writer.handler('hint')
+def _write_hints(rows):
+    from .models import Hint
+
+    latest = {(row['analysis_id'], int(row['issue_id']), int(row['level'])): row for row in rows}
+    Hint.objects.bulk_create(
+        [
+            Hint(analysis_id=analysis_id, issue_id=issue_id, level=level, text=row['text'], source=row['source'])
+            for (analysis_id, issue_id, level), row in latest.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['analysis', 'issue_id', 'level'],
+        update_fields=['text', 'source'],
+    )
+
+
+@db_writer.handler('submission')
+def _write_submissions(rows):
+    from .models import Analysis, Submission
+
+    # Submissions whose analysis is stored are rolled up now, the others
+    # when it is written
+    results = {}
+    if get_analytics_settings()['ENABLED']:
+        results = dict(
+            Analysis.objects.filter(analysis_id__in={row['analysis_id'] for row in rows})
+            .values_list('analysis_id', 'result')
+        )
+    rolled_up = roll_up([
+        (row['classroom'], row['exercise'], row['created_at'], results[row['analysis_id']])
+        for row in rows if row['analysis_id'] in results
+    ])
+    Submission.objects.bulk_create([
+        Submission(
+            analysis_id=row['analysis_id'],
+            code_hash=row['code_hash'],
+            code=row['code'],
+            language=row['language'][:32],
+            source=row['source'],
+            session_key=row['session_key'][:40],
+            user_id=row['user_id'],
+            classroom=row['classroom'],
+            exercise=row['exercise'],
+            rolled_up=rolled_up and row['analysis_id'] in results,
+            created_at=row['created_at'],
+        )
+        for row in rows
+    ])
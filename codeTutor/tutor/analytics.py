@@ -0,0 +1,284 @@
+# analytics.py
+"""
+Concept analytics for instructors, kept as pre-aggregated counters.
+
+Submissions can be labelled with a "classroom" and an "exercise". When a
+submission is recorded, the background writer (tutor/persistence.py) rolls
+its analysis up into two small tables instead of leaving dashboards to scan
+the analyses:
+
+- ConceptRollup counts issues per classroom, exercise, day, concept,
+  category and severity (an issue linked from a concept_map entry counts
+  for that concept; an issue no entry links to counts under a blank concept);
+- ExerciseRollup counts submissions, submissions with errors and issues per
+  classroom, exercise and day.
+
+Counters are incremented with one upsert per distinct row of a write batch,
+so a class submitting the same exercise costs a handful of statements. A
+submission whose analysis isn't stored yet (streamed or queued analyses) is
+rolled up when the analysis is written. Queries read only the rollup rows of
+the requested days, whatever the number of submissions behind them.
+
+manage.py rebuild_analytics recomputes the tables from the stored
+submissions (after enabling analytics, or to repair them).
+"""
+import logging
+from collections import Counter
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANALYTICS_SETTINGS = {
+    'ENABLED': True,
+    # Longest date range a query may cover
+    'MAX_DAYS': 366,
+    'DEFAULT_DAYS': 30,
+    # Concepts returned by a query, most frequent first
+    'MAX_CONCEPTS': 100,
+}
+
+LABEL_MAX_LENGTH = 64
+LABELS = ('classroom', 'exercise')
+
+
+def get_analytics_settings():
+    config = dict(DEFAULT_ANALYTICS_SETTINGS)
+    config.update(getattr(settings, 'ANALYTICS', {}))
+    return config
+
+
+def clean_label(value, name):
+    """
+    A classroom or exercise label from a request ('' when absent). Raises
+    ValueError for anything but a short string.
+    """
+    if value is None:
+        return ''
+    if not isinstance(value, str) or len(value.strip()) > LABEL_MAX_LENGTH:
+        raise ValueError(f'{name} must be a string of at most {LABEL_MAX_LENGTH} characters')
+    return value.strip()
+
+
+def request_labels(data):
+    """
+    {'classroom', 'exercise'} from a request's JSON body or query string
+    """
+    return {name: clean_label(data.get(name), name) for name in LABELS}
+
+
+# Rolling up
+
+def analysis_counts(result):
+    """
+    ({(concept, category, severity): issues}, issue count, has errors) of a
+    stored frontend result
+    """
+    severities = {}
+    for issue in result.get('errors', []) + result.get('warnings', []):
+        severities[str(issue.get('id'))] = (
+            str(issue.get('type') or '')[:64], str(issue.get('severity') or '')[:16]
+        )
+
+    counts = Counter()
+    linked = set()
+    for entry in result.get('concept_map', []):
+        concept = str(entry.get('concept') or '')[:128]
+        category = str(entry.get('category') or '')[:64]
+        issue_ids = [str(issue_id) for issue_id in entry.get('issues') or [] if str(issue_id) in severities]
+        for issue_id in issue_ids:
+            linked.add(issue_id)
+            counts[(concept, category, severities[issue_id][1])] += 1
+        if not issue_ids and concept:
+            count = entry.get('count')
+            counts[(concept, category, '')] += count if isinstance(count, int) and count > 0 else 1
+    for issue_id, (category, severity) in severities.items():
+        if issue_id not in linked:
+            counts[('', category, severity)] += 1
+    return counts, len(severities), bool(result.get('errors'))
+
+
+def roll_up(submissions):
+    """
+    Add [(classroom, exercise, created_at, result)] to the rollup tables.
+    Returns False when that failed; the failure is logged and the caller's
+    transaction (the background writer's batch) goes on.
+    """
+    if not submissions:
+        return True
+    try:
+        with transaction.atomic():
+            _roll_up(submissions)
+    except DatabaseError:
+        logger.exception('Could not roll up %d submissions', len(submissions))
+        return False
+    return True
+
+
+def _roll_up(submissions):
+    from .models import ConceptRollup, ExerciseRollup
+
+    concepts = Counter()
+    exercises = {}
+    for classroom, exercise, created_at, result in submissions:
+        day = timezone.localdate(created_at)
+        counts, issues, has_errors = analysis_counts(result)
+        for (concept, category, severity), count in counts.items():
+            concepts[(classroom, exercise, day, concept, category, severity)] += count
+        totals = exercises.setdefault((classroom, exercise, day), [0, 0, 0])
+        totals[0] += 1
+        totals[1] += has_errors
+        totals[2] += issues
+
+    increment(
+        ExerciseRollup, ('classroom', 'exercise', 'day'), ('submissions', 'submissions_with_errors', 'issues'),
+        {key: tuple(totals) for key, totals in exercises.items()},
+    )
+    increment(
+        ConceptRollup, ('classroom', 'exercise', 'day', 'concept', 'category', 'severity'), ('count',),
+        {key: (count,) for key, count in concepts.items()},
+    )
+
+
+def increment(model, key_fields, counter_fields, amounts):
+    """
+    Add {key values: counter amounts} to the counters of model's rows,
+    creating missing rows. One INSERT ... ON CONFLICT DO UPDATE per row
+    where the database supports it.
+    """
+    if not amounts:
+        return
+    if not connection.features.supports_update_conflicts_with_target:
+        for key, values in amounts.items():
+            lookup = dict(zip(key_fields, key))
+            updated = model.objects.filter(**lookup).update(
+                **{name: F(name) + value for name, value in zip(counter_fields, values)}
+            )
+            if not updated:
+                model.objects.create(**lookup, **dict(zip(counter_fields, values)))
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields]
+    keys = [quote(field.column) for field in fields]
+    counters = [quote(model._meta.get_field(name).column) for name in counter_fields]
+    placeholders = ', '.join(['%s'] * (len(keys) + len(counters)))
+    updates = ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in counters)
+    sql = (
+        f'INSERT INTO {table} ({", ".join(keys + counters)}) VALUES ({placeholders}) '
+        f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}'
+    )
+    params = [
+        (*(field.get_db_prep_save(value, connection) for field, value in zip(fields, key)), *values)
+        for key, values in amounts.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def rebuild(batch_size=500):
+    """
+    Recompute the rollup tables from every stored submission whose analysis
+    exists. Returns the number of submissions rolled up.
+    """
+    from .models import Analysis, ConceptRollup, ExerciseRollup, Submission
+
+    with transaction.atomic():
+        ConceptRollup.objects.all().delete()
+        ExerciseRollup.objects.all().delete()
+        Submission.objects.filter(rolled_up=True).update(rolled_up=False)
+
+    total = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Submission.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'analysis_id', 'classroom', 'exercise', 'created_at')[:batch_size]
+            )
+            if not rows:
+                return total
+            last_id = rows[-1][0]
+            results = dict(
+                Analysis.objects.filter(analysis_id__in={row[1] for row in rows}).values_list('analysis_id', 'result')
+            )
+            done = [row for row in rows if row[1] in results]
+            _roll_up([(classroom, exercise, created_at, results[analysis_id])
+                     for _, analysis_id, classroom, exercise, created_at in done])
+            Submission.objects.filter(id__in=[row[0] for row in done]).update(rolled_up=True)
+            total += len(done)
+
+
+# Queries
+
+def date_range(start=None, end=None):
+    """
+    (first day, last day) of a query from optional ISO dates, by default the
+    last DEFAULT_DAYS days. Raises ValueError.
+    """
+    config = get_analytics_settings()
+    try:
+        end = date.fromisoformat(end) if end else timezone.localdate()
+        start = date.fromisoformat(start) if start else end - timedelta(days=config['DEFAULT_DAYS'] - 1)
+    except (TypeError, ValueError):
+        raise ValueError('from and to must be dates (YYYY-MM-DD)')
+    if start > end:
+        raise ValueError('from is after to')
+    if (end - start).days >= config['MAX_DAYS']:
+        raise ValueError(f'The range can cover at most {config["MAX_DAYS"]} days')
+    return start, end
+
+
+def concept_report(classroom, exercise=None, start=None, end=None):
+    """
+    Struggled-with concepts and daily totals of a classroom (one exercise,
+    or all of them when exercise is None) between two days
+    """
+    from .models import ConceptRollup, ExerciseRollup
+
+    config = get_analytics_settings()
+    scope = {'classroom': classroom, 'day__range': (start, end)}
+    if exercise is not None:
+        scope['exercise'] = exercise
+
+    days = list(
+        ExerciseRollup.objects.filter(**scope)
+        .values('day')
+        .annotate(
+            submissions=Sum('submissions'),
+            submissions_with_errors=Sum('submissions_with_errors'),
+            issues=Sum('issues'),
+        )
+        .order_by('day')
+    )
+    concepts = {}
+    rows = ConceptRollup.objects.filter(**scope).values('concept', 'category', 'severity').annotate(total=Sum('count'))
+    for row in rows:
+        entry = concepts.setdefault((row['concept'], row['category']), {
+            'concept': row['concept'], 'category': row['category'], 'count': 0, 'severity': {},
+        })
+        entry['count'] += row['total']
+        entry['severity'][row['severity'] or 'unknown'] = row['total']
+
+    submissions = sum(day['submissions'] for day in days)
+    ranked = sorted(concepts.values(), key=lambda entry: (-entry['count'], entry['concept'], entry['category']))
+    for entry in ranked:
+        # Issues of this concept per submission
+        entry['rate'] = round(entry['count'] / submissions, 4) if submissions else 0.0
+    return {
+        'classroom': classroom,
+        'exercise': exercise,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'submissions': submissions,
+        'submissions_with_errors': sum(day['submissions_with_errors'] for day in days),
+        'issues': sum(day['issues'] for day in days),
+        'concepts': ranked[:config['MAX_CONCEPTS']],
+        'days': [dict(day, day=day['day'].isoformat()) for day in days],
+    }
@@ -0,0 +1,316 @@
+# batch.py
+"""
+Batch analysis of whole assignment sets.
+
+An instructor hands over a directory or an archive (.zip, .tar, .tar.gz) of
+submissions, through `manage.py grade_submissions` or POST
+/api/analyze/batch/. Files are read one at a time and analyzed by a bounded
+pool of workers through the normal pipeline (views.analyze_submission), so
+every LLM call still goes through the upstream scheduler's rate budget.
+Identical files (same normalized code and language) are analyzed once; the
+copies are answered from the stored analysis. Results are emitted as one
+JSON line per file as soon as each finishes, so memory stays bounded by the
+worker count rather than the size of the set.
+
+A run writing to an existing JSONL file skips the files already recorded
+there as done (with unchanged code), so an interrupted run picks up where it
+stopped.
+"""
+import asyncio
+import fnmatch
+import io
+import json
+import logging
+import os
+import posixpath
+import tarfile
+import zipfile
+from collections import namedtuple
+
+from django.conf import settings
+
+from .analysis_store import analysis_store, make_analysis_id
+from .depth import analysis_cache_key, get_analysis_depth
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SETTINGS = {
+    'CONCURRENCY': 16,
+    'MAX_FILES': 2000,
+    'MAX_FILE_BYTES': 256 * 1024,
+    'MAX_ARCHIVE_BYTES': 64 * 1024 * 1024,
+    'EXTENSIONS': {
+        '.py': 'python',
+        '.js': 'javascript',
+        '.mjs': 'javascript',
+        '.java': 'java',
+        '.cpp': 'cpp',
+        '.cc': 'cpp',
+        '.cxx': 'cpp',
+        '.hpp': 'cpp',
+        '.h': 'cpp',
+        '.cs': 'csharp',
+    },
+    # Matched against each path component
+    'IGNORE': ['.*', '__pycache__', '__MACOSX', 'node_modules'],
+}
+
+# code is None for files that are skipped; error then says why
+BatchItem = namedtuple('BatchItem', ['name', 'code', 'language', 'error'])
+
+
+def get_batch_settings():
+    config = dict(DEFAULT_BATCH_SETTINGS)
+    config.update(getattr(settings, 'BATCH_ANALYSIS', {}))
+    return config
+
+
+def submission_id(code, language):
+    """
+    Content address of a submission, equal to the analysis_id it gets at
+    the default depth
+    """
+    return make_analysis_id(analysis_cache_key(code.strip(), language, get_analysis_depth()))
+
+
+def iter_submissions(path, default_language=None, config=None):
+    """
+    Yield a BatchItem for each source file in a directory or archive
+    """
+    config = config or get_batch_settings()
+    if os.path.isdir(path):
+        yield from iter_directory(path, default_language, config)
+        return
+    with open(path, 'rb') as archive:
+        yield from iter_archive(archive, default_language, config)
+
+
+def iter_directory(path, default_language=None, config=None):
+    config = config or get_batch_settings()
+    count = 0
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(name for name in dirs if not _ignored(name, config))
+        for filename in sorted(files):
+            if _ignored(filename, config):
+                continue
+            full_path = os.path.join(root, filename)
+            name = os.path.relpath(full_path, path).replace(os.sep, '/')
+            language = language_for(name, default_language, config)
+            if language is None:
+                continue
+            count += 1
+            if count > config['MAX_FILES']:
+                yield BatchItem(name, None, language, f'More than {config["MAX_FILES"]} files')
+                return
+            size = os.path.getsize(full_path)
+            with open(full_path, 'rb') as source:
+                yield _item(name, language, source.read(config['MAX_FILE_BYTES'] + 1), size, config)
+
+
+def iter_archive(fileobj, default_language=None, config=None):
+    """
+    Iterator of BatchItems for the source files in a zip or tar archive (a
+    seekable binary file object). Raises ValueError for other files.
+    """
+    config = config or get_batch_settings()
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        members = _zip_members(zipfile.ZipFile(fileobj))
+    else:
+        fileobj.seek(0)
+        try:
+            members = _tar_members(tarfile.open(fileobj=fileobj, mode='r:*'))
+        except tarfile.TarError:
+            raise ValueError('Not a zip or tar archive')
+    return _archive_items(members, default_language, config)
+
+
+def _archive_items(members, default_language, config):
+    count = 0
+    for name, size, read in members:
+        name = posixpath.normpath(name).lstrip('/')
+        if any(_ignored(part, config) for part in name.split('/')):
+            continue
+        language = language_for(name, default_language, config)
+        if language is None:
+            continue
+        count += 1
+        if count > config['MAX_FILES']:
+            yield BatchItem(name, None, language, f'More than {config["MAX_FILES"]} files')
+            return
+        if size > config['MAX_FILE_BYTES']:
+            yield BatchItem(name, None, language, f'Larger than {config["MAX_FILE_BYTES"]} bytes')
+            continue
+        yield _item(name, language, read(), size, config)
+
+
+def _zip_members(archive):
+    with archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, lambda info=info: archive.read(info)
+
+
+def _tar_members(archive):
+    with archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, lambda member=member: archive.extractfile(member).read()
+
+
+def _ignored(name, config):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in config['IGNORE'])
+
+
+def language_for(name, default_language=None, config=None):
+    config = config or get_batch_settings()
+    extension = os.path.splitext(name)[1].lower()
+    return config['EXTENSIONS'].get(extension, default_language)
+
+
+def _item(name, language, data, size, config):
+    if size > config['MAX_FILE_BYTES']:
+        return BatchItem(name, None, language, f'Larger than {config["MAX_FILE_BYTES"]} bytes')
+    try:
+        code = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return BatchItem(name, None, language, 'Not UTF-8 text')
+    if not code.strip():
+        return BatchItem(name, None, language, 'Empty file')
+    return BatchItem(name, code, language, None)
+
+
+def read_progress(path):
+    """
+    {name: submission_id} of the files recorded as done (or skipped, with
+    None) in an earlier run's JSONL output. Later lines win; a line cut
+    short by an interruption is ignored.
+    """
+    progress = {}
+    if not os.path.exists(path):
+        return progress
+    with open(path, encoding='utf-8') as lines:
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'name' not in entry:
+                continue
+            if entry.get('status') in ('done', 'skipped'):
+                progress[entry['name']] = entry.get('submission_id')
+            else:
+                progress.pop(entry['name'], None)
+    return progress
+
+
+def open_output(path, resume=True):
+    """
+    Open a JSONL output file for appending (or truncate it when not
+    resuming), making sure a cut-off last line doesn't swallow the next one
+    """
+    if resume and os.path.exists(path) and os.path.getsize(path):
+        with open(path, 'rb') as existing:
+            existing.seek(-1, io.SEEK_END)
+            needs_newline = existing.read(1) != b'\n'
+        output = open(path, 'a', encoding='utf-8')
+        if needs_newline:
+            output.write('\n')
+        return output
+    return open(path, 'w', encoding='utf-8')
+
+
+async def run_batch(items, emit, concurrency=None, completed=None):
+    """
+    Analyze BatchItems with a pool of concurrency workers, awaiting
+    emit(entry) with one JSON-ready dict per file as it finishes. Files in
+    completed ({name: submission_id}) with unchanged code are not emitted
+    again. Returns the run's counters.
+    """
+    from .views import AnalysisParseError, analyze_submission, describe_openai_error
+
+    concurrency = concurrency or get_batch_settings()['CONCURRENCY']
+    completed = completed or {}
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    # submission_id -> future of the first copy's outcome (without the result)
+    outcomes = {}
+    for name, submission in completed.items():
+        if submission is not None and submission not in outcomes:
+            outcomes[submission] = loop.create_future()
+            outcomes[submission].set_result({'status': 'done', 'analysis_id': submission, 'name': name})
+    counters = {'files': 0, 'done': 0, 'failed': 0, 'skipped': 0, 'duplicates': 0, 'resumed': 0, 'analyzed': 0}
+
+    async def analyze(item, submission):
+        try:
+            result, source = await analyze_submission(item.code.strip(), item.language, endpoint='analyze_batch')
+        except AnalysisParseError:
+            return {'status': 'failed', 'error': 'Could not parse analysis results', 'error_status': 500}, None
+        except Exception as e:
+            logger.warning('Batch analysis of %s failed: %s', item.name, e)
+            message, status = describe_openai_error(e)
+            return {'status': 'failed', 'error': message, 'error_status': status}, None
+        counters['analyzed'] += source != 'hit'
+        return {'status': 'done', 'analysis_id': result['analysis_id'], 'source': source}, result
+
+    async def process(item):
+        counters['files'] += 1
+        entry = {'name': item.name, 'language': item.language}
+        submission = submission_id(item.code, item.language) if item.code is not None else None
+        if item.name in completed and completed[item.name] == submission:
+            counters['resumed'] += 1
+            return
+        if item.code is None:
+            counters['skipped'] += 1
+            await emit({**entry, 'status': 'skipped', 'error': item.error})
+            return
+        entry['submission_id'] = submission
+
+        first = outcomes.get(submission)
+        if first is None:
+            outcomes[submission] = loop.create_future()
+            outcome, result = await analyze(item, submission)
+            outcomes[submission].set_result({**outcome, 'name': item.name})
+        else:
+            # A copy of a file analyzed (or being analyzed) by another worker
+            counters['duplicates'] += 1
+            outcome = dict(await first)
+            entry['duplicate_of'] = outcome.pop('name')
+            result = None
+            if outcome['status'] == 'done':
+                record = await analysis_store.aget(outcome['analysis_id'])
+                if record is None:
+                    outcome, result = await analyze(item, submission)
+                else:
+                    result = record['result']
+                    outcome['source'] = 'duplicate'
+
+        counters[outcome['status']] += 1
+        entry.update(outcome)
+        if result is not None:
+            entry['result'] = result
+        await emit(entry)
+
+    async def work():
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                await process(item)
+            except Exception:
+                logger.exception('Batch worker failed on %s', item.name)
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(work()) for _ in range(concurrency)]
+    try:
+        for item in items:
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for worker in workers:
+            worker.cancel()
+    return counters
@@ -0,0 +1,390 @@
+# benchmark.py
+"""
+Latency and throughput benchmark for the tutor API.
+
+run_benchmark() drives /api/analyze/ (or its streaming variant),
+/api/get_hint/, /api/correction-strategy/ and /api/corrected-code/ through
+Django's async request handler with a synthetic corpus
+(tutor/benchmark_corpus.py), while the LLM is served by the in-process
+stand-in (tutor/standin.py). The report has per-endpoint latency
+percentiles, requests/sec, peak RSS and the time spent decoding completions
+and in transform_response_for_frontend. Reports can be saved as baselines
+and compared to spot regressions. See `manage.py bench_api`.
+"""
+import asyncio
+import json
+import platform
+import time
+from pathlib import Path
+
+import django
+import httpx
+from django.conf import settings
+from django.test import AsyncClient
+
+from . import views
+from .analysis_store import analysis_store
+from .cache import analysis_cache
+from .decoding import decode_stats
+from .fingerprint import near_duplicates
+from .llm import get_client
+from .metrics import llm_completion_tokens, llm_prompt_tokens, llm_tokens
+from .singleflight import llm_flight
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ENDPOINTS = {
+    'analyze': '/api/analyze/',
+    'analyze_stream': '/api/analyze/stream/',
+    'hint': '/api/get_hint/',
+    'correction_strategy': '/api/correction-strategy/',
+    'corrected_code': '/api/corrected-code/',
+}
+
+# Functions in tutor.views whose time is reported separately
+TIMED_FUNCTIONS = {
+    'json_decode': ['decode_analysis', 'decode_strategies', 'decode_hint'],
+    'transform_response_for_frontend': ['transform_response_for_frontend'],
+}
+
+# Endpoint labels of LLM calls, for the per-call token report
+LLM_ENDPOINTS = ('analyze', 'hint', 'correction_strategy', 'corrected_code')
+
+PERCENTILES = (50, 95, 99)
+
+# Metrics compared against a baseline; True when higher is better
+COMPARED_METRICS = {
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'rps': True,
+    'mean_ms': False,
+    'peak_rss_mb': False,
+    'prompt_tokens_mean': False,
+}
+
+
+def get_baseline_dir():
+    return Path(getattr(settings, 'BENCHMARK_BASELINE_DIR', Path(settings.BASE_DIR) / 'benchmarks'))
+
+
+def percentile(sorted_values, percent):
+    """
+    Nearest-rank percentile of an ascending list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None if unknown
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    divisor = 1024 * 1024 if platform.system() == 'Darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+class FunctionTimer:
+    """
+    Wraps module functions to accumulate the time spent in them
+    """
+
+    def __init__(self, module, groups):
+        self.module = module
+        self.groups = groups
+        self.totals = {group: [0, 0.0] for group in groups}  # group -> [calls, seconds]
+        self._originals = {}
+
+    def __enter__(self):
+        for group, names in self.groups.items():
+            for name in names:
+                original = getattr(self.module, name)
+                self._originals[name] = original
+                setattr(self.module, name, self._wrap(group, original))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, original in self._originals.items():
+            setattr(self.module, name, original)
+
+    def _wrap(self, group, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                totals = self.totals[group]
+                totals[0] += 1
+                totals[1] += time.perf_counter() - start
+        return timed
+
+    def report(self):
+        return {
+            group: {
+                'calls': calls,
+                'total_ms': round(seconds * 1000, 3),
+                'mean_ms': round(seconds * 1000 / calls, 4) if calls else 0.0,
+            }
+            for group, (calls, seconds) in self.totals.items()
+        }
+
+
+class BenchmarkRun:
+    """
+    Runs one scenario per corpus submission with bounded concurrency and
+    records the latency of every request
+    """
+
+    def __init__(self, corpus, concurrency=16, endpoints=None, stream=False, depth=None):
+        self.corpus = corpus
+        self.concurrency = concurrency
+        self.endpoints = endpoints or ['analyze', 'hint', 'correction_strategy', 'corrected_code']
+        self.stream = stream
+        self.depth = depth
+        self.latencies = {}   # endpoint -> [seconds]
+        self.errors = {}      # endpoint -> count
+        self.first_event = []  # streaming: seconds to the first event
+
+    async def run(self):
+        client = AsyncClient()
+        queue = asyncio.Queue()
+        for index, submission in enumerate(self.corpus):
+            queue.put_nowait((index, submission))
+
+        async def worker():
+            while True:
+                try:
+                    index, submission = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self.scenario(client, index, submission)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return time.perf_counter() - start
+
+    async def scenario(self, client, index, submission):
+        payload = {'code': submission['code'], 'language': submission['language']}
+        analysis = {}
+        if 'analyze' in self.endpoints:
+            analyze_payload = {**payload, 'depth': self.depth} if self.depth else payload
+            if self.stream:
+                analysis = await self.analyze_stream(client, analyze_payload)
+            else:
+                analysis = await self.post(client, 'analyze', analyze_payload)
+
+        issues = analysis.get('errors', []) + analysis.get('warnings', [])
+        if 'hint' in self.endpoints and analysis.get('analysis_id') and issues:
+            await self.post(client, 'hint', {
+                'analysis_id': analysis['analysis_id'],
+                'issue_id': issues[0]['id'],
+                'level': index % 3 + 1,
+            })
+        # Follow-ups build on the stored analysis when there is one
+        follow_up = {**payload, 'analysis_id': analysis['analysis_id']} if analysis.get('analysis_id') else payload
+        if 'correction_strategy' in self.endpoints:
+            issue_type = issues[0]['title'] if issues else 'general improvements'
+            await self.post(client, 'correction_strategy', {**follow_up, 'issue_type': issue_type})
+        if 'corrected_code' in self.endpoints:
+            await self.post(client, 'corrected_code', follow_up)
+
+    async def post(self, client, endpoint, payload):
+        start = time.perf_counter()
+        response = await client.post(ENDPOINTS[endpoint], json.dumps(payload), content_type='application/json')
+        elapsed = time.perf_counter() - start
+        self.record(endpoint, elapsed, response.status_code)
+        try:
+            return json.loads(response.content)
+        except ValueError:
+            return {}
+
+    async def analyze_stream(self, client, payload):
+        start = time.perf_counter()
+        response = await client.post(ENDPOINTS['analyze_stream'], json.dumps(payload), content_type='application/json')
+        first = None
+        body = []
+        async for part in response.streaming_content:
+            if first is None:
+                first = time.perf_counter() - start
+            body.append(part.decode('utf-8') if isinstance(part, bytes) else part)
+        elapsed = time.perf_counter() - start
+        text = ''.join(body)
+        failed = response.status_code != 200 or 'event: complete' not in text
+        self.record('analyze_stream', elapsed, 500 if failed else 200)
+        if first is not None:
+            self.first_event.append(first)
+        if failed:
+            return {}
+        complete = text.split('event: complete\ndata: ', 1)[1].split('\n\n', 1)[0]
+        return json.loads(complete)
+
+    def record(self, endpoint, elapsed, status):
+        self.latencies.setdefault(endpoint, []).append(elapsed)
+        if status >= 400:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def summarize_latencies(latencies, wall_seconds, errors=0):
+    values = sorted(latencies)
+    summary = {
+        'requests': len(values),
+        'errors': errors,
+        'rps': round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+        'mean_ms': round(sum(values) * 1000 / len(values), 2) if values else 0.0,
+        'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+    }
+    for percent in PERCENTILES:
+        summary[f'p{percent}_ms'] = round(percentile(values, percent) * 1000, 2)
+    return summary
+
+
+def _token_counts():
+    return {
+        endpoint: (
+            llm_prompt_tokens.count(endpoint=endpoint),
+            llm_prompt_tokens.total(endpoint=endpoint),
+            llm_completion_tokens.total(endpoint=endpoint),
+            llm_tokens.value(endpoint=endpoint, kind='cached'),
+        )
+        for endpoint in LLM_ENDPOINTS
+    }
+
+
+def summarize_tokens(before, after):
+    """
+    Per-call token means for each LLM endpoint between two _token_counts()
+    snapshots
+    """
+    summary = {}
+    for endpoint in LLM_ENDPOINTS:
+        calls, prompt, completion, cached = (new - old for old, new in zip(before[endpoint], after[endpoint]))
+        if not calls:
+            continue
+        summary[endpoint] = {
+            'calls': calls,
+            'prompt_tokens_mean': round(prompt / calls, 1),
+            'completion_tokens_mean': round(completion / calls, 1),
+            'cached_tokens': cached,
+        }
+    return summary
+
+
+async def _standin_stats():
+    response = await get_client().get('/stats', cast_to=httpx.Response)
+    return response.json()
+
+
+def run_benchmark(corpus, concurrency=16, endpoints=None, stream=False, use_cache=True, depth=None):
+    """
+    Run the benchmark and return its report. Must be called outside an
+    event loop, with the stand-in provider configured and a scratch
+    database in place (see the bench_api command).
+    """
+    analysis_cache.clear()
+    analysis_store.clear()
+    near_duplicates.clear()
+    cache_enabled = analysis_cache.enabled
+    analysis_cache.enabled = use_cache
+    benchmark = BenchmarkRun(corpus, concurrency, endpoints, stream, depth)
+
+    async def main():
+        wall = await benchmark.run()
+        return wall, await _standin_stats()
+
+    tokens_before = _token_counts()
+    try:
+        with FunctionTimer(views, TIMED_FUNCTIONS) as timer:
+            wall_seconds, llm_stats = asyncio.run(main())
+    finally:
+        analysis_cache.enabled = cache_enabled
+
+    all_latencies = [value for values in benchmark.latencies.values() for value in values]
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'submissions': len(corpus),
+            'concurrency': concurrency,
+            'stream': stream,
+            'depth': depth,
+            'cache': use_cache,
+            'standin': settings.LLM_CLIENT.get('STANDIN', {}),
+            'scheduler': getattr(settings, 'LLM_SCHEDULER', {}),
+        },
+        'overall': {
+            **summarize_latencies(all_latencies, wall_seconds, sum(benchmark.errors.values())),
+            'wall_s': round(wall_seconds, 3),
+            'peak_rss_mb': peak_rss_mb(),
+        },
+        'endpoints': {
+            endpoint: summarize_latencies(values, wall_seconds, benchmark.errors.get(endpoint, 0))
+            for endpoint, values in benchmark.latencies.items()
+        },
+        'timings': timer.report(),
+        'cache': analysis_cache.stats(),
+        'singleflight': llm_flight.stats(),
+        'decoding': decode_stats.stats(),
+        'llm': llm_stats,
+        'tokens': summarize_tokens(tokens_before, _token_counts()),
+    }
+    if benchmark.first_event:
+        report['endpoints']['analyze_stream']['first_event_p50_ms'] = round(
+            percentile(sorted(benchmark.first_event), 50) * 1000, 2
+        )
+    return report
+
+
+def save_baseline(report, name):
+    """
+    Write a report to the baseline directory and return its path
+    """
+    directory = get_baseline_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{name}.json'
+    path.write_text(json.dumps(report, indent=2, default=str) + '\n', encoding='utf-8')
+    return path
+
+
+def load_baseline(name):
+    """
+    Load a saved baseline by name or path
+    """
+    path = Path(name)
+    if not path.suffix:
+        path = get_baseline_dir() / f'{name}.json'
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def compare_reports(baseline, report, threshold=0.10):
+    """
+    Compare report with baseline. Returns rows of (scope, metric, baseline,
+    current, relative change, regressed) for every metric in both.
+    """
+    rows = []
+    scopes = [('overall', baseline.get('overall', {}), report.get('overall', {}))]
+    for endpoint, current in report.get('endpoints', {}).items():
+        scopes.append((endpoint, baseline.get('endpoints', {}).get(endpoint, {}), current))
+    for group, current in report.get('timings', {}).items():
+        scopes.append((group, baseline.get('timings', {}).get(group, {}), current))
+    for endpoint, current in report.get('tokens', {}).items():
+        scopes.append((f'{endpoint} tokens', baseline.get('tokens', {}).get(endpoint, {}), current))
+
+    for scope, before, after in scopes:
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before.get(metric), after.get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            rows.append((scope, metric, old, new, change, worse > threshold))
+    return rows
@@ -0,0 +1,191 @@
+# benchmark_corpus.py
+"""
+Synthetic corpus of student submissions for the API benchmark.
+
+Submissions are assembled from small per-language building blocks (helper
+functions, classes, loops) with seeded names and constants, so a corpus is
+reproducible but its submissions are distinct. Sizes range from a single
+function to files large enough to be analyzed in chunks, and a share of
+submissions carry a syntax error that the local pre-analysis answers.
+"""
+import random
+
+LANGUAGES = ['python', 'javascript', 'java', 'cpp']
+
+# Number of building blocks per submission size
+SIZES = {
+    'small': 1,
+    'medium': 6,
+    'large': 40,
+}
+
+NOUNS = ['score', 'item', 'grade', 'order', 'student', 'price', 'value', 'record', 'entry', 'total']
+VERBS = ['filter', 'count', 'collect', 'average', 'find', 'merge', 'update', 'check', 'sum', 'rank']
+
+PYTHON_BLOCKS = [
+    '''def {verb}_{noun}s(items, limit={n}):
+    """Return the {noun}s below limit, scaled"""
+    result = []
+    for item in items:
+        if item is not None and item < limit:
+            result.append(item * {k})
+    return result
+''',
+    '''class {Noun}Tracker:
+    def __init__(self):
+        self.{noun}s = {{}}
+
+    def add(self, key, value):
+        self.{noun}s[key] = self.{noun}s.get(key, 0) + value
+
+    def top(self, count={n}):
+        return sorted(self.{noun}s.items(), key=lambda pair: pair[1], reverse=True)[:count]
+''',
+    '''def {verb}_{noun}(records):
+    total = 0
+    for i in range(len(records)):
+        total = total + records[i]["{noun}"]
+    if len(records) == 0:
+        return 0
+    return total / len(records)
+''',
+]
+
+JAVASCRIPT_BLOCKS = [
+    '''function {verb}{Noun}s(items, limit = {n}) {{
+  var result = [];
+  for (var i = 0; i < items.length; i++) {{
+    if (items[i] != null && items[i] < limit) {{
+      result.push(items[i] * {k});
+    }}
+  }}
+  return result;
+}}
+''',
+    '''class {Noun}Store {{
+  constructor() {{
+    this.{noun}s = new Map();
+  }}
+
+  add(key, value) {{
+    this.{noun}s.set(key, (this.{noun}s.get(key) || 0) + value);
+  }}
+}}
+''',
+    '''const {verb}{Noun} = (records) => {{
+  let total = 0;
+  records.forEach((record) => {{ total += record.{noun}; }});
+  if (records.length == 0) return 0;
+  return total / records.length;
+}};
+''',
+]
+
+JAVA_BLOCKS = [
+    '''    public static List<Integer> {verb}{Noun}s(List<Integer> items) {{
+        List<Integer> result = new ArrayList<>();
+        for (int i = 0; i < items.size(); i++) {{
+            if (items.get(i) != null && items.get(i) < {n}) {{
+                result.add(items.get(i) * {k});
+            }}
+        }}
+        return result;
+    }}
+''',
+    '''    public static double {verb}{Noun}(int[] records) {{
+        int total = 0;
+        for (int record : records) {{
+            total += record;
+        }}
+        return records.length == 0 ? 0 : total / records.length;
+    }}
+''',
+]
+
+CPP_BLOCKS = [
+    '''std::vector<int> {verb}_{noun}s(const std::vector<int>& items) {{
+    std::vector<int> result;
+    for (size_t i = 0; i <= items.size(); i++) {{
+        if (items[i] < {n}) {{
+            result.push_back(items[i] * {k});
+        }}
+    }}
+    return result;
+}}
+''',
+    '''double {verb}_{noun}(int* records, int count) {{
+    int total = 0;
+    for (int i = 0; i < count; i++) {{
+        total += records[i];
+    }}
+    return count == 0 ? 0 : total / count;
+}}
+''',
+]
+
+BLOCKS = {
+    'python': PYTHON_BLOCKS,
+    'javascript': JAVASCRIPT_BLOCKS,
+    'java': JAVA_BLOCKS,
+    'cpp': CPP_BLOCKS,
+}
+
+HEADERS = {
+    'python': '',
+    'javascript': '',
+    'java': 'import java.util.*;\n\npublic class Submission{index} {{\n',
+    'cpp': '#include <vector>\n\n',
+}
+
+FOOTERS = {
+    'python': '',
+    'javascript': '',
+    'java': '}\n',
+    'cpp': '',
+}
+
+
+def build_submission(language, size, rng, index=0, syntax_error=False):
+    """
+    Assemble one submission of the given language and size
+    """
+    blocks = []
+    for _ in range(SIZES[size]):
+        noun = rng.choice(NOUNS)
+        blocks.append(rng.choice(BLOCKS[language]).format(
+            noun=noun, Noun=noun.capitalize(), verb=rng.choice(VERBS),
+            n=rng.randint(2, 500), k=rng.randint(2, 9),
+        ))
+    code = HEADERS[language].format(index=index) + '\n'.join(blocks) + FOOTERS[language]
+
+    if syntax_error:
+        if language == 'python':
+            # Drop the colon of the first definition
+            code = code.replace('):\n', ')\n', 1)
+        else:
+            # Drop the last closing brace
+            position = code.rfind('}')
+            code = code[:position] + code[position + 1:]
+    return code
+
+
+def build_corpus(count, languages=None, sizes=None, syntax_error_rate=0.15, seed=0):
+    """
+    Return count submissions as dicts with code, language, size and
+    syntax_error, cycling through languages and sizes
+    """
+    rng = random.Random(seed)
+    languages = languages or LANGUAGES
+    sizes = sizes or list(SIZES)
+    corpus = []
+    for index in range(count):
+        language = languages[index % len(languages)]
+        size = sizes[(index // len(languages)) % len(sizes)]
+        syntax_error = rng.random() < syntax_error_rate
+        corpus.append({
+            'code': build_submission(language, size, rng, index, syntax_error),
+            'language': language,
+            'size': size,
+            'syntax_error': syntax_error,
+        })
+    return corpus
@@ -0,0 +1,371 @@
+# cache.py
+"""
+Content-addressed cache for code analysis results.
+
+Results are keyed by the normalized code, language, model and prompt version,
+so byte-identical submissions (e.g. a whole class pasting the same starter
+exercise) are answered without another OpenAI call. There are two tiers:
+
+- an in-process LRU tier bounded by entry count and total size
+- a persistent tier stored in the default database (AnalysisCacheEntry)
+
+Both tiers expire entries after a TTL. Async writes to the persistent tier
+go through the background writer (tutor/persistence.py).
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .persistence import db_writer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SETTINGS = {
+    'ENABLED': True,
+    'MEMORY_MAX_ENTRIES': 512,
+    'MEMORY_MAX_BYTES': 32 * 1024 * 1024,
+    'PERSISTENT': True,
+    'PERSISTENT_MAX_ENTRIES': 20000,
+    'TTL': 7 * 24 * 60 * 60,
+    'PRUNE_INTERVAL': 100,
+}
+
+
+def normalize_code(code):
+    """
+    Normalize code so that trivially different copies of the same submission
+    share a cache entry (line endings, trailing whitespace, blank edges).
+    Indentation and tabs are kept as they are: mixing tabs and spaces
+    changes what Python accepts, and a tab inside a string is part of it.
+    """
+    code = code.replace('\r\n', '\n').replace('\r', '\n')
+    lines = [line.rstrip() for line in code.split('\n')]
+    return '\n'.join(lines).strip('\n')
+
+
+def make_cache_key(code, language, model, prompt_version):
+    """
+    Build the content-addressed key for an analysis request
+    """
+    material = json.dumps(
+        [normalize_code(code), language.lower(), model, str(prompt_version)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """
+    Two-tier (memory LRU + database) cache of transformed analysis responses.
+
+    Values are stored as serialized JSON so that cached responses can't be
+    mutated by callers and their size is known for eviction.
+    """
+
+    def __init__(self, options=None):
+        config = dict(DEFAULT_CACHE_SETTINGS)
+        config.update(options if options is not None else getattr(settings, 'ANALYSIS_CACHE', {}))
+
+        self.enabled = config['ENABLED']
+        self.memory_max_entries = config['MEMORY_MAX_ENTRIES']
+        self.memory_max_bytes = config['MEMORY_MAX_BYTES']
+        self.persistent = config['PERSISTENT']
+        self.persistent_max_entries = config['PERSISTENT_MAX_ENTRIES']
+        self.ttl = config['TTL']
+        self.prune_interval = config['PRUNE_INTERVAL']
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._memory_bytes = 0
+        self._sets_since_prune = 0
+        self._counters = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'persistent_errors': 0,
+        }
+
+    # Public API
+
+    def get(self, key):
+        """
+        Return the cached response for key, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        payload = self._memory_get(key)
+        if payload is not None:
+            self._count('memory_hits')
+            return json.loads(payload)
+
+        if self.persistent:
+            payload = self._persistent_get(key)
+            if payload is not None:
+                self._count('persistent_hits')
+                self._memory_set(key, payload)
+                return json.loads(payload)
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value, language=''):
+        """
+        Store a response in both tiers
+        """
+        if not self.enabled:
+            return
+
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        self._count('sets')
+        self._memory_set(key, payload)
+        if self.persistent:
+            self._persistent_set(key, payload, language)
+
+    async def aget(self, key):
+        """
+        Async get(). Memory hits are answered inline; only the persistent
+        tier is consulted from a worker thread.
+        """
+        if not self.enabled:
+            return None
+
+        payload = self._memory_get(key)
+        if payload is not None:
+            self._count('memory_hits')
+            return json.loads(payload)
+
+        if self.persistent:
+            payload = await sync_to_async(self._persistent_get)(key, touch=False)
+            if payload is not None:
+                await db_writer.aput('analysis_cache_touch', key)
+                self._count('persistent_hits')
+                self._memory_set(key, payload)
+                return json.loads(payload)
+
+        self._count('misses')
+        return None
+
+    async def aset(self, key, value, language=''):
+        """
+        Async set()
+        """
+        if not self.enabled:
+            return
+
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        self._count('sets')
+        self._memory_set(key, payload)
+        if self.persistent:
+            await db_writer.aput('analysis_cache', (self, key, payload, language))
+
+    def preload(self, limit):
+        """
+        Load up to limit of the most recently used persistent entries into
+        the memory tier. Returns how many were loaded.
+        """
+        if not self.enabled or not self.persistent or limit <= 0:
+            return 0
+        from .models import AnalysisCacheEntry
+
+        try:
+            rows = list(
+                AnalysisCacheEntry.objects.filter(expires_at__gt=timezone.now())
+                .order_by('-accessed_at')
+                .values_list('key', 'payload')[:min(limit, self.memory_max_entries)]
+            )
+        except DatabaseError:
+            self._count('persistent_errors')
+            logger.exception('Could not preload the analysis cache')
+            return 0
+        # Oldest first, so the most recently used end up least likely to be evicted
+        for key, payload in reversed(rows):
+            self._memory_set(key, payload)
+        return len(rows)
+
+    def clear(self):
+        """
+        Drop every entry from both tiers
+        """
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+        if self.persistent:
+            try:
+                from .models import AnalysisCacheEntry
+                AnalysisCacheEntry.objects.all().delete()
+            except DatabaseError:
+                self._count('persistent_errors')
+                logger.exception('Could not clear persistent analysis cache')
+
+    def stats(self):
+        """
+        Hit/miss counters and current memory tier usage
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._entries)
+            stats['memory_bytes'] = self._memory_bytes
+        lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+        hits = stats['memory_hits'] + stats['persistent_hits']
+        stats['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    # Memory tier
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                self._memory_discard(key)
+                self._counters['expirations'] += 1
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def _memory_set(self, key, payload):
+        size = len(payload)
+        if size > self.memory_max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._memory_discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, payload)
+            self._memory_bytes += size
+            while self._entries and (
+                len(self._entries) > self.memory_max_entries
+                or self._memory_bytes > self.memory_max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._memory_discard(oldest)
+                self._counters['evictions'] += 1
+
+    def _memory_discard(self, key):
+        # Caller must hold self._lock
+        _, payload = self._entries.pop(key)
+        self._memory_bytes -= len(payload)
+
+    # Persistent tier
+
+    def _persistent_get(self, key, touch=True):
+        from .models import AnalysisCacheEntry
+
+        now = timezone.now()
+        try:
+            entry = AnalysisCacheEntry.objects.filter(key=key, expires_at__gt=now).only('payload').first()
+            if entry is None:
+                return None
+            if touch:
+                AnalysisCacheEntry.objects.filter(key=key).update(accessed_at=now)
+            return entry.payload
+        except DatabaseError:
+            self._count('persistent_errors')
+            logger.exception('Persistent analysis cache read failed')
+            return None
+
+    def _persistent_set(self, key, payload, language):
+        try:
+            self._persistent_write([(key, payload, language)])
+        except DatabaseError:
+            self._count('persistent_errors')
+            logger.exception('Persistent analysis cache write failed')
+
+    def _persistent_write(self, entries):
+        """
+        Upsert [(key, payload, language)] and prune every PRUNE_INTERVAL sets
+        """
+        from .models import AnalysisCacheEntry
+
+        now = timezone.now()
+        latest = {key: (payload, language) for key, payload, language in entries}
+        AnalysisCacheEntry.objects.bulk_create(
+            [
+                AnalysisCacheEntry(
+                    key=key,
+                    language=language[:32],
+                    payload=payload,
+                    size=len(payload),
+                    created_at=now,
+                    accessed_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl),
+                )
+                for key, (payload, language) in latest.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['language', 'payload', 'size', 'accessed_at', 'expires_at'],
+        )
+
+        with self._lock:
+            self._sets_since_prune += len(latest)
+            should_prune = self._sets_since_prune >= self.prune_interval
+            if should_prune:
+                self._sets_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """
+        Apply TTL and size-based eviction to the persistent tier
+        """
+        if not self.persistent:
+            return
+        from .models import AnalysisCacheEntry
+
+        try:
+            # A savepoint when run inside the background writer's batch
+            with transaction.atomic():
+                expired, _ = AnalysisCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+                evicted = 0
+                overflow = AnalysisCacheEntry.objects.count() - self.persistent_max_entries
+                if overflow > 0:
+                    stale_keys = list(
+                        AnalysisCacheEntry.objects.order_by('accessed_at').values_list('key', flat=True)[:overflow]
+                    )
+                    evicted, _ = AnalysisCacheEntry.objects.filter(key__in=stale_keys).delete()
+        except DatabaseError:
+            self._count('persistent_errors')
+            logger.exception('Persistent analysis cache prune failed')
+            return
+
+        with self._lock:
+            self._counters['expirations'] += expired
+            self._counters['evictions'] += evicted
+
+
+analysis_cache = AnalysisCache()
+
+
+@db_writer.handler('analysis_cache')
+def _write_cache_entries(rows):
+    caches = {}
+    for cache, key, payload, language in rows:
+        caches.setdefault(id(cache), (cache, []))[1].append((key, payload, language))
+    for cache, entries in caches.values():
+        cache._persistent_write(entries)
+
+
+@db_writer.handler('analysis_cache_touch')
+def _touch_cache_entries(keys):
+    from .models import AnalysisCacheEntry
+
+    AnalysisCacheEntry.objects.filter(key__in=set(keys)).update(accessed_at=timezone.now())
@@ -0,0 +1,280 @@
+# chunking.py
+"""
+Chunked analysis of large submissions.
+
+A submission whose code exceeds the token budget is split along function and
+class boundaries (top-level statements for Python, top-level brace blocks for
+the C-family languages and JavaScript). Each chunk is analyzed separately and
+in parallel, then merge_chunk_analyses() stitches the results back into one
+analysis: issue ids renumbered, line numbers shifted back to file positions
+and concept_map groups re-aggregated.
+"""
+import ast
+import math
+import re
+from collections import namedtuple
+
+from django.conf import settings
+
+from .prompts import ANALYSIS_MODEL, count_tokens
+
+DEFAULT_CHUNKING_SETTINGS = {
+    # Submissions up to this many code tokens are analyzed in one request
+    'MAX_CODE_TOKENS': 2500,
+    # Target size of each chunk when a submission is split
+    'CHUNK_TOKENS': 1500,
+    # Upper bound on parallel requests for one submission; chunks grow
+    # beyond CHUNK_TOKENS rather than exceed it
+    'MAX_CHUNKS': 8,
+}
+
+SEVERITY_ORDER = ['low', 'medium', 'high', 'critical']
+
+# first_line / last_line are 1-based and inclusive
+Chunk = namedtuple('Chunk', ['first_line', 'last_line', 'text'])
+
+_STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$')
+
+
+def get_chunking_settings():
+    config = dict(DEFAULT_CHUNKING_SETTINGS)
+    config.update(getattr(settings, 'ANALYSIS_CHUNKING', {}))
+    return config
+
+
+def plan_chunks(code, language, model=ANALYSIS_MODEL):
+    """
+    Split code into chunks that each fit the token budget. Returns a single
+    chunk covering the whole file when no split is needed.
+    """
+    config = get_chunking_settings()
+    lines = code.split('\n')
+    total_tokens = count_tokens(code, model)
+    if total_tokens <= config['MAX_CODE_TOKENS'] or len(lines) < 2:
+        return [Chunk(1, len(lines), code)]
+
+    units = None
+    if language.lower() == 'python':
+        units = _python_units(code, lines)
+    if units is None:
+        units = _brace_units(lines)
+
+    unit_tokens = [count_tokens('\n'.join(lines[first - 1:last]), model) for first, last in units]
+    budget = max(config['CHUNK_TOKENS'], math.ceil(total_tokens / config['MAX_CHUNKS']))
+    ranges = _group_units(units, unit_tokens, lines, budget, model)
+
+    # Oversized units may still produce too many chunks; widen the budget
+    while len(ranges) > config['MAX_CHUNKS']:
+        budget = math.ceil(budget * 1.25)
+        ranges = _group_units(units, unit_tokens, lines, budget, model)
+
+    return [Chunk(first, last, '\n'.join(lines[first - 1:last])) for first, last in ranges]
+
+
+def _python_units(code, lines):
+    """
+    Line ranges of top-level statements, with preceding comments and
+    decorators attached to the definition they belong to
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    if not tree.body:
+        return None
+
+    starts = []
+    for node in tree.body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])])
+        # Pull leading comment lines into the unit
+        while start > 1 and lines[start - 2].lstrip().startswith('#'):
+            start -= 1
+        starts.append(start)
+    starts[0] = 1
+    return _ranges_from_starts(sorted(set(starts)), len(lines))
+
+
+def _brace_units(lines):
+    """
+    Line ranges that end where brace depth returns to zero, or at blank
+    lines between top-level blocks
+    """
+    depth = 0
+    in_block_comment = False
+    starts = [1]
+    for number, line in enumerate(lines, start=1):
+        text = line
+        if in_block_comment:
+            if '*/' not in text:
+                continue
+            text = text.split('*/', 1)[1]
+            in_block_comment = False
+        text = _STRING_OR_COMMENT.sub('', text)
+        if '/*' in text:
+            head, _, tail = text.partition('/*')
+            in_block_comment = '*/' not in tail
+            text = head + (tail.split('*/', 1)[1] if not in_block_comment else '')
+        depth = max(depth + text.count('{') - text.count('}'), 0)
+
+        if depth == 0 and number < len(lines):
+            if '}' in text or text.rstrip().endswith(';') or not line.strip():
+                starts.append(number + 1)
+    return _ranges_from_starts(sorted(set(starts)), len(lines))
+
+
+def _ranges_from_starts(starts, total_lines):
+    ranges = []
+    for index, start in enumerate(starts):
+        end = starts[index + 1] - 1 if index + 1 < len(starts) else total_lines
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+def _group_units(units, unit_tokens, lines, budget, model):
+    """
+    Greedily pack consecutive units into chunks of at most budget tokens,
+    splitting units that are too large on their own
+    """
+    ranges = []
+    current_first, current_last, current_tokens = None, None, 0
+
+    for (first, last), tokens in zip(units, unit_tokens):
+        if tokens > budget:
+            if current_first is not None:
+                ranges.append((current_first, current_last))
+                current_first, current_tokens = None, 0
+            ranges.extend(_split_lines(first, last, lines, budget, model))
+            continue
+        if current_first is not None and current_tokens + tokens > budget:
+            ranges.append((current_first, current_last))
+            current_first, current_tokens = None, 0
+        if current_first is None:
+            current_first = first
+        current_last = last
+        current_tokens += tokens
+
+    if current_first is not None:
+        ranges.append((current_first, current_last))
+    return ranges
+
+
+def _split_lines(first, last, lines, budget, model):
+    """
+    Split an oversized unit line by line, preferring blank lines as cut points
+    """
+    ranges = []
+    start = first
+    tokens = 0
+    last_blank = None
+    for number in range(first, last + 1):
+        line_tokens = count_tokens(lines[number - 1], model) + 1
+        if tokens + line_tokens > budget and number > start:
+            cut = last_blank if last_blank is not None and last_blank > start else number - 1
+            ranges.append((start, cut))
+            start = cut + 1
+            tokens = count_tokens('\n'.join(lines[start - 1:number]), model)
+            last_blank = None
+        else:
+            tokens += line_tokens
+        if not lines[number - 1].strip():
+            last_blank = number
+    if start <= last:
+        ranges.append((start, last))
+    return ranges
+
+
+def merge_chunk_analyses(chunk_results, language):
+    """
+    Merge [(chunk, analysis_json or None)] into one analysis in the LLM
+    schema. Chunks whose analysis failed keep their original code and are
+    mentioned in the suggestions.
+    """
+    issues = []
+    concept_groups = {}  # (category, concept) -> entry
+    strategies = []
+    suggestions = []
+    best_practices = []
+    concepts_covered = []
+    corrected_parts = []
+    # Analyses at depths without corrected code leave it empty
+    corrected_any = False
+    severities = []
+
+    for chunk, analysis in chunk_results:
+        if analysis is None:
+            corrected_parts.append(chunk.text)
+            suggestions.append(
+                f'Lines {chunk.first_line}-{chunk.last_line} could not be analyzed. Try analyzing them on their own.'
+            )
+            continue
+
+        offset = chunk.first_line - 1
+        id_map = {}
+        for issue in analysis.get('issues', []):
+            merged_issue = dict(issue)
+            merged_issue['id'] = len(issues) + 1
+            id_map[str(issue.get('id'))] = merged_issue['id']
+            if isinstance(merged_issue.get('line'), int):
+                merged_issue['line'] += offset
+            issues.append(merged_issue)
+
+        for category, concepts in (analysis.get('concept_map') or {}).items():
+            for concept in concepts or []:
+                name = concept.get('concept', '')
+                entry = concept_groups.setdefault(
+                    (category, name), {'concept': name, 'count': 0, 'issues': [], '_reported': 0}
+                )
+                entry['issues'].extend(
+                    id_map[str(issue_id)] for issue_id in concept.get('issues', []) if str(issue_id) in id_map
+                )
+                entry['_reported'] += concept.get('count', 0) or 0
+
+        for strategy in analysis.get('correction_strategies', []):
+            merged_strategy = dict(strategy)
+            merged_strategy['applicable_to_issues'] = [
+                id_map[str(issue_id)] for issue_id in strategy.get('applicable_to_issues', [])
+                if str(issue_id) in id_map
+            ]
+            strategies.append(merged_strategy)
+
+        summary = analysis.get('analysis_summary', {})
+        severities.append(summary.get('overall_severity'))
+        for concept in summary.get('concepts_covered', []):
+            if concept not in concepts_covered:
+                concepts_covered.append(concept)
+        for item in analysis.get('suggestions', []):
+            if item not in suggestions:
+                suggestions.append(item)
+        for item in analysis.get('best_practices', []):
+            if item not in best_practices:
+                best_practices.append(item)
+
+        corrected_parts.append(analysis.get('corrected_code') or chunk.text)
+        corrected_any = corrected_any or bool(analysis.get('corrected_code'))
+
+    concept_map = {}
+    for (category, _), entry in concept_groups.items():
+        reported = entry.pop('_reported')
+        entry['count'] = len(entry['issues']) or reported
+        concept_map.setdefault(category, []).append(entry)
+
+    severities += [issue.get('severity') for issue in issues]
+    known = [severity for severity in severities if severity in SEVERITY_ORDER]
+    total_errors = sum(1 for issue in issues if str(issue.get('type', '')).lower() == 'error')
+
+    return {
+        'analysis_summary': {
+            'total_errors': total_errors,
+            'total_warnings': len(issues) - total_errors,
+            'overall_severity': max(known, key=SEVERITY_ORDER.index) if known else 'low',
+            'language': language,
+            'concepts_covered': concepts_covered,
+        },
+        'concept_map': concept_map,
+        'issues': issues,
+        'correction_strategies': strategies,
+        'corrected_code': '\n'.join(corrected_parts) if corrected_any else '',
+        'suggestions': suggestions,
+        'best_practices': best_practices,
+    }
@@ -0,0 +1,568 @@
+# decoding.py
+"""
+Decoding of LLM responses into validated payloads.
+
+Completions are not always clean JSON: they arrive wrapped in prose or
+markdown fences, cut off at max_tokens, with trailing commas or with
+unescaped backslashes copied from the student's code. repair_json() recovers
+the JSON value from such text, and the decode_* functions validate it
+against typed schemas, coercing loose values (line numbers as "12-14",
+severities in capitals, ids as strings) and dropping only the items that
+can't be used. A truncated analysis still yields its complete issues
+instead of a parse error, so the completion isn't thrown away.
+"""
+import functools
+import json
+import re
+import threading
+from collections import namedtuple
+from typing import Annotated, Optional, Union
+
+from pydantic import (
+    BaseModel, BeforeValidator, ConfigDict, TypeAdapter, ValidationError, field_validator, model_validator
+)
+
+from .metrics import decode_duration
+
+SEVERITIES = ('low', 'medium', 'high', 'critical')
+
+# Upper bound on truncation points tried when closing a cut-off response
+MAX_REPAIR_ATTEMPTS = 64
+
+
+class Decoded(namedtuple('Decoded', ['data', 'repaired', 'truncated', 'dropped'])):
+    """
+    A validated payload as plain JSON data. repaired is True when the text
+    needed more than slicing to parse; truncated is True when a cut-off
+    response had to be closed; dropped counts the items that failed
+    validation. Lossless repairs (a trailing comma, an invalid escape)
+    don't make a payload partial.
+    """
+    __slots__ = ()
+
+    @property
+    def partial(self):
+        return self.truncated or self.dropped > 0
+
+
+_FENCE = re.compile(r'^\s*```[\w+#.-]*[ \t]*\n?|\n?```\s*$')
+_CODE_BLOCK = re.compile(r'```[\w+#.-]*[ \t]*\n(.*?)\n?```', re.DOTALL)
+_FIRST_INT = re.compile(r'-?\d+')
+_VALID_ESCAPES = set('"\\/bfnrt')
+_HEX_DIGITS = set('0123456789abcdefABCDEF')
+
+
+class DecodeError(ValueError):
+    """
+    No usable payload could be recovered from a completion
+    """
+    def __init__(self, message, raw_text=''):
+        super().__init__(message)
+        self.raw_text = raw_text
+
+
+# JSON repair
+
+def strip_code_fences(text):
+    """
+    Remove a markdown code fence wrapped around the whole text
+    """
+    return _FENCE.sub('', text.strip())
+
+
+def extract_code_block(text):
+    """
+    Return the contents of the first fenced code block, or the text itself
+    when it has none
+    """
+    match = _CODE_BLOCK.search(text)
+    return match.group(1) if match else strip_code_fences(text)
+
+
+def repair_json(text):
+    """
+    Recover a JSON object from a completion. Returns (value, repaired,
+    truncated): repaired when the text needed fixing, truncated when values
+    past the end of a cut-off response were lost.
+
+    Text before the first '{' and after its matching '}' is ignored.
+    Trailing commas and invalid backslash escapes are fixed, and a
+    truncated object is closed after its last complete value. Raises
+    DecodeError when no object can be recovered.
+    """
+    start = text.find('{')
+    while start != -1:
+        try:
+            return _repair_from(text, start)
+        except ValueError:
+            # A brace in leading prose; try the next one
+            start = text.find('{', start + 1)
+    raise DecodeError('No JSON object found in response', text)
+
+
+def _repair_from(text, start):
+    end, cut_points, open_string = _scan(text, start)
+    candidate = text[start:end]
+    if open_string is None:
+        try:
+            return json.loads(candidate, strict=False), False, False
+        except json.JSONDecodeError:
+            pass
+        sanitized = _sanitize(candidate)
+        try:
+            return json.loads(sanitized, strict=False), True, False
+        except json.JSONDecodeError:
+            # Possibly a '}' inside prose that closed early; rescan below
+            if end < len(text):
+                raise ValueError('Unbalanced object')
+
+    # Truncated: close an unfinished string value first, then fall back to
+    # cutting after each earlier complete value
+    attempts = []
+    if open_string is not None:
+        tail = text[start:]
+        if (len(tail) - len(tail.rstrip('\\'))) % 2:
+            # Cut off in the middle of an escape sequence
+            tail = tail[:-1]
+        attempts.append(tail + '"' + open_string)
+    attempts.extend(text[start:position] + closers for position, closers in reversed(cut_points))
+    for attempt in attempts[:MAX_REPAIR_ATTEMPTS]:
+        try:
+            return json.loads(_sanitize(attempt), strict=False), True, True
+        except json.JSONDecodeError:
+            continue
+    raise ValueError('Could not close truncated object')
+
+
+def _scan(text, start):
+    """
+    Scan the object starting at text[start]. Returns (end, cut_points,
+    open_string): end is one past its closing brace (or len(text) when
+    truncated), cut_points lists (position, closers) after each complete
+    value and open_string holds the closers needed after closing an
+    unfinished string value, or None.
+    """
+    stack = []  # [bracket, expect_key]
+    cut_points = []
+    in_string = False
+    string_is_key = False
+    escape = False
+    position = start
+    length = len(text)
+
+    def closers():
+        return ''.join('}' if frame[0] == '{' else ']' for frame in reversed(stack))
+
+    while position < length:
+        char = text[position]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+                if not string_is_key:
+                    cut_points.append((position + 1, closers()))
+            position += 1
+            continue
+
+        if char == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1][0] == '{' and stack[-1][1]
+        elif char in '{[':
+            stack.append([char, char == '{'])
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                return position + 1, cut_points, None
+            cut_points.append((position + 1, closers()))
+        elif char == ':' and stack and stack[-1][0] == '{':
+            stack[-1][1] = False
+        elif char == ',' and stack and stack[-1][0] == '{':
+            stack[-1][1] = True
+        elif char.isalnum() or char == '-':
+            # Number or literal; only complete if something follows it
+            token_end = position
+            while token_end < length and (text[token_end].isalnum() or text[token_end] in '.+-'):
+                token_end += 1
+            if token_end < length:
+                cut_points.append((token_end, closers()))
+            position = token_end
+            continue
+        position += 1
+
+    if in_string and not string_is_key:
+        return length, cut_points, closers()
+    return length, cut_points, None
+
+
+def _sanitize(text):
+    """
+    Drop trailing commas and escape stray backslashes inside strings
+    """
+    out = []
+    in_string = False
+    position = 0
+    length = len(text)
+    while position < length:
+        char = text[position]
+        if in_string:
+            if char == '\\':
+                following = text[position + 1:position + 2]
+                if following and following in _VALID_ESCAPES:
+                    out.append(text[position:position + 2])
+                    position += 2
+                    continue
+                if following == 'u' and len(text) >= position + 6 and set(text[position + 2:position + 6]) <= _HEX_DIGITS:
+                    out.append(text[position:position + 6])
+                    position += 6
+                    continue
+                out.append('\\\\')
+            else:
+                if char == '"':
+                    in_string = False
+                out.append(char)
+            position += 1
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char == ',':
+            lookahead = position + 1
+            while lookahead < length and text[lookahead].isspace():
+                lookahead += 1
+            if lookahead == length or text[lookahead] in '}]':
+                position += 1
+                continue
+        out.append(char)
+        position += 1
+    return ''.join(out)
+
+
+# Coercion helpers
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '\n'.join(_to_text(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def _to_optional_int(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _FIRST_INT.search(str(value))
+    return int(match.group()) if match else None
+
+
+def _to_count(value):
+    return max(_to_optional_int(value) or 0, 0)
+
+
+def _to_issue_id(value):
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _to_severity(value):
+    severity = _to_text(value).strip().lower()
+    return severity if severity in SEVERITIES else 'medium'
+
+
+def _to_issue_type(value):
+    return 'error' if 'error' in _to_text(value).lower() else 'warning'
+
+
+def _salvaged_list(item_type):
+    """
+    List validator that keeps the valid items and counts the dropped ones
+    in the validation context
+    """
+    adapter = TypeAdapter(item_type)
+
+    def validate(value, info):
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            value = [value]
+        kept = []
+        for item in value:
+            try:
+                kept.append(adapter.validate_python(item, context=info.context))
+            except ValidationError:
+                if info.context is not None:
+                    info.context['dropped'] += 1
+        return kept
+
+    return BeforeValidator(validate)
+
+
+Text = Annotated[str, BeforeValidator(_to_text)]
+OptionalInt = Annotated[Optional[int], BeforeValidator(_to_optional_int)]
+Count = Annotated[int, BeforeValidator(_to_count)]
+IssueId = Annotated[Union[int, str], BeforeValidator(_to_issue_id)]
+Severity = Annotated[str, BeforeValidator(_to_severity)]
+TextList = Annotated[list[Text], _salvaged_list(Text)]
+IdList = Annotated[list[IssueId], _salvaged_list(IssueId)]
+
+
+# Schemas
+
+class Payload(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+
+class Hints(Payload):
+    level1: Optional[Text] = None
+    level2: Optional[Text] = None
+    level3: Optional[Text] = None
+
+
+class Issue(Payload):
+    id: Optional[IssueId] = None
+    type: Annotated[str, BeforeValidator(_to_issue_type)] = 'warning'
+    category: Text = ''
+    title: Text = ''
+    description: Text = ''
+    cause: Text = ''
+    fix: Text = ''
+    line: OptionalInt = None
+    column: OptionalInt = None
+    code_snippet: Text = ''
+    severity: Severity = 'medium'
+    hints: Optional[Hints] = None
+
+    @field_validator('hints', mode='before')
+    @classmethod
+    def _hints_mapping(cls, value):
+        return value if isinstance(value, dict) else None
+
+    @model_validator(mode='after')
+    def _has_content(self):
+        if not (self.title or self.description):
+            raise ValueError('issue has neither title nor description')
+        return self
+
+
+class ConceptEntry(Payload):
+    concept: Text
+    count: Count = 0
+    issues: IdList = []
+
+    @model_validator(mode='after')
+    def _has_name(self):
+        if not self.concept:
+            raise ValueError('concept has no name')
+        self.count = self.count or len(self.issues)
+        return self
+
+
+class Strategy(Payload):
+    name: Text = ''
+    description: Text = ''
+    code: Text = ''
+    pros: TextList = []
+    cons: TextList = []
+    applicable_to_issues: IdList = []
+
+    @model_validator(mode='after')
+    def _has_content(self):
+        if not (self.name or self.code):
+            raise ValueError('strategy has neither name nor code')
+        return self
+
+
+class AnalysisSummary(Payload):
+    total_errors: Count = 0
+    total_warnings: Count = 0
+    overall_severity: Severity = 'medium'
+    language: Text = ''
+    concepts_covered: TextList = []
+
+
+class AnalysisPayload(Payload):
+    analysis_summary: AnalysisSummary = AnalysisSummary()
+    concept_map: dict[str, Annotated[list[ConceptEntry], _salvaged_list(ConceptEntry)]] = {}
+    issues: Annotated[list[Issue], _salvaged_list(Issue)] = []
+    correction_strategies: Annotated[list[Strategy], _salvaged_list(Strategy)] = []
+    corrected_code: Text = ''
+    suggestions: TextList = []
+    best_practices: TextList = []
+
+    @field_validator('analysis_summary', mode='before')
+    @classmethod
+    def _summary_mapping(cls, value):
+        return value if isinstance(value, dict) else {}
+
+    @field_validator('concept_map', mode='before')
+    @classmethod
+    def _group_concepts(cls, value):
+        # Also accept a flat list of {"category", "concept", ...} entries
+        if isinstance(value, list):
+            grouped = {}
+            for entry in value:
+                if isinstance(entry, dict):
+                    grouped.setdefault(_to_text(entry.get('category')) or 'general', []).append(entry)
+            return grouped
+        return value if isinstance(value, dict) else {}
+
+
+class StrategyPayload(Payload):
+    strategies: Annotated[list[Strategy], _salvaged_list(Strategy)] = []
+
+
+class HintPayload(Payload):
+    hint: Text
+
+    @field_validator('hint')
+    @classmethod
+    def _not_empty(cls, value):
+        value = value.strip()
+        if not value:
+            raise ValueError('empty hint')
+        return value
+
+
+ANALYSIS_KEYS = set(AnalysisPayload.model_fields)
+
+
+# Decoders
+
+class DecodeStats:
+    """
+    Thread-safe counters of decoding outcomes per payload kind
+    """
+    OUTCOMES = ('clean', 'repaired', 'failed')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, kind, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(kind, dict.fromkeys(self.OUTCOMES, 0))
+            counters[outcome] += 1
+
+    def stats(self):
+        """
+        Outcome counts per kind, with the share of responses that were
+        usable only because of repair or salvage
+        """
+        with self._lock:
+            stats = {kind: dict(counters) for kind, counters in self._counters.items()}
+        for counters in stats.values():
+            total = sum(counters[outcome] for outcome in self.OUTCOMES)
+            counters['salvage_ratio'] = round(counters['repaired'] / total, 4) if total else 0.0
+        return stats
+
+
+decode_stats = DecodeStats()
+
+
+def _validate(kind, model, text, value, repaired, truncated=False):
+    context = {'dropped': 0}
+    try:
+        payload = model.model_validate(value, context=context)
+    except ValidationError as e:
+        decode_stats.record(kind, 'failed')
+        raise DecodeError(f'Invalid {kind} payload: {e.error_count()} errors', text) from e
+    decoded = Decoded(payload.model_dump(exclude_none=True), repaired, truncated, context['dropped'])
+    decode_stats.record(kind, 'repaired' if decoded.repaired or decoded.partial else 'clean')
+    return decoded
+
+
+def _repair_object(kind, text):
+    try:
+        value, repaired, truncated = repair_json(text)
+    except DecodeError:
+        decode_stats.record(kind, 'failed')
+        raise
+    if not isinstance(value, dict):
+        decode_stats.record(kind, 'failed')
+        raise DecodeError(f'Expected a JSON object for {kind}', text)
+    return value, repaired, truncated
+
+
+def _timed(kind):
+    """
+    Record the decoder's run time in the decode_duration histogram
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with decode_duration.time(kind=kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@_timed('analysis')
+def decode_analysis(text, language=''):
+    """
+    Decode an analysis completion into the analysis schema. Raises
+    DecodeError when the text holds no recognisable analysis.
+    """
+    value, repaired, truncated = _repair_object('analysis', text)
+    if not ANALYSIS_KEYS & set(value):
+        decode_stats.record('analysis', 'failed')
+        raise DecodeError('Response is not an analysis', text)
+
+    decoded = _validate('analysis', AnalysisPayload, text, value, repaired, truncated)
+    summary = decoded.data['analysis_summary']
+    summary['language'] = summary['language'] or language
+    if decoded.partial or 'analysis_summary' not in value:
+        # Counts from a truncated or salvaged response no longer match
+        issues = decoded.data['issues']
+        summary['total_errors'] = sum(1 for issue in issues if issue['type'] == 'error')
+        summary['total_warnings'] = len(issues) - summary['total_errors']
+    return decoded
+
+
+@_timed('strategies')
+def decode_strategies(text):
+    """
+    Decode a correction strategy completion into {"strategies": [...]}
+    """
+    value, repaired, truncated = _repair_object('strategies', text)
+    if 'strategies' not in value and Strategy.model_fields.keys() & set(value):
+        # A single strategy object instead of the wrapper
+        value = {'strategies': [value]}
+    return _validate('strategies', StrategyPayload, text, value, repaired, truncated)
+
+
+@_timed('hint')
+def decode_hint(text, level=None):
+    """
+    Decode a hint completion into {"hint": "..."}. Plain text is the
+    expected form; fences, surrounding quotes and JSON wrappers such as
+    {"hint": ...} or {"level2": ...} are removed.
+    """
+    hint = strip_code_fences(text)
+    repaired = hint != text.strip()
+    if hint.startswith('{'):
+        try:
+            value, _, _ = repair_json(hint)
+        except DecodeError:
+            value = None
+        if isinstance(value, dict):
+            keys = ['hint', f'level{level}' if level else None, 'text']
+            found = next((value[key] for key in keys if key and value.get(key)), None)
+            if found is None:
+                found = next((item for item in value.values() if isinstance(item, str) and item.strip()), None)
+            if found is not None:
+                hint, repaired = found, True
+    if len(hint) >= 2 and hint[0] == hint[-1] == '"':
+        hint, repaired = hint[1:-1], True
+    return _validate('hint', HintPayload, text, {'hint': hint}, repaired)
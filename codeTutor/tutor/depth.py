@@ -0,0 +1,95 @@
+# depth.py
+"""
+Analysis depth modes.
+
+/api/analyze/ (and the stream and job endpoints) take an optional "depth":
+
+- quick: syntax errors and obvious logic errors only, one hint per issue, no
+  concept map. For "why doesn't this run".
+- standard (the default): every issue category with the concept map and
+  three hint levels.
+- deep: the full analysis, with correction strategies and the corrected
+  code generated up front.
+
+Below deep, correction strategies and the corrected code are generated
+lazily by /api/correction-strategy/ and /api/corrected-code/ from the
+stored analysis, and stored with it.
+
+Each depth has its own prompt template (tutor/prompts.py DEPTH_PROMPTS),
+model and completion budget, set in ANALYSIS_DEPTHS. Analyses of different
+depths are cached separately; the deep one keeps the cache key it always
+had. A near-duplicate's analysis is reused when it covers at least the
+requested depth, and an incremental re-analysis only builds on a previous
+analysis of the same depth.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+
+from .cache import make_cache_key
+from .prompts import ANALYSIS_MODEL, ANALYSIS_PROMPT_VERSION, DEPTH_PROMPTS
+
+DEPTHS = ('quick', 'standard', 'deep')
+
+# The depth that generates correction strategies and corrected code eagerly
+FULL_DEPTH = 'deep'
+
+DEFAULT_ANALYSIS_DEPTH_SETTINGS = {
+    # Depth of requests that don't ask for one
+    'DEFAULT': 'standard',
+    'QUICK_MODEL': ANALYSIS_MODEL,
+    'QUICK_MAX_TOKENS': 1200,
+    'STANDARD_MODEL': ANALYSIS_MODEL,
+    'STANDARD_MAX_TOKENS': 3000,
+    'DEEP_MODEL': ANALYSIS_MODEL,
+    'DEEP_MAX_TOKENS': 6000,
+}
+
+
+class AnalysisDepth(namedtuple('AnalysisDepth', ['name', 'model', 'max_tokens', 'prompt'])):
+    """
+    An analysis depth with its model, completion budget and prompt template
+    """
+    __slots__ = ()
+
+    @property
+    def eager_artifacts(self):
+        """
+        Whether the analysis includes correction strategies and corrected code
+        """
+        return self.name == FULL_DEPTH
+
+
+def get_analysis_depth_settings():
+    config = dict(DEFAULT_ANALYSIS_DEPTH_SETTINGS)
+    config.update(getattr(settings, 'ANALYSIS_DEPTHS', {}))
+    return config
+
+
+def get_analysis_depth(name=None):
+    """
+    The AnalysisDepth called name (the configured default when empty).
+    Raises ValueError for unknown names.
+    """
+    config = get_analysis_depth_settings()
+    name = str(name or config['DEFAULT']).lower()
+    if name not in DEPTHS:
+        raise ValueError(f'Unknown analysis depth {name!r}; use one of {", ".join(DEPTHS)}')
+    prefix = name.upper()
+    return AnalysisDepth(name, config[f'{prefix}_MODEL'], config[f'{prefix}_MAX_TOKENS'], DEPTH_PROMPTS[name])
+
+
+def analysis_cache_key(code, language, depth):
+    """
+    Cache key of an analysis of code at depth
+    """
+    version = ANALYSIS_PROMPT_VERSION if depth.name == FULL_DEPTH else f'{ANALYSIS_PROMPT_VERSION}-{depth.name}'
+    return make_cache_key(code, language, depth.model, version)
+
+
+def covers(depth, requested):
+    """
+    Whether an analysis at the named depth answers a request for the
+    requested one
+    """
+    return DEPTHS.index(depth) >= DEPTHS.index(requested)
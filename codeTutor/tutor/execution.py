@@ -0,0 +1,278 @@
+# execution.py
+"""
+Grounding analyses in real runs of the code.
+
+Python submissions that compile are run in the sandbox (tutor/sandbox.py)
+before the LLM is asked:
+
+- a plain runtime error raised by the student's own code (NameError,
+  IndexError, ZeroDivisionError, ...) is answered locally from the
+  traceback, the way tutor/static_analysis.py answers syntax errors;
+- any other exception is added to the analysis as a runtime error at the
+  line it was raised, unless the analysis already reports an error there;
+- corrected code is run as well, and the analysis says whether it works.
+
+Runs are remembered by code, so the analysis pipeline can ask for the same
+submission more than once without running it again.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from .metrics import sandbox_duration, sandbox_runs
+from .sandbox import SandboxUnavailable, get_sandbox_settings, run_limits, sandbox_pool, supported
+from .static_analysis import LocalAnalysis
+
+logger = logging.getLogger(__name__)
+
+MEMORY_MAX_ENTRIES = 256
+
+# Exceptions that, raised directly by the student's code, are explained
+# from the traceback alone
+RUNTIME_CONCEPTS = {
+    'NameError': {
+        'concept': 'Undefined Name',
+        'title': 'Name used before it is defined',
+        'cause': 'Python looks a name up when the line runs; this one has not been assigned, defined or imported at that point (or is misspelled).',
+        'fix': 'Define or import the name before this line, or correct its spelling.',
+        'hints': {
+            'level1': 'Check where the names used on line {line} are created.',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Assign, define or import the missing name before line {line}, or fix its spelling.',
+        },
+    },
+    'UnboundLocalError': {
+        'concept': 'Local Variable Before Assignment',
+        'title': 'Local variable used before assignment',
+        'cause': 'A name assigned anywhere in a function is local to the whole function, so reading it before that assignment fails even if a global of the same name exists.',
+        'fix': 'Assign the variable before reading it in the function, pass it in as a parameter, or declare it global if that is really intended.',
+        'hints': {
+            'level1': 'Look at where this variable is assigned inside the function.',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Give the variable a value before line {line} in the function, or pass it in as a parameter.',
+        },
+    },
+    'TypeError': {
+        'concept': 'Type Mismatch',
+        'title': 'Operation on the wrong type',
+        'cause': 'An operation or function call received a value of a type it does not support, or the wrong number of arguments.',
+        'fix': 'Convert the value to the expected type, or call the function with the arguments it expects.',
+        'hints': {
+            'level1': 'Think about the type of each value used on line {line}.',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Convert the values on line {line} to the types the operation expects (e.g. int(), str()) or fix the call\'s arguments.',
+        },
+    },
+    'AttributeError': {
+        'concept': 'Missing Attribute',
+        'title': 'Attribute or method does not exist',
+        'cause': 'The object does not have the attribute or method being used, often because it is of a different type than expected (for example None).',
+        'fix': 'Check the type of the object and use an attribute or method it actually has.',
+        'hints': {
+            'level1': 'What kind of object is used on line {line}?',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Use an attribute or method that exists for this type on line {line}, or make sure the object is what you expect.',
+        },
+    },
+    'IndexError': {
+        'concept': 'Index Out of Range',
+        'title': 'Index out of range',
+        'cause': 'A sequence was indexed at a position it does not have; valid indexes run from 0 to len(sequence) - 1.',
+        'fix': 'Keep the index within the length of the sequence, e.g. loop over range(len(items)) or over the items themselves.',
+        'hints': {
+            'level1': 'How many elements does the sequence on line {line} have?',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Make sure the index on line {line} stays below the length of the sequence.',
+        },
+    },
+    'KeyError': {
+        'concept': 'Missing Key',
+        'title': 'Key not found in dictionary',
+        'cause': 'A dictionary was read with a key it does not contain.',
+        'fix': 'Check that the key exists first (key in d), or use d.get(key, default).',
+        'hints': {
+            'level1': 'Which keys does the dictionary on line {line} contain at that point?',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Use dict.get() or check "key in dict" before reading it on line {line}.',
+        },
+    },
+    'ZeroDivisionError': {
+        'concept': 'Division by Zero',
+        'title': 'Division by zero',
+        'cause': 'A number was divided (or taken modulo) by zero, which has no result.',
+        'fix': 'Check the divisor before dividing and handle the zero case separately.',
+        'hints': {
+            'level1': 'What value can the divisor on line {line} have?',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Add a check on line {line} so you never divide by zero, and decide what to do in that case.',
+        },
+    },
+    'ValueError': {
+        'concept': 'Invalid Value',
+        'title': 'Value of the right type but invalid',
+        'cause': 'A function received a value of the right type that it cannot handle, such as int() on text that is not a number.',
+        'fix': 'Validate or clean the value before passing it, or handle the error with try/except.',
+        'hints': {
+            'level1': 'Look at the value passed on line {line}.',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Check the value before using it on line {line}, or wrap the conversion in try/except ValueError.',
+        },
+    },
+    'RecursionError': {
+        'concept': 'Unbounded Recursion',
+        'title': 'Recursion never stops',
+        'cause': 'A function keeps calling itself without reaching a base case, until Python\'s recursion limit is hit.',
+        'fix': 'Add a base case that returns without recursing, and make sure each call moves towards it.',
+        'hints': {
+            'level1': 'When does the recursive function on line {line} stop calling itself?',
+            'level2': 'Running the code reported: {detail}',
+            'level3': 'Add a base case to the function and make every recursive call move closer to it.',
+        },
+    },
+}
+
+# Any other exception raised when the code ran
+RUNTIME_ERROR = {
+    'concept': 'Runtime Error',
+    'title': 'Error when the code runs',
+    'cause': 'The code is valid Python but raised an exception when it was run.',
+    'fix': 'Read the error message and fix the statement that raised it.',
+    'hints': {
+        'level1': 'Run the code and read the error message for line {line}.',
+        'level2': 'Running the code reported: {detail}',
+        'level3': 'Fix the statement on line {line} that raised {detail}.',
+    },
+}
+
+
+class ExecutionMemo:
+    """
+    Recent runs by code, so each submission is run once
+    """
+
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def set(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+execution_memo = ExecutionMemo()
+
+
+async def aexecute(code, language):
+    """
+    Run code in the sandbox. Returns its ExecutionResult, or None when the
+    code isn't Python, the sandbox is disabled or unavailable, or all its
+    workers are busy.
+    """
+    config = get_sandbox_settings()
+    if language.lower() != 'python' or not config['ENABLED'] or not supported():
+        return None
+    key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+    result = execution_memo.get(key)
+    if result is not None:
+        return result
+    try:
+        result = await sandbox_pool.arun(code, run_limits(config))
+    except SandboxUnavailable as e:
+        logger.warning('Could not run the submission in the sandbox: %s', e)
+        sandbox_runs.inc(outcome='unavailable')
+        return None
+    if result is None:
+        # Every worker is busy: analyze without running rather than wait
+        sandbox_runs.inc(outcome='busy')
+        return None
+    sandbox_runs.inc(outcome=result.outcome)
+    sandbox_duration.observe(result.duration)
+    if result.outcome != 'crashed':
+        execution_memo.set(key, result)
+    return result
+
+
+async def acheck_corrected_code(corrected_code, language):
+    """
+    Run corrected code. Returns its ExecutionResult, or None when it
+    couldn't be checked.
+    """
+    if not corrected_code.strip() or not get_sandbox_settings()['CHECK_CORRECTED_CODE']:
+        return None
+    return await aexecute(corrected_code, language)
+
+
+def is_plain_error(result, code):
+    """
+    Whether a run failed with a common error raised by the submission
+    itself, not deliberately with a raise statement
+    """
+    if not result.failed or not result.in_submission or result.exception not in RUNTIME_CONCEPTS:
+        return False
+    return not source_line(code, result.line).lstrip().startswith('raise')
+
+
+def answers_locally(result, code):
+    """
+    Whether a run's error is answered from the traceback without the LLM
+    """
+    return get_sandbox_settings()['ANSWER_RUNTIME_ERRORS'] and is_plain_error(result, code)
+
+
+def source_line(code, line):
+    lines = code.split('\n')
+    return lines[line - 1] if line and 0 < line <= len(lines) else ''
+
+
+def runtime_issue(result, code):
+    """
+    The exception of a failed run as an issue in the LLM analysis schema,
+    with its message cleaned up (ExecutionResult.detail) and tagged with
+    its source
+    """
+    info = RUNTIME_CONCEPTS[result.exception] if is_plain_error(result, code) else RUNTIME_ERROR
+    detail = result.detail
+    where = f' on line {result.line}' if result.line else ''
+    fields = {'line': result.line or '?', 'detail': detail}
+    return {
+        'type': 'error',
+        'category': 'runtime',
+        'concept': info['concept'],
+        'title': info['title'],
+        'description': f'Running the code raised {detail}{where}.',
+        'cause': info['cause'],
+        'fix': info['fix'],
+        'line': result.line,
+        'column': None,
+        'code_snippet': source_line(code, result.line).strip(),
+        'severity': 'high',
+        'hints': {level: text.format(**fields) for level, text in info['hints'].items()},
+        # Found by running the code, not by the LLM
+        'source': 'sandbox',
+    }
+
+
+def execution_analysis(result, code):
+    """
+    A LocalAnalysis answering a submission with its runtime error
+    """
+    issue = runtime_issue(result, code)
+    issue['id'] = 1
+    return LocalAnalysis('python', [issue], syntax_verified=True, suggestions=[
+        'Fix the runtime error above, then analyze again for a full review of logic, style and performance.'
+    ])
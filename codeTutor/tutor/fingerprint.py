@@ -0,0 +1,715 @@
+# fingerprint.py
+"""
+Near-duplicate lookup for analysis results.
+
+The analysis cache only matches byte-identical code (after whitespace
+normalization), but a class's answers to the same exercise mostly differ in
+variable names, comments, string literals and layout. fingerprint() reduces
+code to a canonical token stream: Python through `ast` (to find the names
+the program binds) and `tokenize`, other languages through a C-family token
+scanner. Comments and layout are dropped, string literals collapse to one
+token, and identifiers the program defines are numbered in order of first
+use. Keywords, builtins, numbers and attribute names are kept.
+
+NearDuplicateIndex keeps the fingerprints of recent LLM analyses and finds
+the nearest one: an exact canonical digest match first, then candidates
+sharing a MinHash band, ranked by token-sequence similarity. A candidate
+only counts when it passes THRESHOLD and every token where the two streams
+differ is an identifier or a string literal: one changed operator, number,
+keyword, builtin or attribute (range(1, n) for range(0, n), / for //)
+changes what the code does however similar the rest is. For the best
+match, remap_analysis() adapts its analysis to the new code: issue lines are moved along the token alignment, identifiers are
+renamed in the explanations and snippets, and the corrections are replayed
+onto the new code. Anything that can't be placed safely makes the lookup a
+miss, so the code gets a normal analysis.
+
+The index is per process and in memory, like the analysis cache's memory
+tier.
+"""
+import ast
+import builtins
+import copy
+import difflib
+import hashlib
+import io
+import keyword
+import random
+import re
+import threading
+import tokenize
+import zlib
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .analysis_store import analysis_store
+from .depth import FULL_DEPTH, covers
+from .metrics import registry
+
+DEFAULT_NEAR_DUPLICATE_SETTINGS = {
+    'ENABLED': True,
+    # Token-sequence similarity (0-1) needed to reuse an analysis; the tokens
+    # that differ must also all be identifiers or string literals
+    'THRESHOLD': 0.95,
+    # Below this many tokens only exact canonical matches are reused
+    'MIN_TOKENS': 40,
+    # Longer submissions are not fingerprinted
+    'MAX_TOKENS': 8000,
+    'MAX_ENTRIES': 5000,
+    'MAX_CANDIDATES': 8,
+}
+
+SHINGLE_SIZE = 4
+NUM_HASHES = 32
+BANDS = 8
+_ROWS = NUM_HASHES // BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_HASHES)]
+
+# Canonical tokens for renamed identifiers and string literals; control
+# characters can't collide with source text
+IDENTIFIER = '\x01'
+STRING = '\x02'
+
+_PYTHON_BUILTINS = frozenset(dir(builtins)) | {'self', 'cls'}
+_C_FAMILY_KEYWORDS = frozenset('''
+    abstract async await bool boolean break byte case catch char class const constexpr continue
+    debugger decimal default delegate delete do double dynamic else enum event explicit export
+    extends extern false final finally float for foreach friend function get goto if implements
+    import in inline instanceof int interface internal is let long namespace new null nullptr
+    object of operator out override package private protected public readonly ref register
+    return sbyte sealed set short signed sizeof static string struct super switch synchronized
+    template this throw throws true try typedef typename typeof uint ulong unsigned ushort using
+    var virtual void volatile while with yield include define ifdef ifndef endif pragma
+    undefined NaN Infinity
+'''.split())
+_C_TOKEN = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?|`(?:\\.|[^`\\])*`?)
+  | (?P<number>\d[\w.]*)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<space>\s+)
+  | (?P<op>::|->|\+\+|--|&&|\|\||[=!<>]=|.)
+''', re.S | re.X)
+_MEMBER_ACCESS = frozenset(['.', '->', '::'])
+# Keywords after which a name is being declared
+_C_FAMILY_DECLARATORS = frozenset('''
+    bool boolean byte char class const decimal double dynamic enum float function int interface let long
+    namespace object sbyte short signed string struct typedef typename uint ulong unsigned ushort var void
+'''.split())
+# Keywords that can be the type of a declaration
+_C_FAMILY_TYPES = _C_FAMILY_DECLARATORS - {'class', 'enum', 'function', 'interface', 'namespace', 'struct', 'typedef'}
+# Tokens that follow a declared name
+_DECLARATOR_ENDS = frozenset(['=', ';', ',', ')', '(', '[', ':', '{'])
+_STATEMENT_START = frozenset([None, ';', '{', '}'])
+_WORD = re.compile(r'[A-Za-z_$][\w$]*')
+_QUOTED = re.compile(r'(`[^`]*`|"[^"\n]*")')
+
+# Canonical tokens, the source text of each (for renaming) and its line
+# (None for Python indentation)
+Fingerprint = namedtuple('Fingerprint', ['language', 'tokens', 'texts', 'lines', 'digest', 'bands'])
+
+NearMatch = namedtuple('NearMatch', ['analysis_id', 'fingerprint', 'similarity'])
+
+
+def get_near_duplicate_settings():
+    config = dict(DEFAULT_NEAR_DUPLICATE_SETTINGS)
+    config.update(getattr(settings, 'NEAR_DUPLICATE_CACHE', {}))
+    return config
+
+
+def fingerprint(code, language):
+    """
+    Fingerprint of code, or None when it can't be tokenized or is too long
+    """
+    language = language.lower()
+    if language == 'python':
+        scanned = _python_tokens(code)
+    else:
+        scanned = _c_family_tokens(code)
+    if not scanned or len(scanned) > get_near_duplicate_settings()['MAX_TOKENS']:
+        return None
+
+    tokens, texts, lines = [], [], []
+    numbers = {}
+    for kind, text, line in scanned:
+        if kind == 'identifier':
+            token = IDENTIFIER + str(numbers.setdefault(text, len(numbers)))
+        elif kind == 'string':
+            token = STRING
+        else:
+            token = text
+        tokens.append(token)
+        texts.append(text)
+        lines.append(line)
+
+    digest = hashlib.sha256('\x00'.join([language] + tokens).encode('utf-8')).hexdigest()
+    return Fingerprint(language, tuple(tokens), tuple(texts), tuple(lines), digest, _band_keys(tokens))
+
+
+def _python_tokens(code):
+    """
+    [(kind, text, line)] for Python source. Names bound or used as variables
+    in the AST are identifiers, except builtins.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    names = set()
+    docstrings = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            docstrings.add(node.lineno)
+        elif isinstance(node, ast.Name):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+    names -= _PYTHON_BUILTINS
+
+    scanned = []
+    previous = None
+    in_docstring = False
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type in (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER):
+                continue
+            line = token.start[0]
+            if in_docstring or (token.type == tokenize.STRING and line in docstrings and previous in _STATEMENT_START):
+                # Bare string statements are documentation, like comments
+                in_docstring = token.type != tokenize.NEWLINE
+                continue
+            if token.type == tokenize.STRING:
+                scanned.append(('string', token.string, line))
+            elif token.type == tokenize.NAME:
+                is_identifier = token.string in names and previous != '.' and not keyword.iskeyword(token.string)
+                scanned.append(('identifier' if is_identifier else 'name', token.string, line))
+            elif token.type == tokenize.NEWLINE:
+                scanned.append(('layout', ';', line))
+            elif token.type == tokenize.INDENT:
+                scanned.append(('layout', '{', None))
+            elif token.type == tokenize.DEDENT:
+                scanned.append(('layout', '}', None))
+            else:
+                scanned.append(('op', token.string, line))
+            previous = scanned[-1][1]
+    except (tokenize.TokenError, IndentationError):
+        return None
+    return scanned
+
+
+def _c_family_tokens(code):
+    """
+    [(kind, text, line)] for JavaScript, Java, C++ and C# source. Names the
+    program declares are identifiers; library and builtin names (parseInt,
+    ArrayList, strcpy) are kept, like keywords and member accesses.
+    """
+    scanned = []
+    line = 1
+    for match in _C_TOKEN.finditer(code.replace('\r\n', '\n')):
+        kind, text = match.lastgroup, match.group()
+        if kind in ('name', 'string', 'number', 'op'):
+            scanned.append((kind, text, line))
+        line += text.count('\n')
+
+    declared = _c_family_declarations([text for _, text, _ in scanned])
+    previous = None
+    for index, (kind, text, line) in enumerate(scanned):
+        if kind == 'name':
+            is_identifier = text in declared and previous not in _MEMBER_ACCESS
+            scanned[index] = ('identifier' if is_identifier else 'name', text, line)
+        previous = text
+    return scanned
+
+
+def _c_family_declarations(texts):
+    """
+    Names declared in a C-family token stream: after a declaring keyword
+    (let, class, function, int, ...), after a type (a name, or a generic,
+    array or pointer type) when followed by what ends a declarator, and as
+    the parameters of functions and arrow functions
+    """
+    declared = set()
+
+    def is_name(position):
+        return 0 <= position < len(texts) and _WORD.fullmatch(texts[position]) and (
+            texts[position] not in _C_FAMILY_KEYWORDS or texts[position] in _C_FAMILY_TYPES
+        )
+
+    def at(position):
+        return texts[position] if 0 <= position < len(texts) else None
+
+    def closes_generic(position):
+        # texts[position] is '>': whether it ends a type argument list
+        depth = 0
+        for position in range(position, -1, -1):
+            text = texts[position]
+            if text == '>':
+                depth += 1
+            elif text == '<':
+                depth -= 1
+                if depth == 0:
+                    return is_name(position - 1)
+            elif text not in (',', '?', '[', ']', '.', '::') and not is_name(position):
+                return False
+        return False
+
+    def declare_parameters(start):
+        # texts[start] is '('; names directly after '(' or ',' at depth 1
+        depth = 0
+        for position in range(start, len(texts)):
+            text = texts[position]
+            if text in '([{':
+                depth += 1
+            elif text in ')]}':
+                depth -= 1
+                if depth == 0:
+                    return position
+            elif depth == 1 and is_name(position) and at(position - 1) in ('(', ','):
+                if at(position + 1) in (',', ')', '=', ':'):
+                    declared.add(text)
+        return None
+
+    for index, text in enumerate(texts):
+        if text == '(' and (at(index - 1) == 'function' or at(index - 2) == 'function'):
+            declare_parameters(index)
+            continue
+        if text == '=' and at(index + 1) == '>':
+            # Arrow function: x => ... or (x, y) => ...
+            if at(index - 1) == ')':
+                depth = 0
+                for position in range(index - 1, -1, -1):
+                    depth += {')': 1, '(': -1}.get(texts[position], 0)
+                    if depth == 0:
+                        declare_parameters(position)
+                        break
+            elif is_name(index - 1):
+                declared.add(at(index - 1))
+            continue
+        if not _WORD.fullmatch(text) or text in _C_FAMILY_KEYWORDS or at(index - 1) in _MEMBER_ACCESS:
+            continue
+        before, after = at(index - 1), at(index + 1)
+        if before in _C_FAMILY_DECLARATORS:
+            declared.add(text)
+        elif after not in _DECLARATOR_ENDS:
+            continue
+        elif is_name(index - 1) and at(index - 2) not in _MEMBER_ACCESS or before == ']' and at(index - 2) == '[':
+            # int count = ..., String name; List<T> items = ..., int[] values;
+            declared.add(text)
+        elif before == '>' and closes_generic(index - 1):
+            declared.add(text)
+        elif before in ('*', '&') and is_name(index - 2) and at(index - 3) in _STATEMENT_START | {'(', ','}:
+            # char *name, int &total
+            declared.add(text)
+    return declared
+
+
+def _band_keys(tokens):
+    """
+    MinHash LSH band keys over token shingles: similar token streams share
+    at least one band with high probability
+    """
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {zlib.crc32('\x00'.join(tokens).encode('utf-8'))}
+    else:
+        shingles = {
+            zlib.crc32('\x00'.join(tokens[index:index + SHINGLE_SIZE]).encode('utf-8'))
+            for index in range(len(tokens) - SHINGLE_SIZE + 1)
+        }
+    signature = [min((a * shingle + b) % _PRIME for shingle in shingles) for a, b in _PERMUTATIONS]
+    return tuple(
+        (band, hash(tuple(signature[band * _ROWS:(band + 1) * _ROWS]))) for band in range(BANDS)
+    )
+
+
+def similarity(first, second):
+    """
+    Similarity (0-1) of two fingerprints' token sequences
+    """
+    if first.digest == second.digest:
+        return 1.0
+    return difflib.SequenceMatcher(None, first.tokens, second.tokens, autojunk=False).ratio()
+
+
+def is_renamable(token):
+    """
+    Whether a canonical token is a renamed identifier or a string literal
+    """
+    return token == STRING or token.startswith(IDENTIFIER)
+
+
+def differs_only_in_names(opcodes, first, second):
+    """
+    Whether every difference in an alignment of two token streams (difflib
+    opcodes) is between identifiers and string literals
+    """
+    for tag, first_start, first_end, second_start, second_end in opcodes:
+        if tag == 'equal':
+            continue
+        if not all(map(is_renamable, first[first_start:first_end] + second[second_start:second_end])):
+            return False
+    return True
+
+
+class NearDuplicateIndex:
+    """
+    LRU of fingerprints of stored analyses, indexed by digest and MinHash
+    band
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # analysis_id -> Fingerprint
+        self._digests = {}             # digest -> analysis_id
+        self._bands = {}               # band key -> {analysis_id}
+        self._counters = {'lookups': 0, 'exact': 0, 'near': 0, 'misses': 0, 'changed': 0, 'rejected': 0}
+
+    def add(self, analysis_id, fp, max_entries=None):
+        max_entries = max_entries or get_near_duplicate_settings()['MAX_ENTRIES']
+        with self._lock:
+            if analysis_id in self._entries:
+                self._entries.move_to_end(analysis_id)
+                return
+            self._entries[analysis_id] = fp
+            self._digests[fp.digest] = analysis_id
+            for key in fp.bands:
+                self._bands.setdefault(key, set()).add(analysis_id)
+            while len(self._entries) > max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, analysis_id):
+        with self._lock:
+            if analysis_id in self._entries:
+                self._remove(analysis_id)
+
+    def nearest(self, fp, config=None):
+        """
+        The NearMatch of the most similar indexed fingerprint in the same
+        language, if it passes the threshold and differs from fp only in
+        identifiers and string literals
+        """
+        config = config or get_near_duplicate_settings()
+        self._count('lookups')
+        with self._lock:
+            exact = self._digests.get(fp.digest)
+            if exact is not None:
+                self._entries.move_to_end(exact)
+                self._counters['exact'] += 1
+                return NearMatch(exact, self._entries[exact], 1.0)
+            if len(fp.tokens) < config['MIN_TOKENS']:
+                self._counters['misses'] += 1
+                return None
+            shared = {}
+            for key in fp.bands:
+                for analysis_id in self._bands.get(key, ()):
+                    shared[analysis_id] = shared.get(analysis_id, 0) + 1
+            candidates = [
+                (analysis_id, self._entries[analysis_id])
+                for analysis_id in sorted(shared, key=shared.get, reverse=True)[:config['MAX_CANDIDATES']]
+            ]
+
+        best = None
+        changed = False
+        for analysis_id, candidate in candidates:
+            if candidate.language != fp.language:
+                continue
+            matcher = difflib.SequenceMatcher(None, candidate.tokens, fp.tokens, autojunk=False)
+            if matcher.real_quick_ratio() < config['THRESHOLD'] or matcher.quick_ratio() < config['THRESHOLD']:
+                continue
+            ratio = matcher.ratio()
+            if ratio < config['THRESHOLD'] or best is not None and ratio <= best.similarity:
+                continue
+            if not differs_only_in_names(matcher.get_opcodes(), candidate.tokens, fp.tokens):
+                changed = True
+                continue
+            best = NearMatch(analysis_id, candidate, ratio)
+        self._count('near' if best is not None else 'changed' if changed else 'misses')
+        return best
+
+    def reject(self):
+        """
+        Count a match whose analysis could not be remapped
+        """
+        self._count('rejected')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._digests.clear()
+            self._bands.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        hits = stats['exact'] + stats['near'] - stats['rejected']
+        stats['hit_ratio'] = round(hits / stats['lookups'], 4) if stats['lookups'] else 0.0
+        return stats
+
+    def _remove(self, analysis_id):
+        # Caller must hold self._lock
+        fp = self._entries.pop(analysis_id)
+        if self._digests.get(fp.digest) == analysis_id:
+            del self._digests[fp.digest]
+        for key in fp.bands:
+            members = self._bands.get(key)
+            if members is not None:
+                members.discard(analysis_id)
+                if not members:
+                    del self._bands[key]
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+
+near_duplicates = NearDuplicateIndex()
+
+
+def remap_analysis(result, old_code, old_print, code, new_print):
+    """
+    Adapt a frontend analysis of old_code to code. Returns the new result,
+    or None when an issue or a correction can't be placed in the new code.
+    """
+    matcher = difflib.SequenceMatcher(None, old_print.tokens, new_print.tokens, autojunk=False)
+    line_map = {}
+    pairs = {IDENTIFIER: {}, STRING: {}}
+    conflicts = set()
+    for old_index, new_index, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            old_token = old_print.tokens[old_index + offset]
+            old_line, new_line = old_print.lines[old_index + offset], new_print.lines[new_index + offset]
+            if old_line is not None and new_line is not None:
+                line_map.setdefault(old_line, new_line)
+            kind = old_token[:1]
+            if kind in pairs:
+                old_text = old_print.texts[old_index + offset]
+                new_text = new_print.texts[new_index + offset]
+                if pairs[kind].setdefault(old_text, new_text) != new_text:
+                    conflicts.add(old_text)
+    rename = _Renamer(*(
+        {old: new for old, new in pairs[kind].items() if old != new and old not in conflicts}
+        for kind in (IDENTIFIER, STRING)
+    ))
+    old_lines = old_code.split('\n')
+    new_lines = code.split('\n')
+
+    def map_line(line):
+        if line in line_map:
+            return line_map[line]
+        # Blank and comment-only lines sit between mapped neighbours
+        above = max((known for known in line_map if known < line), default=None)
+        below = min((known for known in line_map if known > line), default=None)
+        if above is None or below is None:
+            return None
+        if line_map[below] - line_map[above] != below - above:
+            return None
+        return line_map[above] + line - above
+
+    remapped = copy.deepcopy(result)
+    for issue in remapped.get('errors', []) + remapped.get('warnings', []):
+        line = issue.get('line')
+        if isinstance(line, int):
+            # Issues on lines without code (comments, docstrings) aren't carried over
+            new_line = line_map.get(line)
+            if new_line is None or not 0 < new_line <= len(new_lines):
+                return None
+            snippet = str(issue.get('code') or '')
+            if 0 < line <= len(old_lines) and snippet.strip() == old_lines[line - 1].strip():
+                issue['code'] = new_lines[new_line - 1].strip()
+            else:
+                issue['code'] = rename(snippet)
+            issue['line'] = new_line
+        for field in ('title', 'description', 'cause', 'fix'):
+            if isinstance(issue.get(field), str):
+                issue[field] = rename(issue[field], prose=True)
+        if isinstance(issue.get('hints'), dict):
+            issue['hints'] = {
+                level: rename(text, prose=True) if isinstance(text, str) else text
+                for level, text in issue['hints'].items()
+            }
+
+    corrected_code = remapped.get('corrected_code')
+    if corrected_code:
+        corrected_code = _replay_corrections(old_lines, corrected_code.split('\n'), new_lines, map_line, rename)
+        if corrected_code is None:
+            return None
+        remapped['corrected_code'] = corrected_code
+
+    for field in ('correction_strategies', 'suggestions', 'best_practices'):
+        if field in remapped:
+            remapped[field] = _rename_all(remapped[field], rename)
+    for field in ('analysis_id', 'source', 'partial', 'reanalyzed_lines', 'similarity'):
+        remapped.pop(field, None)
+    return remapped
+
+
+def _replay_corrections(old_lines, corrected_lines, new_lines, map_line, rename):
+    """
+    Apply the edits that turned old_lines into corrected_lines to the
+    matching lines of new_lines, or return None if one can't be placed
+    """
+    edits = []
+    matcher = difflib.SequenceMatcher(None, old_lines, corrected_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        replacement = [rename(line) for line in corrected_lines[j1:j2]]
+        if i2 > i1:
+            mapped = [map_line(line) for line in range(i1 + 1, i2 + 1)]
+            if None in mapped or mapped != list(range(mapped[0], mapped[0] + len(mapped))):
+                return None
+            start, end = mapped[0] - 1, mapped[-1]
+            old_indent = _indent(old_lines[i1])
+            new_indent = _indent(new_lines[start]) if start < len(new_lines) else old_indent
+            if old_indent != new_indent:
+                replacement = [
+                    new_indent + line[len(old_indent):] if line.startswith(old_indent) else line
+                    for line in replacement
+                ]
+        else:
+            # Lines inserted after old line i1
+            if i1 == 0:
+                start = 0
+            else:
+                start = map_line(i1)
+                if start is None:
+                    return None
+            end = start
+        edits.append((start, end, replacement))
+
+    edits.sort()
+    for (_, previous_end, _), (start, _, _) in zip(edits, edits[1:]):
+        if start < previous_end:
+            return None
+    output = list(new_lines)
+    for start, end, replacement in reversed(edits):
+        output[start:end] = replacement
+    return '\n'.join(output)
+
+
+def _indent(line):
+    return line[:len(line) - len(line.lstrip())]
+
+
+class _Renamer:
+    """
+    Renames the old code's identifiers and string literals to the new
+    code's. In prose, short names are only renamed inside `code` or
+    "quoted" spans, so words like "a" are left alone.
+    """
+
+    def __init__(self, names, literals):
+        self.names = names
+        self.literals = {old: new for old, new in literals.items() if len(old) >= 3}
+        alternatives = [re.escape(literal) for literal in sorted(self.literals, key=len, reverse=True)]
+        self.pattern = re.compile('|'.join(alternatives + [_WORD.pattern]))
+
+    def __call__(self, text, prose=False):
+        if not text or not (self.names or self.literals):
+            return text
+        if not prose:
+            return self._substitute(text, True)
+        parts = _QUOTED.split(text)
+        return ''.join(self._substitute(part, index % 2 == 1) for index, part in enumerate(parts))
+
+    def _substitute(self, span, short_names):
+        def replace(match):
+            found = match.group()
+            if found in self.literals:
+                return self.literals[found]
+            if short_names or len(found) >= 3:
+                return self.names.get(found, found)
+            return found
+        return self.pattern.sub(replace, span)
+
+
+def _rename_all(value, rename, key=''):
+    if isinstance(value, str):
+        return rename(value, prose='code' not in key)
+    if isinstance(value, list):
+        return [_rename_all(item, rename, key) for item in value]
+    if isinstance(value, dict):
+        return {name: _rename_all(item, rename, name) for name, item in value.items()}
+    return value
+
+
+async def afind_near_duplicate(code, language, depth=FULL_DEPTH):
+    """
+    A near-duplicate's analysis remapped to code, with source
+    "near_duplicate" and its similarity, or None. Only analyses covering
+    the named depth are reused.
+    """
+    config = get_near_duplicate_settings()
+    if not config['ENABLED']:
+        return None
+    fp = fingerprint(code, language)
+    if fp is None:
+        return None
+    match = near_duplicates.nearest(fp, config)
+    if match is None:
+        return None
+    record = await analysis_store.aget(match.analysis_id)
+    if record is None or record['result'].get('partial'):
+        near_duplicates.discard(match.analysis_id)
+        near_duplicates.reject()
+        return None
+    if not covers(record['result'].get('depth', FULL_DEPTH), depth):
+        near_duplicates.reject()
+        return None
+    remapped = remap_analysis(record['result'], record['code'], match.fingerprint, code, fp)
+    if remapped is None:
+        near_duplicates.reject()
+        return None
+    remapped['source'] = 'near_duplicate'
+    remapped['similarity'] = round(match.similarity, 3)
+    return remapped
+
+
+def index_analysis(analysis_id, code, language, result):
+    """
+    Index a stored analysis for near-duplicate lookups. Only full analyses
+    by the LLM are indexed, not local or remapped ones.
+    """
+    config = get_near_duplicate_settings()
+    if not config['ENABLED'] or result.get('partial') or result.get('source') in ('local', 'near_duplicate'):
+        return
+    fp = fingerprint(code, language)
+    if fp is not None:
+        near_duplicates.add(analysis_id, fp, config['MAX_ENTRIES'])
+
+
+def index_recent_analyses(limit):
+    """
+    Index up to limit of the most recent stored analyses, so a new process
+    finds near duplicates of work done before it started. Returns how many
+    were read.
+    """
+    from .models import Analysis
+
+    config = get_near_duplicate_settings()
+    if not config['ENABLED'] or limit <= 0:
+        return 0
+    rows = list(
+        Analysis.objects.order_by('-created_at')
+        .values_list('analysis_id', 'code', 'language', 'result')[:min(limit, config['MAX_ENTRIES'])]
+    )
+    for analysis_id, code, language, result in reversed(rows):
+        index_analysis(analysis_id, code, language, result)
+    return len(rows)
+
+
+@registry.collector
+def _collect_near_duplicate_stats():
+    stats = near_duplicates.stats()
+    return [
+        ('tutor_near_duplicate_entries', 'Fingerprints in the near-duplicate index', {(): stats['entries']}),
+        ('tutor_near_duplicate_hit_ratio', 'Share of lookups answered from a near duplicate', {(): stats['hit_ratio']}),
+    ]
@@ -0,0 +1,227 @@
+# frontend.py
+"""
+Precompiled delivery of the single-page frontend.
+
+tutor/templates/coder.html is the source of the page: the markup with one
+inline <style> and one inline <script>. It has no template tags, so it isn't
+rendered per request. On first use it is compiled into:
+
+- coder.<hash>.css and coder.<hash>.js, bundles named after a hash of their
+  content, served from /assets/ with a long immutable Cache-Control;
+- the shell, the markup with the bundles linked instead of inlined, served
+  with Cache-Control: no-cache so browsers revalidate it on every load.
+
+Every file is held in memory, compressed once at build time with gzip (and
+brotli when the brotli package is installed), with an ETag. Responses use
+the best encoding the request's Accept-Encoding allows, and a request whose
+If-None-Match matches gets an empty 304. With DEBUG on, the page is rebuilt
+when coder.html changes.
+
+manage.py build_frontend writes the same files to a directory, for serving
+the bundles from a CDN or a web server's precompressed static files.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+
+from .metrics import frontend_responses
+from .transport import available_encodings, choose_encoding, compress
+
+DEFAULT_FRONTEND_SETTINGS = {
+    'SOURCE': Path(__file__).resolve().parent / 'templates' / 'coder.html',
+    # URL prefix of the bundles in the shell; point it at a CDN that serves
+    # the output of manage.py build_frontend
+    'ASSET_URL': '/assets/',
+    # Seconds browsers may keep a bundle; its name changes with its content
+    'ASSET_MAX_AGE': 365 * 24 * 60 * 60,
+    # Smaller files aren't worth compressing
+    'COMPRESS_MIN_BYTES': 512,
+    # Rebuild when the source changes (None: when DEBUG is on)
+    'RELOAD': None,
+}
+
+SHELL_NAME = 'index.html'
+SHELL_CACHE_CONTROL = 'no-cache'
+
+STYLE_RE = re.compile(r'<style>(.*?)</style>', re.DOTALL)
+SCRIPT_RE = re.compile(r'<script>(.*?)</script>', re.DOTALL)
+
+
+def get_frontend_settings():
+    config = dict(DEFAULT_FRONTEND_SETTINGS)
+    config.update(getattr(settings, 'FRONTEND', {}))
+    return config
+
+
+class FrontendFile(namedtuple('FrontendFile', ['name', 'content_type', 'body', 'digest', 'encoded'])):
+    """
+    A compiled file with its precompressed variants ({encoding: bytes})
+    """
+    __slots__ = ()
+
+    def etag(self, encoding=None):
+        # Each representation has its own strong validator
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    @property
+    def etags(self):
+        return {self.etag()} | {self.etag(encoding) for encoding in self.encoded}
+
+
+def make_file(name, content_type, text, min_bytes):
+    body = text.encode('utf-8')
+    encoded = {}
+    if len(body) >= min_bytes:
+        for encoding in available_encodings():
+            data = compress(body, encoding)
+            if len(data) < len(body):
+                encoded[encoding] = data
+    return FrontendFile(name, content_type, body, hashlib.sha256(body).hexdigest()[:16], encoded)
+
+
+def bundle_name(stem, extension, text):
+    return f'{stem}.{hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]}.{extension}'
+
+
+def replace_blocks(pattern, text, tag, keep):
+    """
+    Replace the blocks pattern matches in text with one tag, at the
+    position of the first or the last block (keep), dropping the others
+    """
+    matches = list(pattern.finditer(text))
+    kept = matches[0] if keep == 'first' else matches[-1]
+    parts, position = [], 0
+    for match in matches:
+        parts.append(text[position:match.start()])
+        if match is kept:
+            parts.append(tag)
+        position = match.end()
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def compile_page(source, asset_url, min_bytes=DEFAULT_FRONTEND_SETTINGS['COMPRESS_MIN_BYTES'], stem='coder'):
+    """
+    Split the inline styles and scripts of source into bundles. Returns
+    (shell, {name: bundle}), all FrontendFiles.
+    """
+    bundles = {}
+    shell = source
+
+    styles = STYLE_RE.findall(source)
+    if styles:
+        css = '\n'.join(style.strip('\n') for style in styles) + '\n'
+        name = bundle_name(stem, 'css', css)
+        bundles[name] = make_file(name, 'text/css; charset=utf-8', css, min_bytes)
+        # In place of the first block, so the cascade is unchanged
+        shell = replace_blocks(STYLE_RE, shell, f'<link rel="stylesheet" href="{asset_url}{name}">', 'first')
+
+    scripts = SCRIPT_RE.findall(source)
+    if scripts:
+        js = ';\n'.join(script.strip('\n') for script in scripts) + '\n'
+        name = bundle_name(stem, 'js', js)
+        bundles[name] = make_file(name, 'text/javascript; charset=utf-8', js, min_bytes)
+        # In place of the last block, so every element the scripts look up exists
+        shell = replace_blocks(SCRIPT_RE, shell, f'<script src="{asset_url}{name}"></script>', 'last')
+
+    return make_file(SHELL_NAME, 'text/html; charset=utf-8', shell, min_bytes), bundles
+
+
+def not_modified(file, header):
+    """
+    Whether an If-None-Match header matches one of the file's ETags
+    """
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison: a proxy in front of us may have weakened the tag
+    return any(tag.strip().removeprefix('W/') in file.etags for tag in header.split(','))
+
+
+class Frontend:
+    """
+    The compiled page of this process, rebuilt when the source changes if
+    RELOAD is on
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build = None  # (source mtime, shell, bundles)
+
+    def files(self):
+        """
+        (shell, {name: bundle}) of the current build
+        """
+        config = get_frontend_settings()
+        build = self._build
+        reload = config['RELOAD'] if config['RELOAD'] is not None else settings.DEBUG
+        if build is not None and not reload:
+            return build[1], build[2]
+
+        mtime = os.stat(config['SOURCE']).st_mtime_ns
+        if build is None or build[0] != mtime:
+            with self._lock:
+                build = self._build
+                if build is None or build[0] != mtime:
+                    build = self._build = (mtime, *self.compile(config))
+        return build[1], build[2]
+
+    def compile(self, config):
+        with open(config['SOURCE'], encoding='utf-8') as handle:
+            source = handle.read()
+        return compile_page(source, config['ASSET_URL'], config['COMPRESS_MIN_BYTES'])
+
+    def shell(self):
+        return self.files()[0]
+
+    def bundle(self, name):
+        return self.files()[1].get(name)
+
+    def clear(self):
+        with self._lock:
+            self._build = None
+
+
+frontend = Frontend()
+
+
+def file_response(request, file, cache_control, kind):
+    """
+    Response for file, negotiated on Accept-Encoding and If-None-Match
+    """
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'), file.encoded)
+    if not_modified(file, request.headers.get('If-None-Match')):
+        response = HttpResponseNotModified()
+    else:
+        body = file.encoded[encoding] if encoding else file.body
+        response = HttpResponse(body, content_type=file.content_type)
+        response['Content-Length'] = str(len(body))
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = file.etag(encoding)
+    response['Cache-Control'] = cache_control
+    response['Vary'] = 'Accept-Encoding'
+    frontend_responses.inc(kind=kind, status=response.status_code, encoding=encoding or 'identity')
+    return response
+
+
+def shell_response(request):
+    return file_response(request, frontend.shell(), SHELL_CACHE_CONTROL, 'shell')
+
+
+def bundle_response(request, name):
+    """
+    Response for the bundle called name, or None when there is none
+    """
+    bundle = frontend.bundle(name)
+    if bundle is None:
+        return None
+    cache_control = f'public, max-age={get_frontend_settings()["ASSET_MAX_AGE"]}, immutable'
+    return file_response(request, bundle, cache_control, 'asset')
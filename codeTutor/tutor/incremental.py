@@ -0,0 +1,330 @@
+# incremental.py
+"""
+Incremental re-analysis of resubmitted code.
+
+Students usually change a line or two and analyze again. When the previous
+analysis of the session is available, plan_incremental() diffs the new code
+against it and splits the new file into segments: regions around the
+changed lines (widened to their enclosing function, class or block) that
+are sent to the LLM, and unchanged stretches whose previous issues are kept
+with their line numbers shifted. The segments are merged back into a full
+analysis with merge_chunk_analyses(), so the response has the usual schema.
+
+Edits that touch too much of the file fall back to a full analysis.
+"""
+import ast
+import difflib
+from collections import namedtuple
+
+from django.conf import settings
+
+from .chunking import Chunk, _brace_units, _python_units, _STRING_OR_COMMENT
+from .prompts import count_tokens
+
+DEFAULT_INCREMENTAL_SETTINGS = {
+    'ENABLED': True,
+    # Fall back to a full analysis when regions to re-analyze cover more
+    # than this share of the file
+    'MAX_REANALYZED_RATIO': 0.6,
+    # Enclosing scopes larger than this are narrowed to the nested scope
+    # (method, block) around the change
+    'MAX_SCOPE_LINES': 60,
+    # Lines of context around changes outside any scope
+    'CONTEXT_LINES': 2,
+    'MIN_MAX_TOKENS': 800,
+    'MAX_MAX_TOKENS': 6000,
+}
+
+# reanalyze is False for unchanged segments, whose analysis holds the
+# previous issues (lines relative to the segment)
+Segment = namedtuple('Segment', ['chunk', 'reanalyze', 'analysis'])
+
+IncrementalPlan = namedtuple('IncrementalPlan', ['segments', 'reanalyzed_lines'])
+
+_FRONTEND_ISSUE_FIELDS = {
+    'type': 'category',
+    'title': 'title',
+    'description': 'description',
+    'cause': 'cause',
+    'fix': 'fix',
+    'column': 'column',
+    'code': 'code_snippet',
+    'severity': 'severity',
+    'hints': 'hints',
+}
+
+
+def get_incremental_settings():
+    config = dict(DEFAULT_INCREMENTAL_SETTINGS)
+    config.update(getattr(settings, 'INCREMENTAL_ANALYSIS', {}))
+    return config
+
+
+def can_build_on(record, language):
+    """
+    Whether a stored analysis record can be the base of an incremental one:
+    same language, complete, and reviewed by the LLM rather than only
+    checked for syntax locally
+    """
+    if record is None or record.get('language') != language:
+        return False
+    result = record.get('result') or {}
+    return not result.get('partial') and result.get('source') != 'local'
+
+
+def region_max_tokens(text):
+    """
+    Completion budget for re-analyzing a region: room for the issues and a
+    corrected copy of the region, rather than the full-file budget
+    """
+    config = get_incremental_settings()
+    estimate = config['MIN_MAX_TOKENS'] + 3 * count_tokens(text)
+    return max(config['MIN_MAX_TOKENS'], min(estimate, config['MAX_MAX_TOKENS']))
+
+
+def plan_incremental(previous_code, previous_result, code, language, syntax_verified=False):
+    """
+    Plan the re-analysis of code given the previous submission and its
+    frontend result. Returns an IncrementalPlan, or None when a full
+    analysis is the better choice.
+    """
+    config = get_incremental_settings()
+    old_lines = previous_code.split('\n')
+    lines = code.split('\n')
+    opcodes = difflib.SequenceMatcher(None, old_lines, lines, autojunk=False).get_opcodes()
+
+    changed = _changed_lines(opcodes, len(lines))
+    if not changed:
+        return None
+
+    scopes = _scope_ranges(code, lines, language)
+    regions = _merge_ranges(
+        _region_for_line(line, scopes, len(lines), config) for line in sorted(changed)
+    )
+    reanalyzed = sum(last - first + 1 for first, last in regions)
+    if reanalyzed > config['MAX_REANALYZED_RATIO'] * len(lines):
+        return None
+
+    old_to_new = {}
+    for tag, i1, i2, j1, _ in opcodes:
+        if tag == 'equal':
+            for offset in range(i2 - i1):
+                old_to_new[i1 + offset + 1] = j1 + offset + 1
+    new_to_old = {new: old for old, new in old_to_new.items()}
+
+    kept = _kept_issues(previous_result, old_to_new, regions, syntax_verified)
+    corrected_lines = (previous_result.get('corrected_code') or '').split('\n')
+
+    segments = []
+    cursor = 1
+    for first, last in regions + [(len(lines) + 1, len(lines))]:
+        if cursor < first:
+            segments.append(_unchanged_segment(
+                cursor, first - 1, lines, old_lines, corrected_lines, new_to_old, kept, previous_result
+            ))
+        if first <= last:
+            segments.append(Segment(Chunk(first, last, '\n'.join(lines[first - 1:last])), True, None))
+        cursor = last + 1
+
+    # Issues without a line number belong to the whole file
+    unplaced = [issue for issue in kept if not isinstance(issue.get('line'), int)]
+    for segment in segments:
+        if unplaced and not segment.reanalyze:
+            segment.analysis['issues'].extend(unplaced)
+            break
+
+    return IncrementalPlan(segments, regions)
+
+
+def _changed_lines(opcodes, total_lines):
+    """
+    1-based lines of the new file that were inserted or replaced, plus the
+    lines on either side of deletions
+    """
+    changed = set()
+    for tag, _, _, j1, j2 in opcodes:
+        if tag in ('replace', 'insert'):
+            changed.update(range(j1 + 1, j2 + 1))
+        elif tag == 'delete':
+            changed.update(line for line in (j1, j1 + 1) if 1 <= line <= total_lines)
+    return changed
+
+
+def _scope_ranges(code, lines, language):
+    """
+    (first, last) line ranges of definitions and blocks, at every depth
+    """
+    ranges = []
+    if language == 'python':
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            tree = None
+        if tree is not None:
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    first = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+                    ranges.append((first, node.end_lineno))
+            ranges.extend(_python_units(code, lines) or [])
+            return ranges
+    ranges.extend(_brace_blocks(lines))
+    ranges.extend(_brace_units(lines))
+    return ranges
+
+
+def _brace_blocks(lines):
+    """
+    Ranges of multi-line brace blocks, starting at the header line when the
+    opening brace sits on a line of its own
+    """
+    blocks = []
+    stack = []
+    in_block_comment = False
+    for number, line in enumerate(lines, start=1):
+        text = line
+        if in_block_comment:
+            if '*/' not in text:
+                continue
+            text = text.split('*/', 1)[1]
+            in_block_comment = False
+        text = _STRING_OR_COMMENT.sub('', text)
+        if '/*' in text:
+            head, _, tail = text.partition('/*')
+            in_block_comment = '*/' not in tail
+            text = head + (tail.split('*/', 1)[1] if not in_block_comment else '')
+        for char in text:
+            if char == '{':
+                start = number
+                if text.strip() == '{' and number > 1:
+                    start -= 1
+                stack.append(start)
+            elif char == '}' and stack:
+                start = stack.pop()
+                if number > start:
+                    blocks.append((start, number))
+    return blocks
+
+
+def _region_for_line(line, scopes, total_lines, config):
+    """
+    The largest scope around line that fits MAX_SCOPE_LINES, else the
+    smallest one, else the line with some context
+    """
+    enclosing = sorted(
+        (scope for scope in scopes if scope[0] <= line <= scope[1]),
+        key=lambda scope: scope[1] - scope[0],
+        reverse=True,
+    )
+    for first, last in enclosing:
+        if last - first + 1 <= config['MAX_SCOPE_LINES']:
+            return first, last
+    if enclosing:
+        return enclosing[-1]
+    context = config['CONTEXT_LINES']
+    return max(line - context, 1), min(line + context, total_lines)
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _kept_issues(previous_result, old_to_new, regions, syntax_verified):
+    """
+    Previous issues on unchanged lines outside the regions, converted back
+    to the LLM schema with their new line numbers
+    """
+    kept = []
+    for kind in ('errors', 'warnings'):
+        for issue in previous_result.get(kind, []):
+            if syntax_verified and str(issue.get('type', '')).lower() == 'syntax':
+                continue
+            line = issue.get('line')
+            if isinstance(line, int):
+                line = old_to_new.get(line)
+                if line is None or any(first <= line <= last for first, last in regions):
+                    continue
+            converted = {target: issue[source] for source, target in _FRONTEND_ISSUE_FIELDS.items() if source in issue}
+            converted.update({
+                'id': issue.get('id'),
+                'type': 'error' if kind == 'errors' else 'warning',
+                'line': line,
+            })
+            kept.append(converted)
+    return kept
+
+
+def _unchanged_segment(first, last, lines, old_lines, corrected_lines, new_to_old, kept, previous_result):
+    """
+    Segment for an unchanged stretch of the new file, carrying the kept
+    issues, concepts and strategies that fall inside it
+    """
+    offset = first - 1
+    issues = []
+    for issue in kept:
+        line = issue.get('line')
+        if isinstance(line, int) and first <= line <= last:
+            issues.append({**issue, 'line': line - offset})
+    issue_ids = {str(issue['id']) for issue in issues}
+
+    concept_map = {}
+    for concept in previous_result.get('concept_map', []):
+        concept_issues = [issue_id for issue_id in concept.get('issues', []) if str(issue_id) in issue_ids]
+        if concept_issues:
+            concept_map.setdefault(concept.get('category', ''), []).append({
+                'concept': concept.get('concept', ''),
+                'count': len(concept_issues),
+                'issues': concept_issues,
+            })
+
+    strategies = [
+        strategy for strategy in previous_result.get('correction_strategies', [])
+        if any(str(issue_id) in issue_ids for issue_id in strategy.get('applicable_to_issues', []))
+    ]
+
+    text = '\n'.join(lines[first - 1:last])
+    old_first, old_last = new_to_old.get(first), new_to_old.get(last)
+    corrected = None
+    if old_first is not None and old_last is not None and corrected_lines != ['']:
+        corrected = _corrected_excerpt(old_lines, corrected_lines, old_first, old_last)
+
+    analysis = {
+        'analysis_summary': {
+            'concepts_covered': (previous_result.get('analysis_summary') or {}).get('concepts_covered', []),
+        },
+        'concept_map': concept_map,
+        'issues': issues,
+        'correction_strategies': strategies,
+        # No previous corrected code (an analysis at a depth without it)
+        'corrected_code': corrected if corrected is not None else (text if corrected_lines != [''] else ''),
+        'suggestions': [],
+        'best_practices': [],
+    }
+    return Segment(Chunk(first, last, text), False, analysis)
+
+
+def _corrected_excerpt(old_lines, corrected_lines, first, last):
+    """
+    The part of the previous corrected code that corresponds to old lines
+    first..last, found by diffing the previous code with its correction
+    """
+    start, end = first - 1, last  # 0-based, end exclusive
+    matcher = difflib.SequenceMatcher(None, old_lines, corrected_lines, autojunk=False)
+    excerpt = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'insert':
+            # Lines added after old line i1 belong to the range holding it
+            if start < i1 <= end or (i1 == 0 and start == 0):
+                excerpt.extend(corrected_lines[j1:j2])
+        elif tag == 'equal':
+            low, high = max(i1, start), min(i2, end)
+            if low < high:
+                excerpt.extend(corrected_lines[j1 + low - i1:j1 + high - i1])
+        elif start <= i1 < end:
+            excerpt.extend(corrected_lines[j1:j2])
+    return '\n'.join(excerpt)
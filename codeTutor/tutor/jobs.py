@@ -0,0 +1,311 @@
+# jobs.py
+"""
+Background analysis jobs.
+
+POST /api/analyze/jobs/ queues a submission and returns a job ID at once; a
+pool of workers runs the normal analysis pipeline (views.analyze_submission:
+cache, local checks, prompt, LLM call, decoding and
+transform_response_for_frontend) and clients poll
+/api/analyze/jobs/<id>/ or subscribe to its server-sent events for the
+result. No request stays open for the length of an LLM call, so long files
+no longer hit proxy timeouts.
+
+The broker is in-process: the workers are coroutines on an event loop in a
+dedicated thread, so they run the same under ASGI, WSGI and
+`manage.py runserver`. Job state is kept in memory for fast polling and
+written to the AnalysisJob table (through the background writer), so other
+server processes can answer status requests too. Jobs still queued or
+running when a process exits are not resumed.
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import registry
+from .persistence import db_writer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_SETTINGS = {
+    'WORKERS': 8,
+    # New jobs are refused (503) beyond this many queued ones
+    'MAX_QUEUED': 1000,
+    # Finished jobs are kept in memory this many seconds
+    'RETENTION': 3600,
+}
+
+FINISHED = ('done', 'failed')
+
+
+class QueueFull(Exception):
+    """
+    The job queue holds MAX_QUEUED jobs already
+    """
+
+
+def get_job_settings():
+    config = dict(DEFAULT_JOB_SETTINGS)
+    config.update(getattr(settings, 'ANALYSIS_JOBS', {}))
+    return config
+
+
+class Job:
+    """
+    State of one analysis job
+    """
+
+    def __init__(self, job_id, code, language, previous_id=None, session_key='', status='queued',
+                 analysis_id='', source='', error='', error_status=None,
+                 created_at=None, started_at=None, finished_at=None, depth=None):
+        self.job_id = job_id
+        self.code = code
+        self.language = language
+        self.previous_id = previous_id
+        # Name of the analysis depth; not persisted, the analysis records it
+        self.depth = depth
+        self.session_key = session_key or ''
+        self.status = status
+        self.analysis_id = analysis_id
+        self.source = source
+        self.error = error
+        self.error_status = error_status
+        self.created_at = created_at or timezone.now()
+        self.started_at = started_at
+        self.finished_at = finished_at
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def as_row(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'code': self.code,
+            'language': self.language,
+            'session_key': self.session_key,
+            'analysis_id': self.analysis_id,
+            'source': self.source,
+            'error': self.error,
+            'error_status': self.error_status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+    @classmethod
+    def from_model(cls, instance):
+        row = {field: getattr(instance, field) for field in (
+            'job_id', 'code', 'language', 'session_key', 'status', 'analysis_id', 'source',
+            'error', 'error_status', 'created_at', 'started_at', 'finished_at',
+        )}
+        return cls(**row)
+
+
+class JobQueue:
+    """
+    In-process broker with a pool of worker coroutines on its own loop
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}      # job_id -> Job
+        self._waiters = {}   # job_id -> [(loop, future)]
+        self._loop = None
+        self._queue = None
+        self._thread = None
+        self._counters = {'submitted': 0, 'done': 0, 'failed': 0, 'rejected': 0}
+
+    async def asubmit(self, code, language, previous_id=None, session_key='', depth=None):
+        """
+        Queue an analysis (at the named depth, or the default one) and
+        return its Job. Raises QueueFull when the queue is at MAX_QUEUED.
+        """
+        config = get_job_settings()
+        self._ensure_started(config)
+        job = Job(uuid.uuid4().hex, code, language, previous_id, session_key, depth=depth)
+        with self._lock:
+            self._prune(config['RETENTION'])
+            if self._count_status('queued') >= config['MAX_QUEUED']:
+                self._counters['rejected'] += 1
+                raise QueueFull()
+            self._jobs[job.job_id] = job
+            self._counters['submitted'] += 1
+        await db_writer.aput('analysis_job', job.as_row())
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job
+
+    async def aget(self, job_id):
+        """
+        The Job for job_id from this process, or from the database
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return await sync_to_async(self._load)(job_id)
+
+    async def wait(self, job_id, timeout):
+        """
+        Wait up to timeout seconds for a job to finish and return it (finished
+        or not), or None if there is no such job
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.finished:
+                self._waiters.setdefault(job_id, []).append((loop, future))
+        if job is None:
+            # Another process's job: poll the database
+            deadline = loop.time() + timeout
+            while True:
+                job = await self.aget(job_id)
+                if job is None or job.finished or loop.time() >= deadline:
+                    return job
+                await asyncio.sleep(min(0.5, max(deadline - loop.time(), 0)))
+        if not job.finished:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def position(self, job):
+        """
+        Number of queued jobs ahead of job
+        """
+        with self._lock:
+            return sum(
+                1 for other in self._jobs.values()
+                if other.status == 'queued' and other.created_at < job.created_at
+            )
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['queued'] = self._count_status('queued')
+            stats['running'] = self._count_status('running')
+        return stats
+
+    def _count_status(self, status):
+        # Caller must hold self._lock
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def _prune(self, retention):
+        # Caller must hold self._lock
+        cutoff = timezone.now() - timedelta(seconds=retention)
+        for job_id in [
+            job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
+
+    def _load(self, job_id):
+        from .models import AnalysisJob
+
+        instance = AnalysisJob.objects.filter(job_id=job_id).first()
+        return Job.from_model(instance) if instance is not None else None
+
+    # Worker pool
+
+    def _ensure_started(self, config):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(
+                target=self._serve, args=(config['WORKERS'], ready), name='tutor-analysis-jobs', daemon=True
+            )
+            self._thread.start()
+        ready.wait()
+
+    def _serve(self, workers, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._queue = asyncio.Queue()
+
+        async def main():
+            ready.set()
+            await asyncio.gather(*(self._work() for _ in range(workers)))
+
+        loop.run_until_complete(main())
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception('Analysis job %s crashed', job.job_id)
+
+    async def _run(self, job):
+        from .depth import get_analysis_depth
+        from .views import AnalysisParseError, analyze_submission, describe_openai_error
+
+        job.status = 'running'
+        job.started_at = timezone.now()
+        await db_writer.aput('analysis_job', job.as_row())
+        try:
+            result, job.source = await analyze_submission(
+                job.code, job.language, job.previous_id, endpoint='analyze_job', depth=get_analysis_depth(job.depth)
+            )
+            job.analysis_id = result['analysis_id']
+            job.status = 'done'
+        except AnalysisParseError:
+            job.error, job.error_status = 'Could not parse analysis results. Please try again.', 500
+            job.status = 'failed'
+        except Exception as e:
+            logger.exception('Analysis job %s failed', job.job_id)
+            job.error, job.error_status = describe_openai_error(e)
+            job.status = 'failed'
+        job.finished_at = timezone.now()
+        await db_writer.aput('analysis_job', job.as_row())
+        self._finish(job)
+
+    def _finish(self, job):
+        with self._lock:
+            self._counters[job.status] += 1
+            waiters = self._waiters.pop(job.job_id, [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+analysis_jobs = JobQueue()
+
+
+@db_writer.handler('analysis_job')
+def _write_jobs(rows):
+    from .models import AnalysisJob
+
+    latest = {row['job_id']: row for row in rows}
+    AnalysisJob.objects.bulk_create(
+        [AnalysisJob(**row) for row in latest.values()],
+        update_conflicts=True,
+        unique_fields=['job_id'],
+        update_fields=[
+            'status', 'session_key', 'analysis_id', 'source', 'error', 'error_status', 'started_at', 'finished_at',
+        ],
+    )
+
+
+@registry.collector
+def _collect_job_stats():
+    stats = analysis_jobs.stats()
+    return [
+        ('tutor_analysis_jobs', 'Analysis jobs by state', {
+            (('state', 'queued'),): stats['queued'],
+            (('state', 'running'),): stats['running'],
+        }),
+    ]
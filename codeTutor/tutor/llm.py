@@ -0,0 +1,315 @@
+# llm.py
+"""
+Shared async OpenAI client for the tutor views.
+
+All LLM views are async and share one AsyncOpenAI client per event loop.
+Under the ASGI server (codeTutor/asgi.py) there is a single loop, so every
+request reuses the same pooled, keep-alive httpx connections. Each endpoint
+also has its own concurrency limit so a burst of full analyses can't starve
+hint requests of upstream connections.
+
+Calls are admitted by the upstream scheduler (tutor/scheduler.py), which
+keeps them within the account's rate limits and owns retries; the SDK's own
+retries are turned off while it is enabled.
+
+The client comes from the provider named in LLM_CLIENT['PROVIDER']:
+OpenAIProvider talks to the OpenAI API (or any compatible server at
+LLM_CLIENT['BASE_URL'], such as `manage.py llm_standin`), StandInProvider
+replays recorded completions in-process for offline load tests.
+
+openai and httpx are imported when the first client is built, not with this
+module, so processes that never call the LLM (manage.py migrate, serving
+the page) don't pay for them. tutor/warmup.py builds the client ahead of
+the first request.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .metrics import (
+    llm_completion_tokens, llm_duration, llm_first_token, llm_prompt_tokens, llm_requests, llm_retries, llm_tokens
+)
+from .prompts import count_message_tokens, count_tokens
+from .scheduler import get_scheduler, get_scheduler_settings
+
+DEFAULT_LLM_SETTINGS = {
+    'PROVIDER': 'tutor.llm.OpenAIProvider',
+    # OpenAI-compatible API root; None for api.openai.com
+    'BASE_URL': None,
+    # Append non-streamed completions to this JSON lines file for replay
+    'RECORD_PATH': None,
+    # Options for StandInProvider (see tutor/standin.py)
+    'STANDIN': {},
+    'MAX_CONNECTIONS': 200,
+    'MAX_KEEPALIVE_CONNECTIONS': 50,
+    'KEEPALIVE_EXPIRY': 30.0,
+    'CONNECT_TIMEOUT': 10.0,
+    'READ_TIMEOUT': 120.0,
+    'CONCURRENCY': {
+        'analyze': 100,
+        'hint': 200,
+        'correction_strategy': 50,
+        'corrected_code': 50,
+    },
+}
+
+_lock = threading.Lock()
+_clients = weakref.WeakKeyDictionary()      # event loop -> AsyncOpenAI
+_semaphores = weakref.WeakKeyDictionary()   # event loop -> {endpoint: Semaphore}
+
+# Endpoint of the LLM call being sent, for the httpx retry hook
+_current_endpoint = contextvars.ContextVar('llm_endpoint', default=None)
+
+
+def get_llm_settings():
+    config = dict(DEFAULT_LLM_SETTINGS)
+    config.update(getattr(settings, 'LLM_CLIENT', {}))
+    config['CONCURRENCY'] = {**DEFAULT_LLM_SETTINGS['CONCURRENCY'], **config.get('CONCURRENCY', {})}
+    return config
+
+
+class LLMProvider:
+    """
+    Builds the AsyncOpenAI-compatible client used by the tutor views
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def build_client(self):
+        raise NotImplementedError
+
+    def http_client_options(self):
+        import httpx
+
+        return {
+            'event_hooks': {'request': [_count_retry]},
+            'limits': httpx.Limits(
+                max_connections=self.config['MAX_CONNECTIONS'],
+                max_keepalive_connections=self.config['MAX_KEEPALIVE_CONNECTIONS'],
+                keepalive_expiry=self.config['KEEPALIVE_EXPIRY'],
+            ),
+            'timeout': httpx.Timeout(self.config['READ_TIMEOUT'], connect=self.config['CONNECT_TIMEOUT']),
+        }
+
+    def max_retries(self):
+        """
+        SDK retries, unless the upstream scheduler retries instead
+        """
+        return 0 if get_scheduler_settings()['ENABLED'] else 2
+
+
+class OpenAIProvider(LLMProvider):
+    """
+    The OpenAI API, or a compatible server at BASE_URL
+    """
+
+    def build_client(self):
+        import httpx
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            base_url=self.config['BASE_URL'],
+            max_retries=self.max_retries(),
+            http_client=httpx.AsyncClient(**self.http_client_options()),
+        )
+
+
+class StandInProvider(LLMProvider):
+    """
+    Recorded completions served in-process. Requests still go through the
+    SDK and httpx, over an ASGI transport instead of the network.
+    """
+
+    def build_client(self):
+        import httpx
+        from openai import AsyncOpenAI
+
+        from .standin import build_standin_app
+
+        transport = httpx.ASGITransport(app=build_standin_app(self.config['STANDIN']))
+        return AsyncOpenAI(
+            api_key='stand-in',
+            base_url='http://llm-standin/v1',
+            max_retries=self.max_retries(),
+            http_client=httpx.AsyncClient(transport=transport, **self.http_client_options()),
+        )
+
+
+def get_provider():
+    config = get_llm_settings()
+    return import_string(config['PROVIDER'])(config)
+
+
+def _build_client():
+    return get_provider().build_client()
+
+
+def get_client():
+    """
+    Return the AsyncOpenAI client for the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = _build_client()
+        return client
+
+
+@asynccontextmanager
+async def endpoint_limit(endpoint):
+    """
+    Limit the number of in-flight upstream calls for an endpoint
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        semaphores = _semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(endpoint)
+        if semaphore is None:
+            limit = get_llm_settings()['CONCURRENCY'].get(endpoint, 50)
+            semaphore = semaphores[endpoint] = asyncio.Semaphore(limit)
+    async with semaphore:
+        yield
+
+
+async def _count_retry(request):
+    """
+    httpx request hook: the SDK numbers its attempts in a header
+    """
+    endpoint = _current_endpoint.get()
+    if endpoint and request.headers.get('x-stainless-retry-count', '0') != '0':
+        llm_retries.inc(endpoint=endpoint)
+
+
+class LLMCall:
+    """
+    Records latency, tokens and the outcome of one LLM call
+    """
+
+    def __init__(self, endpoint, messages):
+        self.endpoint = endpoint
+        self.messages = messages
+        self.start = None
+        self.first_token_seen = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def first_token(self):
+        if not self.first_token_seen:
+            self.first_token_seen = True
+            llm_first_token.observe(time.perf_counter() - self.start, endpoint=self.endpoint)
+
+    def finish(self, content, usage=None):
+        """
+        Record token counts, estimating them locally when the response
+        carries no usage. Prompt tokens served from the upstream prompt cache
+        are also counted as kind="cached". Returns the total.
+        """
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+            details = getattr(usage, 'prompt_tokens_details', None)
+            cached_tokens = getattr(details, 'cached_tokens', None) or 0
+            if cached_tokens:
+                llm_tokens.inc(cached_tokens, endpoint=self.endpoint, kind='cached')
+        else:
+            prompt_tokens = count_message_tokens(self.messages or [])
+            completion_tokens = count_tokens(content or '')
+        llm_tokens.inc(prompt_tokens, endpoint=self.endpoint, kind='prompt')
+        llm_tokens.inc(completion_tokens, endpoint=self.endpoint, kind='completion')
+        llm_prompt_tokens.observe(prompt_tokens, endpoint=self.endpoint)
+        llm_completion_tokens.observe(completion_tokens, endpoint=self.endpoint)
+        return prompt_tokens + completion_tokens
+
+    def __exit__(self, exc_type, exc, traceback):
+        llm_duration.observe(time.perf_counter() - self.start, endpoint=self.endpoint)
+        if exc_type is None:
+            outcome = 'ok'
+        elif issubclass(exc_type, Exception):
+            outcome = exc_type.__name__
+        else:
+            outcome = 'cancelled'
+        llm_requests.inc(endpoint=self.endpoint, outcome=outcome)
+
+
+async def _create(endpoint, **kwargs):
+    token = _current_endpoint.set(endpoint)
+    try:
+        return await get_client().chat.completions.create(**kwargs)
+    finally:
+        _current_endpoint.reset(token)
+
+
+def _reserved_tokens(kwargs):
+    """
+    Tokens a call counts against the rate limit before it runs: the prompt
+    plus max_tokens
+    """
+    return count_message_tokens(kwargs.get('messages') or []) + (kwargs.get('max_tokens') or 0)
+
+
+async def _send(endpoint, **kwargs):
+    """
+    Send a call through the upstream scheduler. Returns the response and the
+    tokens reserved for it, to settle once the usage is known.
+    """
+    scheduler = get_scheduler()
+    if scheduler is None:
+        return await _create(endpoint, **kwargs), None
+    reserved = _reserved_tokens(kwargs)
+    response = await scheduler.submit(endpoint, reserved, lambda: _create(endpoint, **kwargs))
+    return response, (scheduler, reserved)
+
+
+def _settle(reservation, used):
+    if reservation is not None:
+        scheduler, reserved = reservation
+        scheduler.budget.settle(reserved, used)
+
+
+async def create_chat_completion(endpoint, **kwargs):
+    """
+    Run a chat completion on the shared client within the endpoint's
+    concurrency limit
+    """
+    async with endpoint_limit(endpoint):
+        with LLMCall(endpoint, kwargs.get('messages')) as call:
+            response, reservation = await _send(endpoint, **kwargs)
+            _settle(reservation, call.finish(response.choices[0].message.content, response.usage))
+    record_path = get_llm_settings()['RECORD_PATH']
+    if record_path and not kwargs.get('stream'):
+        from .standin import record_completion
+
+        record_completion(record_path, endpoint, response.choices[0].message.content)
+    return response
+
+
+async def stream_chat_completion(endpoint, **kwargs):
+    """
+    Stream a chat completion within the endpoint's concurrency limit,
+    yielding the SDK's chunks. The slot is held until the stream ends.
+    """
+    kwargs['stream'] = True
+    kwargs.setdefault('stream_options', {'include_usage': True})
+    async with endpoint_limit(endpoint):
+        with LLMCall(endpoint, kwargs.get('messages')) as call:
+            stream, reservation = await _send(endpoint, **kwargs)
+            parts = []
+            usage = None
+            async for chunk in stream:
+                usage = getattr(chunk, 'usage', None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    call.first_token()
+                    parts.append(chunk.choices[0].delta.content)
+                yield chunk
+            _settle(reservation, call.finish(''.join(parts), usage))
@@ -0,0 +1,152 @@
+# bench_api.py
+"""
+Benchmark the tutor API against the in-process LLM stand-in.
+
+    python manage.py bench_api --submissions 200 --concurrency 32 --save main
+    python manage.py bench_api --compare main --fail-on-regression
+
+Runs in a scratch test database, so the project database is untouched.
+"""
+import contextlib
+import io
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+
+from tutor.benchmark import ENDPOINTS, compare_reports, load_baseline, run_benchmark, save_baseline
+from tutor.benchmark_corpus import LANGUAGES, SIZES, build_corpus
+from tutor.depth import DEPTHS
+from tutor.llm import get_llm_settings
+from tutor.scheduler import get_scheduler_settings
+
+
+class Command(BaseCommand):
+    help = 'Measure API latency, throughput and memory with a synthetic corpus and a stubbed LLM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=120, help='Corpus size (one scenario each)')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--languages', nargs='+', choices=LANGUAGES, default=LANGUAGES)
+        parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+        parser.add_argument('--syntax-error-rate', type=float, default=0.15)
+        parser.add_argument('--endpoints', nargs='+', choices=[name for name in ENDPOINTS if name != 'analyze_stream'])
+        parser.add_argument('--stream', action='store_true', help='Use the streaming analysis endpoint')
+        parser.add_argument('--depth', choices=DEPTHS, help='Analysis depth (default ANALYSIS_DEPTHS DEFAULT)')
+        parser.add_argument('--no-cache', action='store_true', help='Disable the analysis cache')
+        parser.add_argument('--latency', type=float, default=0.05, help='Stand-in seconds before the first token')
+        parser.add_argument('--tokens-per-second', type=float, default=2000.0, help='Stand-in completion throughput')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+        parser.add_argument('--malformed-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--rpm', type=int, default=10 ** 6, help='Scheduler requests-per-minute budget')
+        parser.add_argument('--tpm', type=int, default=10 ** 9, help='Scheduler tokens-per-minute budget')
+        parser.add_argument('--save', metavar='NAME', help='Save the report as a named baseline')
+        parser.add_argument('--compare', metavar='NAME', help='Compare with a saved baseline (name or path)')
+        parser.add_argument('--threshold', type=float, default=0.10, help='Relative change counted as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def handle(self, *args, **options):
+        baseline = load_baseline(options['compare']) if options['compare'] else None
+        corpus = build_corpus(
+            options['submissions'], options['languages'], options['sizes'],
+            options['syntax_error_rate'], options['seed'],
+        )
+        llm_settings = get_llm_settings()
+        llm_settings.update({
+            'PROVIDER': 'tutor.llm.StandInProvider',
+            'RECORD_PATH': None,
+            'STANDIN': {
+                **llm_settings['STANDIN'],
+                'LATENCY': options['latency'],
+                'LATENCY_JITTER': options['latency'] / 4,
+                'TOKENS_PER_SECOND': options['tokens_per_second'],
+                'RATE_LIMIT_RATE': options['rate_limit_rate'],
+                'ERROR_RATE': 0.0,
+                'MALFORMED_RATE': options['malformed_rate'],
+                'SEED': options['seed'],
+            },
+        })
+
+        # Unlimited by default, so the run measures the app rather than the budget
+        scheduler_settings = get_scheduler_settings()
+        scheduler_settings.update({
+            'REQUESTS_PER_MINUTE': options['rpm'],
+            'TOKENS_PER_MINUTE': options['tpm'],
+        })
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # The views log every request to stdout
+            with override_settings(LLM_CLIENT=llm_settings, LLM_SCHEDULER=scheduler_settings), contextlib.redirect_stdout(io.StringIO()):
+                report = run_benchmark(
+                    corpus,
+                    concurrency=options['concurrency'],
+                    endpoints=options['endpoints'],
+                    stream=options['stream'],
+                    depth=options['depth'],
+                    use_cache=not options['no_cache'],
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+        else:
+            self.write_report(report)
+
+        if options['save']:
+            path = save_baseline(report, options['save'])
+            self.stdout.write(f'\nSaved baseline to {path}')
+
+        if baseline is not None:
+            regressions = self.write_comparison(baseline, report, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} metrics regressed by more than {options["threshold"]:.0%}')
+
+    def write_report(self, report):
+        overall = report['overall']
+        self.stdout.write(
+            f"{report['meta']['submissions']} submissions, concurrency {report['meta']['concurrency']}: "
+            f"{overall['requests']} requests in {overall['wall_s']}s "
+            f"({overall['rps']} req/s, {overall['errors']} errors), peak RSS {overall['peak_rss_mb']} MB"
+        )
+        self.stdout.write('')
+        self.stdout.write(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+        for endpoint, summary in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<22}{summary['requests']:>9}{summary['errors']:>8}{summary['p50_ms']:>10}"
+                f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}{summary['rps']:>9}"
+            )
+        self.stdout.write('')
+        for group, timing in report['timings'].items():
+            self.stdout.write(f"{group}: {timing['calls']} calls, {timing['total_ms']} ms total, {timing['mean_ms']} ms mean")
+        for endpoint, tokens in report['tokens'].items():
+            self.stdout.write(
+                f"{endpoint} LLM calls: {tokens['calls']}, {tokens['prompt_tokens_mean']} prompt / "
+                f"{tokens['completion_tokens_mean']} completion tokens mean, {tokens['cached_tokens']} cached"
+            )
+        cache = report['cache']
+        self.stdout.write(
+            f"cache hit ratio {cache['hit_ratio']}, coalescing ratio {report['singleflight']['coalescing_ratio']}, "
+            f"LLM requests {report['llm'].get('requests')}"
+        )
+
+    def write_comparison(self, baseline, report, threshold):
+        rows = compare_reports(baseline, report, threshold)
+        self.stdout.write(f"\nCompared with baseline from {baseline.get('meta', {}).get('timestamp', '?')}:")
+        regressions = 0
+        for scope, metric, old, new, change, regressed in rows:
+            line = f"  {scope:<32}{metric:<12}{old:>12}{new:>12}{change:>+9.1%}"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + '  REGRESSION'))
+            else:
+                self.stdout.write(line)
+        self.stdout.write(f'{regressions} regressions')
+        return regressions
@@ -0,0 +1,43 @@
+# build_frontend.py
+"""
+Write the compiled frontend to a directory.
+
+    python manage.py build_frontend --output dist/
+    python manage.py build_frontend --output dist/ --asset-url https://cdn.example.com/tutor/
+
+Writes the shell (index.html) and the fingerprinted bundles, each with its
+.gz (and .br, when brotli is installed) variant next to it, so a CDN or a
+web server configured for precompressed static files (nginx gzip_static,
+brotli_static) can serve them without the app. Set FRONTEND['ASSET_URL'] to
+the same URL when the app keeps serving the shell.
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from tutor.frontend import get_frontend_settings, frontend
+
+EXTENSIONS = {'gzip': '.gz', 'br': '.br'}
+
+
+class Command(BaseCommand):
+    help = 'Compile coder.html into a shell and precompressed, fingerprinted bundles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True, help='Directory to write to')
+        parser.add_argument('--asset-url', help='URL prefix of the bundles in the shell (default FRONTEND["ASSET_URL"])')
+
+    def handle(self, *args, **options):
+        config = get_frontend_settings()
+        if options['asset_url']:
+            config['ASSET_URL'] = options['asset_url'].rstrip('/') + '/'
+        shell, bundles = frontend.compile(config)
+
+        output = Path(options['output'])
+        output.mkdir(parents=True, exist_ok=True)
+        for file in (shell, *bundles.values()):
+            (output / file.name).write_bytes(file.body)
+            for encoding, data in file.encoded.items():
+                (output / f'{file.name}{EXTENSIONS[encoding]}').write_bytes(data)
+            sizes = '  '.join(f'{encoding} {len(data):>7}' for encoding, data in file.encoded.items())
+            self.stdout.write(f'{file.name:<24}{len(file.body):>8}  {sizes}')
@@ -0,0 +1,71 @@
+# grade_submissions.py
+"""
+Analyze a whole assignment set and write the results as JSON lines.
+
+    python manage.py grade_submissions submissions/ --output grades.jsonl
+    python manage.py grade_submissions week3.zip --output week3.jsonl --concurrency 32
+
+Rerunning with the same --output resumes: files already recorded as done
+(with unchanged code) are skipped and the rest are appended. Each line is
+{"name", "language", "submission_id", "status", "analysis_id", "source",
+"result"} (or "error"); copies of an identical file carry "duplicate_of".
+"""
+import asyncio
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tutor.batch import get_batch_settings, iter_submissions, open_output, read_progress, run_batch
+from tutor.persistence import db_writer
+
+
+class Command(BaseCommand):
+    help = 'Analyze every source file in a directory or archive, writing one JSON line per file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Directory, .zip or .tar(.gz) of submissions')
+        parser.add_argument('--output', '-o', required=True, help='JSONL file to write (appended to when resuming)')
+        parser.add_argument('--concurrency', type=int, help='Analyses in flight (default BATCH_ANALYSIS CONCURRENCY)')
+        parser.add_argument('--language', help='Language of files whose extension is not recognized')
+        parser.add_argument('--restart', action='store_true', help='Ignore and overwrite an existing output file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        config = get_batch_settings()
+        concurrency = options['concurrency'] or config['CONCURRENCY']
+        completed = {} if options['restart'] else read_progress(options['output'])
+        if completed:
+            self.stdout.write(f'Resuming: {len(completed)} files already recorded')
+
+        items = iter_submissions(path, options['language'], config)
+        started = time.perf_counter()
+        with open_output(options['output'], resume=not options['restart']) as output:
+            written = 0
+
+            async def emit(entry):
+                nonlocal written
+                output.write(json.dumps(entry) + '\n')
+                output.flush()
+                written += 1
+                if written % 50 == 0:
+                    self.stdout.write(f'{written} files written')
+
+            try:
+                counters = asyncio.run(run_batch(items, emit, concurrency, completed))
+            except ValueError as e:
+                raise CommandError(str(e))
+            finally:
+                db_writer.flush()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{counters['files']} files in {elapsed:.1f}s: {counters['done']} done, {counters['failed']} failed, "
+            f"{counters['skipped']} skipped, {counters['duplicates']} duplicates, {counters['resumed']} resumed, "
+            f"{counters['analyzed']} analyzed"
+        ))
+        if counters['failed']:
+            self.stdout.write(f'Run the command again to retry the {counters["failed"]} failed files')
@@ -0,0 +1,63 @@
+# llm_standin.py
+"""
+Serve the OpenAI stand-in (tutor/standin.py) over HTTP.
+
+    python manage.py llm_standin --port 8765 --latency 0.5 --rate-limit-rate 0.05
+
+Point the app at it with LLM_CLIENT['BASE_URL'] = 'http://127.0.0.1:8765/v1'
+(any OPENAI_API_KEY value works). Counters are served at GET /stats.
+"""
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from tutor.llm import get_llm_settings
+from tutor.standin import DEFAULT_STANDIN_SETTINGS, build_standin_app, serve
+
+# option name -> STANDIN setting
+OPTIONS = {
+    'recordings': 'RECORDINGS',
+    'latency': 'LATENCY',
+    'latency_jitter': 'LATENCY_JITTER',
+    'tokens_per_second': 'TOKENS_PER_SECOND',
+    'rate_limit_rate': 'RATE_LIMIT_RATE',
+    'error_rate': 'ERROR_RATE',
+    'malformed_rate': 'MALFORMED_RATE',
+    'seed': 'SEED',
+}
+
+
+class Command(BaseCommand):
+    help = 'Serve recorded completions on an OpenAI-compatible API for offline load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--recordings', help='JSON lines file of recorded completions')
+        parser.add_argument('--latency', type=float, help='Seconds before the first token')
+        parser.add_argument('--latency-jitter', type=float, help='+/- seconds of latency jitter')
+        parser.add_argument('--tokens-per-second', type=float, help='Completion throughput; 0 for instant')
+        parser.add_argument('--rate-limit-rate', type=float, help='Share of requests answered with 429')
+        parser.add_argument('--error-rate', type=float, help='Share of requests answered with 500')
+        parser.add_argument('--malformed-rate', type=float, help='Share of completions with malformed JSON')
+        parser.add_argument('--seed', type=int, help='Seed for fault and jitter decisions')
+
+    def handle(self, *args, **options):
+        config = dict(DEFAULT_STANDIN_SETTINGS)
+        config.update(get_llm_settings()['STANDIN'])
+        for option, setting in OPTIONS.items():
+            if options[option] is not None:
+                config[setting] = options[option]
+
+        app = build_standin_app(config)
+        self.stdout.write(
+            f"LLM stand-in on http://{options['host']}:{options['port']}/v1 "
+            f"({sum(len(items) for items in app.engine.recordings.values())} recordings, "
+            f"latency {config['LATENCY']}s, {config['TOKENS_PER_SECOND']} tokens/s, "
+            f"429 rate {config['RATE_LIMIT_RATE']}, 500 rate {config['ERROR_RATE']}, "
+            f"malformed rate {config['MALFORMED_RATE']})"
+        )
+        try:
+            asyncio.run(serve(app, options['host'], options['port']))
+        except KeyboardInterrupt:
+            pass
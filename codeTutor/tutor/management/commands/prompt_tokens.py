@@ -0,0 +1,51 @@
+# prompt_tokens.py
+"""
+Compare the prompt tokens of the analysis prompt versions.
+
+    python manage.py prompt_tokens
+    python manage.py prompt_tokens --submissions 200 --versions 3 4
+
+Builds the analysis messages for each submission of the synthetic benchmark
+corpus with every prompt version and reports the mean prompt tokens per
+request, split into the static prefix (a system message identical for every
+request, which upstream prompt caching can reuse) and the per-request rest.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from tutor.benchmark_corpus import LANGUAGES, SIZES, build_corpus
+from tutor.prompts import ANALYSIS_PROMPTS, count_message_tokens, count_tokens
+
+
+class Command(BaseCommand):
+    help = 'Report per-request analysis prompt tokens for each prompt version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=120, help='Corpus size')
+        parser.add_argument('--languages', nargs='+', choices=LANGUAGES, default=LANGUAGES)
+        parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+        parser.add_argument('--versions', nargs='+', type=int, default=sorted(ANALYSIS_PROMPTS))
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        unknown = [version for version in options['versions'] if version not in ANALYSIS_PROMPTS]
+        if unknown:
+            raise CommandError(f'Unknown prompt versions: {unknown}')
+        corpus = build_corpus(options['submissions'], options['languages'], options['sizes'], 0, options['seed'])
+        if not corpus:
+            raise CommandError('The corpus is empty')
+
+        self.stdout.write(f"{'version':<9}{'prompt':>9}{'static':>9}{'per request':>13}{'code':>9}")
+        for version in options['versions']:
+            prompt = ANALYSIS_PROMPTS[version]
+            totals, systems, code_tokens = [], set(), []
+            for submission in corpus:
+                messages = prompt.messages(submission['code'], submission['language'], syntax_verified=True)
+                totals.append(count_message_tokens(messages))
+                systems.add(messages[0]['content'])
+                code_tokens.append(count_tokens(submission['code']))
+            # Only a system message shared by every request is a cacheable prefix
+            static = count_tokens(systems.pop()) + 4 if len(systems) == 1 else 0
+            mean = sum(totals) / len(totals)
+            self.stdout.write(
+                f"{version:<9}{mean:>9.0f}{static:>9}{mean - static:>13.0f}{sum(code_tokens) / len(code_tokens):>9.0f}"
+            )
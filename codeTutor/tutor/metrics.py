@@ -0,0 +1,313 @@
+# metrics.py
+"""
+Prometheus-style metrics for the tutor API.
+
+A small in-process registry of counters and histograms, rendered in the
+Prometheus text exposition format by the /metrics view.
+MetricsMiddleware (tutor/middleware.py) times every request; tutor/llm.py
+records upstream latency, token counts, retries and errors for each LLM
+call; tutor/scheduler.py records queue waits and rate limits and exports
+the queue depth and remaining budgets; tutor/decoding.py records parse
+time; the analyze views record the cache outcome. Cache and coalescing
+counters are collected at scrape time.
+
+Metrics are per process: with several server workers, scrape each one (or
+run a single worker per scrape target).
+
+/metrics and /api/analyze/cache-stats/ are only served to monitoring
+clients (monitoring_allowed): requests bearing MONITORING['TOKEN'], from
+MONITORING['ALLOWED_IPS'], or by signed-in staff users. Anyone else gets a
+404.
+"""
+import hmac
+import math
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_MONITORING_SETTINGS = {
+    # Scrapers send "Authorization: Bearer <TOKEN>"; empty accepts no token
+    'TOKEN': '',
+    # Client addresses let in without a token. Behind a reverse proxy every
+    # request comes from the proxy, so only list addresses it can't be.
+    'ALLOWED_IPS': (),
+    # Signed-in staff users may read them from the browser
+    'STAFF': True,
+}
+
+
+
+def get_monitoring_settings():
+    config = dict(DEFAULT_MONITORING_SETTINGS)
+    config.update(getattr(settings, 'MONITORING', {}))
+    return config
+
+
+def monitoring_allowed(request):
+    """
+    Whether request may read the metrics and stats endpoints
+    """
+    config = get_monitoring_settings()
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if config['TOKEN'] and scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.strip().encode('utf-8'), str(config['TOKEN']).encode('utf-8')
+    ):
+        return True
+    if request.META.get('REMOTE_ADDR') in config['ALLOWED_IPS']:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(config['STAFF'] and user is not None and user.is_active and user.is_staff)
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+PARSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metric:
+    """
+    Base class for labelled metrics
+    """
+    kind = ''
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'{self.name} expects labels {self.label_names}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self.header()
+        for key, value in values:
+            lines.append(f'{self.name}_total{_format_labels(self.label_names, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """
+        Context manager observing the duration of its block
+        """
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def total(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[1] if state else 0.0
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = self.header()
+        for key, (bucket_counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(round(total, 6))}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """
+    The metrics of this process, plus collectors called at scrape time
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def collector(self, function):
+        """
+        Register function() -> [(name, documentation, {labels: value})],
+        rendered as gauges. Usable as a decorator.
+        """
+        with self._lock:
+            self._collectors.append(function)
+        return function
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            for name, documentation, samples in collect():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} gauge')
+                for labels, value in samples.items():
+                    label_names = [label for label, _ in labels]
+                    label_values = [label_value for _, label_value in labels]
+                    lines.append(f'{name}{_format_labels(label_names, label_values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'tutor_http_requests', 'HTTP requests by view, method and status', ['view', 'method', 'status']
+)
+http_duration = registry.histogram(
+    'tutor_http_request_duration_seconds', 'Time to produce the response (headers for streams)', ['view']
+)
+llm_requests = registry.counter(
+    'tutor_llm_requests', 'LLM calls by endpoint and outcome (ok or error class)', ['endpoint', 'outcome']
+)
+llm_duration = registry.histogram(
+    'tutor_llm_request_duration_seconds', 'Upstream LLM call latency, including SDK retries', ['endpoint']
+)
+llm_first_token = registry.histogram(
+    'tutor_llm_first_token_seconds', 'Time to the first streamed token', ['endpoint']
+)
+llm_tokens = registry.counter(
+    'tutor_llm_tokens', 'Tokens used by LLM calls', ['endpoint', 'kind']
+)
+llm_completion_tokens = registry.histogram(
+    'tutor_llm_completion_tokens', 'Completion tokens per LLM call', ['endpoint'], TOKEN_BUCKETS
+)
+llm_prompt_tokens = registry.histogram(
+    'tutor_llm_prompt_tokens', 'Prompt tokens per LLM call', ['endpoint'], TOKEN_BUCKETS
+)
+llm_retries = registry.counter(
+    'tutor_llm_retries', 'Retries made by the upstream scheduler or the OpenAI SDK', ['endpoint']
+)
+llm_rate_limited = registry.counter(
+    'tutor_llm_rate_limited', 'Rate-limit responses from the LLM provider', ['endpoint']
+)
+llm_queue_wait = registry.histogram(
+    'tutor_llm_queue_wait_seconds', 'Time LLM calls waited for admission by the scheduler', ['endpoint']
+)
+decode_duration = registry.histogram(
+    'tutor_decode_duration_seconds', 'Time spent repairing and validating completions', ['kind'], PARSE_BUCKETS
+)
+analysis_outcomes = registry.counter(
+    'tutor_analysis_cache', 'Analysis requests by outcome (hit, near_duplicate, miss, local or incremental)',
+    ['endpoint', 'outcome']
+)
+sandbox_runs = registry.counter(
+    'tutor_sandbox_runs', 'Sandboxed runs of submissions and corrected code by outcome', ['outcome']
+)
+sandbox_duration = registry.histogram(
+    'tutor_sandbox_run_duration_seconds', 'Time to run code in the sandbox, including the fork'
+)
+frontend_responses = registry.counter(
+    'tutor_frontend_responses', 'Page shell and bundle responses by kind, status and encoding',
+    ['kind', 'status', 'encoding']
+)
+
+
+@registry.collector
+def _collect_cache_stats():
+    from .cache import analysis_cache
+    from .singleflight import llm_flight
+
+    cache_stats = analysis_cache.stats()
+    flight_stats = llm_flight.stats()
+    return [
+        ('tutor_analysis_cache_entries', 'Analysis cache memory tier entries', {(): cache_stats['memory_entries']}),
+        ('tutor_analysis_cache_bytes', 'Analysis cache memory tier size', {(): cache_stats['memory_bytes']}),
+        ('tutor_analysis_cache_hit_ratio', 'Analysis cache hit ratio since start', {(): cache_stats['hit_ratio']}),
+        ('tutor_llm_in_flight', 'Coalesced LLM calls in flight', {(): flight_stats['in_flight']}),
+        ('tutor_llm_coalescing_ratio', 'Share of LLM calls served by another caller', {(): flight_stats['coalescing_ratio']}),
+    ]
@@ -0,0 +1,82 @@
+# middleware.py
+"""
+Request instrumentation and response compression for the tutor app
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import http_duration, http_requests
+from .transport import available_encodings, choose_encoding, compress, get_response_compression_settings
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """
+    Count and time every request by resolved view name
+    """
+    def record(request, response, start):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        http_duration.observe(time.perf_counter() - start, view=view)
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            record(request, response, start)
+            return response
+    else:
+        def middleware(request):
+            start = time.perf_counter()
+            response = get_response(request)
+            record(request, response, start)
+            return response
+    return middleware
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Django's GZipMiddleware (random-length gzip headers against BREACH,
+    streaming, Vary and ETag handling) limited to RESPONSE_COMPRESSION's
+    content types and sizes, with brotli preferred when the brotli package
+    is installed and the request's Accept-Encoding allows it
+    (tutor/transport.py). Event streams aren't among the content types, so
+    their events aren't held back by a compressor.
+    """
+
+    def process_response(self, request, response):
+        config = get_response_compression_settings()
+        if (
+            not config['ENABLED']
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(tuple(config['CONTENT_TYPES']))
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < config['MIN_BYTES']:
+            return response
+        # Streams are only ever gzipped, by GZipMiddleware, which doesn't
+        # read q-values: gzip is negotiated here so gzip;q=0 is respected
+        offered = ('gzip',) if response.streaming else available_encodings()
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'), offered)
+        if encoding == 'gzip':
+            return super().process_response(request, response)
+        if encoding != 'br':
+            return response
+
+        compressed = compress(response.content, 'br', config['BROTLI_QUALITY'])
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # The compressed bytes differ, so the validator becomes weak
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,126 @@
+# Generated by Django 5.2.10 on 2026-10-18 04:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0002_analysis'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issue_id', models.PositiveIntegerField()),
+                ('level', models.PositiveSmallIntegerField()),
+                ('text', models.TextField()),
+                ('source', models.CharField(blank=True, max_length=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Issue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issue_id', models.PositiveIntegerField()),
+                ('kind', models.CharField(max_length=8)),
+                ('category', models.CharField(blank=True, max_length=64)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('severity', models.CharField(blank=True, max_length=16)),
+                ('line', models.PositiveIntegerField(blank=True, null=True)),
+                ('language', models.CharField(blank=True, max_length=32)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code_hash', models.CharField(max_length=64)),
+                ('code', models.TextField()),
+                ('language', models.CharField(blank=True, max_length=32)),
+                ('session_key', models.CharField(blank=True, max_length=40)),
+                ('source', models.CharField(blank=True, max_length=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['language', 'created_at'], name='tutor_analysis_lang_created'),
+        ),
+        migrations.AddIndex(
+            model_name='analysis',
+            index=models.Index(fields=['created_at'], name='tutor_analysis_created'),
+        ),
+        migrations.AddField(
+            model_name='hint',
+            name='analysis',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hints', to='tutor.analysis', to_field='analysis_id'),
+        ),
+        migrations.AddField(
+            model_name='issue',
+            name='analysis',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issues', to='tutor.analysis', to_field='analysis_id'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='analysis',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='submissions', to='tutor.analysis', to_field='analysis_id'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='submissions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='hint',
+            index=models.Index(fields=['created_at'], name='tutor_hint_created'),
+        ),
+        migrations.AddConstraint(
+            model_name='hint',
+            constraint=models.UniqueConstraint(fields=('analysis', 'issue_id', 'level'), name='tutor_hint_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['language', 'category'], name='tutor_issue_lang_cat'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['severity'], name='tutor_issue_severity'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['created_at'], name='tutor_issue_created'),
+        ),
+        migrations.AddConstraint(
+            model_name='issue',
+            constraint=models.UniqueConstraint(fields=('analysis', 'issue_id'), name='tutor_issue_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['code_hash', 'language'], name='tutor_sub_hash_lang'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['session_key', '-created_at'], name='tutor_sub_session'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', '-created_at'], name='tutor_sub_user'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['language', 'created_at'], name='tutor_sub_lang_created'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['created_at'], name='tutor_sub_created'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.10 on 2026-10-18 04:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0003_submission_issue_hint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=32, unique=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=8)),
+                ('code', models.TextField()),
+                ('language', models.CharField(blank=True, max_length=32)),
+                ('session_key', models.CharField(blank=True, max_length=40)),
+                ('analysis_id', models.CharField(blank=True, max_length=32)),
+                ('source', models.CharField(blank=True, max_length=16)),
+                ('error', models.TextField(blank=True)),
+                ('error_status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='tutor_job_status_created'), models.Index(fields=['session_key', '-created_at'], name='tutor_job_session')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.10 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0004_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='classroom',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='exercise',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ConceptRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('classroom', models.CharField(blank=True, max_length=64)),
+                ('exercise', models.CharField(blank=True, max_length=64)),
+                ('day', models.DateField()),
+                ('concept', models.CharField(blank=True, max_length=128)),
+                ('category', models.CharField(blank=True, max_length=64)),
+                ('severity', models.CharField(blank=True, max_length=16)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['classroom', 'day'], name='tutor_concept_rollup_day')],
+                'constraints': [models.UniqueConstraint(fields=('classroom', 'exercise', 'day', 'concept', 'category', 'severity'), name='tutor_concept_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExerciseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('classroom', models.CharField(blank=True, max_length=64)),
+                ('exercise', models.CharField(blank=True, max_length=64)),
+                ('day', models.DateField()),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('submissions_with_errors', models.PositiveIntegerField(default=0)),
+                ('issues', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['classroom', 'day'], name='tutor_exercise_rollup_day')],
+                'constraints': [models.UniqueConstraint(fields=('classroom', 'exercise', 'day'), name='tutor_exercise_rollup_unique')],
+            },
+        ),
+    ]
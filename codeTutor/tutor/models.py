@@ -1,3 +1,229 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class AnalysisCacheEntry(models.Model):
+    """
+    Persistent tier of the analysis cache (see tutor/cache.py).
+    Stores the serialized frontend response keyed by a content hash.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    language = models.CharField(max_length=32, blank=True)
+    payload = models.TextField()
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    accessed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'analysis cache entries'
+
+    def __str__(self):
+        return f'{self.language}:{self.key[:12]}'
+
+
+class Analysis(models.Model):
+    """
+    A completed analysis, addressed by the analysis_id returned to the
+    frontend (see tutor/analysis_store.py). Follow-up requests such as
+    hints are answered from the stored result.
+    """
+    analysis_id = models.CharField(max_length=32, unique=True)
+    code = models.TextField()
+    language = models.CharField(max_length=32, blank=True)
+    result = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'analyses'
+        indexes = [
+            models.Index(fields=['language', 'created_at'], name='tutor_analysis_lang_created'),
+            models.Index(fields=['created_at'], name='tutor_analysis_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.language}:{self.analysis_id}'
+
+
+class Submission(models.Model):
+    """
+    One submission to the analyze endpoints, with the analysis that answered
+    it. Many submissions can share one (content-addressed) analysis.
+    """
+    code_hash = models.CharField(max_length=64)
+    code = models.TextField()
+    language = models.CharField(max_length=32, blank=True)
+    session_key = models.CharField(max_length=40, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='submissions'
+    )
+    # Written by the background writer, possibly before the analysis row
+    analysis = models.ForeignKey(
+        Analysis, to_field='analysis_id', null=True, blank=True, db_constraint=False,
+        on_delete=models.SET_NULL, related_name='submissions'
+    )
+    source = models.CharField(max_length=16, blank=True)
+    # Labels for the concept analytics (see tutor/analytics.py)
+    classroom = models.CharField(max_length=64, blank=True)
+    exercise = models.CharField(max_length=64, blank=True)
+    # Counted in the analytics rollups
+    rolled_up = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['code_hash', 'language'], name='tutor_sub_hash_lang'),
+            models.Index(fields=['session_key', '-created_at'], name='tutor_sub_session'),
+            models.Index(fields=['user', '-created_at'], name='tutor_sub_user'),
+            models.Index(fields=['language', 'created_at'], name='tutor_sub_lang_created'),
+            models.Index(fields=['created_at'], name='tutor_sub_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.language}:{self.code_hash[:12]}'
+
+
+class Issue(models.Model):
+    """
+    An error or warning of a stored analysis, queryable for history and
+    analytics (the full issue stays in Analysis.result)
+    """
+    analysis = models.ForeignKey(
+        Analysis, to_field='analysis_id', on_delete=models.CASCADE, related_name='issues'
+    )
+    issue_id = models.PositiveIntegerField()
+    kind = models.CharField(max_length=8)  # error or warning
+    category = models.CharField(max_length=64, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    severity = models.CharField(max_length=16, blank=True)
+    line = models.PositiveIntegerField(null=True, blank=True)
+    language = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['analysis', 'issue_id'], name='tutor_issue_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['language', 'category'], name='tutor_issue_lang_cat'),
+            models.Index(fields=['severity'], name='tutor_issue_severity'),
+            models.Index(fields=['created_at'], name='tutor_issue_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.analysis_id}#{self.issue_id}'
+
+
+class ConceptRollup(models.Model):
+    """
+    Issues counted per classroom, exercise, day, concept, category and
+    severity, incremented as submissions are recorded (see
+    tutor/analytics.py)
+    """
+    classroom = models.CharField(max_length=64, blank=True)
+    exercise = models.CharField(max_length=64, blank=True)
+    day = models.DateField()
+    concept = models.CharField(max_length=128, blank=True)
+    category = models.CharField(max_length=64, blank=True)
+    severity = models.CharField(max_length=16, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['classroom', 'exercise', 'day', 'concept', 'category', 'severity'],
+                name='tutor_concept_rollup_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['classroom', 'day'], name='tutor_concept_rollup_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.classroom}/{self.exercise} {self.day} {self.concept}: {self.count}'
+
+
+class ExerciseRollup(models.Model):
+    """
+    Submissions counted per classroom, exercise and day, the totals behind
+    the concept counts (see tutor/analytics.py)
+    """
+    classroom = models.CharField(max_length=64, blank=True)
+    exercise = models.CharField(max_length=64, blank=True)
+    day = models.DateField()
+    submissions = models.PositiveIntegerField(default=0)
+    submissions_with_errors = models.PositiveIntegerField(default=0)
+    issues = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['classroom', 'exercise', 'day'], name='tutor_exercise_rollup_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['classroom', 'day'], name='tutor_exercise_rollup_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.classroom}/{self.exercise} {self.day}: {self.submissions}'
+
+
+class Hint(models.Model):
+    """
+    A hint shown for an issue, generated or taken from the analysis
+    """
+    analysis = models.ForeignKey(
+        Analysis, to_field='analysis_id', on_delete=models.CASCADE, related_name='hints'
+    )
+    issue_id = models.PositiveIntegerField()
+    level = models.PositiveSmallIntegerField()
+    text = models.TextField()
+    source = models.CharField(max_length=16, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['analysis', 'issue_id', 'level'], name='tutor_hint_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='tutor_hint_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.analysis_id}#{self.issue_id} level {self.level}'
+
+
+class AnalysisJob(models.Model):
+    """
+    An analysis run in the background (see tutor/jobs.py). The result is the
+    stored Analysis named by analysis_id once the job is done.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.CharField(max_length=32, unique=True)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default='queued')
+    code = models.TextField()
+    language = models.CharField(max_length=32, blank=True)
+    session_key = models.CharField(max_length=40, blank=True)
+    analysis_id = models.CharField(max_length=32, blank=True)
+    source = models.CharField(max_length=16, blank=True)
+    error = models.TextField(blank=True)
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='tutor_job_status_created'),
+            models.Index(fields=['session_key', '-created_at'], name='tutor_job_session'),
+        ]
+
+    def __str__(self):
+        return f'{self.job_id} ({self.status})'
@@ -0,0 +1,194 @@
+# persistence.py
+"""
+Batched database writes off the request path.
+
+Views and the analysis store/cache hand rows to db_writer instead of
+writing them inline. A background thread drains the queue every
+FLUSH_INTERVAL seconds (or BATCH_SIZE rows) and writes each batch in one
+transaction with bulk inserts/upserts, so a classroom of concurrent
+submissions becomes a few short write transactions on SQLite (in WAL mode,
+see DATABASES in settings.py) instead of one lock acquisition per row.
+
+Rows are grouped by kind; each kind has a handler registered with
+@db_writer.handler(kind) that writes a list of rows. Handlers run in
+registration order, so analyses are written before their issues and hints.
+
+With an in-memory database (the test runner) or BACKGROUND off, rows are
+written inline from a worker thread instead.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERSISTENCE_SETTINGS = {
+    'BACKGROUND': True,
+    'FLUSH_INTERVAL': 0.05,
+    'BATCH_SIZE': 500,
+    # Rows beyond this are dropped (and counted) rather than block requests
+    'MAX_QUEUE': 50000,
+}
+
+
+def get_persistence_settings():
+    config = dict(DEFAULT_PERSISTENCE_SETTINGS)
+    config.update(getattr(settings, 'PERSISTENCE', {}))
+    return config
+
+
+class BulkWriter:
+    """
+    Queue of (kind, row) drained in batches by a daemon thread
+    """
+
+    def __init__(self):
+        self._handlers = {}  # kind -> function(rows), in registration order
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {'queued': 0, 'written': 0, 'batches': 0, 'failed': 0, 'dropped': 0}
+
+    def handler(self, kind):
+        """
+        Register function(rows) as the writer of rows of kind
+        """
+        def register(function):
+            self._handlers[kind] = function
+            return function
+        return register
+
+    def background(self):
+        if not get_persistence_settings()['BACKGROUND']:
+            return False
+        # A separate connection can't share the test runner's in-memory database
+        return not connections['default'].is_in_memory_db()
+
+    async def aput(self, kind, row):
+        """
+        Queue a row for writing, or write it now when not in background mode
+        """
+        if kind not in self._handlers:
+            raise KeyError(f'No writer registered for {kind!r}')
+        if self.background():
+            self.put(kind, row)
+        else:
+            await sync_to_async(self.write_batch)([(kind, row)])
+
+    def put(self, kind, row):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((kind, row))
+        except queue.Full:
+            self._count('dropped')
+            logger.error('Write queue full, dropping %s row', kind)
+            return
+        self._count('queued')
+
+    def write_batch(self, items):
+        """
+        Write [(kind, row)] in one transaction, grouped by kind
+        """
+        grouped = {kind: [] for kind in self._handlers}
+        for kind, row in items:
+            grouped[kind].append(row)
+        try:
+            with transaction.atomic():
+                for kind, rows in grouped.items():
+                    if rows:
+                        self._handlers[kind](rows)
+        except DatabaseError:
+            self._count('failed', len(items))
+            logger.exception('Could not write a batch of %d rows', len(items))
+            return
+        self._count('written', len(items))
+        self._count('batches')
+
+    def flush(self, timeout=10.0):
+        """
+        Wait until every queued row has been written
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((None, done))
+        done.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['pending'] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            config = get_persistence_settings()
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=config['MAX_QUEUE'])
+            self._thread = threading.Thread(
+                target=self._run, args=(config['FLUSH_INTERVAL'], config['BATCH_SIZE']),
+                name='tutor-db-writer', daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self, flush_interval, batch_size):
+        while True:
+            items, waiters = [], []
+            kind, row = self._queue.get()
+            deadline = time.monotonic() + flush_interval
+            while True:
+                if kind is None:
+                    waiters.append(row)
+                else:
+                    items.append((kind, row))
+                if len(items) >= batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and not waiters:
+                    break
+                try:
+                    if remaining > 0:
+                        kind, row = self._queue.get(timeout=remaining)
+                    else:
+                        kind, row = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if items:
+                close_old_connections()
+                self.write_batch(items)
+            for waiter in waiters:
+                waiter.set()
+
+
+db_writer = BulkWriter()
+
+
+@registry.collector
+def _collect_writer_stats():
+    stats = db_writer.stats()
+    return [
+        ('tutor_db_write_queue', 'Rows waiting for the background writer', {(): stats['pending']}),
+        ('tutor_db_rows_written', 'Rows written by the background writer', {(): stats['written']}),
+        ('tutor_db_rows_failed', 'Rows lost to failed or full writes', {(): stats['failed'] + stats['dropped']}),
+    ]
+
+
+@atexit.register
+def _flush_on_exit():
+    db_writer.flush(timeout=5.0)
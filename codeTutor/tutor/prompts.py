@@ -0,0 +1,358 @@
+# prompts.py
+"""
+Prompt building and local token accounting for the analysis endpoints.
+
+Analysis prompts are versioned templates (ANALYSIS_PROMPTS). From version 4
+the instructions and a compact JSON schema form a static system message
+that is byte-identical for every request and language, so it is a stable
+prefix for upstream prompt caching (requests also carry a prompt_cache_key
+per template). The user message holds only the language, the per-request
+notes (syntax already verified, excerpt of a larger file) and the code.
+Version 3, with everything in one user message, is kept so the two can be
+compared with `manage.py prompt_tokens`.
+
+count_tokens() estimates prompt sizes without a network call (using tiktoken
+when it is installed, otherwise a conservative heuristic) so views can decide
+whether a submission fits one request or has to be analyzed in chunks.
+"""
+import math
+import re
+
+# Model and prompt version used by analyze_code. Bump the prompt version
+# whenever the analysis prompt changes so cached results are not reused.
+ANALYSIS_MODEL = "gpt-4o-mini"
+ANALYSIS_PROMPT_VERSION = 4
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\n[ \t]*")
+_encodings = {}
+
+
+def _get_encoding(model):
+    """
+    tiktoken encoding for model, or None when tiktoken is unavailable
+    """
+    if model in _encodings:
+        return _encodings[model]
+    try:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception:
+        # Not installed, unknown model or encoding files not cached offline
+        encoding = None
+    _encodings[model] = encoding
+    return encoding
+
+
+def count_tokens(text, model=ANALYSIS_MODEL):
+    """
+    Count (or estimate) the tokens text uses for model
+    """
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Heuristic: one token per punctuation mark or line break + indent, and
+    # roughly four characters per token for words and identifiers
+    return sum(
+        math.ceil(len(token) / 4) if token[0].isalnum() or token[0] == '_' else 1
+        for token in _TOKEN_PATTERN.findall(text)
+    )
+
+
+def count_message_tokens(messages, model=ANALYSIS_MODEL):
+    """
+    Token estimate for a chat request, including per-message overhead
+    """
+    return sum(count_tokens(message['content'], model) + 4 for message in messages) + 3
+
+
+ANALYSIS_SYSTEM_PROMPT = """You analyze code as an expert developer and educator. Find every issue in the code the user sends, explain each one so a student learns from it, and reply with one JSON object.
+
+Check for: syntax errors, logic errors, best-practice warnings, performance issues, security vulnerabilities, style and readability.
+
+For each issue give its type, category, title, what is wrong (description), why it happens (cause), step-by-step guidance to fix it (fix), line and column (null if not applicable), the problematic code, severity, and three hints, each revealing more: level1 a gentle nudge that doesn't give the solution away, level2 a partial clue pointing towards it, level3 the full solution with an explanation.
+
+Also give:
+- concept_map: the issues grouped by root concept within each category (e.g. syntax: Indentation, Missing Colons; logic: Type Errors, None Handling), with counts and issue ids
+- correction_strategies: different approaches to fixing common error patterns, with code, pros and cons
+- corrected_code: the whole code, fully corrected
+- suggestions for improvement and best_practices to follow
+
+Reply with only this JSON (types stand for values):
+{"analysis_summary":{"total_errors":int,"total_warnings":int,"overall_severity":SEV,"language":str,"concepts_covered":[str]},
+"concept_map":{CAT:[{"concept":str,"count":int,"issues":[id]}]},
+"issues":[{"id":int,"type":"error"|"warning","category":CAT,"title":str,"description":str,"cause":str,"fix":str,"line":int|null,"column":int|null,"code_snippet":str,"severity":SEV,"hints":{"level1":str,"level2":str,"level3":str}}],
+"correction_strategies":[{"name":str,"description":str,"code":str,"pros":[str],"cons":[str],"applicable_to_issues":[id]}],
+"corrected_code":str,"suggestions":[str],"best_practices":[str]}
+CAT is "syntax"|"logic"|"performance"|"security"|"best_practice"|"style"; SEV is "low"|"medium"|"high"|"critical".
+Be thorough and give practical, actionable fixes. If there are no issues, return empty arrays and still give corrected_code."""
+
+QUICK_ANALYSIS_SYSTEM_PROMPT = """You analyze code as an expert developer and educator, in a quick check: find only what stops the code the user sends from running or giving the right result, and reply with one JSON object.
+
+Check only for syntax errors and obvious logic errors (wrong conditions, off-by-one errors, wrong variables, unreachable or missing returns, type errors). Ignore style, performance, security and best practices.
+
+For each issue give its type, category, title, what is wrong (description), how to fix it (fix), line and column (null if not applicable), the problematic code, severity, and one hint (level1) that nudges the student towards the fix without giving it away. Keep every text to one or two sentences.
+
+Reply with only this JSON (types stand for values):
+{"analysis_summary":{"total_errors":int,"total_warnings":int,"overall_severity":SEV,"language":str,"concepts_covered":[str]},
+"issues":[{"id":int,"type":"error"|"warning","category":"syntax"|"logic","title":str,"description":str,"fix":str,"line":int|null,"column":int|null,"code_snippet":str,"severity":SEV,"hints":{"level1":str}}]}
+SEV is "low"|"medium"|"high"|"critical". If there are no issues, return an empty issues array."""
+
+STANDARD_ANALYSIS_SYSTEM_PROMPT = """You analyze code as an expert developer and educator. Find every issue in the code the user sends, explain each one so a student learns from it, and reply with one JSON object.
+
+Check for: syntax errors, logic errors, best-practice warnings, performance issues, security vulnerabilities, style and readability.
+
+For each issue give its type, category, title, what is wrong (description), why it happens (cause), step-by-step guidance to fix it (fix), line and column (null if not applicable), the problematic code, severity, and three hints, each revealing more: level1 a gentle nudge that doesn't give the solution away, level2 a partial clue pointing towards it, level3 the full solution with an explanation.
+
+Also give concept_map (the issues grouped by root concept within each category, with counts and issue ids) and suggestions for improvement. Correction strategies and corrected code are generated separately: don't write corrected versions of the code.
+
+Reply with only this JSON (types stand for values):
+{"analysis_summary":{"total_errors":int,"total_warnings":int,"overall_severity":SEV,"language":str,"concepts_covered":[str]},
+"concept_map":{CAT:[{"concept":str,"count":int,"issues":[id]}]},
+"issues":[{"id":int,"type":"error"|"warning","category":CAT,"title":str,"description":str,"cause":str,"fix":str,"line":int|null,"column":int|null,"code_snippet":str,"severity":SEV,"hints":{"level1":str,"level2":str,"level3":str}}],
+"suggestions":[str]}
+CAT is "syntax"|"logic"|"performance"|"security"|"best_practice"|"style"; SEV is "low"|"medium"|"high"|"critical".
+If there are no issues, return empty arrays."""
+
+ANALYSIS_USER_PROMPT = "Language: {language}\n{notes}Code:\n```\n{code}\n```"
+
+SYNTAX_VERIFIED_NOTE = "The code compiles; don't report syntax errors.\n"
+
+EXCERPT_NOTE = (
+    "This is lines {first_line}-{last_line} of a {total_lines}-line file analyzed in parts. Number lines from 1 at "
+    "its first line, only report issues inside it, and make corrected_code the corrected excerpt only.\n"
+)
+
+
+class AnalysisPrompt:
+    """
+    A versioned analysis prompt: a static system message, identical for
+    every request, and a user message template with only the per-request
+    text
+    """
+
+    def __init__(self, version, system, user, name='analysis'):
+        self.version = version
+        self.system = system
+        self.user = user
+        self.name = name
+
+    @property
+    def cache_key(self):
+        """
+        prompt_cache_key for requests using this template, so they are
+        routed to the same upstream prompt cache
+        """
+        return f'tutor-{self.name}-v{self.version}'
+
+    def notes(self, syntax_verified=False, excerpt=None):
+        notes = SYNTAX_VERIFIED_NOTE if syntax_verified else ''
+        if excerpt is not None:
+            first_line, last_line, total_lines = excerpt
+            notes += EXCERPT_NOTE.format(first_line=first_line, last_line=last_line, total_lines=total_lines)
+        return notes
+
+    def messages(self, code, language, syntax_verified=False, excerpt=None):
+        """
+        Chat messages for analyzing code. excerpt is (first_line,
+        last_line, total_lines) when code is one chunk of a larger file.
+        """
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.format(
+                language=language, notes=self.notes(syntax_verified, excerpt), code=code
+            )},
+        ]
+
+
+class LegacyAnalysisPrompt(AnalysisPrompt):
+    """
+    Version 3: a per-language system message and the instructions, schema
+    and code in one user message
+    """
+
+    def __init__(self):
+        super().__init__(3, None, None)
+
+    def messages(self, code, language, syntax_verified=False, excerpt=None):
+        return [
+            {"role": "system", "content": f"You are an expert {language} developer and educator. You analyze code thoroughly, explain issues clearly, provide educational hints, and show multiple correction strategies."},
+            {"role": "user", "content": _legacy_analysis_prompt(code, language, syntax_verified, excerpt)}
+        ]
+
+
+ANALYSIS_PROMPTS = {
+    3: LegacyAnalysisPrompt(),
+    4: AnalysisPrompt(4, ANALYSIS_SYSTEM_PROMPT, ANALYSIS_USER_PROMPT),
+}
+
+
+# Current template for each analysis depth (see tutor/depth.py); deep is
+# the full analysis
+DEPTH_PROMPTS = {
+    'quick': AnalysisPrompt(ANALYSIS_PROMPT_VERSION, QUICK_ANALYSIS_SYSTEM_PROMPT, ANALYSIS_USER_PROMPT, 'quick-analysis'),
+    'standard': AnalysisPrompt(
+        ANALYSIS_PROMPT_VERSION, STANDARD_ANALYSIS_SYSTEM_PROMPT, ANALYSIS_USER_PROMPT, 'standard-analysis'
+    ),
+    'deep': ANALYSIS_PROMPTS[ANALYSIS_PROMPT_VERSION],
+}
+
+
+def get_analysis_prompt(version=ANALYSIS_PROMPT_VERSION):
+    return ANALYSIS_PROMPTS[version]
+
+
+def build_analysis_messages(code, language, syntax_verified=False, excerpt=None, depth='deep'):
+    """
+    Chat messages for an analysis request with the current template of a
+    depth. When the local pre-analysis has verified the syntax, the model is
+    told to skip syntax checking; excerpt is (first_line, last_line,
+    total_lines) when code is one chunk of a larger file.
+    """
+    return DEPTH_PROMPTS[depth].messages(code, language, syntax_verified, excerpt)
+
+
+def _legacy_analysis_prompt(code, language, syntax_verified=False, excerpt=None):
+    """
+    Version 3 prompt: instructions, schema and code in one user message
+    """
+    checks = [
+        "All syntax errors",
+        "All logical errors",
+        "All warnings about best practices",
+        "Performance issues",
+        "Security vulnerabilities",
+        "Style and readability issues",
+    ]
+    preamble = ""
+    if syntax_verified:
+        checks = checks[1:]
+        preamble = "The code has already been compiled locally and contains no syntax errors. Do not report syntax errors; focus on the remaining semantic issues.\n    "
+    if excerpt is not None:
+        first_line, last_line, total_lines = excerpt
+        preamble += (
+            f"The code below is lines {first_line}-{last_line} of a {total_lines}-line file that is analyzed in parts. "
+            "Report line numbers relative to this excerpt (its first line is line 1), only report issues inside it, "
+            "and make corrected_code the corrected version of this excerpt only.\n    "
+        )
+    check_list = "\n    ".join(f"{number}. {check}" for number, check in enumerate(checks, start=1))
+    
+    return f"""
+    You are an expert {language} code analyzer and educator. Analyze the following code thoroughly and provide:
+    
+    {preamble}{check_list}
+    
+    For EACH issue found, provide:
+    - Error Type: The type/category of error
+    - Category: One of: "syntax", "logic", "performance", "security", "best_practice", "style"
+    - Title: A brief title describing the issue
+    - What the error is: Detailed explanation of what's wrong
+    - Why it occurred: Explanation of why this error happens
+    - How to correct it: Step-by-step guidance on fixing it
+    - Line Number: Where the error occurs (if applicable)
+    - Column Number: Where the error occurs (if applicable)
+    - Code Snippet: The problematic code
+    - Severity: "low", "medium", "high", or "critical"
+    
+    IMPORTANT ADDITIONAL REQUIREMENTS:
+    
+    A) CONCEPT MAP: 
+    Create a concept map that groups issues by their root concepts. For example:
+    - **Syntax**: Indentation, Missing Parentheses, Missing Colons, etc.
+    - **Logic**: Type Errors, None Handling, Loop Issues, etc.
+    - **Performance**: Inefficient Algorithms, Unnecessary Computation, etc.
+    - **Security**: Input Validation, SQL Injection, etc.
+    
+    For each concept category, show how many issues belong to it (like: Indentation (3), Missing Parentheses (2), etc.)
+    
+    B) PROGRESSIVE HINTS:
+    For each significant error, provide 3 levels of hints:
+    - Level 1: Gentle Nudge (subtle hint without giving away the solution)
+    - Level 2: Partial Clue (more specific hint pointing towards solution)
+    - Level 3: Full Solution (explicit solution and explanation)
+    
+    C) CORRECTION STRATEGIES:
+    For common error patterns, provide multiple correction strategies with:
+    - Strategy Name
+    - Code implementation
+    - Pros of this approach
+    - Cons of this approach
+    
+    After analyzing all issues, provide:
+    - A fully corrected version of the entire code
+    - General suggestions for improvement
+    - Best practices to follow
+    
+    Code to analyze:
+    ```
+    {code}
+    ```
+    
+    Return the analysis in the following JSON format:
+    {{
+        "analysis_summary": {{
+            "total_errors": number,
+            "total_warnings": number,
+            "overall_severity": "low/medium/high/critical",
+            "language": "{language}",
+            "concepts_covered": ["concept1", "concept2", ...]
+        }},
+        "concept_map": {{
+            "syntax": [
+                {{"concept": "Indentation", "count": 3, "issues": [1, 2, 3]}},
+                {{"concept": "Missing Parentheses", "count": 2, "issues": [4, 5]}}
+            ],
+            "logic": [
+                {{"concept": "Type Errors", "count": 1, "issues": [6]}}
+            ]
+        }},
+        "issues": [
+            {{
+                "id": 1,
+                "type": "error/warning",
+                "category": "syntax/logic/performance/security/best_practice/style",
+                "title": "Issue title",
+                "description": "What the error is",
+                "cause": "Why it occurred",
+                "fix": "How to correct it",
+                "line": line_number,
+                "column": column_number,
+                "code_snippet": "problematic code",
+                "severity": "low/medium/high/critical",
+                "hints": {{
+                    "level1": "Gentle nudge hint",
+                    "level2": "Partial clue hint",
+                    "level3": "Full solution explanation"
+                }}
+            }}
+        ],
+        "correction_strategies": [
+            {{
+                "name": "Strategy Name",
+                "description": "Brief description",
+                "code": "Code implementation",
+                "pros": ["Pro 1", "Pro 2"],
+                "cons": ["Con 1", "Con 2"],
+                "applicable_to_issues": [1, 2, 3]
+            }}
+        ],
+        "corrected_code": "The fully corrected version of the code",
+        "suggestions": [
+            "General suggestions for improvement"
+        ],
+        "best_practices": [
+            "Best practices to follow"
+        ]
+    }}
+    
+    Important guidelines:
+    1. Be extremely thorough and detailed in your analysis
+    2. Don't miss any potential issues
+    3. Provide practical, actionable fixes
+    4. The corrected code should be production-ready
+    5. Explain concepts clearly for learning purposes
+    6. If no issues are found, return empty arrays but still provide corrected code
+    7. Only return the JSON object, no other text
+    8. For the concept map, group similar issues under appropriate concepts
+    9. Hints should be educational and progressive
+    10. Correction strategies should show different approaches to solving problems
+    """
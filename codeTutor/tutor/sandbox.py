@@ -0,0 +1,771 @@
+# sandbox.py
+"""
+Sandboxed execution of Python submissions.
+
+The pool keeps SANDBOX['POOL_SIZE'] worker processes warm. A worker is a
+separate interpreter started without the server's environment, with the
+modules submissions commonly use already imported (never ctypes). For every
+run it forks a child which:
+
+- works in a fresh temporary directory and can't touch files outside it
+  (reading the Python installation is allowed, for imports);
+- gets its own network namespace where the platform allows it (Python 3.12+),
+  and has sockets, subprocesses, forks, ctypes, tracing and garbage collector
+  introspection refused by an audit hook whose rules are bound when it is
+  installed, so code that rewrites this module's globals doesn't change them;
+- runs as SANDBOX['USER'] when the server runs as root (the pool refuses to
+  start as root without it), under rlimits for CPU time, address space, file
+  size, open files and processes;
+- runs the submission as a fresh __main__ module, reads an empty stdin, has
+  its output captured up to a limit, and is killed after the wall-clock
+  TIMEOUT.
+
+Forking a warm worker keeps the overhead of a run to a few milliseconds, and
+no state survives into the next run. Runs never queue: when every worker is
+busy, arun() returns None at once and the analysis goes on without a run,
+so a few slow programs can't hold up everyone else's requests. The outcome, the exception and the
+line it was raised at come back as an ExecutionResult.
+
+This contains mistakes in student code (endless loops, runaway allocations,
+stray file writes and network calls); it isn't a hardened security boundary,
+so it is disabled unless SANDBOX['ENABLED'] is set, which should only be done
+where the workers themselves run in a jail (a container with seccomp, or
+namespaces and a uid of their own).
+"""
+import asyncio
+import atexit
+import builtins
+import io
+import json
+import logging
+import os
+import queue
+import re
+import select
+import shutil
+import signal
+import stat
+import struct
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import threading
+import time
+import types
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import resource
+except ImportError:  # Windows: no sandbox
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SANDBOX_SETTINGS = {
+    'ENABLED': False,
+    'POOL_SIZE': 2,
+    # Seconds of wall-clock and CPU time per run
+    'TIMEOUT': 2.0,
+    'CPU_SECONDS': 2,
+    'MEMORY_MB': 256,
+    # Largest file a run may write, and how much output is kept
+    'FILE_BYTES': 1024 * 1024,
+    'OUTPUT_CHARS': 4000,
+    # Unprivileged account runs switch to when the server runs as root. It
+    # must be able to read the Python installation.
+    'USER': None,
+    # Answer plain runtime errors raised by the student's code (NameError,
+    # IndexError, ...) from the traceback instead of calling the LLM
+    'ANSWER_RUNTIME_ERRORS': True,
+    # Run the corrected code of analyses and report whether it works
+    'CHECK_CORRECTED_CODE': True,
+}
+
+SUBMISSION = '<submission>'
+
+# Longest exception message shown to students
+MESSAGE_CHARS = 160
+
+# Exceptions whose messages describe the worker (paths, refused operations)
+# rather than the student's code; only their type is shown
+OPAQUE_EXCEPTIONS = frozenset({
+    'BlockingIOError', 'FileExistsError', 'FileNotFoundError', 'IsADirectoryError', 'MemoryError',
+    'NotADirectoryError', 'OSError', 'PermissionError', 'SandboxViolation', 'SystemError',
+})
+
+# Symbolic links followed when resolving a path
+MAX_SYMLINKS = 40
+
+# Bytes a run's reply may hold besides its output (JSON escapes take up
+# to 12 bytes per output character); a longer reply is a crashed run
+RESULT_BYTES = 64 * 1024
+
+# What a run's child can report; a reply claiming anything else is forged
+CHILD_OUTCOMES = frozenset({'ok', 'error', 'syntax_error', 'needs_input', 'memory', 'blocked'})
+
+_PATH = re.compile(r'(?:[A-Za-z]:)?(?:[\\/][\w.\-]+){2,}[\\/]?')
+_CONTROL = re.compile(r'[\x00-\x1f\x7f]+')
+
+# Imported by every worker up front, so runs don't pay for them
+PRELOADED_MODULES = (
+    'bisect', 'collections', 'copy', 'dataclasses', 'datetime', 'decimal', 'enum', 'fractions', 'functools',
+    'heapq', 'itertools', 'json', 'math', 'operator', 'random', 're', 'statistics', 'string', 'time', 'typing',
+)
+
+# Dropped from sys.modules before a run so importing them again is seen
+# (and refused) by the audit hook
+BLOCKED_MODULES = frozenset({
+    '_ctypes', '_posixsubprocess', '_socket', '_ssl', 'ctypes', 'ctypes.util', 'multiprocessing', 'pty',
+    'socket', 'ssl', 'subprocess',
+})
+
+BLOCKED_EVENTS = frozenset({
+    'ctypes.call_function', 'ctypes.cdata', 'ctypes.dlopen', 'ctypes.dlsym', 'os.exec', 'os.fork', 'os.forkpty',
+    'os.kill', 'os.killpg', 'os.posix_spawn', 'os.spawn', 'os.system', 'pty.spawn', 'resource.prlimit',
+    'resource.setrlimit', 'socket.__new__', 'socket.bind', 'socket.connect', 'socket.getaddrinfo',
+    'subprocess.Popen', 'sys.addaudithook', 'urllib.Request', 'webbrowser.open',
+    # Links could be swapped between the hook's check and the access
+    'os.link', 'os.symlink',
+    # Ways to reach the audit hook function (and rebind its closure)
+    'gc.get_objects', 'gc.get_referents', 'gc.get_referrers', 'sys.setprofile', 'sys.settrace',
+})
+
+# Events whose path arguments must lie inside the run's directory
+WRITE_EVENTS = {
+    'os.chdir': 1, 'os.chmod': 1, 'os.chown': 1, 'os.mkdir': 1, 'os.remove': 1, 'os.rename': 2, 'os.rmdir': 1,
+    'os.truncate': 1, 'os.utime': 1, 'shutil.copyfile': 2, 'shutil.rmtree': 1,
+}
+# Events whose path argument may also be under the Python installation
+READ_EVENTS = {'glob.glob': 1, 'os.listdir': 1, 'os.scandir': 1}
+
+# The worker's entry point. It isn't run with -m, so the worker's __main__
+# module is empty rather than this module.
+WORKER_COMMAND = 'from tutor.sandbox import serve; serve()'
+
+# Set up by each worker: the directories runs may read
+_read_roots = ()
+
+
+class SandboxUnavailable(Exception):
+    """
+    The sandbox is disabled, unsupported on this platform, or its worker failed
+    """
+
+
+class SandboxViolation(PermissionError):
+    """
+    Raised inside a run when the code attempts something the sandbox refuses
+    """
+
+
+class ExecutionResult(namedtuple('ExecutionResult', [
+    'outcome', 'exception', 'message', 'line', 'in_submission', 'output', 'duration',
+])):
+    """
+    What running a submission did.
+
+    outcome is "ok", "error" (an uncaught exception), "syntax_error",
+    "needs_input" (it read stdin), "timeout", "memory", "blocked" (it tried
+    something the sandbox refuses) or "crashed". exception, message and line
+    describe the exception; in_submission is True when it was raised by the
+    submission's own code rather than inside a library it called.
+    """
+    __slots__ = ()
+
+    @property
+    def failed(self):
+        return self.outcome == 'error'
+
+    @property
+    def public_message(self):
+        """
+        The exception's message as shown to students: on one line, without
+        paths, at most MESSAGE_CHARS long, and None for OPAQUE_EXCEPTIONS
+        """
+        if not self.message or self.exception in OPAQUE_EXCEPTIONS:
+            return None
+        message = _PATH.sub('<path>', _CONTROL.sub(' ', self.message)).strip()
+        if len(message) > MESSAGE_CHARS:
+            message = message[:MESSAGE_CHARS - 3].rstrip() + '...'
+        return message or None
+
+    @property
+    def detail(self):
+        """
+        "Exception: message" (or just the exception) as shown to students
+        """
+        message = self.public_message
+        return f'{self.exception}: {message}' if message else self.exception
+
+    def summary(self):
+        """
+        The result as included in analysis responses
+        """
+        return {
+            'outcome': self.outcome,
+            'exception': self.exception,
+            'message': self.public_message,
+            'line': self.line,
+            'duration_ms': round(self.duration * 1000, 1),
+        }
+
+
+def get_sandbox_settings():
+    config = dict(DEFAULT_SANDBOX_SETTINGS)
+    config.update(getattr(settings, 'SANDBOX', {}))
+    return config
+
+
+def supported():
+    return resource is not None and hasattr(os, 'fork')
+
+
+def run_limits(config):
+    return {key: config[key] for key in ('TIMEOUT', 'CPU_SECONDS', 'MEMORY_MB', 'FILE_BYTES', 'OUTPUT_CHARS', 'USER')}
+
+
+# Worker protocol: length-prefixed JSON over the worker's stdin and stdout
+
+def send_message(stream, message):
+    data = json.dumps(message).encode('utf-8')
+    stream.write(struct.pack('>I', len(data)) + data)
+    stream.flush()
+
+
+def receive_message(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    (length,) = struct.unpack('>I', header)
+    return json.loads(stream.read(length).decode('utf-8'))
+
+
+# Server side
+
+class SandboxWorker:
+    """
+    One warm worker process
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-E', '-s', '-c', WORKER_COMMAND],
+            cwd=Path(__file__).resolve().parent.parent,
+            # Nothing from the server's environment (API keys) reaches the worker
+            env={'PATH': os.defpath, 'LANG': 'C.UTF-8'},
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, code, limits):
+        """
+        Run code in a fresh child of the worker. Raises SandboxUnavailable
+        when the worker dies or doesn't answer.
+        """
+        try:
+            send_message(self.process.stdin, {'code': code, 'limits': limits})
+            # The worker enforces the timeout; this only catches a stuck worker
+            ready, _, _ = select.select([self.process.stdout], [], [], limits['TIMEOUT'] + 5)
+            reply = receive_message(self.process.stdout) if ready else None
+        except (OSError, ValueError) as e:
+            raise SandboxUnavailable(f'Sandbox worker failed: {e}') from e
+        if reply is None:
+            self.close()
+            raise SandboxUnavailable('Sandbox worker stopped answering')
+        return ExecutionResult(**reply)
+
+    def close(self):
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+
+
+class SandboxPool:
+    """
+    POOL_SIZE warm workers, each driven by a thread of a private executor
+    so waiting for a run never blocks the event loop
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._executor = None
+
+    def start(self):
+        """
+        Start the workers (done by the first run otherwise)
+        """
+        config = get_sandbox_settings()
+        if not config['ENABLED'] or not supported():
+            raise SandboxUnavailable('The sandbox is disabled or not supported on this platform')
+        if os.getuid() == 0 and _account(config['USER']) is None:
+            raise SandboxUnavailable("The sandbox doesn't run code as root: set SANDBOX['USER'] to an unprivileged account")
+        with self._lock:
+            if self._executor is None:
+                size = max(1, int(config['POOL_SIZE']))
+                for _ in range(size):
+                    worker = SandboxWorker()
+                    self._workers.append(worker)
+                    self._idle.put(worker)
+                self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='sandbox')
+                atexit.register(self.close)
+            return self._executor
+
+    async def arun(self, code, limits=None):
+        """
+        Run code in the sandbox and return its ExecutionResult, or None when
+        every worker is busy. Raises SandboxUnavailable when it can't be run.
+        """
+        executor = self.start()
+        limits = limits or run_limits(get_sandbox_settings())
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(executor, self._run, worker, code, limits)
+
+    def _run(self, worker, code, limits):
+        try:
+            return worker.run(code, limits)
+        finally:
+            if not worker.alive:
+                worker = self._replace(worker)
+            self._idle.put(worker)
+
+    def _replace(self, worker):
+        logger.warning('Sandbox worker exited; starting a new one')
+        with self._lock:
+            replacement = SandboxWorker()
+            self._workers[self._workers.index(worker)] = replacement
+        return replacement
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': len(self._workers),
+                'alive': sum(worker.alive for worker in self._workers),
+                'idle': self._idle.qsize(),
+            }
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            executor, self._executor = self._executor, None
+            self._idle = queue.Queue()
+        for worker in workers:
+            worker.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+sandbox_pool = SandboxPool()
+
+
+# Worker side
+
+def serve():
+    """
+    Worker main loop: run each request in a forked child and reply with
+    the result. Exits when the server closes the pipe.
+    """
+    # Replies go to a private copy of stdout; anything printed lands on stderr
+    replies = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    requests = sys.stdin.buffer
+    for name in PRELOADED_MODULES:
+        __import__(name)
+    _load_read_roots()
+
+    while True:
+        request = receive_message(requests)
+        if request is None:
+            return
+        try:
+            result = run_isolated(request['code'], request['limits'])
+        except OSError as e:
+            result = ExecutionResult('crashed', None, f'Could not start the run: {e}', None, False, '', 0.0)
+        except (KeyError, TypeError, ValueError) as e:
+            result = ExecutionResult('crashed', None, f'The run failed: {type(e).__name__}', None, False, '', 0.0)
+        send_message(replies, result._asdict())
+
+
+def _load_read_roots():
+    global _read_roots
+
+    paths = sysconfig.get_paths()
+    _read_roots = tuple(
+        os.path.realpath(paths[key]) for key in ('stdlib', 'platstdlib', 'purelib', 'platlib') if key in paths
+    ) + ('/usr/share/zoneinfo', os.devnull)
+
+
+def run_isolated(code, limits):
+    """
+    Fork a child to run code under limits, and collect its result
+    """
+    account = _account(limits.get('USER'))
+    if os.getuid() == 0 and account is None:
+        raise PermissionError('no unprivileged SANDBOX USER to run as')
+    jail = tempfile.mkdtemp(prefix='tutor-sandbox-')
+    if account is not None:
+        os.chown(jail, *account)
+    read_fd, write_fd = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            _run_child(code, limits, jail, write_fd, account)
+        finally:
+            os._exit(0)
+
+    os.close(write_fd)
+    try:
+        data, timed_out = _read_until(
+            read_fd, time.monotonic() + limits['TIMEOUT'], RESULT_BYTES + 12 * limits['OUTPUT_CHARS']
+        )
+        if timed_out or data is None:
+            os.kill(pid, signal.SIGKILL)
+        _, status = os.waitpid(pid, 0)
+    finally:
+        os.close(read_fd)
+        shutil.rmtree(jail, ignore_errors=True)
+    duration = time.perf_counter() - start
+
+    if data or data is None:
+        # The submission can write to the result pipe too, so the reply is
+        # checked rather than trusted
+        result = _parse_result(data, limits) if data else None
+        if result is None:
+            return ExecutionResult('crashed', None, 'The run sent back an invalid result', None, False, '', duration)
+        return ExecutionResult(**result, duration=duration)
+    if timed_out or os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL):
+        return ExecutionResult('timeout', None, None, None, False, '', duration)
+    return ExecutionResult('crashed', None, f'The process ended with status {status}', None, False, '', duration)
+
+
+def _read_until(fd, deadline, limit):
+    """
+    (data, timed out) read from fd until EOF or the deadline; data is None
+    when more than limit bytes arrive
+    """
+    chunks = []
+    size = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return b'', True
+        ready, _, _ = select.select([fd], [], [], remaining)
+        if not ready:
+            return b'', True
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            return b''.join(chunks), False
+        size += len(chunk)
+        if size > limit:
+            return None, False
+        chunks.append(chunk)
+
+
+def _parse_result(data, limits):
+    """
+    The fields of a run's reply, or None when it isn't one the child could
+    have sent
+    """
+    try:
+        result = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(result, dict) or set(result) != set(ExecutionResult._fields) - {'duration'}:
+        return None
+    valid = (
+        isinstance(result['outcome'], str) and result['outcome'] in CHILD_OUTCOMES
+        and (result['exception'] is None or isinstance(result['exception'], str) and len(result['exception']) <= 64)
+        and (result['message'] is None or isinstance(result['message'], str) and len(result['message']) <= 500)
+        and (result['line'] is None or type(result['line']) is int)
+        and type(result['in_submission']) is bool
+        and isinstance(result['output'], str) and len(result['output']) <= limits['OUTPUT_CHARS']
+    )
+    return result if valid else None
+
+
+def _account(user):
+    """
+    (uid, gid) of user, when the worker runs as root and should switch to it
+    (None when user isn't an existing unprivileged account)
+    """
+    if not user or os.getuid() != 0:
+        return None
+    import pwd
+
+    try:
+        entry = pwd.getpwnam(user)
+    except KeyError:
+        return None
+    if entry.pw_uid == 0:
+        return None
+    return entry.pw_uid, entry.pw_gid
+
+
+class _Output(io.TextIOBase):
+    """
+    stdout and stderr of a run, keeping the first limit characters
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if self.size < self.limit:
+            kept = text[:self.limit - self.size]
+            self.parts.append(kept)
+            self.size += len(kept)
+        return len(text)
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+def _run_child(code, limits, jail, result_fd, account):
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.closerange(3, result_fd)
+    os.closerange(result_fd + 1, 1024)
+
+    os.chdir(jail)
+    os.environ.clear()
+    os.environ.update({'HOME': jail, 'TMPDIR': jail, 'PATH': os.defpath, 'LANG': 'C.UTF-8'})
+    tempfile.tempdir = jail
+    _isolate_network()
+    if account is not None:
+        os.setgroups([])
+        os.setgid(account[1])
+        os.setuid(account[0])
+    _set_limits(limits)
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)  # oversized writes fail instead of killing the run
+
+    output = _Output(limits['OUTPUT_CHARS'])
+    sys.stdout = sys.stderr = output
+    sys.stdin = io.StringIO('')
+    for name in BLOCKED_MODULES:
+        sys.modules.pop(name, None)
+    state = {'input': False}
+    sys.addaudithook(_audit_hook(jail, state))
+
+    result = _execute(code, state)
+    result['output'] = output.getvalue()
+    data = json.dumps(result).encode('utf-8')
+    while data:
+        data = data[os.write(result_fd, data):]
+
+
+def _isolate_network():
+    """
+    Move to an empty network namespace, where privileges and the Python
+    version (os.unshare) allow
+    """
+    if not hasattr(os, 'unshare'):
+        return
+    try:
+        os.unshare(os.CLONE_NEWNET)
+    except OSError:
+        try:
+            os.unshare(os.CLONE_NEWUSER | os.CLONE_NEWNET)
+        except OSError:
+            pass
+
+
+def _set_limits(limits):
+    memory = int(limits['MEMORY_MB']) * 1024 * 1024
+    cpu = int(limits['CPU_SECONDS'])
+    for limit, value in (
+        (resource.RLIMIT_CPU, (cpu, cpu + 1)),
+        (resource.RLIMIT_AS, (memory, memory)),
+        (resource.RLIMIT_FSIZE, (limits['FILE_BYTES'], limits['FILE_BYTES'])),
+        (resource.RLIMIT_NOFILE, (32, 32)),
+        (resource.RLIMIT_NPROC, (0, 0)),
+        (resource.RLIMIT_CORE, (0, 0)),
+    ):
+        try:
+            resource.setrlimit(limit, value)
+        except (ValueError, OSError):
+            pass
+
+
+def _audit_hook(jail, state):
+    """
+    The audit hook of a run. Everything it consults is bound here, when it
+    is installed: the submission can rebind this module's globals, os.path
+    or builtins, but not the hook's closure, since only the hook function
+    refers to it and the garbage collector calls that could find the
+    function are refused. Paths are resolved with the C functions of the
+    os module (bound here too) rather than os.path.realpath, whose helpers
+    are looked up in posixpath's globals on every call.
+    """
+    blocked_events = frozenset(BLOCKED_EVENTS)
+    blocked_modules = frozenset(BLOCKED_MODULES)
+    write_events = types.MappingProxyType(dict(WRITE_EVENTS))
+    read_events = types.MappingProxyType(dict(READ_EVENTS))
+    jail = os.path.realpath(jail)
+    jails = (jail,)
+    readable = (jail, *_read_roots)
+    getcwd, lstat, readlink, is_link = os.getcwd, os.lstat, os.readlink, stat.S_ISLNK
+    encoding = sys.getfilesystemencoding()
+    sep = os.sep
+    write_flags = os.O_WRONLY | os.O_RDWR
+    violation = SandboxViolation
+    lookup_errors = (OSError, ValueError)
+    max_links = MAX_SYMLINKS
+    str_type, bytes_type, int_type, type_of = str, bytes, int, type
+
+    def resolve(path):
+        # os.path.realpath, without symlink loops; None when it can't be resolved
+        if path[:1] != sep:
+            path = getcwd() + sep + path
+        pending = path.split(sep)
+        pending.reverse()
+        resolved = []
+        links = 0
+        while pending:
+            part = pending.pop()
+            if part == '' or part == '.':
+                continue
+            if part == '..':
+                if resolved:
+                    resolved.pop()
+                continue
+            candidate = sep + sep.join(resolved + [part])
+            try:
+                mode = lstat(candidate).st_mode
+            except lookup_errors:
+                resolved.append(part)
+                continue
+            if not is_link(mode):
+                resolved.append(part)
+                continue
+            links += 1
+            if links > max_links:
+                return None
+            try:
+                target = readlink(candidate).split(sep)
+            except lookup_errors:
+                return None
+            if target[0] == '':
+                resolved.clear()
+            target.reverse()
+            pending.extend(target)
+        return sep + sep.join(resolved)
+
+    def inside(path, roots):
+        # Only plain strings: anything else could run the submission's code
+        # (__fspath__, overridden str methods) while the hook is on the stack
+        if type_of(path) is bytes_type:
+            path = path.decode(encoding, 'surrogateescape')
+        elif type_of(path) is not str_type:
+            return False
+        real = resolve(path)
+        if real is None:
+            return False
+        for root in roots:
+            if real == root or real.startswith(root + sep):
+                return True
+        return False
+
+    def hook(event, args):
+        if event == 'builtins.input':
+            state['input'] = True
+        elif event in blocked_events:
+            raise violation(f'{event} is not allowed in the sandbox')
+        elif event == 'import':
+            name = args[0]
+            if type_of(name) is not str_type or name in blocked_modules or name.partition('.')[0] in blocked_modules:
+                raise violation(f'Importing {name} is not allowed in the sandbox')
+        elif event == 'open':
+            path, mode, flags = args
+            if path is None or type_of(path) is int_type:
+                return
+            if mode:
+                writing = 'w' in mode or 'a' in mode or 'x' in mode or '+' in mode
+            else:
+                writing = flags & write_flags
+            if not inside(path, jails if writing else readable):
+                raise violation('Access to this path is not allowed in the sandbox')
+        elif event in write_events or event in read_events:
+            roots = jails if event in write_events else readable
+            count = write_events.get(event) or read_events[event]
+            for path in args[:count]:
+                if path is not None and type_of(path) is not int_type and not inside(path, roots):
+                    raise violation('Access to this path is not allowed in the sandbox')
+
+    return hook
+
+
+def _execute(code, state):
+    try:
+        compiled = compile(code, SUBMISSION, 'exec')
+    except (SyntaxError, ValueError) as error:
+        return _result('syntax_error', error, getattr(error, 'lineno', None), True)
+
+    # Reporting uses what is bound now, whatever the code does to the module
+    failing_line, result, violation = _failing_line, _result, SandboxViolation
+    # A fresh __main__, so "import __main__" gives the submission its own
+    # module rather than the worker's
+    main = types.ModuleType('__main__')
+    main.__builtins__ = builtins
+    sys.modules['__main__'] = main
+    try:
+        exec(compiled, main.__dict__)
+    except SystemExit:
+        pass
+    except BaseException as error:  # noqa: B036 - every failure of the code is the result
+        line, in_submission = failing_line(error.__traceback__)
+        if isinstance(error, EOFError) and state['input']:
+            outcome = 'needs_input'
+        elif isinstance(error, MemoryError):
+            outcome = 'memory'
+        elif isinstance(error, violation):
+            outcome = 'blocked'
+        else:
+            outcome = 'error'
+        return result(outcome, error, line, in_submission)
+    return result('ok', None, None, False)
+
+
+def _failing_line(traceback):
+    """
+    The last submission line in traceback, and whether the exception was
+    raised there rather than in code it called
+    """
+    line, in_submission = None, False
+    while traceback is not None:
+        in_submission = traceback.tb_frame.f_code.co_filename == SUBMISSION
+        if in_submission:
+            line = traceback.tb_lineno
+        traceback = traceback.tb_next
+    return line, in_submission
+
+
+def _result(outcome, error, line, in_submission):
+    return {
+        'outcome': outcome,
+        'exception': type(error).__name__[:64] if error is not None else None,
+        'message': str(error)[:500] if error is not None else None,
+        'line': line,
+        'in_submission': in_submission,
+    }
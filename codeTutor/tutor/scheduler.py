@@ -0,0 +1,319 @@
+# scheduler.py
+"""
+Admission control and retries for upstream LLM calls.
+
+Every chat completion is admitted by the scheduler before it is sent. Two
+token buckets track the account's requests-per-minute and tokens-per-minute
+budgets; a call reserves one request and its prompt tokens plus max_tokens
+(the amount OpenAI counts against the limit), and the reservation is
+settled against the real usage afterwards. Calls that don't fit wait in a
+priority queue (hints before strategies before full analyses), so a
+classroom spike becomes a queue instead of a burst of 429s.
+
+Rate-limit, timeout, connection and 5xx errors are retried with jittered
+exponential backoff. A 429 pauses admission for everyone until its
+retry-after has passed. The SDK's own retries are disabled while the
+scheduler is enabled so there is a single retry policy.
+
+The buckets are shared by the whole process; each event loop keeps its own
+queue of waiters.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+from .metrics import llm_queue_wait, llm_rate_limited, llm_retries, registry
+
+DEFAULT_SCHEDULER_SETTINGS = {
+    'ENABLED': True,
+    # Account limits for the analysis model
+    'REQUESTS_PER_MINUTE': 500,
+    'TOKENS_PER_MINUTE': 200000,
+    # Lower runs first; unknown endpoints get the lowest priority
+    'PRIORITIES': {
+        'hint': 0,
+        'corrected_code': 1,
+        'correction_strategy': 1,
+        'analyze': 2,
+    },
+    'MAX_RETRIES': 4,
+    'BACKOFF_BASE': 0.5,
+    'BACKOFF_MAX': 20.0,
+    # Give up on calls that could not be admitted within this many seconds
+    'MAX_QUEUE_WAIT': 60.0,
+}
+
+# Names of the openai exceptions worth retrying (openai is imported with the
+# client, not with this module)
+RETRYABLE_ERRORS = ('RateLimitError', 'APITimeoutError', 'APIConnectionError', 'InternalServerError')
+
+
+class UpstreamBusy(Exception):
+    """
+    A call waited longer than MAX_QUEUE_WAIT for upstream capacity
+    """
+    def __init__(self, retry_after):
+        super().__init__('Upstream capacity exhausted')
+        self.retry_after = retry_after
+
+
+def get_scheduler_settings():
+    config = dict(DEFAULT_SCHEDULER_SETTINGS)
+    config.update(getattr(settings, 'LLM_SCHEDULER', {}))
+    config['PRIORITIES'] = {**DEFAULT_SCHEDULER_SETTINGS['PRIORITIES'], **config.get('PRIORITIES', {})}
+    return config
+
+
+class TokenBucket:
+    """
+    Refills continuously at per_minute / 60 units per second up to
+    per_minute. Takes may overdraw it; the debt delays later takes.
+    """
+
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """
+        Seconds until amount can be taken (requests larger than the whole
+        bucket only need a full bucket)
+        """
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateBudget:
+    """
+    The process-wide request and token buckets, plus the pause set by 429s
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, clock=time.monotonic):
+        self.lock = threading.Lock()
+        self.clock = clock
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self.paused_until = 0.0
+
+    def try_take(self, tokens):
+        """
+        Take one request and tokens if both fit now. Returns 0 on success,
+        otherwise the seconds to wait before trying again.
+        """
+        with self.lock:
+            now = self.clock()
+            delay = max(
+                self.paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now),
+            )
+            if delay > 0:
+                return delay
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            return 0.0
+
+    def settle(self, reserved, used):
+        """
+        Return unused reserved tokens, or charge usage above the reservation
+        """
+        with self.lock:
+            if used < reserved:
+                self.tokens.give(reserved - used)
+            else:
+                self.tokens.take(used - reserved, self.clock())
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+class UpstreamScheduler:
+    """
+    Priority queue of calls waiting for the shared RateBudget on one
+    event loop
+    """
+
+    def __init__(self, budget, config):
+        self.budget = budget
+        self.config = config
+        self._queue = []  # (priority, sequence, future, tokens)
+        self._sequence = itertools.count()
+        self._wakeup = None
+
+    def priority(self, endpoint):
+        priorities = self.config['PRIORITIES']
+        return priorities.get(endpoint, max(priorities.values(), default=0) + 1)
+
+    def queue_depth(self):
+        return sum(1 for _, _, future, _ in self._queue if not future.done())
+
+    async def acquire(self, endpoint, tokens):
+        """
+        Wait until the call may be sent. Raises UpstreamBusy after
+        MAX_QUEUE_WAIT seconds.
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (self.priority(endpoint), next(self._sequence), future, tokens))
+        start = time.perf_counter()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, self.config['MAX_QUEUE_WAIT'])
+        except asyncio.TimeoutError:
+            raise UpstreamBusy(retry_after=self.config['BACKOFF_MAX']) from None
+        finally:
+            llm_queue_wait.observe(time.perf_counter() - start, endpoint=endpoint)
+            # Let the next waiter in if this one left without its turn
+            self._dispatch()
+
+    def _dispatch(self):
+        """
+        Admit waiters in priority order while the budget allows, then
+        schedule a wake-up for the first one that has to wait
+        """
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        while self._queue:
+            _, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            delay = self.budget.try_take(tokens)
+            if delay > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            future.set_result(None)
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Full-jitter exponential backoff, never shorter than retry_after
+        """
+        ceiling = min(self.config['BACKOFF_MAX'], self.config['BACKOFF_BASE'] * 2 ** attempt)
+        return max(random.uniform(0, ceiling), retry_after or 0.0)
+
+    async def submit(self, endpoint, tokens, send):
+        """
+        Admit and run send() (a coroutine function), retrying retryable
+        upstream errors with backoff
+        """
+        import openai
+
+        retryable = tuple(getattr(openai, name) for name in RETRYABLE_ERRORS)
+        attempt = 0
+        while True:
+            await self.acquire(endpoint, tokens)
+            try:
+                return await send()
+            except retryable as e:
+                # The request counted against the limit; its tokens mostly didn't
+                self.budget.settle(tokens, 0)
+                retry_after = _retry_after(e)
+                if isinstance(e, openai.RateLimitError):
+                    llm_rate_limited.inc(endpoint=endpoint)
+                    self.budget.pause(retry_after if retry_after is not None else self.backoff(attempt))
+                if attempt >= self.config['MAX_RETRIES']:
+                    raise
+                delay = self.backoff(attempt, retry_after)
+                attempt += 1
+                llm_retries.inc(endpoint=endpoint)
+                await asyncio.sleep(delay)
+
+
+def _retry_after(error):
+    """
+    Seconds from the retry-after-ms / retry-after headers of an API error
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if 'retry-after-ms' in headers:
+            return float(headers['retry-after-ms']) / 1000
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+def suggested_retry_after(error):
+    """
+    Seconds a client should wait before retrying after error, or None
+    """
+    if isinstance(error, UpstreamBusy):
+        return error.retry_after
+    return _retry_after(error)
+
+
+_lock = threading.Lock()
+_budget = None
+_budget_config = None
+_schedulers = weakref.WeakKeyDictionary()  # event loop -> UpstreamScheduler
+
+
+def get_scheduler():
+    """
+    The scheduler for the running event loop, or None when disabled
+    """
+    global _budget, _budget_config
+
+    config = get_scheduler_settings()
+    if not config['ENABLED']:
+        return None
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if config != _budget_config:
+            # First use, or the settings changed (tests, benchmarks)
+            _budget = RateBudget(config['REQUESTS_PER_MINUTE'], config['TOKENS_PER_MINUTE'])
+            _budget_config = config
+            _schedulers.clear()
+        scheduler = _schedulers.get(loop)
+        if scheduler is None:
+            scheduler = _schedulers[loop] = UpstreamScheduler(_budget, config)
+        return scheduler
+
+
+@registry.collector
+def _collect_scheduler_stats():
+    with _lock:
+        schedulers = list(_schedulers.values())
+        budget = _budget
+    samples = [
+        ('tutor_llm_queue_depth', 'LLM calls waiting for admission', {(): sum(s.queue_depth() for s in schedulers)}),
+    ]
+    if budget is not None:
+        with budget.lock:
+            now = budget.clock()
+            budget.requests._refill(now)
+            budget.tokens._refill(now)
+            samples += [
+                ('tutor_llm_request_budget', 'Requests left in the per-minute bucket', {(): round(budget.requests.level, 2)}),
+                ('tutor_llm_token_budget', 'Tokens left in the per-minute bucket', {(): round(budget.tokens.level)}),
+            ]
+    return samples
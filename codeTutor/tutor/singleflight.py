@@ -0,0 +1,130 @@
+# singleflight.py
+"""
+Request coalescing for identical in-flight upstream calls.
+
+When a class hits "Analyze" on the same exercise within seconds, only the
+first request (the leader) calls OpenAI; concurrent requests with the same
+key wait for the leader and share its parsed result. Calls are tracked with
+concurrent.futures.Future so waiting works across threads (WSGI workers,
+each with its own event loop) as well as across asyncio tasks.
+"""
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+
+class LeaderCancelled(Exception):
+    """
+    The leading call was cancelled; followers should retry on their own
+    """
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> concurrent.futures.Future
+        self._counters = {'leaders': 0, 'followers': 0, 'errors': 0}
+
+    def join(self, key):
+        """
+        Register interest in key. Returns (future, is_leader); the leader
+        must call complete() when done.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = concurrent.futures.Future()
+                self._counters['leaders'] += 1
+                return future, True
+            self._counters['followers'] += 1
+            return future, False
+
+    def complete(self, key, future, result=None, error=None):
+        """
+        Publish the leader's outcome to every follower
+        """
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+            if error is not None:
+                self._counters['errors'] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def wait(self, future):
+        """
+        Wait for a leader's result from any thread or event loop. Followers
+        get their own copy so they can't mutate the shared result.
+        """
+        result = await asyncio.wrap_future(future)
+        return copy.deepcopy(result)
+
+    async def do(self, key, factory):
+        """
+        Run factory() (a coroutine function) once per key at a time and
+        return its result to every concurrent caller
+        """
+        while True:
+            future, is_leader = self.join(key)
+            if not is_leader:
+                try:
+                    return await self.wait(future)
+                except LeaderCancelled:
+                    continue
+
+            try:
+                result = await factory()
+            except Exception as e:
+                self.complete(key, future, error=e)
+                raise
+            except BaseException:
+                # Cancelled: let a follower take over instead of failing
+                self.complete(key, future, error=LeaderCancelled())
+                raise
+            self.complete(key, future, result=result)
+            return result
+
+    def do_sync(self, key, function):
+        """
+        Thread-based variant of do() for synchronous callers
+        """
+        while True:
+            future, is_leader = self.join(key)
+            if not is_leader:
+                try:
+                    return copy.deepcopy(future.result())
+                except LeaderCancelled:
+                    continue
+
+            try:
+                result = function()
+            except Exception as e:
+                self.complete(key, future, error=e)
+                raise
+            except BaseException:
+                self.complete(key, future, error=LeaderCancelled())
+                raise
+            self.complete(key, future, result=result)
+            return result
+
+    def stats(self):
+        """
+        Leader/follower counts and the coalescing ratio (share of calls
+        that were served by another caller's upstream request)
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+        total = stats['leaders'] + stats['followers']
+        stats['coalescing_ratio'] = round(stats['followers'] / total, 4) if total else 0.0
+        return stats
+
+
+llm_flight = SingleFlight()
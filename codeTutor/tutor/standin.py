@@ -0,0 +1,392 @@
+# standin.py
+"""
+Local stand-in for the OpenAI chat completions API.
+
+The stand-in replays recorded completions with configurable latency, token
+throughput and fault rates (429s, 500s and malformed JSON) so the real
+request path (SDK, connection pool, streaming, parsing, caching and
+coalescing) can be load tested without a network or an API key.
+
+It is an ASGI app. StandInProvider (tutor/llm.py) mounts it in-process
+through httpx.ASGITransport; `python manage.py llm_standin` serves it over
+HTTP for load tests against a running server, with OpenAIProvider pointed at
+it through LLM_CLIENT['BASE_URL'].
+
+Recordings are JSON lines of {"endpoint": ..., "content": ...}, where
+endpoint is one of analyze, analyze_quick and analyze_standard (analyses at
+those depths), hint, correction_strategy or corrected_code.
+Set LLM_CLIENT['RECORD_PATH'] to append real completions in this format.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from .prompts import count_message_tokens, count_tokens
+
+DEFAULT_STANDIN_SETTINGS = {
+    'RECORDINGS': Path(__file__).resolve().parent / 'recordings' / 'completions.jsonl',
+    # Seconds before the first token, and the +/- jitter around it
+    'LATENCY': 0.4,
+    'LATENCY_JITTER': 0.1,
+    # Completion tokens generated per second; 0 sends everything at once
+    'TOKENS_PER_SECOND': 80.0,
+    # Share of requests answered with a 429 / a 500 / malformed content
+    'RATE_LIMIT_RATE': 0.0,
+    'ERROR_RATE': 0.0,
+    'MALFORMED_RATE': 0.0,
+    # Fault and jitter decisions follow a seeded sequence
+    'SEED': 0,
+}
+
+# Tokens per streamed delta
+STREAM_CHUNK_TOKENS = 4
+
+# Words in the system prompt that identify each endpoint, most specific first
+ENDPOINT_MARKERS = [
+    ('analyze_quick', 'quick check'),
+    ('analyze_standard', 'generated separately'),
+    ('hint', 'progressive hints'),
+    ('correction_strategy', 'multiple solutions'),
+    ('corrected_code', 'code corrector'),
+    ('analyze', 'analyze code'),
+]
+
+
+def classify_request(body):
+    """
+    Tell which tutor endpoint a chat completion request came from
+    """
+    messages = body.get('messages') or []
+    system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '').lower()
+    for endpoint, marker in ENDPOINT_MARKERS:
+        if marker in system:
+            return endpoint
+    return 'analyze'
+
+
+def load_recordings(path):
+    """
+    Read recorded completions grouped by endpoint
+    """
+    recordings = {}
+    with open(path, encoding='utf-8') as recording_file:
+        for line in recording_file:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            recordings.setdefault(record['endpoint'], []).append(record['content'])
+    return recordings
+
+
+def record_completion(path, endpoint, content):
+    """
+    Append a completion to a recordings file
+    """
+    with open(path, 'a', encoding='utf-8') as recording_file:
+        recording_file.write(json.dumps({'endpoint': endpoint, 'content': content}) + '\n')
+
+
+class ReplayEngine:
+    """
+    Chooses the recorded completion, timing and fault for each request
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.recordings = load_recordings(config['RECORDINGS'])
+        self._lock = threading.Lock()
+        self._random = random.Random(config['SEED'])
+        self._counters = {'requests': 0, 'rate_limited': 0, 'errors': 0, 'malformed': 0, 'truncated': 0}
+        self._endpoints = {}
+
+    def plan(self, body):
+        """
+        Decide the reply for a request body. Returns a dict with status,
+        content, finish_reason, the first token delay and tokens per second.
+        """
+        endpoint = classify_request(body)
+        with self._lock:
+            draws = [self._random.random() for _ in range(4)]
+            self._counters['requests'] += 1
+            self._endpoints[endpoint] = self._endpoints.get(endpoint, 0) + 1
+
+        config = self.config
+        delay = max(config['LATENCY'] + (draws[3] * 2 - 1) * config['LATENCY_JITTER'], 0.0)
+        if draws[0] < config['RATE_LIMIT_RATE']:
+            self._count('rate_limited')
+            return {'status': 429, 'endpoint': endpoint, 'delay': delay / 4}
+        if draws[1] < config['ERROR_RATE']:
+            self._count('errors')
+            return {'status': 500, 'endpoint': endpoint, 'delay': delay}
+
+        # The same prompt always gets the same recording
+        choices = self.recordings.get(endpoint) or self.recordings.get('analyze') or ['']
+        digest = hashlib.sha256(json.dumps(body.get('messages'), sort_keys=True).encode('utf-8')).digest()
+        content = choices[int.from_bytes(digest[:4], 'big') % len(choices)]
+
+        if draws[2] < config['MALFORMED_RATE']:
+            self._count('malformed')
+            content = self._malform(content)
+
+        finish_reason = 'stop'
+        max_tokens = body.get('max_tokens') or body.get('max_completion_tokens')
+        if max_tokens and count_tokens(content) > max_tokens:
+            self._count('truncated')
+            content = content[:len(content) * max_tokens // count_tokens(content)]
+            finish_reason = 'length'
+
+        return {
+            'status': 200,
+            'endpoint': endpoint,
+            'content': content,
+            'finish_reason': finish_reason,
+            'delay': delay,
+            'tokens_per_second': config['TOKENS_PER_SECOND'],
+        }
+
+    def _malform(self, content):
+        with self._lock:
+            style = self._random.randrange(3)
+            cut = self._random.uniform(0.3, 0.9)
+        if style == 0:
+            # Cut off mid-response
+            return content[:int(len(content) * cut)]
+        if style == 1:
+            # Prose and a code fence around the JSON
+            return f"Here is the analysis you asked for:\n```json\n{content}\n```\nLet me know if you need more help!"
+        # Trailing commas
+        return content.replace('}', ',}').replace(']', ',]')
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'endpoints': dict(self._endpoints)}
+
+
+class StandInApp:
+    """
+    ASGI app serving POST /v1/chat/completions from a ReplayEngine, plus
+    GET /stats (or /v1/stats) with its counters
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        path = scope['path'].rstrip('/')
+        if scope['method'] == 'GET' and path.endswith('/stats'):
+            return await self._send_json(send, 200, self.engine.stats())
+        if scope['method'] != 'POST' or not path.endswith('/chat/completions'):
+            return await self._send_json(send, 404, _error_body('Not found', 'invalid_request_error'))
+
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            return await self._send_json(send, 400, _error_body('Invalid JSON body', 'invalid_request_error'))
+
+        plan = self.engine.plan(request)
+        await asyncio.sleep(plan['delay'])
+        if plan['status'] == 429:
+            return await self._send_json(
+                send, 429,
+                _error_body('Rate limit reached for requests (stand-in)', 'requests', 'rate_limit_exceeded'),
+                [(b'retry-after-ms', b'250')]
+            )
+        if plan['status'] != 200:
+            return await self._send_json(send, plan['status'], _error_body('The server had an error (stand-in)', 'server_error'))
+
+        model = request.get('model', 'standin')
+        if request.get('stream'):
+            return await self._stream(send, request, plan, model)
+
+        if plan['tokens_per_second']:
+            await asyncio.sleep(count_tokens(plan['content']) / plan['tokens_per_second'])
+        await self._send_json(send, 200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': plan['content']},
+                'finish_reason': plan['finish_reason'],
+            }],
+            'usage': _usage(request, plan['content']),
+        })
+
+    async def _stream(self, send, request, plan, model):
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')],
+        })
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+            return f'data: {json.dumps(payload)}\n\n'.encode('utf-8')
+
+        await send({'type': 'http.response.body', 'body': chunk({'role': 'assistant', 'content': ''}), 'more_body': True})
+        content = plan['content']
+        pieces = max(count_tokens(content) // STREAM_CHUNK_TOKENS, 1)
+        size = -(-len(content) // pieces)
+        pause = STREAM_CHUNK_TOKENS / plan['tokens_per_second'] if plan['tokens_per_second'] else 0
+        for offset in range(0, len(content), size):
+            if pause:
+                await asyncio.sleep(pause)
+            await send({'type': 'http.response.body', 'body': chunk({'content': content[offset:offset + size]}), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': chunk({}, plan['finish_reason']), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'data: [DONE]\n\n', 'more_body': False})
+
+    async def _send_json(self, send, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + list(headers),
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def _error_body(message, error_type, code=None):
+    return {'error': {'message': message, 'type': error_type, 'param': None, 'code': code}}
+
+
+def _usage(request, content):
+    prompt_tokens = count_message_tokens(request.get('messages') or [])
+    completion_tokens = count_tokens(content)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+
+
+def build_standin_app(overrides=None):
+    """
+    Build a StandInApp from DEFAULT_STANDIN_SETTINGS updated with overrides
+    """
+    config = dict(DEFAULT_STANDIN_SETTINGS)
+    config.update(overrides or {})
+    return StandInApp(ReplayEngine(config))
+
+
+# Minimal HTTP/1.1 server for the ASGI app (keep-alive, chunked responses)
+
+async def serve(app, host='127.0.0.1', port=8765):
+    """
+    Serve app on host:port until cancelled
+    """
+    async def handle(reader, writer):
+        try:
+            while await _handle_request(app, reader, writer, (host, port)):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port, limit=2 ** 20, backlog=1024)
+    async with server:
+        await server.serve_forever()
+
+
+async def _handle_request(app, reader, writer, server_address):
+    """
+    Run one request through app. Returns False when the connection closes.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return False
+    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+    header_map = dict(headers)
+    length = int(header_map.get(b'content-length', b'0'))
+    body = await reader.readexactly(length) if length else b''
+    keep_alive = header_map.get(b'connection', b'').lower() != b'close'
+
+    url = urlsplit(target)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode('latin-1'),
+        'query_string': url.query.encode('latin-1'),
+        'headers': headers,
+        'server': server_address,
+        'client': writer.get_extra_info('peername'),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Future()  # No disconnect detection; wait forever
+        received = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    chunked = False
+
+    async def send(message):
+        nonlocal chunked
+        if message['type'] == 'http.response.start':
+            response_headers = list(message.get('headers', []))
+            chunked = not any(name.lower() == b'content-length' for name, _ in response_headers)
+            if chunked:
+                response_headers.append((b'transfer-encoding', b'chunked'))
+            if not keep_alive:
+                response_headers.append((b'connection', b'close'))
+            lines = [f'HTTP/1.1 {message["status"]} {_REASONS.get(message["status"], "")}'.encode('latin-1')]
+            lines += [name + b': ' + value for name, value in response_headers]
+            writer.write(b'\r\n'.join(lines) + b'\r\n\r\n')
+        else:
+            data = message.get('body', b'')
+            if chunked:
+                if data:
+                    writer.write(f'{len(data):x}\r\n'.encode('latin-1') + data + b'\r\n')
+                if not message.get('more_body'):
+                    writer.write(b'0\r\n\r\n')
+            else:
+                writer.write(data)
+            await writer.drain()
+
+    await app(scope, receive, send)
+    return keep_alive
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error'}
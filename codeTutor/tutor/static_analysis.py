@@ -0,0 +1,516 @@
+# static_analysis.py
+"""
+Local static pre-analysis of submissions.
+
+Runs before any LLM call and catches the trivial syntax problems most
+beginner submissions fail on (missing colons, bad indentation, unbalanced
+brackets, unterminated strings). Python code is checked with compile() and
+tokenize; the other languages offered by the frontend get a lightweight
+bracket and string scanner that knows their literal forms (template
+literals, text blocks, verbatim and raw strings). Languages it doesn't know
+are left to the LLM. Results use the same schema as the LLM analysis
+(issues[] and concept_map) so they go through transform_response_for_frontend
+unchanged.
+"""
+import bisect
+import io
+import re
+import tokenize
+
+from django.conf import settings
+
+DEFAULT_STATIC_ANALYSIS_SETTINGS = {
+    'ENABLED': True,
+    # Answer submissions with syntax errors locally instead of calling the LLM
+    'ANSWER_SYNTAX_ERRORS': True,
+}
+
+# Python syntax errors are "repaired" and recompiled up to this many times so
+# several mistakes can be reported in one pass
+MAX_PYTHON_PASSES = 20
+
+BRACKET_PAIRS = {')': '(', ']': '[', '}': '{'}
+OPENING_BRACKETS = {opening: closing for closing, opening in BRACKET_PAIRS.items()}
+
+# Languages _scan_brackets can tokenize; others get no local issues
+SCANNED_LANGUAGES = ('javascript', 'java', 'cpp', 'csharp')
+
+# Multi-line literals, matched at the start of a string:
+# Java text blocks, C# raw / verbatim strings, C++ raw strings
+JAVA_TEXT_BLOCK = re.compile(r'"""[ \t\f]*\n')
+CSHARP_RAW_STRING = re.compile(r'\$*("{3,})')
+CSHARP_VERBATIM_STRING = re.compile(r'(?:\$@|@\$?)"')
+CPP_RAW_STRING = re.compile(r'(?:u8|[uUL])?R"([^\s()\\]{0,16})\(')
+
+# Concept -> explanation templates shared by every language
+CONCEPTS = {
+    'Missing Colon': {
+        'title': 'Missing colon',
+        'cause': 'Statements that open a block (def, class, if, elif, else, for, while, try, except, finally, with) must end with a colon.',
+        'fix': 'Add a colon (:) at the end of the line that opens the block.',
+        'hints': {
+            'level1': 'Look at how this line opens a new block of code.',
+            'level2': 'Lines that start a block in Python need a specific punctuation mark at the end.',
+            'level3': 'Add a colon (:) at the end of line {line}.',
+        },
+    },
+    'Indentation': {
+        'title': 'Indentation error',
+        'cause': 'Python uses indentation to decide which statements belong to a block, so every line of a block must be indented consistently.',
+        'fix': 'Indent the block body with 4 spaces and keep lines of the same block at the same level.',
+        'hints': {
+            'level1': 'Check how far this line is indented compared with the lines around it.',
+            'level2': 'The body of a block must be indented more than the line that opens it, and consistently.',
+            'level3': 'Fix the indentation of line {line} so it matches the block it belongs to (4 spaces per level).',
+        },
+    },
+    'Unbalanced Brackets': {
+        'title': 'Unbalanced brackets',
+        'cause': 'Every opening bracket ( [ { needs a matching closing bracket of the same kind, in the right order.',
+        'fix': 'Add the missing bracket or remove the extra one so every bracket has a partner.',
+        'hints': {
+            'level1': 'Count the opening and closing brackets on and around this line.',
+            'level2': 'One of the brackets near line {line} has no matching partner.',
+            'level3': '{detail}',
+        },
+    },
+    'Unterminated String': {
+        'title': 'Unterminated string',
+        'cause': 'A string literal was opened with a quote but never closed on the same line.',
+        'fix': 'Close the string with the same kind of quote it was opened with.',
+        'hints': {
+            'level1': 'Look at the quotes on this line.',
+            'level2': 'A string starts on line {line} but does not end.',
+            'level3': 'Add the closing quote at the end of the string on line {line}.',
+        },
+    },
+    'Syntax Error': {
+        'title': 'Syntax error',
+        'cause': 'The code does not follow the grammar of the language, so it cannot be run.',
+        'fix': 'Rewrite the line so it follows the language syntax.',
+        'hints': {
+            'level1': 'Read line {line} carefully, token by token.',
+            'level2': 'The interpreter reported: {detail}',
+            'level3': 'Fix the construct reported as "{detail}" on line {line}.',
+        },
+    },
+}
+
+
+class LocalAnalysis:
+    """
+    Result of the local pass.
+
+    issues / concept_map follow the LLM analysis schema. syntax_verified is
+    True when the code is known to parse (Python only), which lets the LLM
+    prompt skip syntax checking. corrected_code holds the repaired source
+    when every reported problem could be fixed mechanically.
+    """
+
+    def __init__(self, language, issues, syntax_verified=False, corrected_code='', suggestions=None):
+        self.language = language
+        self.issues = issues
+        self.syntax_verified = syntax_verified
+        self.corrected_code = corrected_code
+        self.suggestions = suggestions
+
+    @property
+    def has_errors(self):
+        return bool(self.issues)
+
+    def as_analysis_json(self):
+        """
+        Full analysis payload in the same shape the LLM is asked to return
+        """
+        concept_map = {}
+        for issue in self.issues:
+            group = concept_map.setdefault(issue['category'], {})
+            entry = group.setdefault(issue['concept'], {'concept': issue['concept'], 'count': 0, 'issues': []})
+            entry['count'] += 1
+            entry['issues'].append(issue['id'])
+
+        return {
+            'analysis_summary': {
+                'total_errors': len(self.issues),
+                'total_warnings': 0,
+                'overall_severity': 'high' if self.issues else 'low',
+                'language': self.language,
+                'concepts_covered': sorted({issue['concept'] for issue in self.issues}),
+            },
+            'concept_map': {category: list(group.values()) for category, group in concept_map.items()},
+            'issues': self.issues,
+            'correction_strategies': [],
+            'corrected_code': self.corrected_code,
+            'suggestions': self.suggestions if self.suggestions is not None else [
+                'Fix the syntax errors above, then analyze again for a full review of logic, style and performance.'
+            ] if self.issues else [],
+            'best_practices': [],
+        }
+
+
+def get_static_analysis_settings():
+    config = dict(DEFAULT_STATIC_ANALYSIS_SETTINGS)
+    config.update(getattr(settings, 'STATIC_ANALYSIS', {}))
+    return config
+
+
+def analyze_locally(code, language):
+    """
+    Run the local pre-analysis for a submission
+    """
+    language = language.lower()
+    if language == 'python':
+        return _analyze_python(code)
+    if language not in SCANNED_LANGUAGES:
+        return LocalAnalysis(language, [])
+    issues = _scan_brackets(code, language)
+    return LocalAnalysis(language, _number(issues))
+
+
+def _make_issue(concept, line, column, code_line, detail=''):
+    info = CONCEPTS[concept]
+    fields = {'line': line, 'detail': detail}
+    return {
+        'type': 'error',
+        'category': 'syntax',
+        'concept': concept,
+        'title': info['title'],
+        'description': detail or info['title'],
+        'cause': info['cause'],
+        'fix': info['fix'],
+        'line': line,
+        'column': column,
+        'code_snippet': code_line.strip(),
+        'severity': 'high',
+        'hints': {level: text.format(**fields) for level, text in info['hints'].items()},
+    }
+
+
+def _number(issues):
+    for index, issue in enumerate(issues, start=1):
+        issue['id'] = index
+    return issues
+
+
+# Python
+
+def _classify_python_error(error):
+    message = error.msg.lower()
+    if isinstance(error, IndentationError) or 'indent' in message:
+        return 'Indentation'
+    if "expected ':'" in message:
+        return 'Missing Colon'
+    if 'unterminated string' in message or 'eol while scanning' in message or 'unterminated triple-quoted' in message:
+        return 'Unterminated String'
+    if 'never closed' in message or 'unmatched' in message or 'does not match opening' in message:
+        return 'Unbalanced Brackets'
+    return 'Syntax Error'
+
+
+def _repair_python_line(concept, error, lines):
+    """
+    Apply a mechanical fix for the error so compilation can continue.
+    Returns False when the error can't be repaired safely.
+    """
+    index = (error.lineno or 0) - 1
+    if not 0 <= index < len(lines):
+        return False
+    line = lines[index]
+    message = error.msg.lower()
+
+    if concept == 'Missing Colon':
+        lines[index] = re.sub(r'\s*(#.*)?$', lambda m: ':' + (' ' + m.group(1) if m.group(1) else ''), line, count=1)
+        return lines[index] != line
+    if concept == 'Indentation':
+        previous = next((lines[i] for i in range(index - 1, -1, -1) if lines[i].strip()), '')
+        previous_indent = len(previous) - len(previous.lstrip())
+        if 'expected an indented block' in message:
+            lines[index] = ' ' * (previous_indent + 4) + line.lstrip()
+        elif 'unexpected indent' in message:
+            lines[index] = ' ' * previous_indent + line.lstrip()
+        elif 'unindent does not match' in message:
+            indents = sorted({len(l) - len(l.lstrip()) for l in lines[:index] if l.strip()})
+            current = len(line) - len(line.lstrip())
+            lines[index] = ' ' * max([i for i in indents if i <= current] or [0]) + line.lstrip()
+        else:
+            return False
+        return lines[index] != line
+    return False
+
+
+def _analyze_python(code):
+    source = code.replace('\r\n', '\n').expandtabs(4)
+    lines = source.split('\n')
+    issues = []
+    repaired = True
+
+    for _ in range(MAX_PYTHON_PASSES):
+        try:
+            compile('\n'.join(lines), '<submission>', 'exec')
+            break
+        except SyntaxError as error:
+            concept = _classify_python_error(error)
+            line_number = error.lineno or 1
+            original_line = source.split('\n')[line_number - 1] if line_number <= len(source.split('\n')) else ''
+            issues.append(_make_issue(concept, line_number, error.offset, original_line, error.msg))
+            if not _repair_python_line(concept, error, lines):
+                repaired = False
+                break
+        except (ValueError, OverflowError) as error:
+            # e.g. null bytes in the source
+            issues.append(_make_issue('Syntax Error', 1, None, '', str(error)))
+            repaired = False
+            break
+    else:
+        repaired = False
+
+    if not issues:
+        return LocalAnalysis('python', [], syntax_verified=True)
+
+    if not repaired:
+        # Report any bracket problems tokenize can see beyond the first error.
+        # A generic syntax error after an unbalanced bracket is usually just
+        # a consequence of it, so it is dropped.
+        bracket_issues = _python_bracket_issues(source)
+        if bracket_issues:
+            first_bracket_line = min(issue['line'] for issue in bracket_issues)
+            issues = [
+                issue for issue in issues
+                if issue['concept'] not in ('Syntax Error', 'Unbalanced Brackets') or issue['line'] < first_bracket_line
+            ]
+            issues.extend(bracket_issues)
+
+    issues.sort(key=lambda issue: (issue['line'] or 0, issue['column'] or 0))
+    corrected_code = '\n'.join(lines) if repaired else ''
+    return LocalAnalysis('python', _number(issues), corrected_code=corrected_code)
+
+
+def _python_bracket_issues(source):
+    """
+    Use tokenize to find every unbalanced bracket, not just the first
+    """
+    source_lines = source.split('\n')
+    stack = []
+    issues = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type != tokenize.OP:
+                continue
+            line, column = token.start
+            if token.string in OPENING_BRACKETS:
+                stack.append((token.string, line, column + 1))
+            elif token.string in BRACKET_PAIRS:
+                _close_bracket(token.string, line, column + 1, stack, issues, source_lines)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    for bracket, line, column in stack:
+        issues.append(_bracket_issue(bracket, line, column, source_lines))
+    return issues
+
+
+def _close_bracket(bracket, line, column, stack, issues, source_lines):
+    """
+    Match a closing bracket against the stack of (bracket, line, column)
+    openers. Openers skipped over by the match are reported as unclosed.
+    """
+    opening = BRACKET_PAIRS[bracket]
+    match = next((i for i in range(len(stack) - 1, -1, -1) if stack[i][0] == opening), None)
+    if match is None:
+        issues.append(_bracket_issue(bracket, line, column, source_lines, unexpected=True))
+        return
+    for unclosed, unclosed_line, unclosed_column in stack[match + 1:]:
+        issues.append(_bracket_issue(unclosed, unclosed_line, unclosed_column, source_lines))
+    del stack[match:]
+
+
+# Other languages
+
+def _bracket_issue(bracket, line, column, source_lines, unexpected=False):
+    code_line = source_lines[line - 1] if 0 < line <= len(source_lines) else ''
+    if unexpected:
+        detail = f"Unexpected closing '{bracket}' on line {line} has no matching '{BRACKET_PAIRS[bracket]}'."
+    else:
+        detail = f"'{bracket}' opened on line {line} is never closed; add a matching '{OPENING_BRACKETS[bracket]}'."
+    return _make_issue('Unbalanced Brackets', line, column, code_line, detail)
+
+
+def _scan_brackets(code, language):
+    """
+    Scan C-family / JavaScript source for unbalanced brackets and
+    unterminated strings, skipping comments and string contents
+    """
+    source = code.replace('\r\n', '\n')
+    source_lines = source.split('\n')
+    line_starts = [0]
+    for line_text in source_lines[:-1]:
+        line_starts.append(line_starts[-1] + len(line_text) + 1)
+
+    def position(offset):
+        line = bisect.bisect_right(line_starts, offset)
+        return line, offset - line_starts[line - 1] + 1
+
+    quotes = '"\'`' if language == 'javascript' else '"\''
+    stack = []
+    issues = []
+    index = 0
+    length = len(source)
+
+    while index < length:
+        char = source[index]
+        following = source[index + 1] if index + 1 < length else ''
+
+        if char == '/' and following == '/':
+            # Line comment
+            end = source.find('\n', index)
+            index = length if end == -1 else end
+            continue
+        if char == '/' and following == '*':
+            # Block comment
+            end = source.find('*/', index + 2)
+            index = length if end == -1 else end + 2
+            continue
+        literal = _match_literal(source, index, language)
+        if literal is not None:
+            start = index
+            opener, index, closed = literal
+            if not closed:
+                line, column = position(start)
+                issues.append(_make_issue(
+                    'Unterminated String', line, column, source_lines[line - 1],
+                    f'String starting with {opener} on line {line} is never closed.'
+                ))
+            continue
+        if char in quotes:
+            start = index
+            index += 1
+            closed = False
+            while index < length:
+                current = source[index]
+                if current == '\\':
+                    index += 2
+                    continue
+                if current == char:
+                    closed = True
+                    break
+                if current == '\n' and char != '`':
+                    break
+                index += 1
+            if not closed:
+                line, column = position(start)
+                issues.append(_make_issue(
+                    'Unterminated String', line, column, source_lines[line - 1],
+                    f'String starting with {char} on line {line} is never closed.'
+                ))
+            index += 1
+            continue
+        if char == '/' and language == 'javascript' and _starts_regex(source, index):
+            index = _skip_regex(source, index)
+            continue
+        if char in OPENING_BRACKETS:
+            stack.append((char, *position(index)))
+        elif char in BRACKET_PAIRS:
+            _close_bracket(char, *position(index), stack, issues, source_lines)
+        index += 1
+
+    for bracket, line, column in stack:
+        issues.append(_bracket_issue(bracket, line, column, source_lines))
+
+    issues.sort(key=lambda issue: (issue['line'], issue['column'] or 0))
+    return issues
+
+
+def _match_literal(source, index, language):
+    """
+    Match a literal that doesn't follow the one-line quoting rules: a Java
+    text block, a C# raw or verbatim string, a C++ raw string or a C++ digit
+    separator. Returns (opener, end offset, closed) or None.
+    """
+    char = source[index]
+    if char not in '"\'$@uULR':
+        return None
+    if index and (source[index - 1].isalnum() or source[index - 1] == '_') and char != "'":
+        return None
+    if language == 'java':
+        match = JAVA_TEXT_BLOCK.match(source, index)
+        if match:
+            return _find_closer(source, match.end(), '"""', '"""', escapes=True)
+    elif language == 'csharp':
+        match = CSHARP_RAW_STRING.match(source, index)
+        if match:
+            quotes = match.group(1)
+            return _find_closer(source, match.end(), match.group(), quotes, escapes=False)
+        match = CSHARP_VERBATIM_STRING.match(source, index)
+        if match:
+            # Quotes are doubled inside; backslashes are literal
+            end = match.end()
+            while True:
+                end = source.find('"', end)
+                if end == -1:
+                    return match.group(), len(source), False
+                if source.startswith('""', end):
+                    end += 2
+                    continue
+                return match.group(), end + 1, True
+    elif language == 'cpp':
+        match = CPP_RAW_STRING.match(source, index)
+        if match:
+            return _find_closer(source, match.end(), match.group(), ')' + match.group(1) + '"', escapes=False)
+        if char == "'" and re.search(r'(?<![\w.])\d[\w.]*$', source[max(0, index - 64):index]):
+            # Digit separator, as in 1'000'000
+            return "'", index + 1, True
+    return None
+
+
+def _find_closer(source, start, opener, closer, escapes):
+    """
+    Return (opener, end offset, closed) for a literal whose body starts at
+    start and runs to the next closer
+    """
+    index = start
+    while True:
+        end = source.find(closer, index)
+        if end == -1:
+            return opener, len(source), False
+        if escapes:
+            backslashes = len(source[index:end]) - len(source[index:end].rstrip('\\'))
+            if backslashes % 2:
+                index = end + 1
+                continue
+        return opener, end + len(closer), True
+
+
+def _starts_regex(source, index):
+    """
+    A '/' starts a JavaScript regex literal when it can't be a division,
+    i.e. when the previous significant character is an operator or opener
+    """
+    previous = index - 1
+    while previous >= 0 and source[previous] in ' \t':
+        previous -= 1
+    if previous < 0:
+        return True
+    if source[previous] in '(,=:[!&|?{};+-*%<>~^\n':
+        return True
+    word = re.search(r'(\w+)$', source[:previous + 1])
+    return bool(word) and word.group(1) in ('return', 'typeof', 'case', 'in', 'of', 'delete', 'void')
+
+
+def _skip_regex(source, index):
+    """
+    Return the offset just past a regex literal starting at index
+    """
+    index += 1
+    in_class = False
+    while index < len(source) and source[index] != '\n':
+        char = source[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            return index + 1
+        index += 1
+    return index
@@ -0,0 +1,189 @@
+# streaming.py
+"""
+Incremental parsing of streamed analysis completions.
+
+The analysis prompt asks the model for a single JSON object. While the
+completion is still streaming, AnalysisStreamParser scans the text as it
+arrives and reports every value that has been fully received, so finished
+issues, concept map groups and the corrected code can be pushed to the
+browser as server-sent events long before the whole object is complete.
+"""
+import json
+
+from .transport import dumps_json
+
+
+def sse_event(event, data):
+    """
+    Format a single server-sent event
+    """
+    payload = dumps_json(data)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+class _Frame:
+    """
+    An open JSON container on the parser stack
+    """
+    __slots__ = ('kind', 'start', 'key', 'index', 'expect_key', 'awaiting_value')
+
+    def __init__(self, kind, start):
+        self.kind = kind          # '{' or '['
+        self.start = start        # buffer offset of the opening bracket
+        self.key = None           # current key (objects)
+        self.index = -1           # current element index (arrays)
+        self.expect_key = kind == '{'
+        self.awaiting_value = kind == '['
+
+    def child_name(self):
+        return self.key if self.kind == '{' else self.index
+
+
+class IncrementalJSONParser:
+    """
+    Character level scanner that tracks the JSON path of the text received
+    so far and reports each completed container or string value.
+
+    feed() returns a list of (path, value) tuples, where path is a tuple of
+    object keys and array indices starting below the root object.
+    """
+
+    def __init__(self, wanted=None):
+        # wanted(path) -> bool decides which completed values get decoded
+        self.wanted = wanted or (lambda path: True)
+        self.buffer = ''
+        self.pos = 0
+        self.stack = []
+        self.started = False
+        self.finished = False
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.string_is_key = False
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+
+        while self.pos < len(buffer) and not self.finished:
+            char = buffer[self.pos]
+
+            if not self.started:
+                # Skip any prose or markdown fence before the root object
+                if char == '{':
+                    self.started = True
+                    self.stack.append(_Frame('{', self.pos))
+                self.pos += 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    self._end_string(completed)
+                self.pos += 1
+                continue
+
+            frame = self.stack[-1]
+            if char == '"':
+                self.in_string = True
+                self.string_start = self.pos
+                self.string_is_key = frame.kind == '{' and frame.expect_key
+                if not self.string_is_key:
+                    self._begin_value(frame)
+            elif char in '{[':
+                self._begin_value(frame)
+                self.stack.append(_Frame(char, self.pos))
+            elif char in '}]':
+                self._end_container(completed)
+            elif char == ',':
+                if frame.kind == '{':
+                    frame.expect_key = True
+                else:
+                    frame.awaiting_value = True
+            elif char == ':':
+                frame.expect_key = False
+            elif not char.isspace():
+                # Start of a number or literal
+                self._begin_value(frame)
+            self.pos += 1
+
+        return completed
+
+    def _begin_value(self, frame):
+        if frame.kind == '[' and frame.awaiting_value:
+            frame.index += 1
+            frame.awaiting_value = False
+
+    def _path(self):
+        return tuple(frame.child_name() for frame in self.stack)
+
+    def _end_string(self, completed):
+        raw = self.buffer[self.string_start:self.pos + 1]
+        frame = self.stack[-1]
+        if self.string_is_key:
+            try:
+                frame.key = json.loads(raw)
+            except json.JSONDecodeError:
+                frame.key = raw.strip('"')
+            return
+        path = self._path()
+        if self.wanted(path):
+            try:
+                completed.append((path, json.loads(raw)))
+            except json.JSONDecodeError:
+                pass
+
+    def _end_container(self, completed):
+        frame = self.stack.pop()
+        if not self.stack:
+            self.finished = True
+            return
+        path = self._path()
+        if self.wanted(path):
+            raw = self.buffer[frame.start:self.pos + 1]
+            try:
+                completed.append((path, json.loads(raw)))
+            except json.JSONDecodeError:
+                pass
+
+
+def _wanted_analysis_path(path):
+    if len(path) == 1:
+        return path[0] in ('analysis_summary', 'corrected_code')
+    if len(path) == 2:
+        return path[0] in ('issues', 'concept_map')
+    return False
+
+
+class AnalysisStreamParser:
+    """
+    Turns streamed analysis text into (event, raw value) pairs:
+
+    - ("summary", dict) for analysis_summary
+    - ("issue", dict) for each element of issues[]
+    - ("concept_group", (category, list)) for each concept_map category
+    - ("corrected_code", str) once the corrected code string is complete
+    """
+
+    def __init__(self):
+        self._parser = IncrementalJSONParser(wanted=_wanted_analysis_path)
+        self.text = ''
+
+    def feed(self, text):
+        self.text += text
+        events = []
+        for path, value in self._parser.feed(text):
+            if path == ('analysis_summary',) and isinstance(value, dict):
+                events.append(('summary', value))
+            elif path == ('corrected_code',) and isinstance(value, str):
+                events.append(('corrected_code', value))
+            elif path[0] == 'issues' and isinstance(value, dict):
+                events.append(('issue', value))
+            elif path[0] == 'concept_map' and isinstance(value, list):
+                events.append(('concept_group', (path[1], value)))
+        return events
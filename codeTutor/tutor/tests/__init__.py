@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from tutor.analysis_store import analysis_store
+from tutor.cache import analysis_cache
+from tutor.execution import execution_memo
+from tutor.fingerprint import near_duplicates
+
+
+def reset_analysis_state():
+    """
+    Forget the analyses the in-process caches and indexes hold, so a test
+    doesn't answer from an earlier test's results
+    """
+    analysis_cache.clear()
+    analysis_store.clear()
+    near_duplicates.clear()
+    execution_memo.clear()
+
+
+def chat_completion(content):
+    """
+    A stand-in for the ChatCompletion create_chat_completion returns
+    """
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from tutor.analysis_store import analysis_store, find_issue
+from tutor.models import Analysis, Hint, Issue
+from tutor.tests import chat_completion, reset_analysis_state
+
+RESULT = {
+    'errors': [{'id': 1, 'title': 'Missing colon', 'category': 'syntax', 'severity': 'high', 'line': 1,
+                'hints': {'level1': 'Look at the end of line 1.'}}],
+    'warnings': [{'id': 2, 'title': 'Naming', 'category': 'style', 'severity': 'low', 'line': 2, 'hints': {}}],
+}
+
+
+class AnalysisStoreTests(TestCase):
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+
+    def test_find_issue_matches_ids_as_strings(self):
+        self.assertEqual(find_issue(RESULT, '2')['title'], 'Naming')
+        self.assertIsNone(find_issue(RESULT, 3))
+
+    async def test_analyses_are_persisted_with_their_issues(self):
+        await analysis_store.asave('a1', 'if x\n    y', 'python', RESULT)
+        analysis = await Analysis.objects.aget(analysis_id='a1')
+        self.assertEqual(analysis.result, RESULT)
+        issues = [(issue.issue_id, issue.kind) async for issue in Issue.objects.order_by('issue_id')]
+        self.assertEqual(issues, [(1, 'error'), (2, 'warning')])
+
+        # Read back from the database once the memory tier forgets it
+        analysis_store.clear()
+        record = await analysis_store.aget('a1')
+        self.assertEqual((record['code'], record['result']), ('if x\n    y', RESULT))
+        self.assertIsNone(await analysis_store.aget('missing'))
+
+    async def test_generated_hints_are_recorded_on_the_issue(self):
+        await analysis_store.asave('a1', 'x', 'python', RESULT)
+        await analysis_store.aset_hint('a1', 2, 3, 'Rename it to total.')
+        analysis_store.clear()
+        record = await analysis_store.aget('a1')
+        self.assertEqual(find_issue(record['result'], 2)['hints'], {'level3': 'Rename it to total.'})
+        hint = await Hint.objects.aget()
+        self.assertEqual((hint.issue_id, hint.level, hint.source), (2, 3, 'generated'))
+
+
+class HintViewTests(TestCase):
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+
+    async def hint(self, **data):
+        return await self.async_client.post('/api/get_hint/', data, content_type='application/json')
+
+    async def test_stored_hints_are_served_without_the_llm(self):
+        await analysis_store.asave('a1', 'if x\n    y', 'python', RESULT)
+        with mock.patch('tutor.views.create_chat_completion') as create_chat_completion:
+            response = await self.hint(analysis_id='a1', issue_id=1, level=1)
+        create_chat_completion.assert_not_called()
+        self.assertEqual(response.json(), {
+            'hint': 'Look at the end of line 1.', 'level': 1, 'issue_id': 1, 'source': 'stored',
+        })
+
+    async def test_missing_hints_are_generated_once_and_stored(self):
+        await analysis_store.asave('a1', 'if x\n    y', 'python', RESULT)
+        generate = mock.AsyncMock(return_value=chat_completion('```\nAdd a colon after x.\n```'))
+        with mock.patch('tutor.views.create_chat_completion', generate):
+            generated = await self.hint(analysis_id='a1', issue_id=1, level=3)
+            stored = await self.hint(analysis_id='a1', issue_id=1, level=3)
+        self.assertEqual(generate.await_count, 1)
+        # The prompt is scoped to the stored issue
+        self.assertIn('Missing colon', generate.call_args.kwargs['messages'][1]['content'])
+        self.assertEqual((generated.json()['hint'], generated.json()['source']), ('Add a colon after x.', 'generated'))
+        self.assertEqual((stored.json()['hint'], stored.json()['source']), ('Add a colon after x.', 'stored'))
+
+    async def test_invalid_requests(self):
+        self.assertEqual((await self.hint(issue_id=1)).status_code, 400)
+        self.assertEqual((await self.hint(analysis_id='a1', issue_id=1, level=4)).status_code, 400)
+        self.assertEqual((await self.hint(analysis_id='missing', issue_id=1)).status_code, 404)
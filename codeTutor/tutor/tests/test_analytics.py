@@ -0,0 +1,126 @@
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from tutor.analytics import analysis_counts, clean_label, concept_report, date_range, rebuild, roll_up
+from tutor.models import Analysis, ConceptRollup, ExerciseRollup, Submission
+
+RESULT = {
+    'errors': [{'id': 1, 'type': 'syntax', 'severity': 'high'}],
+    'warnings': [
+        {'id': 2, 'type': 'logic', 'severity': 'medium'},
+        {'id': 3, 'type': 'style', 'severity': 'low'},
+    ],
+    'concept_map': [
+        {'category': 'Syntax', 'concept': 'Colons', 'count': 1, 'issues': [1]},
+        {'category': 'Logic', 'concept': 'Loops', 'count': 1, 'issues': ['2']},
+        {'category': 'Style', 'concept': 'Naming', 'count': 2, 'issues': []},
+    ],
+}
+
+CLEAN = {'errors': [], 'warnings': [], 'concept_map': []}
+
+DAY = timezone.make_aware(datetime(2026, 3, 10, 12, 0))
+
+
+class AnalysisCountsTests(SimpleTestCase):
+    def test_issues_count_under_the_concepts_that_link_them(self):
+        counts, issues, has_errors = analysis_counts(RESULT)
+        self.assertEqual(counts, {
+            ('Colons', 'Syntax', 'high'): 1,
+            ('Loops', 'Logic', 'medium'): 1,
+            # A concept without linked issues counts its own count
+            ('Naming', 'Style', ''): 2,
+            # An issue no concept links to counts under a blank concept
+            ('', 'style', 'low'): 1,
+        })
+        self.assertEqual((issues, has_errors), (3, True))
+
+    def test_labels_and_date_ranges_are_validated(self):
+        self.assertEqual(clean_label('  cs101 ', 'classroom'), 'cs101')
+        self.assertEqual(clean_label(None, 'classroom'), '')
+        for value in (5, 'x' * 65):
+            with self.assertRaises(ValueError):
+                clean_label(value, 'classroom')
+        self.assertEqual(date_range('2026-03-01', '2026-03-10'), (date(2026, 3, 1), date(2026, 3, 10)))
+        for start, end in (('2026-03-10', '2026-03-01'), ('March', None), ('2024-01-01', '2026-01-01')):
+            with self.assertRaises(ValueError):
+                date_range(start, end)
+
+
+class RollupTests(TestCase):
+    def test_submissions_are_rolled_up_per_day(self):
+        self.assertTrue(roll_up([
+            ('cs101', 'loops', DAY, RESULT),
+            ('cs101', 'loops', DAY, RESULT),
+            ('cs101', 'loops', DAY, CLEAN),
+            ('cs101', 'lists', DAY + timedelta(days=1), RESULT),
+        ]))
+        loops = ExerciseRollup.objects.get(classroom='cs101', exercise='loops')
+        self.assertEqual((loops.submissions, loops.submissions_with_errors, loops.issues), (3, 2, 6))
+        self.assertEqual(ConceptRollup.objects.get(exercise='loops', concept='Colons').count, 2)
+
+        # Later batches add to the same rows
+        roll_up([('cs101', 'loops', DAY, RESULT)])
+        self.assertEqual(ExerciseRollup.objects.get(classroom='cs101', exercise='loops').submissions, 4)
+        self.assertEqual(ConceptRollup.objects.get(exercise='loops', concept='Colons').count, 3)
+
+    def test_report_ranks_concepts_over_the_range(self):
+        roll_up([
+            ('cs101', 'loops', DAY, RESULT),
+            ('cs101', 'lists', DAY + timedelta(days=1), RESULT),
+            ('cs101', 'lists', DAY + timedelta(days=40), RESULT),
+            ('cs102', 'loops', DAY, RESULT),
+        ])
+        report = concept_report('cs101', None, date(2026, 3, 1), date(2026, 3, 31))
+        self.assertEqual((report['submissions'], report['submissions_with_errors'], report['issues']), (2, 2, 6))
+        self.assertEqual([day['day'] for day in report['days']], ['2026-03-10', '2026-03-11'])
+        naming = report['concepts'][0]
+        self.assertEqual((naming['concept'], naming['count'], naming['rate']), ('Naming', 4, 2.0))
+        colons = next(entry for entry in report['concepts'] if entry['concept'] == 'Colons')
+        self.assertEqual(colons['severity'], {'high': 2})
+
+        one_exercise = concept_report('cs101', 'lists', date(2026, 3, 1), date(2026, 3, 31))
+        self.assertEqual(one_exercise['submissions'], 1)
+
+    def test_rebuild_recomputes_from_stored_submissions(self):
+        Analysis.objects.create(analysis_id='a1', code='x', language='python', result=RESULT)
+        for analysis_id in ('a1', 'a1', 'missing'):
+            Submission.objects.create(
+                code_hash='h', code='x', language='python', analysis_id=analysis_id,
+                classroom='cs101', exercise='loops', created_at=DAY,
+            )
+        ExerciseRollup.objects.create(classroom='cs101', exercise='loops', day=DAY.date(), submissions=99)
+
+        self.assertEqual(rebuild(), 2)
+        rollup = ExerciseRollup.objects.get()
+        self.assertEqual((rollup.submissions, rollup.issues), (2, 6))
+        self.assertEqual(Submission.objects.filter(rolled_up=True).count(), 2)
+
+
+@override_settings(MONITORING={'TOKEN': 's3cret'})
+class ConceptAnalyticsViewTests(TestCase):
+    def get(self, params, token='s3cret'):
+        return self.client.get('/api/analytics/concepts/', params, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_report_endpoint(self):
+        roll_up([('cs101', 'loops', DAY, RESULT)])
+        response = self.get({'classroom': 'cs101', 'exercise': 'loops', 'from': '2026-03-01', 'to': '2026-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['submissions'], 1)
+
+    def test_only_monitoring_clients_see_reports(self):
+        self.assertEqual(self.get({'classroom': 'cs101'}, token='wrong').status_code, 404)
+        self.assertEqual(self.client.get('/api/analytics/concepts/', {'classroom': 'cs101'}).status_code, 404)
+        user = get_user_model().objects.create_user('teacher', password='x', is_staff=True)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/analytics/concepts/', {'classroom': 'cs101'}).status_code, 200)
+
+    def test_invalid_ranges_are_rejected(self):
+        self.assertEqual(self.get({'classroom': 'cs101', 'from': 'yesterday'}).status_code, 400)
+
+    @override_settings(ANALYTICS={'ENABLED': False})
+    def test_disabled_analytics(self):
+        self.assertEqual(self.get({'classroom': 'cs101'}).status_code, 404)
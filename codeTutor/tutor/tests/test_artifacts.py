@@ -0,0 +1,95 @@
+import json
+from unittest import mock
+
+from django.test import TestCase
+
+from tutor.analysis_store import analysis_store, find_issue
+from tutor.tests import chat_completion, reset_analysis_state
+
+CODE = 'def average(values):\n    return sum(values) / len(value)'
+
+RESULT = {
+    'errors': [{'id': 1, 'title': 'Undefined name', 'category': 'logic', 'severity': 'high', 'line': 2,
+                'description': 'value is not defined.'}],
+    'warnings': [],
+    'correction_strategies': [],
+    'corrected_code': '',
+    'depth': 'standard',
+}
+
+STRATEGY = {'name': 'Fix the name', 'description': 'Use values.', 'code': 'len(values)', 'pros': ['Simple'],
+            'cons': [], 'applicable_to_issues': [1]}
+
+
+class LazyArtifactTests(TestCase):
+    """
+    Correction strategies and corrected code of analyses made below the
+    deep depth, generated on first request and stored with the analysis
+    """
+
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+        patcher = mock.patch('tutor.views.acheck_corrected_code', mock.AsyncMock(return_value=None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def post(self, path, **data):
+        return (await self.async_client.post(path, data, content_type='application/json')).json()
+
+    async def test_corrected_code_is_generated_once(self):
+        await analysis_store.asave('a1', CODE, 'python', json.loads(json.dumps(RESULT)))
+        corrected = 'def average(values):\n    return sum(values) / len(values)'
+        generate = mock.AsyncMock(return_value=chat_completion(f'```python\n{corrected}\n```'))
+        with mock.patch('tutor.views.create_chat_completion', generate):
+            generated = await self.post('/api/corrected-code/', analysis_id='a1')
+            # Read back from the database too
+            analysis_store.clear()
+            stored = await self.post('/api/corrected-code/', analysis_id='a1')
+        self.assertEqual(generate.await_count, 1)
+        self.assertIn('Undefined name', generate.call_args.kwargs['messages'][1]['content'])
+        self.assertEqual(generated, {'corrected_code': corrected, 'check': None, 'source': 'generated'})
+        self.assertEqual(stored, {'corrected_code': corrected, 'check': None, 'source': 'stored'})
+
+    async def test_strategies_are_stored_per_issue_and_for_the_whole_analysis(self):
+        await analysis_store.asave('a1', CODE, 'python', json.loads(json.dumps(RESULT)))
+        generate = mock.AsyncMock(return_value=chat_completion(json.dumps({'strategies': [STRATEGY]})))
+        with mock.patch('tutor.views.create_chat_completion', generate):
+            for _ in range(2):
+                issue = await self.post('/api/correction-strategy/', analysis_id='a1', issue_id=1)
+                whole = await self.post('/api/correction-strategy/', analysis_id='a1')
+        self.assertEqual(generate.await_count, 2)
+        self.assertEqual((issue['strategies'], issue['source']), ([STRATEGY], 'stored'))
+        self.assertEqual((whole['strategies'], whole['source']), ([STRATEGY], 'stored'))
+        record = await analysis_store.aget('a1')
+        self.assertEqual(find_issue(record['result'], 1)['correction_strategies'], [STRATEGY])
+        self.assertEqual(record['result']['correction_strategies'], [STRATEGY])
+
+    async def test_partial_strategies_are_not_stored(self):
+        await analysis_store.asave('a1', CODE, 'python', json.loads(json.dumps(RESULT)))
+        text = json.dumps({'strategies': [STRATEGY, STRATEGY]})
+        truncated = chat_completion(text[:text.rindex('"name"')])
+        with mock.patch('tutor.views.create_chat_completion', mock.AsyncMock(return_value=truncated)):
+            response = await self.post('/api/correction-strategy/', analysis_id='a1')
+        self.assertEqual((response['strategies'], response['partial']), ([STRATEGY], True))
+        self.assertEqual((await analysis_store.aget('a1'))['result']['correction_strategies'], [])
+
+    async def test_analyses_without_issues_need_no_call(self):
+        await analysis_store.asave('a1', CODE, 'python', {**RESULT, 'errors': []})
+        with mock.patch('tutor.views.create_chat_completion') as create_chat_completion:
+            corrected = await self.post('/api/corrected-code/', analysis_id='a1')
+            strategies = await self.post('/api/correction-strategy/', analysis_id='a1')
+        create_chat_completion.assert_not_called()
+        self.assertEqual(corrected, {'corrected_code': CODE, 'source': 'stored'})
+        self.assertEqual(strategies, {'strategies': [], 'source': 'stored'})
+
+    async def test_unknown_analyses_and_issues(self):
+        await analysis_store.asave('a1', CODE, 'python', json.loads(json.dumps(RESULT)))
+        for path, data in (
+            ('/api/corrected-code/', {'analysis_id': 'missing'}),
+            ('/api/correction-strategy/', {'analysis_id': 'missing'}),
+            ('/api/correction-strategy/', {'analysis_id': 'a1', 'issue_id': 9}),
+        ):
+            with self.subTest(path=path, data=data):
+                response = await self.async_client.post(path, data, content_type='application/json')
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,196 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+
+from tutor.batch import BatchItem, get_batch_settings, iter_archive, open_output, read_progress, run_batch, submission_id
+from tutor.tests import chat_completion, reset_analysis_state
+
+ANALYSIS = {
+    'analysis_summary': {'total_errors': 0, 'total_warnings': 1, 'overall_severity': 'low'},
+    'concept_map': {'Style': [{'concept': 'Naming', 'count': 1, 'issues': [1]}]},
+    'issues': [{'id': 1, 'type': 'warning', 'title': 'Vague name', 'line': 1, 'severity': 'low'}],
+    'corrected_code': '',
+}
+
+
+def zip_archive(files):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zipped:
+        for name, data in files.items():
+            zipped.writestr(name, data)
+    archive.seek(0)
+    return archive
+
+
+def tar_archive(files):
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tarred:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tarred.addfile(info, io.BytesIO(data))
+    archive.seek(0)
+    return archive
+
+
+class ArchiveTests(SimpleTestCase):
+    files = {
+        'alice/main.py': b'print(1)\n',
+        'bob/Main.java': b'class Main {}\n',
+        'bob/README.md': b'# notes',
+        'carol/.hidden.py': b'x = 1',
+        '__MACOSX/alice/main.py': b'junk',
+        'dave/empty.py': b'  \n',
+        'erin/latin1.py': 'print("caf\xe9")'.encode('latin-1'),
+    }
+
+    def test_source_files_are_read_from_zip_and_tar_archives(self):
+        for archive in (zip_archive(self.files), tar_archive(self.files)):
+            with self.subTest(archive=archive):
+                items = sorted(iter_archive(archive))
+                self.assertEqual(items, [
+                    BatchItem('alice/main.py', 'print(1)\n', 'python', None),
+                    BatchItem('bob/Main.java', 'class Main {}\n', 'java', None),
+                    BatchItem('dave/empty.py', None, 'python', 'Empty file'),
+                    BatchItem('erin/latin1.py', None, 'python', 'Not UTF-8 text'),
+                ])
+
+    def test_default_language_covers_unknown_extensions(self):
+        items = list(iter_archive(zip_archive({'notes.txt': b'x = 1'}), default_language='python'))
+        self.assertEqual(items, [BatchItem('notes.txt', 'x = 1', 'python', None)])
+
+    def test_limits(self):
+        config = {**get_batch_settings(), 'MAX_FILES': 1, 'MAX_FILE_BYTES': 4}
+        items = list(iter_archive(zip_archive({'a.py': b'x = 1', 'b.py': b'y', 'c.py': b'z'}), config=config))
+        self.assertEqual(items, [
+            BatchItem('a.py', None, 'python', 'Larger than 4 bytes'),
+            BatchItem('b.py', None, 'python', 'More than 1 files'),
+        ])
+
+    def test_other_files_are_refused(self):
+        with self.assertRaises(ValueError):
+            iter_archive(io.BytesIO(b'not an archive'))
+
+
+class ProgressTests(SimpleTestCase):
+    def test_interrupted_output_is_resumed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.jsonl')
+            self.assertEqual(read_progress(path), {})
+            with open(path, 'w', encoding='utf-8') as output:
+                output.write('{"name": "a.py", "status": "done", "submission_id": "s1"}\n')
+                output.write('{"name": "b.py", "status": "skipped"}\n')
+                output.write('{"name": "c.py", "status": "done", "submission_id": "s3"}\n')
+                output.write('{"name": "c.py", "status": "failed"}\n')
+                output.write('{"name": "d.py", "sta')
+            self.assertEqual(read_progress(path), {'a.py': 's1', 'b.py': None})
+
+            # The cut-off line doesn't swallow the next entry
+            with open_output(path) as output:
+                output.write('{"name": "d.py", "status": "done", "submission_id": "s4"}\n')
+            self.assertEqual(read_progress(path)['d.py'], 's4')
+
+            with open_output(path, resume=False):
+                pass
+            self.assertEqual(read_progress(path), {})
+
+
+class RunBatchTests(TestCase):
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+        self.generate = mock.AsyncMock(return_value=chat_completion(json.dumps(ANALYSIS)))
+        patcher = mock.patch('tutor.views.create_chat_completion', self.generate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def run_items(self, items, **kwargs):
+        entries = []
+
+        async def emit(entry):
+            entries.append(entry)
+
+        counters = await run_batch(items, emit, **kwargs)
+        return sorted(entries, key=lambda entry: entry['name']), counters
+
+    async def test_copies_are_analyzed_once(self):
+        code = 'data = [1, 2]\nprint(data)'
+        entries, counters = await self.run_items([
+            BatchItem('a.py', code, 'python', None),
+            BatchItem('b.py', code + '\n', 'python', None),
+            BatchItem('c.py', None, 'python', 'Empty file'),
+        ], concurrency=2)
+        self.assertEqual(self.generate.await_count, 1)
+        first, copy, skipped = entries
+        self.assertEqual((first['status'], first['source']), ('done', 'llm'))
+        self.assertEqual((copy['duplicate_of'], copy['source']), ('a.py', 'duplicate'))
+        self.assertEqual(copy['result']['analysis_id'], first['analysis_id'])
+        self.assertEqual(first['submission_id'], submission_id(code, 'python'))
+        self.assertEqual(skipped, {'name': 'c.py', 'language': 'python', 'status': 'skipped', 'error': 'Empty file'})
+        self.assertEqual(counters, {'files': 3, 'done': 2, 'failed': 0, 'skipped': 1, 'duplicates': 1,
+                                    'resumed': 0, 'analyzed': 1})
+
+    async def test_completed_files_are_not_emitted_again(self):
+        code = 'total = 0\nprint(total)'
+        completed = {'a.py': submission_id(code, 'python'), 'b.py': 'an older version'}
+        entries, counters = await self.run_items([
+            BatchItem('a.py', code, 'python', None),
+            BatchItem('b.py', code, 'python', None),
+        ], completed=completed)
+        self.assertEqual([entry['name'] for entry in entries], ['b.py'])
+        self.assertEqual(entries[0]['duplicate_of'], 'a.py')
+        self.assertEqual(counters['resumed'], 1)
+
+    async def test_failures_are_reported_per_file(self):
+        self.generate.return_value = chat_completion('I cannot help with that.')
+        with self.assertLogs('tutor.views', 'WARNING'):
+            entries, counters = await self.run_items([BatchItem('a.py', 'x = 1\nprint(x)', 'python', None)])
+        self.assertEqual((entries[0]['status'], entries[0]['error_status']), ('failed', 500))
+        self.assertEqual(counters['failed'], 1)
+
+
+class AnalyzeBatchViewTests(TestCase):
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+        patcher = mock.patch('tutor.views.create_chat_completion',
+                             mock.AsyncMock(return_value=chat_completion(json.dumps(ANALYSIS))))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def lines(self, response):
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        return [json.loads(line) for line in body.splitlines()]
+
+    async def test_json_submissions(self):
+        response = await self.async_client.post('/api/analyze/batch/', {
+            'submissions': [{'name': 'alice', 'code': 'x = 1\nprint(x)'}, {'name': 'bob', 'code': ' '}],
+            'fields': 'warnings.title',
+        }, content_type='application/json')
+        lines = await self.lines(response)
+        self.assertEqual(lines[-1]['summary']['done'], 1)
+        entries = {line['name']: line for line in lines[:-1]}
+        self.assertEqual(entries['alice']['result']['warnings'], [{'title': 'Vague name'}])
+        self.assertEqual((entries['bob']['status'], entries['bob']['error']), ('skipped', 'No code provided'))
+
+    async def test_archive_upload(self):
+        upload = SimpleUploadedFile('set.zip', zip_archive({'a/main.py': b'x = 1\nprint(x)'}).read())
+        lines = await self.lines(await self.async_client.post('/api/analyze/batch/', {'archive': upload}))
+        self.assertEqual((lines[0]['name'], lines[0]['status']), ('a/main.py', 'done'))
+        self.assertEqual(lines[-1]['summary']['files'], 1)
+
+    async def test_invalid_requests(self):
+        post = self.async_client.post
+        self.assertEqual((await post('/api/analyze/batch/', 'x', content_type='application/json')).status_code, 400)
+        self.assertEqual((await post('/api/analyze/batch/', {'submissions': []},
+                                     content_type='application/json')).status_code, 400)
+        upload = SimpleUploadedFile('set.zip', b'not an archive')
+        self.assertEqual((await post('/api/analyze/batch/', {'archive': upload})).status_code, 400)
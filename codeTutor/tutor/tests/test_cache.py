@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from tutor.cache import AnalysisCache, make_cache_key, normalize_code
+from tutor.models import AnalysisCacheEntry
+
+
+def make_cache(**options):
+    return AnalysisCache({'PERSISTENT': False, **options})
+
+
+class CacheKeyTests(TestCase):
+    def test_normalization_ignores_line_endings_and_trailing_whitespace(self):
+        self.assertEqual(normalize_code('\nx = 1  \r\nif x:\r\n\ty = 2\n\n'), 'x = 1\nif x:\n\ty = 2')
+
+    def test_tabs_are_kept(self):
+        # Regression: tabs were expanded, so code that mixes tabs and spaces
+        # and strings holding tabs shared the key of different code
+        self.assertNotEqual(normalize_code("s = 'a\tb'"), normalize_code("s = 'a   b'"))
+        self.assertNotEqual(
+            make_cache_key('if x:\n\ty = 1\n        z = 2', 'python', 'm', 1),
+            make_cache_key('if x:\n        y = 1\n        z = 2', 'python', 'm', 1),
+        )
+
+    def test_key_depends_on_code_language_model_and_prompt(self):
+        key = make_cache_key('x = 1', 'python', 'model', 1)
+        self.assertEqual(key, make_cache_key('x = 1  \n', 'Python', 'model', '1'))
+        self.assertNotEqual(key, make_cache_key('x = 2', 'python', 'model', 1))
+        self.assertNotEqual(key, make_cache_key('x = 1', 'java', 'model', 1))
+        self.assertNotEqual(key, make_cache_key('x = 1', 'python', 'other', 1))
+        self.assertNotEqual(key, make_cache_key('x = 1', 'python', 'model', 2))
+
+
+class MemoryTierTests(TestCase):
+    def test_hit_returns_a_copy(self):
+        cache = make_cache()
+        cache.set('a', {'errors': [1]})
+        first = cache.get('a')
+        first['errors'].append(2)
+        self.assertEqual(cache.get('a'), {'errors': [1]})
+        self.assertEqual(cache.stats()['memory_hits'], 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = make_cache(MEMORY_MAX_ENTRIES=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_size_bound_evicts_and_skips_oversized_values(self):
+        cache = make_cache(MEMORY_MAX_BYTES=20)
+        cache.set('a', 'x' * 12)
+        cache.set('b', 'y' * 12)
+        self.assertIsNone(cache.get('a'))
+        cache.set('huge', 'z' * 50)
+        self.assertIsNone(cache.get('huge'))
+        self.assertLessEqual(cache.stats()['memory_bytes'], 20)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = make_cache(TTL=10)
+        with mock.patch('tutor.cache.time.monotonic', return_value=1000.0):
+            cache.set('a', 1)
+        with mock.patch('tutor.cache.time.monotonic', return_value=1011.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = make_cache(ENABLED=False)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+class PersistentTierTests(TestCase):
+    def test_persistent_hit_fills_the_memory_tier(self):
+        writer = AnalysisCache({'PERSISTENT': True})
+        writer.set('key', {'errors': []}, 'python')
+        self.assertTrue(AnalysisCacheEntry.objects.filter(key='key', language='python').exists())
+
+        reader = AnalysisCache({'PERSISTENT': True})
+        self.assertEqual(reader.get('key'), {'errors': []})
+        self.assertEqual(reader.get('key'), {'errors': []})
+        stats = reader.stats()
+        self.assertEqual((stats['persistent_hits'], stats['memory_hits']), (1, 1))
+
+    async def test_async_set_and_get_go_through_the_writer(self):
+        cache = AnalysisCache({'PERSISTENT': True})
+        await cache.aset('key', {'n': 1}, 'python')
+        self.assertEqual(await AnalysisCache({'PERSISTENT': True}).aget('key'), {'n': 1})
+
+    def test_prune_keeps_the_most_recently_used_entries(self):
+        cache = AnalysisCache({'PERSISTENT': True, 'PERSISTENT_MAX_ENTRIES': 2, 'PRUNE_INTERVAL': 1000})
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache._persistent_get('a')
+        cache.prune()
+        self.assertEqual(set(AnalysisCacheEntry.objects.values_list('key', flat=True)), {'a', 'c'})
+
+    def test_preload_loads_recent_entries_into_memory(self):
+        AnalysisCache({'PERSISTENT': True}).set('a', 1)
+        cache = AnalysisCache({'PERSISTENT': True})
+        self.assertEqual(cache.preload(10), 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats()['memory_hits'], 1)
@@ -0,0 +1,88 @@
+from django.test import SimpleTestCase, override_settings
+
+from tutor.chunking import Chunk, merge_chunk_analyses, plan_chunks
+
+
+def python_module(functions=6):
+    return '\n\n'.join(
+        f'def function_{index}(values):\n'
+        f'    total = 0\n'
+        f'    for value in values:\n'
+        f'        total += value * {index}\n'
+        f'    return total'
+        for index in range(functions)
+    )
+
+
+def chunk_analysis(issue_line, severity='medium', concept='Loops'):
+    return {
+        'analysis_summary': {'overall_severity': severity, 'concepts_covered': [concept]},
+        'concept_map': {'Control flow': [{'concept': concept, 'count': 1, 'issues': [1]}]},
+        'issues': [{'id': 1, 'type': 'error', 'title': 'Bug', 'line': issue_line, 'severity': severity}],
+        'correction_strategies': [{'name': 'Fix', 'applicable_to_issues': [1]}],
+        'corrected_code': 'fixed',
+        'suggestions': ['Add tests'],
+        'best_practices': [],
+    }
+
+
+class PlanChunksTests(SimpleTestCase):
+    def test_small_code_is_one_chunk(self):
+        code = python_module(2)
+        self.assertEqual(plan_chunks(code, 'python'), [Chunk(1, code.count('\n') + 1, code)])
+
+    @override_settings(ANALYSIS_CHUNKING={'MAX_CODE_TOKENS': 50, 'CHUNK_TOKENS': 60, 'MAX_CHUNKS': 8})
+    def test_large_python_code_is_split_at_top_level_definitions(self):
+        code = python_module()
+        chunks = plan_chunks(code, 'python')
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0].first_line, 1)
+        self.assertEqual(chunks[-1].last_line, code.count('\n') + 1)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(chunk.first_line, previous.last_line + 1)
+        self.assertEqual('\n'.join(chunk.text for chunk in chunks), code)
+        for chunk in chunks[1:]:
+            self.assertTrue(chunk.text.lstrip('\n').startswith('def '))
+
+    @override_settings(ANALYSIS_CHUNKING={'MAX_CODE_TOKENS': 50, 'CHUNK_TOKENS': 10, 'MAX_CHUNKS': 2})
+    def test_chunk_count_is_capped(self):
+        self.assertLessEqual(len(plan_chunks(python_module(), 'python')), 2)
+
+    @override_settings(ANALYSIS_CHUNKING={'MAX_CODE_TOKENS': 20, 'CHUNK_TOKENS': 30, 'MAX_CHUNKS': 8})
+    def test_brace_languages_are_split_at_top_level_blocks(self):
+        code = '\n'.join(
+            f'int f{index}(int x) {{\n    /* {{ }} */\n    return x * {index};\n}}' for index in range(6)
+        )
+        chunks = plan_chunks(code, 'c')
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertTrue(chunk.text.startswith('int f'))
+            self.assertTrue(chunk.text.endswith('}'))
+
+
+class MergeChunkAnalysesTests(SimpleTestCase):
+    def test_lines_are_offset_and_ids_renumbered(self):
+        merged = merge_chunk_analyses([
+            (Chunk(1, 10, 'a'), chunk_analysis(3, 'low')),
+            (Chunk(11, 20, 'b'), chunk_analysis(2, 'high')),
+        ], 'python')
+        self.assertEqual([(issue['id'], issue['line']) for issue in merged['issues']], [(1, 3), (2, 12)])
+        self.assertEqual([strategy['applicable_to_issues'] for strategy in merged['correction_strategies']],
+                         [[1], [2]])
+        self.assertEqual(merged['concept_map'], {
+            'Control flow': [{'concept': 'Loops', 'count': 2, 'issues': [1, 2]}],
+        })
+        summary = merged['analysis_summary']
+        self.assertEqual((summary['total_errors'], summary['overall_severity']), (2, 'high'))
+        self.assertEqual(summary['concepts_covered'], ['Loops'])
+        self.assertEqual(merged['suggestions'], ['Add tests'])
+        self.assertEqual(merged['corrected_code'], 'fixed\nfixed')
+
+    def test_failed_chunks_keep_their_code_and_are_reported(self):
+        merged = merge_chunk_analyses([
+            (Chunk(1, 4, 'first'), chunk_analysis(1)),
+            (Chunk(5, 9, 'second'), None),
+        ], 'python')
+        self.assertEqual(merged['corrected_code'], 'fixed\nsecond')
+        self.assertIn('Lines 5-9 could not be analyzed. Try analyzing them on their own.', merged['suggestions'])
+        self.assertEqual(len(merged['issues']), 1)
@@ -0,0 +1,103 @@
+import json
+
+from django.test import SimpleTestCase
+
+from tutor.decoding import DecodeError, decode_analysis, decode_hint, decode_strategies, repair_json
+
+ANALYSIS = {
+    'analysis_summary': {'total_errors': 1, 'total_warnings': 1, 'overall_severity': 'high'},
+    'concept_map': {'Syntax': [{'concept': 'Colons', 'count': 1, 'issues': [1]}]},
+    'issues': [
+        {'id': 1, 'type': 'error', 'title': 'Missing colon', 'line': 2, 'severity': 'high'},
+        {'id': 2, 'type': 'warning', 'title': 'Unused variable', 'line': 3, 'severity': 'low'},
+    ],
+    'corrected_code': 'if x:\n    pass',
+}
+
+
+class RepairJsonTests(SimpleTestCase):
+    def test_clean_json_is_not_repaired(self):
+        self.assertEqual(repair_json('{"a": [1, 2]}'), ({'a': [1, 2]}, False, False))
+
+    def test_prose_and_fences_around_the_object_are_ignored(self):
+        text = 'Here is the analysis:\n```json\n{"a": 1}\n```\nLet me know {if} that helps.'
+        self.assertEqual(repair_json(text), ({'a': 1}, False, False))
+
+    def test_trailing_commas_and_bad_escapes_are_fixed(self):
+        value, repaired, truncated = repair_json('{"path": "C:\\Users\\me", "items": [1, 2,],}')
+        self.assertEqual((repaired, truncated), (True, False))
+        self.assertEqual(value, {'path': 'C:\\Users\\me', 'items': [1, 2]})
+
+    def test_truncated_object_is_closed_after_its_last_complete_value(self):
+        value, repaired, truncated = repair_json('{"issues": [{"id": 1, "title": "ok"}, {"id": 2, "tit')
+        self.assertEqual((repaired, truncated), (True, True))
+        self.assertEqual(value['issues'][0], {'id': 1, 'title': 'ok'})
+
+    def test_truncated_string_is_closed(self):
+        self.assertEqual(repair_json('{"hint": "Check the loop bou'), ({'hint': 'Check the loop bou'}, True, True))
+
+    def test_text_without_an_object_raises(self):
+        with self.assertRaises(DecodeError) as raised:
+            repair_json('I cannot analyze this code.')
+        self.assertEqual(raised.exception.raw_text, 'I cannot analyze this code.')
+
+
+class DecodeAnalysisTests(SimpleTestCase):
+    def test_complete_analysis_keeps_its_counts(self):
+        decoded = decode_analysis(json.dumps(ANALYSIS), 'python')
+        self.assertFalse(decoded.partial)
+        self.assertEqual(decoded.data['analysis_summary']['language'], 'python')
+        self.assertEqual(decoded.data['issues'][0]['line'], 2)
+
+    def test_lossless_repairs_do_not_make_an_analysis_partial(self):
+        # Regression: a trailing comma or a regex escape in corrected_code
+        # marked the analysis partial, so it was never cached
+        analysis = dict(ANALYSIS, corrected_code="pattern = re.compile('\\d+')")
+        text = json.dumps(analysis).replace('\\\\d', '\\d').replace('}]}', '},]}', 1)
+        decoded = decode_analysis(text)
+        self.assertTrue(decoded.repaired)
+        self.assertFalse(decoded.partial)
+        self.assertEqual(decoded.data['corrected_code'], "pattern = re.compile('\\d+')")
+        self.assertEqual(decoded.data['analysis_summary']['total_warnings'], 1)
+
+    def test_loose_values_are_coerced_and_unusable_items_dropped(self):
+        analysis = dict(ANALYSIS, issues=[
+            {'id': '1', 'type': 'ERROR', 'title': 'Range', 'line': '12-14', 'severity': 'High'},
+            {'id': 2, 'type': 'warning'},
+            'not an issue',
+        ])
+        decoded = decode_analysis(json.dumps(analysis))
+        self.assertEqual(decoded.dropped, 2)
+        self.assertEqual(len(decoded.data['issues']), 1)
+        issue = decoded.data['issues'][0]
+        self.assertEqual((issue['id'], issue['type'], issue['line'], issue['severity']), (1, 'error', 12, 'high'))
+        # Counts are recomputed from the issues that survived
+        self.assertEqual(decoded.data['analysis_summary']['total_errors'], 1)
+        self.assertEqual(decoded.data['analysis_summary']['total_warnings'], 0)
+
+    def test_truncated_analysis_keeps_its_complete_issues(self):
+        text = json.dumps(ANALYSIS)
+        decoded = decode_analysis(text[:text.index('"Unused')])
+        self.assertTrue(decoded.partial)
+        self.assertEqual([issue['id'] for issue in decoded.data['issues']], [1])
+        self.assertEqual(decoded.data['analysis_summary']['total_errors'], 1)
+
+    def test_object_that_is_not_an_analysis_raises(self):
+        with self.assertRaises(DecodeError):
+            decode_analysis('{"message": "hello"}')
+
+
+class DecodeStrategiesTests(SimpleTestCase):
+    def test_single_strategy_is_wrapped(self):
+        decoded = decode_strategies('{"name": "Use a guard", "code": "if x: pass", "applicable_to_issues": ["1"]}')
+        self.assertEqual(decoded.data['strategies'][0]['applicable_to_issues'], [1])
+
+
+class DecodeHintTests(SimpleTestCase):
+    def test_plain_text_is_the_hint(self):
+        self.assertEqual(decode_hint('Look at line 3.').data, {'hint': 'Look at line 3.'})
+
+    def test_fences_and_json_wrappers_are_removed(self):
+        self.assertEqual(decode_hint('```\nLook at line 3.\n```').data['hint'], 'Look at line 3.')
+        self.assertEqual(decode_hint('{"level2": "Check the loop."}', level=2).data['hint'], 'Check the loop.')
+        self.assertTrue(decode_hint('```json\n{"hint": "Check the loop."}\n```').repaired)
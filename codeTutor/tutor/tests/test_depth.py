@@ -0,0 +1,81 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from tutor.cache import make_cache_key
+from tutor.depth import analysis_cache_key, covers, get_analysis_depth
+from tutor.prompts import ANALYSIS_PROMPT_VERSION, DEPTH_PROMPTS
+from tutor.tests import chat_completion, reset_analysis_state
+
+ANALYSIS = {
+    'analysis_summary': {'total_errors': 1, 'total_warnings': 0, 'overall_severity': 'high'},
+    'issues': [{'id': 1, 'type': 'error', 'category': 'logic', 'title': 'Off by one', 'line': 2, 'severity': 'high',
+                'hints': {'level1': 'Count the iterations.'}}],
+}
+
+
+class AnalysisDepthTests(SimpleTestCase):
+    def test_default_and_named_depths(self):
+        self.assertEqual(get_analysis_depth().name, 'standard')
+        quick = get_analysis_depth('Quick')
+        self.assertEqual((quick.name, quick.max_tokens, quick.prompt), ('quick', 1200, DEPTH_PROMPTS['quick']))
+        self.assertFalse(quick.eager_artifacts)
+        self.assertTrue(get_analysis_depth('deep').eager_artifacts)
+
+    @override_settings(ANALYSIS_DEPTHS={'DEFAULT': 'quick', 'QUICK_MODEL': 'small-model'})
+    def test_settings(self):
+        self.assertEqual(get_analysis_depth()[:3], ('quick', 'small-model', 1200))
+
+    def test_unknown_depths_are_refused(self):
+        with self.assertRaisesMessage(ValueError, "Unknown analysis depth 'thorough'"):
+            get_analysis_depth('thorough')
+
+    def test_depths_are_cached_separately(self):
+        keys = {analysis_cache_key('x = 1', 'python', get_analysis_depth(name)) for name in ('quick', 'standard', 'deep')}
+        self.assertEqual(len(keys), 3)
+        # The deep analysis keeps the key it had before depths existed
+        deep = get_analysis_depth('deep')
+        self.assertIn(make_cache_key('x = 1', 'python', deep.model, ANALYSIS_PROMPT_VERSION), keys)
+
+    def test_covers(self):
+        self.assertTrue(covers('deep', 'quick'))
+        self.assertTrue(covers('standard', 'standard'))
+        self.assertFalse(covers('quick', 'standard'))
+
+
+class AnalyzeDepthViewTests(TestCase):
+    code = 'for i in range(1, 4):\n    print(i)'
+
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+        self.generate = mock.AsyncMock(return_value=chat_completion(json.dumps(ANALYSIS)))
+        patcher = mock.patch('tutor.views.create_chat_completion', self.generate)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def analyze(self, **fields):
+        return await self.async_client.post(
+            '/api/analyze/', {'code': self.code, 'language': 'python', **fields}, content_type='application/json',
+        )
+
+    async def test_requests_use_the_depth_template_and_budget(self):
+        response = await self.analyze(depth='quick')
+        self.assertEqual(response.json()['depth'], 'quick')
+        kwargs = self.generate.call_args.kwargs
+        self.assertEqual((kwargs['prompt_cache_key'], kwargs['max_tokens']), ('tutor-quick-analysis-v4', 1200))
+        self.assertEqual(kwargs['messages'][0]['content'], DEPTH_PROMPTS['quick'].system)
+
+    async def test_a_shallower_analysis_does_not_answer_a_deeper_request(self):
+        self.assertEqual((await self.analyze(depth='quick'))['X-Analysis-Cache'], 'miss')
+        self.assertEqual((await self.analyze(depth='quick'))['X-Analysis-Cache'], 'hit')
+        deep = await self.analyze(depth='deep')
+        self.assertEqual(deep['X-Analysis-Cache'], 'miss')
+        self.assertEqual(deep.json()['depth'], 'deep')
+        self.assertEqual(self.generate.await_count, 2)
+
+    async def test_unknown_depth_is_a_bad_request(self):
+        response = await self.analyze(depth='thorough')
+        self.assertEqual(response.status_code, 400)
+        self.generate.assert_not_called()
@@ -0,0 +1,154 @@
+from django.test import SimpleTestCase
+
+from tutor.fingerprint import NearDuplicateIndex, fingerprint, remap_analysis
+
+BASE = '''def average_gap(values):
+    """Mean gap between neighbours"""
+    total = 0
+    for index in range(1, len(values)):
+        total += values[index] - values[index - 1]
+    return total / len(values)
+
+print(average_gap([1, 4, 9, 16]), "done")
+'''
+
+RENAMED = BASE.replace('values', 'nums').replace('total', 'acc').replace('"done"', '"ok"')
+
+RESULT = {
+    'errors': [{
+        'id': 1, 'type': 'logic', 'title': 'Off by one',
+        'description': 'Dividing total by len(values) counts one gap too many.',
+        'line': 6, 'code': 'return total / len(values)', 'severity': 'medium',
+    }],
+    'warnings': [],
+    'concept_map': [{'category': 'Logic', 'concept': 'Off-by-one errors', 'count': 1, 'issues': [1]}],
+    'corrected_code': BASE.replace('total / len(values)', 'total / (len(values) - 1)'),
+    'analysis_id': 'a1',
+}
+
+
+def indexed(code):
+    index = NearDuplicateIndex()
+    index.add('base', fingerprint(code, 'python'))
+    return index
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_names_strings_and_comments_do_not_change_the_digest(self):
+        commented = BASE.replace('    total = 0', '    total = 0  # start at zero')
+        digest = fingerprint(BASE, 'python').digest
+        self.assertEqual(fingerprint(RENAMED, 'python').digest, digest)
+        self.assertEqual(fingerprint(commented, 'python').digest, digest)
+        self.assertNotEqual(fingerprint(BASE, 'java').digest, digest)
+
+    def test_code_that_does_not_tokenize_has_no_fingerprint(self):
+        self.assertIsNone(fingerprint('def broken(:\n    """unterminated', 'python'))
+
+
+class CFamilyFingerprintTests(SimpleTestCase):
+    javascript = '''function total(items, factor) {
+  let sum = 0;
+  const parse = (text) => parseInt(text, 10);
+  for (const item of items) { sum += parse(item) * factor; }
+  return sum;
+}
+console.log(total(["1", "2"], 3));'''
+    java = '''class Counter {
+  static int count(List<Integer> values, int limit) {
+    ArrayList<Integer> kept = new ArrayList<>();
+    Map<String, Integer> seen = new HashMap<>();
+    for (int value : values) { if (value > limit) kept.add(value); }
+    return kept.size();
+  }
+}'''
+    cpp = '''int main(void) {
+  char buffer[16];
+  char *source = "hello";
+  strcpy(buffer, source);
+  return 0;
+}'''
+
+    def test_declared_names_are_renamed(self):
+        renamed = self.javascript.replace('sum', 'acc').replace('items', 'xs').replace('total', 'run')
+        self.assertEqual(fingerprint(renamed, 'javascript').digest, fingerprint(self.javascript, 'javascript').digest)
+        renamed = self.java.replace('kept', 'result').replace('values', 'numbers').replace('Counter', 'Main')
+        self.assertEqual(fingerprint(renamed, 'java').digest, fingerprint(self.java, 'java').digest)
+
+    def test_library_names_must_match(self):
+        # Regression: every undeclared name was renamable, so these shared
+        # a fingerprint and reused each other's analyses
+        for code, language, old, new in [
+            (self.javascript, 'javascript', 'parseInt', 'parseFloat'),
+            (self.java, 'java', 'ArrayList', 'LinkedList'),
+            (self.java, 'java', 'HashMap', 'TreeMap'),
+            (self.cpp, 'cpp', 'strcpy', 'strncpy'),
+        ]:
+            with self.subTest(new=new):
+                changed = fingerprint(code.replace(old, new), language)
+                self.assertNotEqual(changed.digest, fingerprint(code, language).digest)
+                index = NearDuplicateIndex()
+                index.add('base', fingerprint(code, language))
+                self.assertIsNone(index.nearest(changed))
+
+
+class NearDuplicateIndexTests(SimpleTestCase):
+    def test_renamed_copy_is_an_exact_match(self):
+        match = indexed(BASE).nearest(fingerprint(RENAMED, 'python'))
+        self.assertEqual((match.analysis_id, match.similarity), ('base', 1.0))
+
+    def test_added_arguments_are_not_reused(self):
+        index = indexed(BASE)
+        match = index.nearest(fingerprint(BASE.replace('[1, 4, 9, 16]), "done"', '[1, 4, 9, 16], "x"), "done"'),
+                                          'python'))
+        self.assertIsNone(match)
+        match = index.nearest(fingerprint(BASE.replace('print(average_gap', 'print("gap", average_gap'), 'python'))
+        self.assertIsNone(match)
+
+    def test_small_semantic_changes_are_not_reused(self):
+        # Regression: these score above the similarity threshold but change
+        # what the code does, so the stored analysis doesn't apply
+        index = indexed(BASE)
+        for old, new in [
+            ('range(1, len(values))', 'range(0, len(values))'),
+            ('total / len', 'total // len'),
+            ('total / len(values)', 'total / len(values) - 1'),
+            ('total / len(values)', 'total / len(values) + 0'),
+        ]:
+            with self.subTest(new=new):
+                self.assertIsNone(index.nearest(fingerprint(BASE.replace(old, new), 'python')))
+        stats = index.stats()
+        self.assertEqual((stats['changed'], stats['near'], stats['exact']), (4, 0, 0))
+
+    def test_short_code_only_matches_exactly(self):
+        index = indexed('x = 1\n')
+        self.assertIsNone(index.nearest(fingerprint('x = 2\n', 'python')))
+        self.assertEqual(index.nearest(fingerprint('y = 1\n', 'python')).similarity, 1.0)
+
+    def test_other_languages_never_match(self):
+        index = indexed(BASE)
+        self.assertIsNone(index.nearest(fingerprint(BASE.replace('"done"', '"ok"'), 'javascript')))
+
+    def test_index_is_bounded(self):
+        index = NearDuplicateIndex()
+        for number in range(3):
+            index.add(number, fingerprint(f'x = {number}\n', 'python'), max_entries=2)
+        self.assertEqual(index.stats()['entries'], 2)
+        self.assertIsNone(index.nearest(fingerprint('x = 0\n', 'python')))
+
+
+class RemapAnalysisTests(SimpleTestCase):
+    def test_issues_and_corrections_follow_renamed_identifiers(self):
+        code = '# Averages\n' + RENAMED
+        remapped = remap_analysis(
+            RESULT, BASE, fingerprint(BASE, 'python'), code, fingerprint(code, 'python')
+        )
+        (issue,) = remapped['errors']
+        self.assertEqual(issue['line'], 7)
+        self.assertEqual(issue['code'], 'return acc / len(nums)')
+        self.assertEqual(issue['description'], 'Dividing acc by len(nums) counts one gap too many.')
+        self.assertIn('return acc / (len(nums) - 1)', remapped['corrected_code'])
+        self.assertNotIn('values', remapped['corrected_code'])
+        self.assertEqual(remapped['concept_map'], RESULT['concept_map'])
+        self.assertNotIn('analysis_id', remapped)
+        # The stored result is left alone
+        self.assertEqual(RESULT['errors'][0]['line'], 6)
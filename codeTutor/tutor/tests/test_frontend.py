@@ -0,0 +1,76 @@
+import gzip
+
+from django.test import SimpleTestCase
+
+from tutor.frontend import compile_page, frontend, not_modified
+
+SOURCE = '''<html><head>
+<style>body { color: black; }</style>
+<style>p { margin: 0; }</style>
+</head><body>
+<script>var first = 1;</script>
+<p id="out"></p>
+<script>document.getElementById("out").textContent = first;</script>
+</body></html>'''
+
+
+class CompilePageTests(SimpleTestCase):
+    def test_inline_styles_and_scripts_become_bundles(self):
+        shell, bundles = compile_page(SOURCE, '/assets/', min_bytes=10**6)
+        css, js = sorted(bundles)
+        self.assertRegex(css, r'^coder\.[0-9a-f]{12}\.css$')
+        self.assertEqual(bundles[css].body, b'body { color: black; }\np { margin: 0; }\n')
+        self.assertIn(b'var first = 1;;\ndocument', bundles[js].body)
+
+        page = shell.body.decode('utf-8')
+        self.assertNotIn('<style>', page)
+        self.assertEqual(page.count(f'<link rel="stylesheet" href="/assets/{css}">'), 1)
+        # The script bundle replaces the last block, after the elements it uses
+        self.assertLess(page.index('id="out"'), page.index(f'<script src="/assets/{js}"></script>'))
+        self.assertEqual(shell.encoded, {})
+
+    def test_large_files_are_precompressed(self):
+        shell, _ = compile_page(SOURCE + '<!-- padding -->' * 100, '/assets/', min_bytes=512)
+        self.assertIn('gzip', shell.encoded)
+        self.assertEqual(gzip.decompress(shell.encoded['gzip']), shell.body)
+
+    def test_bundle_names_change_with_their_content(self):
+        _, first = compile_page(SOURCE, '/assets/')
+        _, second = compile_page(SOURCE.replace('black', 'white'), '/assets/')
+        self.assertNotEqual(set(first), set(second))
+        self.assertEqual(len(set(first) & set(second)), 1)
+
+
+class NotModifiedTests(SimpleTestCase):
+    def test_if_none_match_matches_any_representation(self):
+        shell, _ = compile_page(SOURCE * 20, '/assets/', min_bytes=512)
+        self.assertTrue(not_modified(shell, shell.etag()))
+        self.assertTrue(not_modified(shell, f'"other", W/{shell.etag("gzip")}'))
+        self.assertTrue(not_modified(shell, '*'))
+        self.assertFalse(not_modified(shell, '"other"'))
+        self.assertFalse(not_modified(shell, None))
+
+
+class FrontendViewTests(SimpleTestCase):
+    def test_page_is_revalidated_with_its_etag(self):
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_assets_are_immutable(self):
+        shell, bundles = frontend.files()
+        name = next(iter(bundles))
+        self.assertIn(f'/assets/{name}', shell.body.decode('utf-8'))
+        response = self.client.get(f'/assets/{name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response.content, bundles[name].body)
+        self.assertEqual(self.client.get(f'/assets/{name}', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/assets/coder.000000000000.js').status_code, 404)
@@ -0,0 +1,76 @@
+from django.test import SimpleTestCase
+
+from tutor.incremental import can_build_on, plan_incremental
+
+PREVIOUS = '''import math
+
+
+def area(radius):
+    return math.pi * radius ** 2
+
+
+def perimeter(radius):
+    return 2 * math.pi * radius
+
+
+def describe(radius):
+    print("area", area(radius))
+    print("perimeter", perimeter(radius))
+
+
+def main():
+    describe(3)
+
+
+main()'''
+
+PREVIOUS_RESULT = {
+    'errors': [],
+    'warnings': [
+        {'id': 1, 'type': 'style', 'title': 'Magic number', 'line': 19, 'severity': 'low'},
+        {'id': 2, 'type': 'logic', 'title': 'Unchecked radius', 'line': 5, 'severity': 'medium'},
+        {'id': 3, 'type': 'style', 'title': 'No docstrings', 'severity': 'low'},
+    ],
+    'concept_map': [{'category': 'Style', 'concept': 'Constants', 'count': 1, 'issues': [1]}],
+    'correction_strategies': [],
+    'corrected_code': '',
+}
+
+
+class PlanIncrementalTests(SimpleTestCase):
+    def test_only_the_changed_function_is_reanalyzed(self):
+        code = PREVIOUS.replace('return math.pi * radius ** 2', 'return math.pi * radius * radius')
+        plan = plan_incremental(PREVIOUS, PREVIOUS_RESULT, code, 'python')
+        self.assertEqual(plan.reanalyzed_lines, [(4, 7)])
+
+        reanalyzed = [segment for segment in plan.segments if segment.reanalyze]
+        self.assertEqual(len(reanalyzed), 1)
+        self.assertIn('radius * radius', reanalyzed[0].chunk.text)
+
+        # The issue inside the region is dropped; the others are kept
+        kept = [issue for segment in plan.segments if not segment.reanalyze for issue in segment.analysis['issues']]
+        self.assertEqual(sorted(issue['id'] for issue in kept), [1, 3])
+        self.assertEqual(plan.segments[0].chunk, (1, 3, 'import math\n\n'))
+
+    def test_kept_issues_follow_inserted_lines(self):
+        code = PREVIOUS.replace('def area(radius):', '# Geometry helpers\ndef area(radius):')
+        plan = plan_incremental(PREVIOUS, PREVIOUS_RESULT, code, 'python')
+        last = plan.segments[-1]
+        self.assertFalse(last.reanalyze)
+        (magic,) = [issue for issue in last.analysis['issues'] if issue['id'] == 1]
+        # Line 19 moved to 20, relative to the segment start
+        self.assertEqual(magic['line'] + last.chunk.first_line - 1, 20)
+        self.assertEqual(last.analysis['concept_map'], {'Style': [{'concept': 'Constants', 'count': 1, 'issues': [1]}]})
+
+    def test_unchanged_code_and_large_edits_fall_back_to_a_full_analysis(self):
+        self.assertIsNone(plan_incremental(PREVIOUS, PREVIOUS_RESULT, PREVIOUS, 'python'))
+        rewritten = '\n'.join(line.replace('radius', 'r') for line in PREVIOUS.split('\n'))
+        self.assertIsNone(plan_incremental(PREVIOUS, PREVIOUS_RESULT, rewritten, 'python'))
+
+    def test_can_build_on_requires_a_complete_llm_analysis_in_the_same_language(self):
+        record = {'language': 'python', 'result': {}}
+        self.assertTrue(can_build_on(record, 'python'))
+        self.assertFalse(can_build_on(record, 'java'))
+        self.assertFalse(can_build_on(None, 'python'))
+        self.assertFalse(can_build_on({'language': 'python', 'result': {'partial': True}}, 'python'))
+        self.assertFalse(can_build_on({'language': 'python', 'result': {'source': 'local'}}, 'python'))
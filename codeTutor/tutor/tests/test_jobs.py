@@ -0,0 +1,78 @@
+import json
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from tutor.cache import analysis_cache
+from tutor.jobs import analysis_jobs
+from tutor.models import AnalysisJob
+from tutor.persistence import db_writer
+from tutor.tests import chat_completion, reset_analysis_state
+
+ANALYSIS = {
+    'analysis_summary': {'total_errors': 0, 'total_warnings': 1, 'overall_severity': 'low'},
+    'concept_map': {'Style': [{'concept': 'Naming', 'count': 1, 'issues': [1]}]},
+    'issues': [{'id': 1, 'type': 'warning', 'title': 'Vague name', 'line': 1, 'severity': 'low'}],
+    'corrected_code': '',
+}
+
+
+class AnalysisJobViewTests(TestCase):
+    def setUp(self):
+        # The workers run on their own thread, which can't use the test
+        # database while a test holds it: the rows they would write are
+        # recorded instead, and the analysis cache stays in memory
+        self.writes = []
+        for patcher in (
+            mock.patch.object(db_writer, 'aput', mock.AsyncMock(side_effect=lambda *row: self.writes.append(row))),
+            mock.patch.object(analysis_cache, 'persistent', False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+
+    async def submit(self, code, completion):
+        patcher = mock.patch('tutor.views.create_chat_completion', mock.AsyncMock(return_value=completion))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return await self.async_client.post(
+            '/api/analyze/jobs/', {'code': code, 'language': 'python'}, content_type='application/json',
+        )
+
+    async def events(self, job):
+        response = await self.async_client.get(job['events_url'])
+        return b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+
+    async def test_jobs_run_in_the_background_and_are_polled(self):
+        response = await self.submit('data = [1, 2]\nprint(data)', chat_completion(json.dumps(ANALYSIS)))
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(response['Location'], job['status_url'])
+
+        status = (await self.async_client.get(job['status_url'], {'wait': 5, 'fields': 'warnings.title'})).json()
+        self.assertEqual((status['status'], status['source']), ('done', 'llm'))
+        self.assertEqual(status['result']['warnings'], [{'title': 'Vague name'}])
+        job_rows = [row for kind, row in self.writes if kind == 'analysis_job' and row['job_id'] == job['job_id']]
+        self.assertEqual([row['status'] for row in job_rows], ['queued', 'running', 'done'])
+        self.assertIn('event: complete', await self.events(job))
+
+    async def test_failed_jobs_report_their_error(self):
+        with self.assertLogs('tutor.views', 'WARNING'):
+            job = (await self.submit('total = 0\nprint(total)', chat_completion('I cannot help with that.'))).json()
+            status = (await self.async_client.get(job['status_url'], {'wait': 5})).json()
+        self.assertEqual((status['status'], status['error']),
+                         ('failed', 'Could not parse analysis results. Please try again.'))
+        self.assertIn('event: error', await self.events(job))
+
+    async def test_jobs_of_other_processes_are_read_from_the_database(self):
+        await AnalysisJob.objects.acreate(job_id='other', code='x', language='python', status='running')
+        self.assertEqual((await self.async_client.get('/api/analyze/jobs/other/')).json()['status'], 'running')
+        self.assertEqual((await self.async_client.get('/api/analyze/jobs/missing/')).status_code, 404)
+
+    @override_settings(ANALYSIS_JOBS={'MAX_QUEUED': 0})
+    async def test_full_queue_is_refused(self):
+        response = await self.submit('x = 1', chat_completion(json.dumps(ANALYSIS)))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertGreaterEqual(analysis_jobs.stats()['rejected'], 1)
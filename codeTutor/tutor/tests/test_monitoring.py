@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+ENDPOINTS = ('/metrics/', '/api/analyze/cache-stats/')
+
+
+class MonitoringEndpointTests(TestCase):
+    def assertStatus(self, status, **extra):
+        for url in ENDPOINTS:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, **extra).status_code, status)
+
+    def test_anonymous_clients_get_not_found(self):
+        self.assertStatus(404)
+
+    @override_settings(MONITORING={'TOKEN': 's3cret'})
+    def test_bearer_token(self):
+        self.assertStatus(200, HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertStatus(404, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertStatus(404, HTTP_AUTHORIZATION='s3cret')
+
+    @override_settings(MONITORING={'ALLOWED_IPS': ('127.0.0.1',)})
+    def test_allowed_addresses(self):
+        self.assertStatus(200)
+        self.assertStatus(404, REMOTE_ADDR='10.0.0.8')
+
+    def test_staff_users(self):
+        user = get_user_model().objects.create_user('teacher', password='x')
+        self.client.force_login(user)
+        self.assertStatus(404)
+        user.is_staff = True
+        user.save()
+        self.assertStatus(200)
+        with override_settings(MONITORING={'STAFF': False}):
+            self.assertStatus(404)
@@ -0,0 +1,110 @@
+import contextlib
+import queue
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from tutor.models import Analysis, ExerciseRollup, Issue, Submission
+from tutor.persistence import BulkWriter, db_writer
+
+RESULT = {
+    'errors': [{'id': 1, 'title': 'Missing colon', 'category': 'syntax', 'severity': 'high', 'line': 1}],
+    'warnings': [],
+    'concept_map': [{'category': 'Syntax', 'concept': 'Colons', 'count': 1, 'issues': [1]}],
+}
+
+
+def submission(analysis_id, **fields):
+    return {
+        'analysis_id': analysis_id, 'code_hash': 'h', 'code': 'x', 'language': 'python', 'source': 'llm',
+        'session_key': '', 'user_id': None, 'classroom': 'cs101', 'exercise': 'loops',
+        'created_at': timezone.now(), **fields,
+    }
+
+
+def recording_writer():
+    writer = BulkWriter()
+    written = []
+    for kind in ('first', 'second'):
+        writer.handler(kind)(lambda rows, kind=kind: written.append((kind, list(rows))))
+    return writer, written
+
+
+@override_settings(PERSISTENCE={'FLUSH_INTERVAL': 0.01})
+class BulkWriterTests(SimpleTestCase):
+    def setUp(self):
+        # The handlers here don't touch the database
+        patcher = mock.patch('tutor.persistence.transaction.atomic', contextlib.nullcontext)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_are_grouped_by_kind_in_registration_order(self):
+        writer, written = recording_writer()
+        writer.write_batch([('second', 1), ('first', 2), ('second', 3)])
+        self.assertEqual(written, [('first', [2]), ('second', [1, 3])])
+        self.assertEqual((writer.stats()['written'], writer.stats()['batches']), (3, 1))
+
+    def test_failed_batches_are_counted(self):
+        writer = BulkWriter()
+        writer.handler('broken')(mock.Mock(side_effect=DatabaseError('locked')))
+        with self.assertLogs('tutor.persistence', 'ERROR'):
+            writer.write_batch([('broken', 1), ('broken', 2)])
+        self.assertEqual((writer.stats()['failed'], writer.stats()['written']), (2, 0))
+
+    async def test_unknown_kinds_are_refused(self):
+        with self.assertRaises(KeyError):
+            await BulkWriter().aput('nothing', {})
+
+    def test_background_thread_drains_the_queue(self):
+        writer, written = recording_writer()
+        with mock.patch('tutor.persistence.close_old_connections'):
+            for row in range(5):
+                writer.put('first', row)
+            writer.flush()
+        self.assertEqual([row for _, rows in written for row in rows], [0, 1, 2, 3, 4])
+        self.assertEqual(writer.stats()['pending'], 0)
+
+    def test_rows_beyond_the_queue_limit_are_dropped(self):
+        writer, _ = recording_writer()
+        # A queue nothing drains
+        writer._ensure_started = mock.Mock()
+        writer._queue = queue.Queue(maxsize=1)
+        writer.put('first', 1)
+        with self.assertLogs('tutor.persistence', 'ERROR'):
+            writer.put('first', 2)
+        self.assertEqual((writer.stats()['queued'], writer.stats()['dropped']), (1, 1))
+
+    def test_in_memory_database_is_written_inline(self):
+        self.assertFalse(db_writer.background())
+
+
+class StoreWriterTests(TestCase):
+    def test_analyses_are_written_before_their_submissions(self):
+        # One batch, in the order a request queues them
+        db_writer.write_batch([
+            ('submission', submission('a1')),
+            ('analysis', {'analysis_id': 'a1', 'code': 'x', 'language': 'python', 'result': RESULT, 'issues': True}),
+        ])
+        self.assertEqual(Analysis.objects.get().result, RESULT)
+        self.assertEqual(Issue.objects.get().title, 'Missing colon')
+        stored = Submission.objects.get()
+        self.assertEqual(stored.analysis.analysis_id, 'a1')
+        self.assertTrue(stored.rolled_up)
+        self.assertEqual(ExerciseRollup.objects.get().submissions, 1)
+
+    def test_submissions_written_first_are_rolled_up_with_their_analysis(self):
+        db_writer.write_batch([('submission', submission('a1'))])
+        self.assertFalse(Submission.objects.get().rolled_up)
+        db_writer.write_batch([
+            ('analysis', {'analysis_id': 'a1', 'code': 'x', 'language': 'python', 'result': RESULT, 'issues': True}),
+        ])
+        self.assertTrue(Submission.objects.get().rolled_up)
+
+    def test_rewriting_an_analysis_keeps_one_row(self):
+        row = {'analysis_id': 'a1', 'code': 'x', 'language': 'python', 'result': RESULT, 'issues': True}
+        db_writer.write_batch([('analysis', row)])
+        db_writer.write_batch([('analysis', {**row, 'result': {**RESULT, 'errors': []}, 'issues': True})])
+        self.assertEqual(Analysis.objects.get().result['errors'], [])
+        self.assertFalse(Issue.objects.exists())
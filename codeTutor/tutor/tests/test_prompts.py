@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from tutor.prompts import (
+    ANALYSIS_PROMPTS, ANALYSIS_SYSTEM_PROMPT, DEPTH_PROMPTS, build_analysis_messages, count_message_tokens,
+    count_tokens,
+)
+
+CODE = 'def total(values):\n    result = 0\n    for value in values:\n        result += value\n    return result'
+
+
+class AnalysisPromptTests(SimpleTestCase):
+    def test_system_message_is_a_static_prefix(self):
+        python = build_analysis_messages(CODE, 'python')
+        java = build_analysis_messages('class Main {}', 'java', syntax_verified=True, excerpt=(10, 20, 40))
+        self.assertEqual(python[0], {'role': 'system', 'content': ANALYSIS_SYSTEM_PROMPT})
+        self.assertEqual(java[0], python[0])
+        self.assertEqual(python[1]['content'], f'Language: python\nCode:\n```\n{CODE}\n```')
+
+    def test_notes(self):
+        user = build_analysis_messages(CODE, 'python', syntax_verified=True, excerpt=(10, 20, 40))[1]['content']
+        self.assertIn("The code compiles; don't report syntax errors.", user)
+        self.assertIn('This is lines 10-20 of a 40-line file', user)
+        self.assertLess(user.index('compiles'), user.index('lines 10-20'))
+
+    def test_legacy_prompt_carries_everything_in_the_user_message(self):
+        messages = ANALYSIS_PROMPTS[3].messages(CODE, 'python', syntax_verified=True)
+        self.assertIn('expert python developer', messages[0]['content'])
+        self.assertIn(CODE, messages[1]['content'])
+        self.assertNotIn('All syntax errors', messages[1]['content'])
+        self.assertLess(count_message_tokens(build_analysis_messages(CODE, 'python')),
+                        count_message_tokens(messages))
+
+    def test_each_depth_has_its_own_cache_key(self):
+        self.assertIs(DEPTH_PROMPTS['deep'], ANALYSIS_PROMPTS[4])
+        self.assertEqual(
+            [DEPTH_PROMPTS[depth].cache_key for depth in ('quick', 'standard', 'deep')],
+            ['tutor-quick-analysis-v4', 'tutor-standard-analysis-v4', 'tutor-analysis-v4'],
+        )
+        self.assertNotIn('corrected_code', DEPTH_PROMPTS['quick'].system)
+
+
+class CountTokensTests(SimpleTestCase):
+    def test_heuristic_without_tiktoken(self):
+        with mock.patch('tutor.prompts._get_encoding', return_value=None):
+            # "x", "=", "compute_total", "(", ")", "\n    ", "return"
+            self.assertEqual(count_tokens('x = compute_total()\n    return'), 1 + 1 + 4 + 1 + 1 + 1 + 2)
+            self.assertEqual(count_message_tokens([{'role': 'user', 'content': 'x'}]), 1 + 4 + 3)
+
+    def test_tiktoken_encoding_is_used_when_available(self):
+        encoding = mock.Mock()
+        encoding.encode.return_value = [1, 2]
+        with mock.patch('tutor.prompts._get_encoding', return_value=encoding):
+            self.assertEqual(count_tokens('anything'), 2)
@@ -0,0 +1,248 @@
+import dis
+import json
+import os
+import posixpath
+import pwd
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from tutor import sandbox
+from tutor.sandbox import ExecutionResult, SandboxUnavailable, SandboxViolation, sandbox_pool
+from tutor.views import analyze_submission
+
+
+def result(exception, message):
+    return ExecutionResult('error', exception, message, 3, True, '', 0.01)
+
+
+def unprivileged_user():
+    """
+    Account for real sandbox runs: none is needed unless running as root
+    """
+    if os.getuid() != 0:
+        return None
+    try:
+        pwd.getpwnam('nobody')
+    except KeyError:
+        raise unittest.SkipTest('No unprivileged account to run the sandbox as')
+    return 'nobody'
+
+
+class AuditHookTests(SimpleTestCase):
+    def setUp(self):
+        self.jail = tempfile.mkdtemp(prefix='tutor-sandbox-test-')
+        self.addCleanup(os.rmdir, self.jail)
+        self.hook = sandbox._audit_hook(self.jail, {'input': False})
+
+    def test_blocked_imports_and_events_are_refused(self):
+        with self.assertRaises(SandboxViolation):
+            self.hook('import', ('subprocess', None, None, None, None))
+        with self.assertRaises(SandboxViolation):
+            self.hook('import', ('ctypes.util', None, None, None, None))
+        with self.assertRaises(SandboxViolation):
+            self.hook('os.system', (b'id',))
+        self.hook('import', ('math', None, None, None, None))
+
+    def test_policy_is_fixed_when_the_hook_is_installed(self):
+        # Regression: a run could empty the module's blocklists and then
+        # import subprocess
+        with mock.patch.object(sandbox, 'BLOCKED_MODULES', frozenset()), \
+                mock.patch.object(sandbox, 'BLOCKED_EVENTS', frozenset()), \
+                mock.patch.object(sandbox, 'SandboxViolation', None), \
+                mock.patch.object(sandbox.os.path, 'realpath', lambda path: self.jail):
+            with self.assertRaises(SandboxViolation):
+                self.hook('import', ('subprocess', None, None, None, None))
+            with self.assertRaises(SandboxViolation):
+                self.hook('gc.get_referrers', ())
+            with self.assertRaises(SandboxViolation):
+                self.hook('open', ('/etc/passwd', 'w', 0))
+
+    def test_hook_looks_nothing_up_at_run_time(self):
+        # Regression: os.path.realpath looked its helpers up in posixpath's
+        # globals, which a run could replace
+        functions = [self.hook]
+        for function in functions:
+            for cell in function.__closure__ or ():
+                if callable(cell.cell_contents) and hasattr(cell.cell_contents, '__code__'):
+                    functions.append(cell.cell_contents)
+            codes = [function.__code__]
+            for code in codes:
+                codes.extend(const for const in code.co_consts if hasattr(const, 'co_code'))
+                with self.subTest(code=code.co_name):
+                    self.assertFalse([
+                        instruction.argval for instruction in dis.get_instructions(code)
+                        if instruction.opname in ('LOAD_GLOBAL', 'LOAD_NAME')
+                    ])
+        self.assertGreater(len(functions), 1)
+
+    def test_replacing_path_helpers_does_not_open_the_jail(self):
+        with mock.patch.object(posixpath, 'abspath', lambda path: os.path.join(self.jail, 'x')), \
+                mock.patch.object(posixpath, '_joinrealpath', lambda *args: (os.path.join(self.jail, 'x'), True)):
+            with self.assertRaises(SandboxViolation):
+                self.hook('open', ('/etc/hostname', 'r', 0))
+            with self.assertRaises(SandboxViolation):
+                self.hook('open', ('/tmp/tutor-sandbox-escape', 'w', 0))
+
+    def test_symbolic_links_are_followed_and_cannot_be_created(self):
+        link = os.path.join(self.jail, 'etc')
+        os.symlink('/etc', link)
+        self.addCleanup(os.remove, link)
+        with self.assertRaises(SandboxViolation):
+            self.hook('open', (os.path.join(link, 'hostname'), 'r', 0))
+        with self.assertRaises(SandboxViolation):
+            self.hook('open', (os.path.join(self.jail, 'etc', '..', '..', 'x'), 'w', 0))
+        with self.assertRaises(SandboxViolation):
+            self.hook('os.symlink', ('/etc', os.path.join(self.jail, 'other'), None))
+
+    def test_writes_are_confined_to_the_jail(self):
+        self.hook('open', (os.path.join(self.jail, 'out.txt'), 'w', 0))
+        self.hook('os.remove', (os.path.join(self.jail, 'out.txt'), None))
+        with self.assertRaises(SandboxViolation):
+            self.hook('open', (os.path.join(self.jail, '..', 'escape.txt'), 'w', 0))
+        with self.assertRaises(SandboxViolation):
+            self.hook('os.rename', (os.path.join(self.jail, 'a'), '/tmp/b', None, None))
+
+    def test_paths_that_are_not_plain_strings_are_refused(self):
+        class Path(str):
+            def __fspath__(self):
+                return '/etc/passwd'
+
+        with self.assertRaises(SandboxViolation):
+            self.hook('open', (Path(os.path.join(self.jail, 'a')), 'w', 0))
+        with self.assertRaises(SandboxViolation):
+            self.hook('import', (Path('math'), None, None, None, None))
+
+    def test_reading_stdin_is_recorded(self):
+        state = {'input': False}
+        sandbox._audit_hook(self.jail, state)('builtins.input', ('prompt',))
+        self.assertTrue(state['input'])
+
+
+class ParseResultTests(SimpleTestCase):
+    limits = {'OUTPUT_CHARS': 10}
+    reply = {'outcome': 'error', 'exception': 'ValueError', 'message': 'bad', 'line': 2, 'in_submission': True,
+             'output': 'hi'}
+
+    def test_replies_the_child_could_send_are_accepted(self):
+        self.assertEqual(sandbox._parse_result(json.dumps(self.reply).encode(), self.limits), self.reply)
+
+    def test_forged_replies_are_rejected(self):
+        for forged in (
+            b'not json', b'[]', json.dumps({**self.reply, 'duration': 0}).encode(),
+            json.dumps({**self.reply, 'outcome': 'timeout'}).encode(),
+            json.dumps({**self.reply, 'outcome': ['ok']}).encode(),
+            json.dumps({**self.reply, 'line': '2'}).encode(),
+            json.dumps({**self.reply, 'in_submission': 1}).encode(),
+            json.dumps({**self.reply, 'output': 'x' * 11}).encode(),
+        ):
+            with self.subTest(forged=forged):
+                self.assertIsNone(sandbox._parse_result(forged, self.limits))
+
+
+class ExecutionResultTests(SimpleTestCase):
+    def test_messages_shown_to_students_are_sanitized(self):
+        self.assertEqual(result('NameError', "name 'totl' is not defined").detail,
+                         "NameError: name 'totl' is not defined")
+        self.assertEqual(result('ValueError', 'bad\nvalue in /srv/app/tutor/data.py').public_message,
+                         'bad value in <path>')
+        long_message = result('ValueError', 'x' * 500).public_message
+        self.assertEqual((len(long_message), long_message[-3:]), (sandbox.MESSAGE_CHARS, '...'))
+
+    def test_worker_errors_show_only_their_type(self):
+        for exception in ('PermissionError', 'SandboxViolation', 'FileNotFoundError', 'MemoryError'):
+            with self.subTest(exception=exception):
+                failure = result(exception, '/tmp/tutor-sandbox-x1/secret')
+                self.assertIsNone(failure.public_message)
+                self.assertEqual(failure.detail, exception)
+                self.assertIsNone(failure.summary()['message'])
+
+
+@unittest.skipUnless(sandbox.supported(), 'The sandbox needs fork() and resource limits')
+class SandboxPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(sandbox_pool.close)
+
+    def test_disabled_sandbox_is_unavailable(self):
+        with self.assertRaises(SandboxUnavailable):
+            sandbox_pool.start()
+
+    @override_settings(SANDBOX={'ENABLED': True})
+    def test_root_without_an_account_is_refused(self):
+        with mock.patch('tutor.sandbox.os.getuid', return_value=0):
+            with self.assertRaisesMessage(SandboxUnavailable, "doesn't run code as root"):
+                sandbox_pool.start()
+
+    async def test_runs_report_errors_and_lines(self):
+        with override_settings(SANDBOX={'ENABLED': True, 'USER': unprivileged_user()}):
+            ok = await sandbox_pool.arun("if __name__ == '__main__':\n    print('hi')")
+            failed = await sandbox_pool.arun('values = [1]\nprint(values[1])')
+        self.assertEqual(ok.outcome, 'ok')
+        self.assertEqual(ok.output, 'hi\n')
+        self.assertEqual((failed.outcome, failed.exception, failed.line), ('error', 'IndexError', 2))
+
+    async def test_escape_attempts_are_blocked(self):
+        # Regression: runs could reach the worker's policy through __main__
+        # or sys.modules and switch it off before importing subprocess
+        payloads = {
+            'main': 'import __main__ as m\nm.BLOCKED_EVENTS = frozenset()\nm.BLOCKED_MODULES = frozenset()\n'
+                    'import subprocess',
+            'module': "import sys\nm = sys.modules['tutor.sandbox']\nm.BLOCKED_EVENTS = frozenset()\n"
+                      'm.BLOCKED_MODULES = frozenset()\nm.SandboxViolation = None\nimport subprocess',
+            'builtins': 'import builtins\nbuiltins.type = lambda x: str\nbuiltins.any = lambda x: False\n'
+                        'import subprocess',
+            'gc': 'import gc\ngc.get_objects()',
+            'trace': 'import sys\nsys.settrace(lambda *args: None)',
+            'ctypes': 'import ctypes',
+            'write': "open('/tmp/tutor-sandbox-escape', 'w').write('x')",
+            'realpath': 'import os, posixpath\nhere = os.getcwd()\nposixpath.abspath = lambda path: here + "/x"\n'
+                        'posixpath._joinrealpath = lambda *args: (here + "/x", True)\n'
+                        "open('/tmp/tutor-sandbox-escape', 'w').write('x')",
+            'symlink': "import os\nos.symlink('/tmp', 'tmp')\nopen('tmp/tutor-sandbox-escape', 'w').write('x')",
+        }
+        with override_settings(SANDBOX={'ENABLED': True, 'USER': unprivileged_user()}):
+            for name, code in payloads.items():
+                with self.subTest(payload=name):
+                    run = await sandbox_pool.arun(code)
+                    self.assertEqual(run.outcome, 'blocked', run)
+        self.assertFalse(os.path.exists('/tmp/tutor-sandbox-escape'))
+
+    async def test_forged_results_are_reported_as_crashes(self):
+        forge = 'import os\nfor fd in range(3, 32):\n    try:\n        os.write(fd, {!r})\n    except OSError:\n        pass'
+        with override_settings(SANDBOX={'ENABLED': True, 'USER': unprivileged_user()}):
+            forged = await sandbox_pool.arun(forge.format(b'{"outcome": "ok"}'))
+            flooded = await sandbox_pool.arun(forge.format(b'x' * 65536) + '\n' + forge.format(b'x' * 65536))
+            after = await sandbox_pool.arun('print(1)')
+        self.assertEqual((forged.outcome, flooded.outcome), ('crashed', 'crashed'))
+        # The worker survives
+        self.assertEqual(after.outcome, 'ok')
+
+    async def test_runs_are_skipped_when_every_worker_is_busy(self):
+        with override_settings(SANDBOX={'ENABLED': True, 'POOL_SIZE': 1, 'USER': unprivileged_user()}):
+            sandbox_pool.start()
+            sandbox_pool._idle.get_nowait()
+            self.assertIsNone(await sandbox_pool.arun('print(1)'))
+
+
+class GroundingTests(TestCase):
+    analysis = {
+        'analysis_summary': {'total_errors': 0, 'total_warnings': 1, 'overall_severity': 'low'},
+        'concept_map': {},
+        'issues': [{'id': 1, 'type': 'warning', 'title': 'Naming', 'line': 1, 'severity': 'low'}],
+        'corrected_code': '',
+    }
+
+    async def test_llm_analyses_reuse_the_first_run(self):
+        # Regression: store_analysis ran the submission a second time
+        run = ExecutionResult('ok', None, None, None, False, '', 0.01)
+        message = SimpleNamespace(content=json.dumps(self.analysis))
+        completion = SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        with mock.patch('tutor.views.aexecute', mock.AsyncMock(return_value=run)) as aexecute, \
+                mock.patch('tutor.views.create_chat_completion', mock.AsyncMock(return_value=completion)):
+            response, source = await analyze_submission('x = 1\nprint(x)\n', 'python')
+        self.assertEqual(source, 'llm')
+        self.assertEqual(aexecute.await_count, 1)
+        self.assertEqual(response['execution']['outcome'], 'ok')
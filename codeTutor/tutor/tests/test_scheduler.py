@@ -0,0 +1,155 @@
+import asyncio
+from unittest import mock
+
+import httpx
+import openai
+from django.test import SimpleTestCase
+
+from tutor.scheduler import (
+    DEFAULT_SCHEDULER_SETTINGS, RateBudget, TokenBucket, UpstreamBusy, UpstreamScheduler, suggested_retry_after,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def scheduler_config(**overrides):
+    return {**DEFAULT_SCHEDULER_SETTINGS, 'BACKOFF_BASE': 0.0, **overrides}
+
+
+def api_request():
+    return httpx.Request('POST', 'https://api.example.test/v1/chat/completions')
+
+
+def rate_limit_error(headers):
+    response = httpx.Response(429, headers=headers, request=api_request())
+    return openai.RateLimitError('Rate limited', response=response, body=None)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_refills_at_the_per_minute_rate_up_to_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock)
+        bucket.take(60, clock.now)
+        self.assertEqual(bucket.wait_time(1, clock.now), 1.0)
+        clock.now += 0.5
+        self.assertEqual(bucket.wait_time(1, clock.now), 0.5)
+        clock.now += 1000
+        bucket.wait_time(1, clock.now)
+        self.assertEqual(bucket.level, 60)
+
+    def test_requests_larger_than_the_bucket_need_only_a_full_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock)
+        self.assertEqual(bucket.wait_time(500, clock.now), 0.0)
+        bucket.take(500, clock.now)
+        # The overdraft delays later takes
+        self.assertEqual(bucket.wait_time(1, clock.now), 401 / (100 / 60))
+
+
+class RateBudgetTests(SimpleTestCase):
+    def test_takes_a_request_and_its_tokens_or_says_how_long_to_wait(self):
+        clock = FakeClock()
+        budget = RateBudget(2, 1000, clock)
+        self.assertEqual(budget.try_take(400), 0.0)
+        self.assertEqual(budget.try_take(400), 0.0)
+        self.assertEqual(budget.try_take(100), 30.0)
+
+    def test_settle_returns_unused_tokens_and_charges_overruns(self):
+        clock = FakeClock()
+        budget = RateBudget(100, 1000, clock)
+        budget.try_take(800)
+        budget.settle(800, 300)
+        self.assertEqual(budget.tokens.level, 700)
+        budget.settle(100, 400)
+        self.assertEqual(budget.tokens.level, 400)
+
+    def test_pause_holds_every_call(self):
+        clock = FakeClock()
+        budget = RateBudget(100, 1000, clock)
+        budget.pause(5)
+        self.assertEqual(budget.try_take(1), 5.0)
+        clock.now += 5
+        self.assertEqual(budget.try_take(1), 0.0)
+
+
+class UpstreamSchedulerTests(SimpleTestCase):
+    async def test_waiting_calls_are_admitted_by_priority(self):
+        budget = RateBudget(600, 100000)
+        budget.requests.level = 0
+        scheduler = UpstreamScheduler(budget, scheduler_config())
+        admitted = []
+
+        async def call(endpoint):
+            await scheduler.acquire(endpoint, 10)
+            admitted.append(endpoint)
+
+        await asyncio.gather(call('analyze'), call('correction_strategy'), call('hint'))
+        self.assertEqual(admitted, ['hint', 'correction_strategy', 'analyze'])
+
+    async def test_calls_waiting_too_long_fail_with_upstream_busy(self):
+        budget = RateBudget(1, 100000)
+        budget.requests.level = 0
+        scheduler = UpstreamScheduler(budget, scheduler_config(MAX_QUEUE_WAIT=0.05, BACKOFF_MAX=7.0))
+        with self.assertRaises(UpstreamBusy) as raised:
+            await scheduler.acquire('analyze', 10)
+        self.assertEqual(suggested_retry_after(raised.exception), 7.0)
+        self.assertEqual(scheduler.queue_depth(), 0)
+
+    def test_backoff_is_jittered_capped_and_respects_retry_after(self):
+        scheduler = UpstreamScheduler(RateBudget(100, 1000), scheduler_config(BACKOFF_BASE=0.5, BACKOFF_MAX=4.0))
+        with mock.patch('tutor.scheduler.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual([scheduler.backoff(attempt) for attempt in range(5)], [0.5, 1.0, 2.0, 4.0, 4.0])
+        with mock.patch('tutor.scheduler.random.uniform', return_value=0.0):
+            self.assertEqual(scheduler.backoff(3, retry_after=2.5), 2.5)
+
+    async def test_retryable_errors_are_retried_until_max_retries(self):
+        scheduler = UpstreamScheduler(RateBudget(100, 100000), scheduler_config(MAX_RETRIES=2))
+        attempts = 0
+
+        async def send():
+            nonlocal attempts
+            attempts += 1
+            if attempts < 3:
+                raise openai.APITimeoutError(request=api_request())
+            return 'ok'
+
+        self.assertEqual(await scheduler.submit('analyze', 10, send), 'ok')
+        self.assertEqual(attempts, 3)
+
+        async def always_fails():
+            raise openai.APITimeoutError(request=api_request())
+
+        with self.assertRaises(openai.APITimeoutError):
+            await scheduler.submit('analyze', 10, always_fails)
+
+    async def test_other_errors_are_not_retried(self):
+        scheduler = UpstreamScheduler(RateBudget(100, 100000), scheduler_config())
+        attempts = 0
+
+        async def send():
+            nonlocal attempts
+            attempts += 1
+            raise ValueError('bad request')
+
+        with self.assertRaises(ValueError):
+            await scheduler.submit('analyze', 10, send)
+        self.assertEqual(attempts, 1)
+
+    async def test_rate_limits_pause_admission_for_their_retry_after(self):
+        budget = RateBudget(100, 100000)
+        scheduler = UpstreamScheduler(budget, scheduler_config(MAX_RETRIES=0))
+        error = rate_limit_error({'retry-after-ms': '1500'})
+        self.assertEqual(suggested_retry_after(error), 1.5)
+
+        async def send():
+            raise error
+
+        with self.assertRaises(openai.RateLimitError):
+            await scheduler.submit('analyze', 10, send)
+        self.assertGreater(budget.try_take(1), 1.0)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from tutor.singleflight import SingleFlight
+
+
+class SingleFlightTests(SimpleTestCase):
+    async def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def factory():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {'issues': []}
+
+        tasks = [asyncio.create_task(flight.do('key', factory)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        self.assertEqual(calls, 1)
+        self.assertEqual(results, [{'issues': []}] * 5)
+        # Followers get copies, not the leader's object
+        self.assertEqual(len({id(result) for result in results}), 5)
+        stats = flight.stats()
+        self.assertEqual((stats['leaders'], stats['followers'], stats['in_flight']), (1, 4, 0))
+        self.assertEqual(stats['coalescing_ratio'], 0.8)
+
+    async def test_leader_error_reaches_every_follower(self):
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def factory():
+            await release.wait()
+            raise ValueError('upstream failed')
+
+        tasks = [asyncio.create_task(flight.do('key', factory)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.stats()['errors'], 1)
+
+    async def test_follower_takes_over_when_the_leader_is_cancelled(self):
+        flight = SingleFlight()
+        started = asyncio.Event()
+        calls = 0
+
+        async def factory():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                started.set()
+                await asyncio.sleep(10)
+            return 'done'
+
+        leader = asyncio.create_task(flight.do('key', factory))
+        await started.wait()
+        follower = asyncio.create_task(flight.do('key', factory))
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.assertEqual(await follower, 'done')
+        self.assertEqual(calls, 2)
+
+    def test_sync_callers_on_other_threads_are_coalesced(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def function():
+            calls.append(1)
+            release.wait(5)
+            return [1, 2]
+
+        leader = threading.Thread(target=lambda: results.append(flight.do_sync('key', function)))
+        leader.start()
+        while not flight.stats()['in_flight']:
+            pass
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do_sync('key', function))) for _ in range(3)
+        ]
+        for thread in followers:
+            thread.start()
+        while flight.stats()['followers'] < 3:
+            pass
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[1, 2]] * 4)
+
+    async def test_different_keys_run_separately(self):
+        flight = SingleFlight()
+
+        async def factory():
+            return object()
+
+        first, second = await asyncio.gather(flight.do('a', factory), flight.do('b', factory))
+        self.assertIsNot(first, second)
+        self.assertEqual(flight.stats()['leaders'], 2)
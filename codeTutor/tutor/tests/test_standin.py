@@ -0,0 +1,115 @@
+import json
+
+import httpx
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from tutor.models import Analysis
+from tutor.standin import DEFAULT_STANDIN_SETTINGS, ReplayEngine, build_standin_app, classify_request
+from tutor.tests import reset_analysis_state
+
+INSTANT = {'LATENCY': 0.0, 'LATENCY_JITTER': 0.0, 'TOKENS_PER_SECOND': 0.0}
+
+CODE = 'def average(values):\n    total = 0\n    for value in values:\n        total += value\n    return total / len(values)'
+
+
+def request_body(system, user='x', **extra):
+    return {'messages': [{'role': 'system', 'content': system}, {'role': 'user', 'content': user}], **extra}
+
+
+def engine(**overrides):
+    return ReplayEngine({**DEFAULT_STANDIN_SETTINGS, **INSTANT, **overrides})
+
+
+class ReplayEngineTests(SimpleTestCase):
+    def test_requests_are_classified_by_their_system_prompt(self):
+        self.assertEqual(classify_request(request_body('You provide progressive hints.')), 'hint')
+        self.assertEqual(classify_request(request_body('A quick check that can analyze code.')), 'analyze_quick')
+        self.assertEqual(classify_request({'messages': []}), 'analyze')
+
+    def test_same_prompt_gets_the_same_recording(self):
+        replay = engine()
+        first = replay.plan(request_body('Analyze code', 'a'))
+        self.assertEqual(first['status'], 200)
+        self.assertEqual(replay.plan(request_body('Analyze code', 'a'))['content'], first['content'])
+        self.assertIn('analysis_summary', json.loads(first['content']))
+        self.assertEqual(replay.stats()['endpoints'], {'analyze': 2})
+
+    def test_max_tokens_truncates_the_completion(self):
+        replay = engine()
+        plan = replay.plan(request_body('Analyze code', max_tokens=20))
+        self.assertEqual(plan['finish_reason'], 'length')
+        self.assertEqual(replay.stats()['truncated'], 1)
+
+    def test_faults_follow_their_rates(self):
+        self.assertEqual(engine(RATE_LIMIT_RATE=1.0).plan(request_body('x'))['status'], 429)
+        self.assertEqual(engine(ERROR_RATE=1.0).plan(request_body('x'))['status'], 500)
+        malformed = engine(MALFORMED_RATE=1.0)
+        malformed.plan(request_body('Analyze code'))
+        self.assertEqual(malformed.stats()['malformed'], 1)
+
+
+class StandInAppTests(SimpleTestCase):
+    async def request(self, method, path, **kwargs):
+        transport = httpx.ASGITransport(app=build_standin_app(INSTANT))
+        async with httpx.AsyncClient(transport=transport, base_url='http://standin') as client:
+            return await client.request(method, path, **kwargs)
+
+    async def test_chat_completions(self):
+        response = await self.request('POST', '/v1/chat/completions', json=request_body('Analyze code', model='m'))
+        self.assertEqual(response.status_code, 200)
+        completion = response.json()
+        self.assertEqual((completion['model'], completion['choices'][0]['finish_reason']), ('m', 'stop'))
+        self.assertGreater(completion['usage']['completion_tokens'], 0)
+
+    async def test_streamed_completions_end_with_done(self):
+        response = await self.request('POST', '/v1/chat/completions', json=request_body('Analyze code', stream=True))
+        events = [line[len('data: '):] for line in response.text.split('\n\n') if line]
+        self.assertEqual(events[-1], '[DONE]')
+        content = ''.join(json.loads(event)['choices'][0]['delta'].get('content', '') for event in events[:-1])
+        self.assertIn('analysis_summary', json.loads(content))
+
+    async def test_other_paths(self):
+        self.assertEqual((await self.request('GET', '/v1/models')).status_code, 404)
+        self.assertEqual((await self.request('GET', '/stats')).json()['requests'], 0)
+
+
+@override_settings(LLM_CLIENT={'PROVIDER': 'tutor.llm.StandInProvider', 'STANDIN': INSTANT})
+class AnalyzeWithStandInTests(TestCase):
+    """
+    The analysis views end to end, through the SDK and the stand-in
+    """
+
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+
+    async def analyze(self, code=CODE, **fields):
+        return await self.async_client.post(
+            '/api/analyze/', {'code': code, 'language': 'python', **fields}, content_type='application/json',
+        )
+
+    async def test_analysis_is_generated_stored_and_cached(self):
+        response = await self.analyze()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Analysis-Cache'], 'miss')
+        result = response.json()
+        self.assertTrue(result['errors'] or result['warnings'])
+        self.assertFalse(result.get('partial'))
+        self.assertTrue(await Analysis.objects.filter(analysis_id=result['analysis_id']).aexists())
+
+        repeat = await self.analyze(fields='analysis_summary')
+        self.assertEqual(repeat['X-Analysis-Cache'], 'hit')
+        self.assertEqual(set(repeat.json()), {'analysis_id', 'analysis_summary'})
+
+    async def test_syntax_errors_are_answered_locally(self):
+        response = await self.analyze('def f(x)\n    return x')
+        self.assertEqual(response['X-Analysis-Source'], 'local')
+        self.assertEqual(response.json()['errors'][0]['line'], 1)
+
+    @override_settings(LLM_SCHEDULER={'MAX_RETRIES': 0})
+    async def test_upstream_rate_limits_are_passed_on(self):
+        with override_settings(LLM_CLIENT={'PROVIDER': 'tutor.llm.StandInProvider',
+                                           'STANDIN': {**INSTANT, 'RATE_LIMIT_RATE': 1.0}}):
+            response = await self.analyze()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
@@ -0,0 +1,84 @@
+from django.test import SimpleTestCase, override_settings
+
+from tutor.static_analysis import analyze_locally
+from tutor.views import local_pre_analysis
+
+
+def concepts(analysis):
+    return [(issue['concept'], issue['line']) for issue in analysis.issues]
+
+
+class PythonAnalysisTests(SimpleTestCase):
+    def test_valid_code_is_syntax_verified(self):
+        analysis = analyze_locally('def f(x):\n    return x\n', 'python')
+        self.assertTrue(analysis.syntax_verified)
+        self.assertFalse(analysis.has_errors)
+
+    def test_repairable_errors_are_all_reported_with_corrected_code(self):
+        analysis = analyze_locally('def f(x)\n    if x\n        return 1\n', 'python')
+        self.assertEqual(concepts(analysis), [('Missing Colon', 1), ('Missing Colon', 2)])
+        self.assertEqual(analysis.corrected_code, 'def f(x):\n    if x:\n        return 1\n')
+        self.assertEqual([issue['id'] for issue in analysis.issues], [1, 2])
+
+    def test_unbalanced_brackets(self):
+        analysis = analyze_locally('values = [1, 2\nprint(values)\n', 'python')
+        self.assertEqual(concepts(analysis), [('Unbalanced Brackets', 1)])
+        self.assertEqual(analysis.corrected_code, '')
+
+    def test_analysis_json_matches_the_llm_schema(self):
+        result = analyze_locally('if True\n    pass\n', 'python').as_analysis_json()
+        self.assertEqual(result['analysis_summary']['total_errors'], 1)
+        self.assertEqual(result['concept_map'], {'syntax': [{'concept': 'Missing Colon', 'count': 1, 'issues': [1]}]})
+        self.assertEqual(result['issues'][0]['hints']['level3'], 'Add a colon (:) at the end of line 1.')
+
+
+class BracketScannerTests(SimpleTestCase):
+    def test_comments_strings_and_regexes_are_skipped(self):
+        code = 'let a = "(";\n// )\n/* ] */\nlet r = /[)]/;\nlet t = `multi\n(line`;\n'
+        self.assertEqual(concepts(analyze_locally(code, 'javascript')), [])
+
+    def test_unbalanced_brackets_and_strings_are_reported(self):
+        code = 'int main() {\n    printf("hi);\n    return (1;\n'
+        self.assertEqual(concepts(analyze_locally(code, 'cpp')), [
+            ('Unbalanced Brackets', 1), ('Unbalanced Brackets', 2), ('Unterminated String', 2),
+            ('Unbalanced Brackets', 3),
+        ])
+
+    def test_multi_line_literals_are_tokenized(self):
+        # Regression: these were reported as unterminated strings
+        valid = {
+            'java': 'class A {\n    String s = """\n        He said "hi" (\n        """;\n}\n',
+            'csharp': 'class A {\n    string p = @"C:\\dir\\";\n    string q = $@"{x} ""(quoted""";\n'
+                      '    string r = """\n        raw " "" text\n        """;\n}\n',
+            'cpp': 'int main() {\n    auto s = R"(a "quoted" \\ ()";\n    auto t = u8R"x( )" still )x";\n'
+                   '    int n = 1\'000\'000;\n    char c = L\'x\';\n}\n',
+        }
+        for language, code in valid.items():
+            with self.subTest(language=language):
+                self.assertEqual(concepts(analyze_locally(code, language)), [])
+
+    def test_unterminated_multi_line_literals_are_reported(self):
+        broken = {
+            'java': 'String s = """\n    never closed;\n',
+            'csharp': 'string p = @"C:\\dir\\;\n',
+            'cpp': 'auto s = R"x(abc)";\n',
+        }
+        for language, code in broken.items():
+            with self.subTest(language=language):
+                self.assertEqual(concepts(analyze_locally(code, language)), [('Unterminated String', 1)])
+
+    def test_unknown_languages_are_left_to_the_llm(self):
+        analysis = analyze_locally('var s = `raw\n', 'go')
+        self.assertFalse(analysis.has_errors)
+        self.assertFalse(analysis.syntax_verified)
+
+
+class LocalPreAnalysisTests(SimpleTestCase):
+    @override_settings(STATIC_ANALYSIS={'ENABLED': False})
+    def test_disabled(self):
+        self.assertIsNone(local_pre_analysis('if True\n', 'python'))
+
+    @override_settings(STATIC_ANALYSIS={'ANSWER_SYNTAX_ERRORS': False})
+    def test_errors_can_be_left_to_the_llm(self):
+        analysis = local_pre_analysis('if True\n    pass\n', 'python')
+        self.assertFalse(analysis.has_errors)
@@ -0,0 +1,127 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from tutor.streaming import AnalysisStreamParser, IncrementalJSONParser, sse_event
+from tutor.tests import reset_analysis_state
+
+ANALYSIS = {
+    'analysis_summary': {'total_errors': 1, 'total_warnings': 1, 'overall_severity': 'high'},
+    'concept_map': {'Logic': [{'concept': 'Loops', 'count': 1, 'issues': [1]}]},
+    'issues': [
+        {'id': 1, 'type': 'error', 'title': 'Off by one "here" {', 'line': 2, 'severity': 'high'},
+        {'id': 2, 'type': 'warning', 'title': 'Naming', 'line': 1, 'severity': 'low'},
+    ],
+    'corrected_code': 'for i in range(3):\n    print("[", i)',
+}
+
+
+def feed_in_pieces(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+class SseEventTests(SimpleTestCase):
+    def test_event_format(self):
+        self.assertEqual(sse_event('issue', {'id': 1, 'title': 'a\nb'}),
+                         'event: issue\ndata: {"id":1,"title":"a\\nb"}\n\n')
+
+
+class IncrementalJSONParserTests(SimpleTestCase):
+    def test_values_are_reported_when_complete(self):
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('Sure:\n```json\n{"a": [1, {"b": "x'), [])
+        self.assertEqual(parser.feed('y"}'), [(('a', 1, 'b'), 'xy'), (('a', 1), {'b': 'xy'})])
+        self.assertEqual(parser.feed('], "c": "}"}'), [(('a',), [1, {'b': 'xy'}]), (('c',), '}')])
+        self.assertTrue(parser.finished)
+
+    def test_wanted_paths_only(self):
+        parser = IncrementalJSONParser(wanted=lambda path: len(path) == 1)
+        self.assertEqual(parser.feed('{"a": {"b": [1]}, "c": "d"}'), [(('a',), {'b': [1]}), (('c',), 'd')])
+
+
+class AnalysisStreamParserTests(SimpleTestCase):
+    def test_events_do_not_depend_on_how_the_text_is_split(self):
+        text = json.dumps(ANALYSIS, indent=2)
+        expected = [
+            ('summary', ANALYSIS['analysis_summary']),
+            ('concept_group', ('Logic', ANALYSIS['concept_map']['Logic'])),
+            ('issue', ANALYSIS['issues'][0]),
+            ('issue', ANALYSIS['issues'][1]),
+            ('corrected_code', ANALYSIS['corrected_code']),
+        ]
+        for size in (1, 7, len(text)):
+            with self.subTest(size=size):
+                parser = AnalysisStreamParser()
+                self.assertEqual(feed_in_pieces(parser, text, size), expected)
+                self.assertEqual(parser.text, text)
+
+    def test_truncated_stream_reports_the_complete_values(self):
+        text = json.dumps(ANALYSIS)
+        events = AnalysisStreamParser().feed(text[:text.index('"Naming')])
+        self.assertEqual([event for event, _ in events], ['summary', 'concept_group', 'issue'])
+
+
+def completion_stream(text, size=5):
+    async def chunks():
+        yield SimpleNamespace(choices=[])
+        for start in range(0, len(text), size):
+            delta = SimpleNamespace(content=text[start:start + size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+    return chunks()
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = block.split('\n')
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+class AnalyzeStreamViewTests(TestCase):
+    code = 'for i in range(3):\n    print(i)'
+
+    def setUp(self):
+        reset_analysis_state()
+        self.addCleanup(reset_analysis_state)
+
+    async def stream(self, **fields):
+        response = await self.async_client.post(
+            '/api/analyze/stream/', {'code': self.code, 'language': 'python', **fields},
+            content_type='application/json',
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        return response, parse_events(body)
+
+    async def test_events_are_sent_as_the_analysis_streams(self):
+        with mock.patch('tutor.views.stream_chat_completion', return_value=completion_stream(json.dumps(ANALYSIS))):
+            response, events = await self.stream()
+        self.assertEqual(response['X-Analysis-Cache'], 'miss')
+        self.assertEqual([event for event, _ in events],
+                         ['summary', 'concept_group', 'issue', 'issue', 'corrected_code', 'complete'])
+        self.assertEqual(events[2][1]['kind'], 'error')
+        complete = events[-1][1]
+        self.assertEqual((len(complete['errors']), len(complete['warnings'])), (1, 1))
+
+        # The stored analysis is replayed to the next identical request
+        with mock.patch('tutor.views.stream_chat_completion') as stream_chat_completion:
+            response, replayed = await self.stream(fields='errors')
+        stream_chat_completion.assert_not_called()
+        self.assertEqual(response['X-Analysis-Cache'], 'hit')
+        self.assertEqual([event for event, _ in replayed], ['issue', 'complete'])
+        self.assertEqual(replayed[-1][1]['analysis_id'], complete['analysis_id'])
+
+    async def test_undecodable_completion_ends_with_an_error_event(self):
+        with mock.patch('tutor.views.stream_chat_completion', return_value=completion_stream('I cannot help.')):
+            _, events = await self.stream()
+        self.assertEqual(events, [('error', {'error': 'Could not parse analysis results. Please try again.'})])
+
+    async def test_invalid_requests(self):
+        response = await self.async_client.post('/api/analyze/stream/', {'code': ' '}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
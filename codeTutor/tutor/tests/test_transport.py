@@ -0,0 +1,113 @@
+import gzip
+import json
+from unittest import mock
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from tutor.middleware import CompressionMiddleware
+from tutor.transport import (
+    InvalidFields, Projection, accepted_encodings, choose_encoding, encode_json, request_projection,
+)
+
+RESPONSE = {
+    'analysis_id': 'a1',
+    'partial': False,
+    'errors': [{'id': 1, 'line': 2, 'hints': {'level1': 'a', 'level2': 'b'}}],
+    'warnings': [],
+    'corrected_code': 'x = 1',
+}
+
+
+class ProjectionTests(SimpleTestCase):
+    def test_included_paths_are_kept_with_the_identifiers(self):
+        projection = Projection.parse('errors.line,errors.hints.level1')
+        self.assertEqual(projection.apply(RESPONSE), {
+            'errors': [{'line': 2, 'hints': {'level1': 'a'}}],
+            'analysis_id': 'a1',
+            'partial': False,
+        })
+
+    def test_excluded_paths_are_removed(self):
+        projection = Projection.parse(['-corrected_code', '-errors.hints'])
+        projected = projection.apply(RESPONSE)
+        self.assertNotIn('corrected_code', projected)
+        self.assertEqual(projected['errors'], [{'id': 1, 'line': 2}])
+        self.assertTrue(projection.includes('errors'))
+        self.assertFalse(projection.includes('corrected_code'))
+        self.assertEqual(projection.part('errors', RESPONSE['errors']), [{'id': 1, 'line': 2}])
+
+    def test_empty_and_invalid_fields(self):
+        self.assertIsNone(Projection.parse(''))
+        self.assertIsNone(Projection.parse(' , '))
+        for value in ('errors..line', 'errors.li-ne', 5, ['errors', 1]):
+            with self.subTest(value=value):
+                with self.assertRaises(InvalidFields):
+                    Projection.parse(value)
+
+    def test_body_fields_take_precedence_over_the_query_string(self):
+        request = RequestFactory().get('/api/analyze/', {'fields': 'warnings'})
+        self.assertTrue(request_projection(request).includes('warnings'))
+        self.assertFalse(request_projection(request, {'fields': 'errors'}).includes('warnings'))
+
+
+class EncodingTests(SimpleTestCase):
+    def test_json_is_compact_utf8(self):
+        self.assertEqual(encode_json({'a': [1, 2], 'b': 'é'}), '{"a":[1,2],"b":"é"}'.encode('utf-8'))
+
+    def test_accept_encoding_qualities(self):
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br;q=0, *;q=bad'), {'gzip': 0.5, 'br': 0.0, '*': 0.0})
+        self.assertEqual(choose_encoding('gzip, br', ('br', 'gzip')), 'br')
+        self.assertEqual(choose_encoding('gzip, br;q=0', ('br', 'gzip')), 'gzip')
+        self.assertEqual(choose_encoding('*', ('gzip',)), 'gzip')
+        self.assertIsNone(choose_encoding('gzip;q=0', ('gzip',)))
+        self.assertIsNone(choose_encoding(None, ('gzip',)))
+
+
+@override_settings(RESPONSE_COMPRESSION={'MIN_BYTES': 100})
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = json.dumps({'issues': ['the same text again'] * 50}).encode('utf-8')
+
+    def respond(self, response, accept='gzip'):
+        request = RequestFactory().get('/api/analyze/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=None):
+        response = HttpResponse(body or self.body, content_type='application/json')
+        response['ETag'] = '"abc"'
+        return response
+
+    def test_large_json_is_gzipped_with_a_weak_etag(self):
+        response = self.respond(self.json_response())
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_responses_are_left_alone_when_compression_does_not_apply(self):
+        refused = self.respond(self.json_response(), accept='gzip;q=0')
+        small = self.respond(self.json_response(b'{}'))
+        page = self.respond(HttpResponse(self.body, content_type='text/html'))
+        for response in (refused, small, page):
+            self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(refused['Vary'], 'Accept-Encoding')
+        self.assertEqual(refused.content, self.body)
+
+    def test_streaming_json_is_gzipped(self):
+        response = self.respond(StreamingHttpResponse(iter([self.body]), content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+    def test_streams_respect_refused_gzip(self):
+        # Regression: streams went to GZipMiddleware, which ignores q-values
+        for accept in ('gzip;q=0', 'br, gzip;q=0', 'br;q=1, gzip;q=0.0'):
+            with self.subTest(accept=accept), mock.patch('tutor.middleware.available_encodings',
+                                                         return_value=('br', 'gzip')):
+                stream = StreamingHttpResponse(iter([self.body]), content_type='application/json')
+                response = self.respond(stream, accept=accept)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(b''.join(response.streaming_content), self.body)
+
+    @override_settings(RESPONSE_COMPRESSION={'ENABLED': False})
+    def test_disabled_compression(self):
+        self.assertFalse(self.respond(self.json_response()).has_header('Content-Encoding'))
@@ -0,0 +1,81 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from tutor import warmup
+from tutor.warmup import WarmupLifespan, aopen_llm_connections, warm_up
+
+INSTANT = {'LATENCY': 0.0, 'LATENCY_JITTER': 0.0, 'TOKENS_PER_SECOND': 0.0}
+
+
+@override_settings(WARMUP={'SANDBOX': False})
+class WarmUpTests(SimpleTestCase):
+    def setUp(self):
+        self.preload = mock.Mock(return_value=3)
+        self.index = mock.Mock(return_value=5)
+        for patcher in (
+            mock.patch.object(warmup, '_warmed', False),
+            mock.patch('tutor.cache.analysis_cache.preload', self.preload),
+            mock.patch('tutor.fingerprint.index_recent_analyses', self.index),
+            mock.patch('tutor.frontend.frontend.files'),
+            mock.patch.object(warmup, 'connections'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_warms_up_once(self):
+        with self.assertLogs('tutor.warmup', 'INFO') as logs:
+            warm_up()
+            warm_up()
+        self.preload.assert_called_once_with(256)
+        self.index.assert_called_once_with(512)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('3 cached analyses, 5 indexed', logs.output[0])
+
+    def test_failed_steps_are_logged(self):
+        self.preload.side_effect = RuntimeError('no cache table')
+        with self.assertLogs('tutor.warmup', 'INFO') as logs:
+            warm_up()
+        self.assertIn('Warm-up step analysis cache failed', logs.output[0])
+        self.index.assert_called_once()
+
+    @override_settings(WARMUP={'ENABLED': False})
+    def test_disabled(self):
+        warm_up()
+        self.preload.assert_not_called()
+
+
+class WarmupLifespanTests(SimpleTestCase):
+    async def run_lifespan(self, app, scope, messages):
+        sent = []
+        received = iter(messages)
+
+        async def receive():
+            return next(received)
+
+        async def send(message):
+            sent.append(message)
+
+        await app(scope, receive, send)
+        return sent
+
+    async def test_startup_opens_llm_connections(self):
+        opened = mock.AsyncMock(return_value=2)
+        with mock.patch('tutor.warmup.aopen_llm_connections', opened), self.assertLogs('tutor.warmup', 'INFO'):
+            sent = await self.run_lifespan(
+                WarmupLifespan(mock.AsyncMock()), {'type': 'lifespan'},
+                [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}],
+            )
+        opened.assert_awaited_once_with(2)
+        self.assertEqual(sent, [{'type': 'lifespan.startup.complete'}, {'type': 'lifespan.shutdown.complete'}])
+
+    async def test_other_scopes_go_to_the_application(self):
+        application = mock.AsyncMock()
+        await self.run_lifespan(WarmupLifespan(application), {'type': 'http'}, [])
+        application.assert_awaited_once()
+
+    @override_settings(LLM_CLIENT={'PROVIDER': 'tutor.llm.StandInProvider', 'STANDIN': INSTANT})
+    async def test_connections_answered_with_an_error_are_open(self):
+        # The stand-in has no /models: a 404 still means the connection works
+        self.assertEqual(await aopen_llm_connections(2), 2)
+        self.assertEqual(await aopen_llm_connections(0), 0)
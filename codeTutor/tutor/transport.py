@@ -0,0 +1,267 @@
+# transport.py
+"""
+Encoding of API responses: field projection, JSON and compression.
+
+The analysis endpoints take an optional "fields" (in the JSON body or the
+query string) naming what the client renders, so it doesn't download the
+rest:
+
+    fields=errors,warnings,corrected_code
+    fields=-errors.hints,-warnings.hints,-best_practices
+
+Names are dotted paths into the response; a path through a list applies to
+every element. Without inclusions everything is kept; "-" paths are then
+removed. analysis_id and partial are always kept.
+
+Payloads are encoded compactly, with orjson when it is installed. Large
+responses are compressed with gzip or brotli (when the brotli package is
+installed), as negotiated from Accept-Encoding, by
+tutor.middleware.CompressionMiddleware, which builds on Django's
+GZipMiddleware.
+"""
+import gzip
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder
+    orjson = None
+
+DEFAULT_RESPONSE_COMPRESSION_SETTINGS = {
+    'ENABLED': True,
+    # Smaller responses aren't worth compressing
+    'MIN_BYTES': 1024,
+    'BROTLI_QUALITY': 5,
+    'CONTENT_TYPES': ('application/json', 'text/plain'),
+}
+
+# Preferred first
+ENCODINGS = ('br', 'gzip')
+
+# Kept whatever the projection: follow-up requests and the client's
+# handling of salvaged analyses depend on them
+ALWAYS_KEPT = ('analysis_id', 'partial')
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False)
+
+
+def get_response_compression_settings():
+    config = dict(DEFAULT_RESPONSE_COMPRESSION_SETTINGS)
+    config.update(getattr(settings, 'RESPONSE_COMPRESSION', {}))
+    return config
+
+
+# JSON
+
+def encode_json(data):
+    """
+    Compact UTF-8 JSON bytes for data
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return _encoder.encode(data).encode('utf-8')
+
+
+def dumps_json(data):
+    """
+    Compact JSON text for data
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode('utf-8')
+    return _encoder.encode(data)
+
+
+def api_response(data, status=200, projection=None):
+    """
+    A JSON response for data, projected when projection is given
+    """
+    if projection is not None:
+        data = projection.apply(data)
+    return HttpResponse(encode_json(data), status=status, content_type='application/json')
+
+
+# Compression
+
+def available_encodings():
+    return tuple(encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None)
+
+
+def compress(body, encoding, level=None):
+    """
+    Compress body; level None compresses as small as possible
+    """
+    if encoding == 'gzip':
+        # mtime=0 keeps the output stable, so it can back an ETag
+        return gzip.compress(body, compresslevel=9 if level is None else level, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if level is None else level)
+    raise ValueError(f'Unsupported encoding {encoding!r}')
+
+
+def accepted_encodings(header):
+    """
+    {encoding: q} from an Accept-Encoding header
+    """
+    accepted = {}
+    for part in header.split(','):
+        encoding, _, params = part.partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+def choose_encoding(header, offered):
+    """
+    The preferred encoding among offered that an Accept-Encoding header
+    allows, or None for the identity
+    """
+    accepted = accepted_encodings(header or '')
+    for encoding in ENCODINGS:
+        if encoding in offered and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+# Projection
+
+class InvalidFields(ValueError):
+    """
+    A fields parameter that isn't a list of dotted names
+    """
+
+
+def _path_tree(paths):
+    tree = {}
+    for path in paths:
+        node = tree
+        parts = path.split('.')
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is None:  # a shorter path already takes the whole value
+                break
+            node = child
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def _select(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [_select(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _select(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+
+def _remove(value, tree):
+    if isinstance(value, list):
+        return [_remove(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {
+            key: item if key not in tree else _remove(item, tree[key])
+            for key, item in value.items()
+            if key not in tree or tree[key] is not None
+        }
+    return value
+
+
+class Projection:
+    """
+    The parts of a response a client asked for with "fields"
+    """
+
+    def __init__(self, include=None, exclude=()):
+        # No include paths: everything, less the exclude paths
+        self.include = _path_tree(include) if include else None
+        self.exclude = _path_tree(exclude)
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Projection from a fields value: a comma-separated string or a list.
+        Returns None when there is nothing to project. Raises InvalidFields.
+        """
+        if value in (None, '', []):
+            return None
+        if isinstance(value, str):
+            names = value.split(',')
+        elif isinstance(value, list) and all(isinstance(name, str) for name in value):
+            names = value
+        else:
+            raise InvalidFields('fields must be a comma-separated string or a list of names')
+        include, exclude = [], []
+        for name in (name.strip() for name in names):
+            if not name:
+                continue
+            path = name[1:] if name.startswith('-') else name
+            if not all(part and (part.isidentifier() or part.isdigit()) for part in path.split('.')):
+                raise InvalidFields(f'Invalid field name {name!r}')
+            (exclude if name.startswith('-') else include).append(path)
+        if not include and not exclude:
+            return None
+        return cls(include, exclude)
+
+    def includes(self, key):
+        """
+        Whether any of the top-level key is kept
+        """
+        if self.include is not None and key not in self.include:
+            return False
+        return key not in self.exclude or self.exclude[key] is not None
+
+    def apply(self, data):
+        """
+        The projected copy of a response (shared values aren't copied)
+        """
+        projected = _select(data, self.include) if self.include is not None else dict(data)
+        if self.exclude:
+            projected = _remove(projected, self.exclude)
+        for key in ALWAYS_KEPT:
+            if key in data:
+                projected[key] = data[key]
+        return projected
+
+    def part(self, key, value):
+        """
+        The projection of value found at the top-level key
+        """
+        if self.include is not None:
+            value = _select(value, self.include.get(key))
+        if self.exclude.get(key) is not None:
+            value = _remove(value, self.exclude[key])
+        return value
+
+
+# Keeps everything
+FULL_PROJECTION = Projection()
+
+
+def request_projection(request, data=None):
+    """
+    The Projection of a request's "fields" (JSON body data, then the query
+    string), or None. Raises InvalidFields.
+    """
+    value = data.get('fields') if isinstance(data, dict) else None
+    if value is None:
+        value = request.GET.get('fields')
+    return Projection.parse(value)
@@ -3,8 +3,17 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('assets/<str:name>', views.frontend_asset, name='frontend_asset'),
     path('api/analyze/', views.analyze_code, name='analyze_code'),
+    path('api/analyze/stream/', views.analyze_code_stream, name='analyze_code_stream'),
+    path('api/analyze/jobs/', views.create_analysis_job, name='create_analysis_job'),
+    path('api/analyze/jobs/<str:job_id>/', views.analysis_job_status, name='analysis_job_status'),
+    path('api/analyze/jobs/<str:job_id>/events/', views.analysis_job_events, name='analysis_job_events'),
+    path('api/analyze/batch/', views.analyze_batch, name='analyze_batch'),
     path('api/analyze/mock/', views.analyze_code_mock, name='analyze_mock'),
+    path('api/analyze/cache-stats/', views.analysis_cache_stats, name='analysis_cache_stats'),
+    path('api/analytics/concepts/', views.concept_analytics, name='concept_analytics'),
+    path('metrics/', views.metrics, name='metrics'),
     path('api/corrected-code/', views.get_corrected_code, name='corrected_code'),
     # New endpoints for enhanced features
     path('api/get_hint/', views.get_hint, name='get_hint'),
@@ -1,28 +1,73 @@
 # views.py
+import asyncio
+import functools
+import hashlib
 import json
-import os
-from django.http import JsonResponse
+import logging
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
-from openai import OpenAI
-from dotenv import load_dotenv
-from django.shortcuts import render
+from django.views.decorators.http import require_GET, require_POST, require_safe
+import math
 import re
 
-load_dotenv()
+from .analysis_store import analysis_store, find_issue, make_analysis_id
+from .analytics import concept_report, date_range, get_analytics_settings, request_labels
+from .batch import BatchItem, get_batch_settings, iter_archive, run_batch
+from .cache import analysis_cache
+from .chunking import merge_chunk_analyses, plan_chunks
+from .depth import FULL_DEPTH, analysis_cache_key, get_analysis_depth
+from .execution import acheck_corrected_code, aexecute, answers_locally, execution_analysis, runtime_issue
+from .decoding import (
+    DecodeError, decode_analysis, decode_hint, decode_stats, decode_strategies, extract_code_block
+)
+from .fingerprint import afind_near_duplicate, index_analysis
+from .frontend import bundle_response, shell_response
+from .incremental import can_build_on, get_incremental_settings, plan_incremental, region_max_tokens
+from .jobs import QueueFull, analysis_jobs
+from .llm import create_chat_completion, stream_chat_completion
+from .metrics import analysis_outcomes, monitoring_allowed, registry
+from .persistence import db_writer
+from .prompts import build_analysis_messages, count_tokens
+from .scheduler import UpstreamBusy, suggested_retry_after
+from .singleflight import LeaderCancelled, llm_flight
+from .static_analysis import analyze_locally, get_static_analysis_settings
+from .streaming import AnalysisStreamParser, sse_event
+from .transport import FULL_PROJECTION, api_response, dumps_json, request_projection
 
-# Configure OpenAI with new API
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+logger = logging.getLogger(__name__)
+
+# Placeholder hints used when the model returned none for an issue
+DEFAULT_HINTS = {
+    'level1': 'Try examining the syntax more carefully.',
+    'level2': 'Check for common syntax patterns.',
+    'level3': 'Here\'s the complete solution.'
+}
 
 
 @csrf_exempt
-def home(request):
-    return render(request, 'coder.html')
+@require_safe
+async def home(request):
+    """
+    The page shell, compiled from coder.html once (tutor/frontend.py)
+    """
+    return shell_response(request)
+
+
+@require_safe
+async def frontend_asset(request, name):
+    """
+    A fingerprinted CSS or JS bundle of the page
+    """
+    response = bundle_response(request, name)
+    if response is None:
+        raise Http404('No such asset')
+    return response
 
 
 @csrf_exempt
 @require_POST
-def analyze_code(request):
+async def analyze_code(request):
     """
     Analyze code using OpenAI API with detailed error explanations, corrected code, and learning features
     """
@@ -37,204 +82,827 @@ def analyze_code(request):
                 'error': 'No code provided'
             }, status=400)
         
-        # Prepare the prompt for OpenAI with enhanced analysis requirements
-        prompt = f"""
-        You are an expert {language} code analyzer and educator. Analyze the following code thoroughly and provide:
-        
-        1. All syntax errors
-        2. All logical errors  
-        3. All warnings about best practices
-        4. Performance issues
-        5. Security vulnerabilities
-        6. Style and readability issues
-        
-        For EACH issue found, provide:
-        - Error Type: The type/category of error
-        - Category: One of: "syntax", "logic", "performance", "security", "best_practice", "style"
-        - Title: A brief title describing the issue
-        - What the error is: Detailed explanation of what's wrong
-        - Why it occurred: Explanation of why this error happens
-        - How to correct it: Step-by-step guidance on fixing it
-        - Line Number: Where the error occurs (if applicable)
-        - Column Number: Where the error occurs (if applicable)
-        - Code Snippet: The problematic code
-        - Severity: "low", "medium", "high", or "critical"
-        
-        IMPORTANT ADDITIONAL REQUIREMENTS:
-        
-        A) CONCEPT MAP: 
-        Create a concept map that groups issues by their root concepts. For example:
-        - **Syntax**: Indentation, Missing Parentheses, Missing Colons, etc.
-        - **Logic**: Type Errors, None Handling, Loop Issues, etc.
-        - **Performance**: Inefficient Algorithms, Unnecessary Computation, etc.
-        - **Security**: Input Validation, SQL Injection, etc.
-        
-        For each concept category, show how many issues belong to it (like: Indentation (3), Missing Parentheses (2), etc.)
-        
-        B) PROGRESSIVE HINTS:
-        For each significant error, provide 3 levels of hints:
-        - Level 1: Gentle Nudge (subtle hint without giving away the solution)
-        - Level 2: Partial Clue (more specific hint pointing towards solution)
-        - Level 3: Full Solution (explicit solution and explanation)
-        
-        C) CORRECTION STRATEGIES:
-        For common error patterns, provide multiple correction strategies with:
-        - Strategy Name
-        - Code implementation
-        - Pros of this approach
-        - Cons of this approach
-        
-        After analyzing all issues, provide:
-        - A fully corrected version of the entire code
-        - General suggestions for improvement
-        - Best practices to follow
-        
-        Code to analyze:
-        ```
-        {code}
-        ```
+        try:
+            depth = get_analysis_depth(data.get('depth'))
+            projection = request_projection(request, data)
+            labels = request_labels(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        Return the analysis in the following JSON format:
-        {{
-            "analysis_summary": {{
-                "total_errors": number,
-                "total_warnings": number,
-                "overall_severity": "low/medium/high/critical",
-                "language": "{language}",
-                "concepts_covered": ["concept1", "concept2", ...]
-            }},
-            "concept_map": {{
-                "syntax": [
-                    {{"concept": "Indentation", "count": 3, "issues": [1, 2, 3]}},
-                    {{"concept": "Missing Parentheses", "count": 2, "issues": [4, 5]}}
-                ],
-                "logic": [
-                    {{"concept": "Type Errors", "count": 1, "issues": [6]}}
-                ]
-            }},
-            "issues": [
-                {{
-                    "id": 1,
-                    "type": "error/warning",
-                    "category": "syntax/logic/performance/security/best_practice/style",
-                    "title": "Issue title",
-                    "description": "What the error is",
-                    "cause": "Why it occurred",
-                    "fix": "How to correct it",
-                    "line": line_number,
-                    "column": column_number,
-                    "code_snippet": "problematic code",
-                    "severity": "low/medium/high/critical",
-                    "hints": {{
-                        "level1": "Gentle nudge hint",
-                        "level2": "Partial clue hint",
-                        "level3": "Full solution explanation"
-                    }}
-                }}
-            ],
-            "correction_strategies": [
-                {{
-                    "name": "Strategy Name",
-                    "description": "Brief description",
-                    "code": "Code implementation",
-                    "pros": ["Pro 1", "Pro 2"],
-                    "cons": ["Con 1", "Con 2"],
-                    "applicable_to_issues": [1, 2, 3]
-                }}
-            ],
-            "corrected_code": "The fully corrected version of the code",
-            "suggestions": [
-                "General suggestions for improvement"
-            ],
-            "best_practices": [
-                "Best practices to follow"
-            ]
-        }}
+        previous_id = data.get('previous_analysis_id') or await request.session.aget('last_analysis_id')
+        try:
+            transformed_response, source = await analyze_submission(code, language, previous_id, depth=depth)
+        except AnalysisParseError as e:
+            # Return a helpful error
+            return JsonResponse({
+                'error': 'Could not parse analysis results. Please try again.',
+                'raw_response': e.raw_text[:500]
+            }, status=500)
         
-        Important guidelines:
-        1. Be extremely thorough and detailed in your analysis
-        2. Don't miss any potential issues
-        3. Provide practical, actionable fixes
-        4. The corrected code should be production-ready
-        5. Explain concepts clearly for learning purposes
-        6. If no issues are found, return empty arrays but still provide corrected code
-        7. Only return the JSON object, no other text
-        8. For the concept map, group similar issues under appropriate concepts
-        9. Hints should be educational and progressive
-        10. Correction strategies should show different approaches to solving problems
-        """
+        await remember_analysis(request, transformed_response['analysis_id'], code, language, source, **labels)
+        response = api_response(transformed_response, projection=projection)
+        response['X-Analysis-Cache'] = 'hit' if source == 'hit' else 'miss'
+        if source in ('local', 'near_duplicate', 'incremental'):
+            response['X-Analysis-Source'] = source
+        return response
+            
+    except Exception as e:
+        return upstream_error_response(e, 'Server error')
+
+
+@csrf_exempt
+@require_POST
+async def create_analysis_job(request):
+    """
+    Queue an analysis and return its job ID at once (202). Poll the status
+    URL or subscribe to the events URL for the result.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    code = data.get('code', '').strip()
+    language = data.get('language', 'python').lower()
+    
+    if not code:
+        return JsonResponse({
+            'error': 'No code provided'
+        }, status=400)
+    
+    try:
+        depth = get_analysis_depth(data.get('depth'))
+        labels = request_labels(data)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    previous_id = data.get('previous_analysis_id') or await request.session.aget('last_analysis_id')
+    try:
+        job = await analysis_jobs.asubmit(code, language, previous_id, depth=depth.name)
+    except QueueFull:
+        response = JsonResponse({'error': 'Too many analyses are waiting. Please try again in a moment.'}, status=503)
+        response['Retry-After'] = '30'
+        return response
+    
+    # Analysis IDs are content-addressed, so the session can point at it now
+    cache_key = analysis_cache_key(code, language, depth)
+    await remember_analysis(request, make_analysis_id(cache_key), code, language, 'job', **labels)
+    job.session_key = request.session.session_key
+    
+    response = JsonResponse(describe_job(job), status=202)
+    response['Location'] = describe_job(job)['status_url']
+    return response
+
+
+@require_GET
+async def analysis_job_status(request, job_id):
+    """
+    Status of an analysis job, with the analysis once it is done. With
+    ?wait=N (seconds, up to 30) the request is held until the job finishes
+    or N seconds pass.
+    """
+    try:
+        wait = min(max(float(request.GET.get('wait', 0)), 0.0), 30.0)
+    except ValueError:
+        wait = 0.0
+    try:
+        projection = request_projection(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    if wait:
+        job = await analysis_jobs.wait(job_id, wait)
+    else:
+        job = await analysis_jobs.aget(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    payload = await describe_job_with_result(job)
+    if projection is not None and 'result' in payload:
+        payload['result'] = projection.apply(payload['result'])
+    return api_response(payload)
+
+
+@require_GET
+async def analysis_job_events(request, job_id):
+    """
+    Server-sent events for an analysis job: "status" now, then "complete"
+    with the analysis or "error" when the job ends
+    """
+    try:
+        projection = request_projection(request) or FULL_PROJECTION
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    job = await analysis_jobs.aget(job_id)
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    
+    async def events():
+        current = job
+        yield sse_event('status', describe_job(current))
+        while not current.finished:
+            current = await analysis_jobs.wait(job_id, 15.0)
+            if not current.finished:
+                # Keep proxies from closing an idle stream
+                yield ': keep-alive\n\n'
+        payload = await describe_job_with_result(current)
+        if payload['status'] == 'done':
+            yield sse_event('complete', projection.apply(payload['result']))
+        else:
+            yield sse_event('error', {'error': payload['error'], 'status': current.error_status or 500})
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def describe_job(job):
+    """
+    Public view of a job, without its result
+    """
+    description = {
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': f'/api/analyze/jobs/{job.job_id}/',
+        'events_url': f'/api/analyze/jobs/{job.job_id}/events/',
+    }
+    if job.status == 'queued':
+        description['position'] = analysis_jobs.position(job)
+    if job.status == 'failed':
+        description['error'] = job.error
+    return description
+
+
+async def describe_job_with_result(job):
+    description = describe_job(job)
+    if job.status == 'done':
+        record = await analysis_store.aget(job.analysis_id)
+        if record is None:
+            description.update(status='failed', error='The analysis result is no longer available.')
+        else:
+            description['result'] = record['result']
+            description['source'] = job.source
+    return description
+
+
+@csrf_exempt
+@require_POST
+async def analyze_batch(request):
+    """
+    Analyze a set of submissions: an uploaded .zip/.tar archive ("archive"
+    field, language taken from file extensions) or a JSON body
+    {"submissions": [{"name", "code", "language"}]}. Streams one JSON line
+    per submission as it finishes, then {"summary": {...}}.
+    """
+    config = get_batch_settings()
+    default_language = (request.POST.get('language') or '').lower() or None
+    archive = request.FILES.get('archive')
+    try:
+        projection = request_projection(request, request.POST if archive is not None else None)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if archive is not None:
+        if archive.size > config['MAX_ARCHIVE_BYTES']:
+            return JsonResponse({'error': f'Archive larger than {config["MAX_ARCHIVE_BYTES"]} bytes'}, status=413)
+        try:
+            items = iter_archive(archive, default_language, config)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    else:
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+        try:
+            projection = request_projection(request, data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        submissions = data.get('submissions')
+        if not isinstance(submissions, list) or not submissions:
+            return JsonResponse({'error': 'No submissions provided'}, status=400)
+        if len(submissions) > config['MAX_FILES']:
+            return JsonResponse({'error': f'At most {config["MAX_FILES"]} submissions per batch'}, status=413)
+        items = [
+            BatchItem(
+                str(submission.get('name') or index),
+                submission.get('code', '').strip() or None,
+                submission.get('language', 'python').lower(),
+                None if submission.get('code', '').strip() else 'No code provided',
+            )
+            for index, submission in enumerate(submissions)
+        ]
+    
+    async def lines():
+        queue = asyncio.Queue()
         
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": f"You are an expert {language} developer and educator. You analyze code thoroughly, explain issues clearly, provide educational hints, and show multiple correction strategies."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            max_tokens=6000  # Increased for detailed analysis with new features
-        )
+        async def emit(entry):
+            if projection is not None and 'result' in entry:
+                entry = {**entry, 'result': projection.apply(entry['result'])}
+            await queue.put(dumps_json(entry) + '\n')
         
-        # Parse the response
-        analysis_text = response.choices[0].message.content.strip()
+        async def run():
+            try:
+                summary = await run_batch(items, emit, config['CONCURRENCY'])
+                await queue.put(dumps_json({'summary': summary}) + '\n')
+            finally:
+                await queue.put(None)
         
-        # Try to extract JSON from the response
+        task = asyncio.create_task(run())
         try:
-            # Find JSON in the response
-            start_idx = analysis_text.find('{')
-            end_idx = analysis_text.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                analysis_json = json.loads(analysis_text[start_idx:end_idx])
+            while (line := await queue.get()) is not None:
+                yield line
+        finally:
+            task.cancel()
+    
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def analyze_submission(code, language, previous_id=None, endpoint='analyze', depth=None):
+    """
+    The analysis pipeline behind analyze_code, analysis jobs and batches.
+    depth is an AnalysisDepth (the default depth when None). Returns
+    (transformed_response, source), source being "hit", "local",
+    "near_duplicate", "llm" or "incremental". Raises AnalysisParseError
+    when the completion can't be used.
+    """
+    depth = depth or get_analysis_depth()
+    
+    # Serve repeat submissions from the analysis cache
+    cache_key = analysis_cache_key(code, language, depth)
+    cached_response = await analysis_cache.aget(cache_key)
+    if cached_response is not None:
+        cached_response.setdefault('analysis_id', make_analysis_id(cache_key))
+        analysis_outcomes.inc(endpoint=endpoint, outcome='hit')
+        return cached_response, 'hit'
+    
+    # Answer plain syntax errors locally, without calling OpenAI
+    local_analysis = local_pre_analysis(code, language)
+    if local_analysis is not None and local_analysis.has_errors:
+        transformed_response = transform_response_for_frontend(local_analysis.as_analysis_json())
+        transformed_response['source'] = 'local'
+        await store_analysis(cache_key, code, language, transformed_response, depth=depth)
+        analysis_outcomes.inc(endpoint=endpoint, outcome='local')
+        return transformed_response, 'local'
+    
+    # Reuse the analysis of a near-identical submission (other names,
+    # comments or strings), remapped to this code
+    if analysis_cache.enabled:
+        near_response = await afind_near_duplicate(code, language, depth.name)
+        if near_response is not None:
+            await store_analysis(cache_key, code, language, near_response, depth=depth)
+            analysis_outcomes.inc(endpoint=endpoint, outcome='near_duplicate')
+            return near_response, 'near_duplicate'
+    
+    # Run the code: plain runtime errors are answered from the traceback
+    syntax_verified = local_analysis is not None and local_analysis.syntax_verified
+    execution = await aexecute(code, language) if syntax_verified else None
+    if execution is not None and answers_locally(execution, code):
+        transformed_response = await answer_from_execution(cache_key, code, language, execution, depth)
+        analysis_outcomes.inc(endpoint=endpoint, outcome='local')
+        return transformed_response, 'local'
+    
+    # Call OpenAI once for all identical in-flight submissions, only about
+    # the changed regions when an earlier version of this code was analyzed
+    plan = await plan_reanalysis(previous_id, code, language, syntax_verified, depth)
+    analysis_outcomes.inc(endpoint=endpoint, outcome='incremental' if plan is not None else 'miss')
+    if plan is not None:
+        transformed_response = await llm_flight.do(
+            ('analyze', cache_key),
+            lambda: run_incremental_analysis(plan, code, language, cache_key, syntax_verified, depth, execution)
+        )
+        return transformed_response, 'incremental'
+    transformed_response = await llm_flight.do(
+        ('analyze', cache_key),
+        lambda: run_llm_analysis(code, language, cache_key, syntax_verified, depth, execution)
+    )
+    return transformed_response, 'llm'
+
+
+class AnalysisParseError(Exception):
+    """
+    The model's analysis could not be parsed as JSON
+    """
+    def __init__(self, raw_text):
+        super().__init__('Could not parse analysis results')
+        self.raw_text = raw_text
+
+
+async def run_llm_analysis(code, language, cache_key, syntax_verified=False, depth=None, execution=None):
+    """
+    Call OpenAI for a full analysis at depth, then parse, transform and
+    store it. Submissions over the token budget are analyzed in parallel
+    chunks. execution is the run of the code made before the call, if any.
+    """
+    depth = depth or get_analysis_depth()
+    chunks = plan_chunks(code, language)
+    if len(chunks) > 1:
+        analysis_json, partial = await run_chunked_analysis(chunks, language, syntax_verified, depth)
+        transformed_response = transform_response_for_frontend(analysis_json)
+        await store_analysis(cache_key, code, language, transformed_response, partial, depth, execution)
+        return transformed_response
+    
+    # Call OpenAI API
+    response = await create_chat_completion(
+        'analyze',
+        model=depth.model,
+        messages=build_analysis_messages(code, language, syntax_verified, depth=depth.name),
+        prompt_cache_key=depth.prompt.cache_key,
+        temperature=0.2,
+        max_tokens=depth.max_tokens
+    )
+    
+    # Parse the response
+    analysis_text = response.choices[0].message.content.strip()
+    
+    # Decode the JSON, repairing and salvaging what we can
+    try:
+        decoded = decode_analysis(analysis_text, language)
+    except DecodeError as e:
+        # Failures are counted by decode_stats (tutor/decoding.py)
+        logger.warning('Could not decode the analysis: %s', e)
+        logger.debug('Undecodable analysis: %s', analysis_text[:500])
+        raise AnalysisParseError(analysis_text) from e
+    
+    # Transform the response to match frontend expectations
+    transformed_response = transform_response_for_frontend(decoded.data)
+    await store_analysis(cache_key, code, language, transformed_response, decoded.partial, depth, execution)
+    return transformed_response
+
+
+async def run_chunked_analysis(chunks, language, syntax_verified=False, depth=None):
+    """
+    Analyze chunks of a large file concurrently and merge the results.
+    Returns (analysis_json, partial).
+    """
+    total_lines = chunks[-1].last_line
+    decoded_chunks = await asyncio.gather(*(
+        analyze_excerpt(chunk, language, total_lines, syntax_verified, depth=depth) for chunk in chunks
+    ))
+    if all(decoded is None for decoded in decoded_chunks):
+        raise AnalysisParseError('')
+    analyses = [decoded.data if decoded is not None else None for decoded in decoded_chunks]
+    partial = any(decoded is None or decoded.partial for decoded in decoded_chunks)
+    return merge_chunk_analyses(list(zip(chunks, analyses)), language), partial
+
+
+async def analyze_excerpt(chunk, language, total_lines, syntax_verified=False, max_tokens=None, depth=None):
+    """
+    Analyze one chunk of a file. Returns the Decoded analysis, with lines
+    relative to the chunk, or None when the completion could not be parsed.
+    max_tokens defaults to the depth's budget.
+    """
+    depth = depth or get_analysis_depth()
+    messages = build_analysis_messages(
+        chunk.text, language, syntax_verified,
+        excerpt=(chunk.first_line, chunk.last_line, total_lines), depth=depth.name
+    )
+    response = await create_chat_completion(
+        'analyze',
+        model=depth.model,
+        messages=messages,
+        prompt_cache_key=depth.prompt.cache_key,
+        temperature=0.2,
+        max_tokens=min(max_tokens or depth.max_tokens, depth.max_tokens)
+    )
+    analysis_text = response.choices[0].message.content.strip()
+    try:
+        return decode_analysis(analysis_text, language)
+    except DecodeError as e:
+        logger.warning('Could not decode the analysis of lines %d-%d: %s', chunk.first_line, chunk.last_line, e)
+        return None
+
+
+async def plan_reanalysis(previous_id, code, language, syntax_verified=False, depth=None):
+    """
+    Plan an incremental analysis against a previous analysis (the session's
+    latest, or previous_analysis_id from the request) of the same depth.
+    Returns None when the code should be analyzed in full.
+    """
+    if not previous_id or not get_incremental_settings()['ENABLED']:
+        return None
+    depth = depth or get_analysis_depth()
+    previous = await analysis_store.aget(previous_id)
+    if not can_build_on(previous, language) or previous['result'].get('depth', FULL_DEPTH) != depth.name:
+        return None
+    return plan_incremental(previous['code'], previous['result'], code, language, syntax_verified)
+
+
+async def run_incremental_analysis(plan, code, language, cache_key, syntax_verified=False, depth=None,
+                                   execution=None):
+    """
+    Analyze the changed regions of a plan concurrently, then merge them with
+    the issues kept from the previous analysis, transform and store
+    """
+    depth = depth or get_analysis_depth()
+    total_lines = code.count('\n') + 1
+    regions = [segment.chunk for segment in plan.segments if segment.reanalyze]
+    decoded_regions = await asyncio.gather(*(
+        analyze_excerpt(chunk, language, total_lines, syntax_verified, region_max_tokens(chunk.text), depth)
+        for chunk in regions
+    ))
+    if all(decoded is None for decoded in decoded_regions):
+        raise AnalysisParseError('')
+    decoded_by_line = dict(zip((chunk.first_line for chunk in regions), decoded_regions))
+    
+    segment_results = []
+    for segment in plan.segments:
+        if segment.reanalyze:
+            decoded = decoded_by_line[segment.chunk.first_line]
+            segment_results.append((segment.chunk, decoded.data if decoded is not None else None))
+        else:
+            segment_results.append((segment.chunk, segment.analysis))
+    partial = any(decoded is None or decoded.partial for decoded in decoded_regions)
+    
+    analysis_json = merge_chunk_analyses(segment_results, language)
+    if not depth.eager_artifacts:
+        # Kept from the previous version; generated again on request
+        analysis_json['correction_strategies'] = []
+        analysis_json['corrected_code'] = ''
+    transformed_response = transform_response_for_frontend(analysis_json)
+    transformed_response['source'] = 'incremental'
+    transformed_response['reanalyzed_lines'] = [list(region) for region in plan.reanalyzed_lines]
+    await store_analysis(cache_key, code, language, transformed_response, partial, depth, execution)
+    return transformed_response
+
+
+async def remember_analysis(request, analysis_id, code, language, source, classroom='', exercise=''):
+    """
+    Keep the session's latest analysis as the base for the next incremental
+    one, and record the submission (labelled for the concept analytics)
+    """
+    session = request.session
+    if await session.aget('last_analysis_id') != analysis_id:
+        if session.session_key is None:
+            await session.acreate()
+        await session.aset('last_analysis_id', analysis_id)
+    user = await request.auser()
+    await analysis_store.arecord_submission(
+        analysis_id, code, language, source,
+        session_key=session.session_key,
+        user_id=user.pk if user.is_authenticated else None,
+        classroom=classroom,
+        exercise=exercise,
+    )
+
+
+async def coalesced_completion(endpoint, **kwargs):
+    """
+    Run a chat completion and return its stripped text. Concurrent requests
+    with an identical prompt share a single upstream call.
+    """
+    digest = hashlib.sha256(
+        json.dumps([kwargs.get('model'), kwargs.get('messages')], sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    
+    async def call():
+        response = await create_chat_completion(endpoint, **kwargs)
+        return response.choices[0].message.content.strip()
+    
+    return await llm_flight.do((endpoint, digest), call)
+
+
+def local_pre_analysis(code, language):
+    """
+    Run the local static pass. Returns None when it is disabled; otherwise
+    a LocalAnalysis whose errors (if any) should be returned as the answer.
+    """
+    config = get_static_analysis_settings()
+    if not config['ENABLED']:
+        return None
+    local_analysis = analyze_locally(code, language)
+    if local_analysis.has_errors and not config['ANSWER_SYNTAX_ERRORS']:
+        local_analysis.issues = []
+    return local_analysis
+
+
+async def store_analysis(cache_key, code, language, transformed_response, partial=False, depth=None, execution=None):
+    """
+    Assign the analysis ID and depth, then save the response to the analysis
+    store (for hints and other follow-ups) and to the analysis cache.
+    Partial analyses salvaged from a truncated or malformed completion are
+    flagged and not cached, so the next identical submission asks again.
+    """
+    depth = depth or get_analysis_depth()
+    analysis_id = make_analysis_id(cache_key)
+    transformed_response['analysis_id'] = analysis_id
+    transformed_response['depth'] = depth.name
+    await ground_analysis(code, language, transformed_response, execution)
+    if partial:
+        transformed_response['partial'] = True
+    await analysis_store.asave(analysis_id, code, language, transformed_response)
+    if not partial:
+        await analysis_cache.aset(cache_key, transformed_response, language)
+        index_analysis(analysis_id, code, language, transformed_response)
+    return analysis_id
+
+
+async def answer_from_execution(cache_key, code, language, execution, depth):
+    """
+    Answer a submission with the runtime error running it raised
+    """
+    transformed_response = transform_response_for_frontend(execution_analysis(execution, code).as_analysis_json())
+    transformed_response['source'] = 'local'
+    transformed_response['execution'] = execution.summary()
+    await store_analysis(cache_key, code, language, transformed_response, depth=depth)
+    return transformed_response
+
+
+async def ground_analysis(code, language, transformed_response, execution=None):
+    """
+    Add what running the code showed to an analysis: the exception it
+    raised, when no error is reported at that line, and whether the
+    corrected code runs (tutor/execution.py). The code is run unless
+    execution, an earlier run of it, is given.
+    """
+    if 'execution' not in transformed_response and transformed_response.get('source') != 'local':
+        if execution is None:
+            execution = await aexecute(code, language)
+        if execution is not None and execution.outcome != 'syntax_error':
+            transformed_response['execution'] = execution.summary()
+            errors = transformed_response.setdefault('errors', [])
+            if execution.failed and not any(error.get('line') == execution.line for error in errors):
+                add_issue(transformed_response, runtime_issue(execution, code))
+    
+    corrected_code = transformed_response.get('corrected_code') or ''
+    if 'corrected_code_check' not in transformed_response and corrected_code.strip() != code.strip():
+        check = await acheck_corrected_code(corrected_code, language)
+        if check is not None:
+            transformed_response['corrected_code_check'] = check.summary()
+
+
+def add_issue(transformed_response, issue):
+    """
+    Append an issue (LLM analysis schema) to a frontend response, with the
+    next free id, its concept map entry and the summary counts
+    """
+    ids = []
+    for existing in transformed_response.get('errors', []) + transformed_response.get('warnings', []):
+        try:
+            ids.append(int(existing.get('id')))
+        except (TypeError, ValueError):
+            pass
+    kind, issue_data = transform_issue_for_frontend(issue, max(ids, default=0) + 1)
+    transformed_response.setdefault('errors' if kind == 'error' else 'warnings', []).append(issue_data)
+    concept = {'concept': issue['concept'], 'count': 1, 'issues': [issue_data['id']]}
+    transformed_response.setdefault('concept_map', []).extend(transform_concept_group(issue['category'], [concept]))
+    summary = transformed_response.get('analysis_summary')
+    counter = 'total_errors' if kind == 'error' else 'total_warnings'
+    if isinstance(summary, dict) and isinstance(summary.get(counter), int):
+        summary[counter] += 1
+
+
+def describe_openai_error(e):
+    """
+    Map an exception raised while calling OpenAI to (message, status)
+    """
+    import openai
+
+    if isinstance(e, UpstreamBusy):
+        return 'The tutor is very busy right now. Please try again in a moment.', 503
+    if isinstance(e, openai.RateLimitError):
+        return 'OpenAI API rate limit exceeded. Please try again later.', 429
+    if isinstance(e, openai.APITimeoutError):
+        return 'OpenAI API timed out. Please try again.', 504
+    if isinstance(e, openai.AuthenticationError):
+        return 'OpenAI API authentication failed. Please check your API key.', 500
+    if isinstance(e, (openai.APIConnectionError, openai.InternalServerError)):
+        return 'OpenAI API is unavailable. Please try again later.', 502
+    if isinstance(e, openai.OpenAIError):
+        return f'OpenAI API error: {str(e)}', 500
+    return f'Server error: {str(e)}', 500
+
+
+def is_upstream_error(e):
+    """
+    Whether e is a failure of the LLM provider (counted by
+    tutor_llm_requests) rather than of the app
+    """
+    import openai
+
+    return isinstance(e, (UpstreamBusy, openai.OpenAIError))
+
+
+def upstream_error_response(e, context):
+    """
+    Error response for an LLM view. Upstream failures keep their own status
+    (with Retry-After when throttled); anything else is logged and is a 500
+    prefixed with context.
+    """
+    if not is_upstream_error(e):
+        logger.exception(context)
+        return JsonResponse({'error': f'{context}: {str(e)}'}, status=500)
+    error_msg, status = describe_openai_error(e)
+    response = JsonResponse({'error': error_msg}, status=status)
+    retry_after = suggested_retry_after(e)
+    if status in (429, 503):
+        response['Retry-After'] = str(math.ceil(retry_after or 1))
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def analyze_code_stream(request):
+    """
+    Streaming variant of analyze_code. Sends server-sent events as the
+    analysis is generated: "summary", one "issue" per finished issue, one
+    "concept_group" per concept map category, "corrected_code" and finally
+    "complete" with the same payload analyze_code returns.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    
+    code = data.get('code', '').strip()
+    language = data.get('language', 'python').lower()
+    
+    if not code:
+        return JsonResponse({
+            'error': 'No code provided'
+        }, status=400)
+    
+    try:
+        depth = get_analysis_depth(data.get('depth'))
+        projection = request_projection(request, data)
+        labels = request_labels(data)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    cache_key = analysis_cache_key(code, language, depth)
+    cached_response = await analysis_cache.aget(cache_key)
+    if cached_response is not None:
+        cached_response.setdefault('analysis_id', make_analysis_id(cache_key))
+        events = replay_analysis_events(cached_response, projection)
+        source = 'hit'
+    else:
+        local_analysis = local_pre_analysis(code, language)
+        if local_analysis is not None and local_analysis.has_errors:
+            transformed_response = transform_response_for_frontend(local_analysis.as_analysis_json())
+            transformed_response['source'] = 'local'
+            await store_analysis(cache_key, code, language, transformed_response, depth=depth)
+            events = replay_analysis_events(transformed_response, projection)
+            source = 'local'
+        elif (
+            analysis_cache.enabled
+            and (near_response := await afind_near_duplicate(code, language, depth.name)) is not None
+        ):
+            await store_analysis(cache_key, code, language, near_response, depth=depth)
+            events = replay_analysis_events(near_response, projection)
+            source = 'near_duplicate'
+        else:
+            syntax_verified = local_analysis is not None and local_analysis.syntax_verified
+            execution = await aexecute(code, language) if syntax_verified else None
+            if execution is not None and answers_locally(execution, code):
+                transformed_response = await answer_from_execution(cache_key, code, language, execution, depth)
+                events = replay_analysis_events(transformed_response, projection)
+                source = 'local'
             else:
-                analysis_json = json.loads(analysis_text)
-            
-            # Transform the response to match frontend expectations
-            transformed_response = transform_response_for_frontend(analysis_json)
-            
-            return JsonResponse(transformed_response)
-            
-        except json.JSONDecodeError as e:
-            # Log the error and the response for debugging
-            print(f"JSON Decode Error: {e}")
-            print(f"Raw response: {analysis_text[:500]}")
-            
-            # Try to clean the response and parse again
+                events = stream_analysis_events(
+                    code, language, cache_key, syntax_verified, depth, projection, execution
+                )
+                source = 'miss'
+    
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    response['X-Analysis-Cache'] = 'hit' if source == 'hit' else 'miss'
+    if source in ('local', 'near_duplicate'):
+        response['X-Analysis-Source'] = source
+    analysis_outcomes.inc(endpoint='analyze_stream', outcome=source)
+    # The analysis ID is known before the stream finishes
+    await remember_analysis(
+        request, make_analysis_id(cache_key), code, language, 'llm' if source == 'miss' else source, **labels
+    )
+    return response
+
+
+async def stream_analysis_events(code, language, cache_key, syntax_verified=False, depth=None, projection=None,
+                                 execution=None):
+    """
+    Call OpenAI with stream=True and yield SSE events as values complete,
+    keeping only the fields of projection. Identical concurrent requests
+    wait for the leading stream and replay its result instead of opening
+    their own.
+    """
+    projection = projection or FULL_PROJECTION
+    flight_key = ('analyze', cache_key)
+    while True:
+        future, is_leader = llm_flight.join(flight_key)
+        if is_leader:
+            break
+        try:
+            transformed_response = await llm_flight.wait(future)
+        except LeaderCancelled:
+            continue
+        except AnalysisParseError:
+            yield sse_event('error', {'error': 'Could not parse analysis results. Please try again.'})
+            return
+        except Exception as e:
+            error_msg, status = describe_openai_error(e)
+            yield sse_event('error', {'error': error_msg, 'status': status})
+            return
+        async for event in replay_analysis_events(transformed_response, projection):
+            yield event
+        return
+    
+    outcome = {'error': LeaderCancelled()}
+    parser = AnalysisStreamParser()
+    issue_count = 0
+    try:
+        # Large files are analyzed in parallel chunks, then replayed
+        if len(plan_chunks(code, language)) > 1:
             try:
-                # Remove markdown code blocks if present
-                cleaned_text = analysis_text.replace('```json', '').replace('```', '')
-                analysis_json = json.loads(cleaned_text)
-                transformed_response = transform_response_for_frontend(analysis_json)
-                return JsonResponse(transformed_response)
-            except:
-                # Return a helpful error
-                return JsonResponse({
-                    'error': 'Could not parse analysis results. Please try again.',
-                    'raw_response': analysis_text[:500]
-                }, status=500)
+                transformed_response = await run_llm_analysis(
+                    code, language, cache_key, syntax_verified, depth, execution
+                )
+            except AnalysisParseError as e:
+                outcome = {'error': e}
+                yield sse_event('error', {'error': 'Could not parse analysis results. Please try again.'})
+                return
+            outcome = {'result': transformed_response}
+            async for event in replay_analysis_events(transformed_response, projection):
+                yield event
+            return
+        
+        # The analyze concurrency slot is held for the whole stream
+        stream = stream_chat_completion(
+            'analyze',
+            model=depth.model,
+            messages=build_analysis_messages(code, language, syntax_verified, depth=depth.name),
+            prompt_cache_key=depth.prompt.cache_key,
+            temperature=0.2,
+            max_tokens=depth.max_tokens
+        )
+        
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
             
-    except Exception as e:
-        import traceback
-        print(f"Error: {e}")
-        print(traceback.format_exc())
+            for event, value in parser.feed(delta):
+                if event == 'issue':
+                    issue_count += 1
+                    kind, issue_data = transform_issue_for_frontend(value, issue_count)
+                    key = 'errors' if kind == 'error' else 'warnings'
+                    if projection.includes(key):
+                        yield sse_event('issue', {'kind': kind, 'issue': projection.part(key, issue_data)})
+                elif event == 'concept_group':
+                    category, concepts = value
+                    if projection.includes('concept_map'):
+                        concept_group = transform_concept_group(category, concepts)
+                        yield sse_event('concept_group', projection.part('concept_map', concept_group))
+                elif event == 'corrected_code':
+                    if projection.includes('corrected_code'):
+                        yield sse_event('corrected_code', {'corrected_code': value})
+                elif projection.includes('analysis_summary'):
+                    yield sse_event('summary', projection.part('analysis_summary', value))
         
-        # Check for specific OpenAI errors
-        error_msg = str(e)
-        if "authentication" in error_msg.lower() or "api key" in error_msg.lower():
-            return JsonResponse({
-                'error': 'OpenAI API authentication failed. Please check your API key.'
-            }, status=500)
-        elif "rate limit" in error_msg.lower():
-            return JsonResponse({
-                'error': 'OpenAI API rate limit exceeded. Please try again later.'
-            }, status=429)
-        elif "openai" in error_msg.lower():
-            return JsonResponse({
-                'error': f'OpenAI API error: {error_msg}'
-            }, status=500)
-        else:
-            return JsonResponse({
-                'error': f'Server error: {error_msg}'
-            }, status=500)
+        try:
+            decoded = decode_analysis(parser.text, language)
+        except DecodeError as e:
+            logger.warning('Could not decode the streamed analysis: %s', e)
+            logger.debug('Undecodable analysis: %s', parser.text[:500])
+            outcome = {'error': AnalysisParseError(parser.text)}
+            yield sse_event('error', {'error': 'Could not parse analysis results. Please try again.'})
+            return
+        
+        transformed_response = transform_response_for_frontend(decoded.data)
+        await store_analysis(cache_key, code, language, transformed_response, decoded.partial, depth, execution)
+        outcome = {'result': transformed_response}
+        yield sse_event('complete', projection.apply(transformed_response))
+        
+    except Exception as e:
+        if not is_upstream_error(e):
+            logger.exception('Streamed analysis failed')
+        outcome = {'error': e}
+        error_msg, status = describe_openai_error(e)
+        yield sse_event('error', {'error': error_msg, 'status': status})
+    
+    finally:
+        llm_flight.complete(flight_key, future, result=outcome.get('result'), error=outcome.get('error'))
+
+
+async def replay_analysis_events(transformed_response, projection=None):
+    """
+    Yield the SSE sequence for an analysis that is already available,
+    keeping only the fields of projection
+    """
+    projection = projection or FULL_PROJECTION
+    if projection.includes('analysis_summary'):
+        yield sse_event('summary', projection.part('analysis_summary', transformed_response.get('analysis_summary', {})))
+    if transformed_response.get('concept_map') and projection.includes('concept_map'):
+        yield sse_event('concept_group', projection.part('concept_map', transformed_response['concept_map']))
+    for kind, key in (('error', 'errors'), ('warning', 'warnings')):
+        if projection.includes(key):
+            for issue_data in transformed_response.get(key, []):
+                yield sse_event('issue', {'kind': kind, 'issue': projection.part(key, issue_data)})
+    if transformed_response.get('corrected_code') and projection.includes('corrected_code'):
+        yield sse_event('corrected_code', {'corrected_code': transformed_response['corrected_code']})
+    yield sse_event('complete', projection.apply(transformed_response))
 
 
 def transform_response_for_frontend(analysis_json):
@@ -247,27 +915,9 @@ def transform_response_for_frontend(analysis_json):
     warnings = []
     
     for issue in analysis_json.get('issues', []):
-        issue_type = issue.get('type', '').lower()
-        
-        issue_data = {
-            'id': issue.get('id', len(errors) + len(warnings) + 1),
-            'type': issue.get('category', ''),
-            'title': issue.get('title', ''),
-            'description': issue.get('description', ''),
-            'cause': issue.get('cause', ''),
-            'fix': issue.get('fix', ''),
-            'line': issue.get('line'),
-            'column': issue.get('column'),
-            'code': issue.get('code_snippet', ''),
-            'severity': issue.get('severity', 'medium'),
-            'hints': issue.get('hints', {
-                'level1': 'Try examining the syntax more carefully.',
-                'level2': 'Check for common syntax patterns.',
-                'level3': 'Here\'s the complete solution.'
-            })
-        }
+        kind, issue_data = transform_issue_for_frontend(issue, len(errors) + len(warnings) + 1)
         
-        if issue_type == 'error':
+        if kind == 'error':
             errors.append(issue_data)
         else:  # warning or other
             warnings.append(issue_data)
@@ -276,13 +926,7 @@ def transform_response_for_frontend(analysis_json):
     concept_map = []
     if 'concept_map' in analysis_json:
         for category, concepts in analysis_json['concept_map'].items():
-            for concept in concepts:
-                concept_map.append({
-                    'category': category,
-                    'concept': concept.get('concept', ''),
-                    'count': concept.get('count', 0),
-                    'issues': concept.get('issues', [])
-                })
+            concept_map.extend(transform_concept_group(category, concepts))
     
     # Prepare the final response
     response = {
@@ -299,42 +943,186 @@ def transform_response_for_frontend(analysis_json):
     return response
 
 
+def transform_issue_for_frontend(issue, default_id):
+    """
+    Transform a single analysis issue, returning ('error' | 'warning', issue_data)
+    """
+    issue_type = issue.get('type', '').lower()
+    
+    issue_data = {
+        'id': issue.get('id', default_id),
+        'type': issue.get('category', ''),
+        'title': issue.get('title', ''),
+        'description': issue.get('description', ''),
+        'cause': issue.get('cause', ''),
+        'fix': issue.get('fix', ''),
+        'line': issue.get('line'),
+        'column': issue.get('column'),
+        'code': issue.get('code_snippet', ''),
+        'severity': issue.get('severity', 'medium'),
+        'hints': {**DEFAULT_HINTS, **(issue.get('hints') or {})}
+    }
+    if issue.get('source') == 'sandbox':
+        issue_data['source'] = 'sandbox'
+    
+    return ('error' if issue_type == 'error' else 'warning'), issue_data
+
+
+def transform_concept_group(category, concepts):
+    """
+    Flatten one concept_map category into frontend concept entries
+    """
+    return [
+        {
+            'category': category,
+            'concept': concept.get('concept', ''),
+            'count': concept.get('count', 0),
+            'issues': concept.get('issues', [])
+        }
+        for concept in concepts
+    ]
+
+
+def monitoring_only(view):
+    """
+    Serve view to monitoring clients only (tutor/metrics.py), and a 404 to
+    anyone else
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # Checking a staff user loads the session and user from the database
+            if not await sync_to_async(monitoring_allowed)(request):
+                raise Http404()
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not monitoring_allowed(request):
+            raise Http404()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+@monitoring_only
+def metrics(request):
+    """
+    Request, LLM and cache metrics in the Prometheus text format
+    """
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@require_GET
+@monitoring_only
+async def concept_analytics(request):
+    """
+    The concepts a classroom struggles with, from the analytics rollups:
+    ?classroom=&exercise=&from=YYYY-MM-DD&to=YYYY-MM-DD (exercise omitted:
+    every exercise; dates omitted: the last 30 days). Served to monitoring
+    clients only, like the metrics.
+    """
+    if not get_analytics_settings()['ENABLED']:
+        raise Http404('Analytics are disabled')
+    try:
+        labels = request_labels(request.GET)
+        start, end = date_range(request.GET.get('from'), request.GET.get('to'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    exercise = labels['exercise'] if 'exercise' in request.GET else None
+    report = await sync_to_async(concept_report)(labels['classroom'], exercise, start, end)
+    return api_response(report)
+
+
+@require_GET
+@monitoring_only
+def analysis_cache_stats(request):
+    """
+    Hit/miss counters for the analysis cache, plus request coalescing,
+    response decoding and background writer stats
+    """
+    stats = analysis_cache.stats()
+    stats['singleflight'] = llm_flight.stats()
+    stats['decoding'] = decode_stats.stats()
+    stats['writer'] = db_writer.stats()
+    return JsonResponse(stats)
+
+
 @csrf_exempt
 @require_POST
-def get_hint(request):
+async def get_hint(request):
     """
-    Get progressive hints for a specific issue
+    Get progressive hints for a specific issue.
+    
+    Hints are read from the stored analysis when an analysis_id is given.
+    The LLM is only asked when the stored issue has no hint for the requested
+    level, using a prompt scoped to that issue; the generated hint is stored.
     """
-    print("=== GET HINT ENDPOINT CALLED ===")
     try:
         data = json.loads(request.body)
         code = data.get('code', '').strip()
+        analysis_id = data.get('analysis_id')
         issue_id = data.get('issue_id')
         hint_level = data.get('level', 1)  # 1, 2, or 3
         language = data.get('language', 'python').lower()
         
-        if not code or not issue_id:
+        if not issue_id or not (code or analysis_id):
             return JsonResponse({
-                'error': 'Code and issue_id are required'
+                'error': 'issue_id and either analysis_id or code are required'
             }, status=400)
         
-        prompt = f"""
-        For the following {language} code, provide a hint for issue #{issue_id} at level {hint_level}.
-        
-        Code:
-        ```
-        {code}
-        ```
+        try:
+            hint_level = int(hint_level)
+        except (TypeError, ValueError):
+            hint_level = 0
+        if hint_level not in (1, 2, 3):
+            return JsonResponse({
+                'error': 'level must be 1, 2 or 3'
+            }, status=400)
         
-        Hint levels:
-        - Level 1: Gentle nudge (subtle hint without giving away solution)
-        - Level 2: Partial clue (more specific hint pointing towards solution)
-        - Level 3: Full solution (explicit solution and explanation)
+        # Look the hint up in the stored analysis
+        issue = None
+        if analysis_id:
+            record = await analysis_store.aget(analysis_id)
+            if record is not None:
+                issue = find_issue(record['result'], issue_id)
+                language = record['language'] or language
+                code = code or record['code']
         
-        Return ONLY the hint text for level {hint_level}, nothing else.
-        """
+        if issue is not None:
+            hint = stored_hint(issue, hint_level)
+            if hint:
+                return JsonResponse({
+                    'hint': hint,
+                    'level': hint_level,
+                    'issue_id': issue_id,
+                    'source': 'stored'
+                })
+            prompt = build_issue_hint_prompt(issue, hint_level, language, code)
+        elif code:
+            prompt = f"""
+            For the following {language} code, provide a hint for issue #{issue_id} at level {hint_level}.
+            
+            Code:
+            ```
+            {code}
+            ```
+            
+            Hint levels:
+            - Level 1: Gentle nudge (subtle hint without giving away solution)
+            - Level 2: Partial clue (more specific hint pointing towards solution)
+            - Level 3: Full solution (explicit solution and explanation)
+            
+            Return ONLY the hint text for level {hint_level}, nothing else.
+            """
+        else:
+            return JsonResponse({
+                'error': 'Analysis not found. Please analyze the code again.'
+            }, status=404)
         
-        response = client.chat.completions.create(
+        hint_text = await coalesced_completion(
+            'hint',
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": f"You are a helpful coding tutor providing progressive hints for {language}."},
@@ -343,39 +1131,135 @@ def get_hint(request):
             temperature=0.3,
             max_tokens=300
         )
+        hint = decode_hint(hint_text, hint_level).data['hint']
         
-        hint = response.choices[0].message.content.strip()
+        if issue is not None:
+            await analysis_store.aset_hint(analysis_id, issue_id, hint_level, hint)
         
         return JsonResponse({
             'hint': hint,
             'level': hint_level,
-            'issue_id': issue_id
+            'issue_id': issue_id,
+            'source': 'generated'
         })
         
     except Exception as e:
-        return JsonResponse({
-            'error': f'Error getting hint: {str(e)}'
-        }, status=500)
+        return upstream_error_response(e, 'Error getting hint')
+
+
+def stored_hint(issue, level):
+    """
+    Return the stored hint for an issue level, ignoring placeholders
+    """
+    key = f'level{level}'
+    hint = (issue.get('hints') or {}).get(key)
+    if not hint or hint == DEFAULT_HINTS[key]:
+        return None
+    return hint
+
+
+def issue_context(issue, code, context_lines=3):
+    """
+    The numbered lines of code around an issue, or its stored snippet when
+    it has no line
+    """
+    snippet = issue.get('code', '')
+    line = issue.get('line')
+    if code and isinstance(line, int) and line > 0:
+        lines = code.splitlines()
+        first = max(line - context_lines, 1)
+        last = min(line + context_lines, len(lines))
+        snippet = '\n'.join(f'{number}: {lines[number - 1]}' for number in range(first, last + 1)) or snippet
+    return snippet
+
+
+def describe_issues(result, limit=20):
+    """
+    One line per issue of a stored analysis, for prompts that build on it
+    """
+    issues = result.get('errors', []) + result.get('warnings', [])
+    lines = [
+        f"#{issue.get('id')} (line {issue.get('line') if issue.get('line') is not None else '?'}): "
+        f"{issue.get('title', '')}. {issue.get('description', '')}"
+        for issue in issues[:limit]
+    ]
+    return '\n'.join(lines)
+
+
+def build_issue_hint_prompt(issue, level, language, code, context_lines=3):
+    """
+    Build a hint prompt scoped to one issue: its details plus a few lines of
+    surrounding code rather than the whole submission
+    """
+    snippet = issue_context(issue, code, context_lines)
+    line = issue.get('line')
+    
+    return f"""
+    A student's {language} code has this issue:
+    
+    Title: {issue.get('title', '')}
+    Category: {issue.get('type', '')}
+    Description: {issue.get('description', '')}
+    Cause: {issue.get('cause', '')}
+    Line: {line if line is not None else 'unknown'}
+    
+    Relevant code:
+    ```
+    {snippet}
+    ```
+    
+    Provide a level {level} hint for this issue.
+    
+    Hint levels:
+    - Level 1: Gentle nudge (subtle hint without giving away solution)
+    - Level 2: Partial clue (more specific hint pointing towards solution)
+    - Level 3: Full solution (explicit solution and explanation)
+    
+    Return ONLY the hint text for level {level}, nothing else.
+    """
 
 
 @csrf_exempt
 @require_POST
-def get_correction_strategy(request):
+async def get_correction_strategy(request):
     """
-    Get detailed correction strategy for a specific issue or pattern
+    Get detailed correction strategies for a specific issue or pattern.
+    
+    With an analysis_id, strategies are built from the stored analysis: for
+    one of its issues (issue_id) or for the analysis as a whole. They are
+    generated on first request, from the issues already found rather than
+    a new analysis, and stored with the analysis for later requests.
     """
     try:
         data = json.loads(request.body)
         code = data.get('code', '').strip()
         issue_type = data.get('issue_type', '')
         language = data.get('language', 'python').lower()
+        analysis_id = data.get('analysis_id')
+        issue_id = data.get('issue_id')
         
-        if not code:
+        if not (code or analysis_id):
             return JsonResponse({
                 'error': 'Code is required'
             }, status=400)
         
-        prompt = f"""
+        record = await analysis_store.aget(analysis_id) if analysis_id else None
+        issue = None
+        if record is not None:
+            language = record['language'] or language
+            if issue_id is not None:
+                issue = find_issue(record['result'], issue_id)
+                if issue is None:
+                    return JsonResponse({'error': 'Issue not found'}, status=404)
+            stored = (issue or record['result']).get('correction_strategies')
+            if stored:
+                return JsonResponse({'strategies': stored, 'source': 'stored'})
+            if issue is None and not record['result'].get('errors') and not record['result'].get('warnings'):
+                # Nothing to correct
+                return JsonResponse({'strategies': [], 'source': 'stored'})
+            prompt = build_strategy_prompt(language, record['code'], record['result'], issue)
+        elif code:
+            prompt = f"""
         For the following {language} code issue: "{issue_type}", provide multiple correction strategies.
         
         Code:
@@ -405,8 +1289,13 @@ def get_correction_strategy(request):
         
         Only return the JSON object.
         """
+        else:
+            return JsonResponse({
+                'error': 'Analysis not found. Please analyze the code again.'
+            }, status=404)
         
-        response = client.chat.completions.create(
+        strategy_text = await coalesced_completion(
+            'correction_strategy',
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You provide multiple solutions to coding problems with pros and cons."},
@@ -416,41 +1305,100 @@ def get_correction_strategy(request):
             max_tokens=1000
         )
         
-        strategy_text = response.choices[0].message.content.strip()
-        
-        # Parse JSON response
-        start_idx = strategy_text.find('{')
-        end_idx = strategy_text.rfind('}') + 1
-        if start_idx != -1 and end_idx != 0:
-            strategies_json = json.loads(strategy_text[start_idx:end_idx])
-        else:
-            strategies_json = json.loads(strategy_text)
+        # Parse JSON response, keeping the valid strategies of a partial one
+        decoded = decode_strategies(strategy_text)
+        if decoded.partial:
+            decoded.data['partial'] = True
+        elif record is not None:
+            await analysis_store.aset_artifact(
+                analysis_id, 'correction_strategies', decoded.data['strategies'],
+                issue_id if issue is not None else None
+            )
+        if record is not None:
+            decoded.data['source'] = 'generated'
         
-        return JsonResponse(strategies_json)
+        return JsonResponse(decoded.data)
         
     except Exception as e:
-        return JsonResponse({
-            'error': f'Error getting correction strategy: {str(e)}'
-        }, status=500)
+        return upstream_error_response(e, 'Error getting correction strategy')
+
+
+def build_strategy_prompt(language, code, result, issue=None):
+    """
+    Build a correction strategy prompt from a stored analysis: the code
+    around one issue, or the whole code with the list of issues found
+    """
+    if issue is not None:
+        focus = f"""this issue (#{issue.get('id')}): {issue.get('title', '')}
+        {issue.get('description', '')}
+        
+        Relevant code:
+        ```
+        {issue_context(issue, code)}
+        ```"""
+    else:
+        focus = f"""the issues an analysis found in it:
+        {describe_issues(result)}
+        
+        Code:
+        ```
+        {code}
+        ```"""
+    
+    return f"""
+        Provide multiple correction strategies for a student's {language} code, covering {focus}
+        
+        For each strategy give a name, a brief description, the code implementing it, its pros and
+        cons, and the ids of the issues it fixes.
+        
+        Return only this JSON object:
+        {{"strategies": [{{"name": str, "description": str, "code": str, "pros": [str], "cons": [str], "applicable_to_issues": [int]}}]}}
+        """
 
 
 @csrf_exempt
 @require_POST
-def get_corrected_code(request):
+async def get_corrected_code(request):
     """
-    Get only the corrected code without full analysis
+    Get only the corrected code without full analysis.
+    
+    With an analysis_id, the code is corrected by fixing the issues the
+    stored analysis found; the result is stored with the analysis, so it is
+    generated at most once.
     """
     try:
         data = json.loads(request.body)
         code = data.get('code', '').strip()
         language = data.get('language', 'python').lower()
+        analysis_id = data.get('analysis_id')
         
-        if not code:
-            return JsonResponse({
-                'error': 'No code provided'
-            }, status=400)
+        record = await analysis_store.aget(analysis_id) if analysis_id else None
+        if record is not None:
+            result = record['result']
+            code = record['code']
+            language = record['language'] or language
+            if result.get('corrected_code'):
+                return JsonResponse({
+                    'corrected_code': result['corrected_code'],
+                    'check': result.get('corrected_code_check'),
+                    'source': 'stored'
+                })
+            if not result.get('errors') and not result.get('warnings'):
+                # Nothing to correct
+                return JsonResponse({'corrected_code': code, 'source': 'stored'})
+            prompt = f"""
+        Correct this {language} code by fixing the issues an analysis found in it:
+        {describe_issues(result)}
         
-        prompt = f"""
+        Keep everything else as it is. Return ONLY the corrected code, no explanations.
+        
+        Code to correct:
+        ```
+        {code}
+        ```
+        """
+        elif code:
+            prompt = f"""
         Correct this {language} code. Fix all errors and improve it following best practices.
         Return ONLY the corrected code, no explanations.
         
@@ -459,30 +1407,46 @@ def get_corrected_code(request):
         {code}
         ```
         """
+        elif analysis_id:
+            return JsonResponse({
+                'error': 'Analysis not found. Please analyze the code again.'
+            }, status=404)
+        else:
+            return JsonResponse({
+                'error': 'No code provided'
+            }, status=400)
         
-        response = client.chat.completions.create(
+        corrected_code = await coalesced_completion(
+            'corrected_code',
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a code corrector. Return only corrected code, no explanations."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
-            max_tokens=2000
+            # Room for a corrected copy of long submissions
+            max_tokens=min(max(2000, 2 * count_tokens(code)), 6000)
         )
         
-        corrected_code = response.choices[0].message.content.strip()
-        
         # Clean up the response
-        corrected_code = corrected_code.replace('```python\n', '').replace('```javascript\n', '').replace('```java\n', '').replace('```cpp\n', '').replace('```\n', '').replace('```', '')
+        corrected_code = extract_code_block(corrected_code)
         
-        return JsonResponse({
-            'corrected_code': corrected_code
-        })
+        # Run it, so the student knows whether it works
+        check = await acheck_corrected_code(corrected_code, language)
+        check = check.summary() if check is not None else None
+        
+        if record is None:
+            return JsonResponse({
+                'corrected_code': corrected_code,
+                'check': check
+            })
+        await analysis_store.aset_artifact(analysis_id, 'corrected_code', corrected_code)
+        if check is not None:
+            await analysis_store.aset_artifact(analysis_id, 'corrected_code_check', check)
+        return JsonResponse({'corrected_code': corrected_code, 'check': check, 'source': 'generated'})
         
     except Exception as e:
-        return JsonResponse({
-            'error': f'Error: {str(e)}'
-        }, status=500)
+        return upstream_error_response(e, 'Error')
 
 
 @csrf_exempt
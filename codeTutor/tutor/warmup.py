@@ -0,0 +1,191 @@
+# warmup.py
+"""
+Warming a server process up before its first request.
+
+Importing the app is kept cheap: the OpenAI SDK and httpx are imported when
+the first LLM client is built, and caches fill as requests arrive. A worker
+that is about to serve traffic instead wants all of that done up front, so
+the first requests don't pay for it. codeTutor/asgi.py and codeTutor/wsgi.py
+call warm_up() once the app is loaded, which:
+
+- imports the LLM client libraries and loads the token counters;
+- compiles the page (tutor/frontend.py);
+- starts the sandbox workers (tutor/sandbox.py);
+- loads the most recently used analyses into the memory cache tier and the
+  near-duplicate index.
+
+The LLM client and its connections belong to an event loop, so they can
+only be opened on the loop that serves requests. Under ASGI, WarmupLifespan
+answers the server's lifespan startup event by building the client there
+and opening LLM_CONNECTIONS pooled connections (uvicorn sends it; servers
+without lifespan support build the client on the first LLM call instead).
+
+Every step is optional and failures are logged, never raised: a worker that
+couldn't warm up still serves requests.
+"""
+import asyncio
+import importlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WARMUP_SETTINGS = {
+    'ENABLED': True,
+    # Connections to the LLM API opened at ASGI startup
+    'LLM_CONNECTIONS': 2,
+    # Persistent cache entries loaded into the memory tier
+    'CACHE_ENTRIES': 256,
+    # Stored analyses loaded into the near-duplicate index
+    'NEAR_DUPLICATE_ENTRIES': 512,
+    'SANDBOX': True,
+}
+
+# Imported by the first LLM call otherwise
+PRELOAD_MODULES = ('httpx', 'openai')
+
+_lock = threading.Lock()
+_warmed = False
+
+
+def get_warmup_settings():
+    config = dict(DEFAULT_WARMUP_SETTINGS)
+    config.update(getattr(settings, 'WARMUP', {}))
+    return config
+
+
+def _step(name, function, *args):
+    """
+    Run one warm-up step, logging how long it took or why it failed
+    """
+    started = time.perf_counter()
+    try:
+        result = function(*args)
+    except Exception:
+        logger.exception('Warm-up step %s failed', name)
+        return None
+    logger.debug('Warm-up step %s took %.1f ms', name, (time.perf_counter() - started) * 1000)
+    return result
+
+
+def _preload_modules():
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+
+def _load_token_counters():
+    from .depth import DEPTHS, get_analysis_depth
+    from .prompts import count_tokens
+
+    for name in DEPTHS:
+        count_tokens('', get_analysis_depth(name).model)
+
+
+def _start_sandbox():
+    from .sandbox import SandboxUnavailable, get_sandbox_settings, sandbox_pool, supported
+
+    if get_sandbox_settings()['ENABLED'] and supported():
+        try:
+            sandbox_pool.start()
+        except SandboxUnavailable as e:
+            logger.warning('Sandbox not started: %s', e)
+
+
+def warm_up():
+    """
+    Do the process-wide warm-up once; later calls return at once
+    """
+    global _warmed
+    config = get_warmup_settings()
+    if not config['ENABLED']:
+        return
+    with _lock:
+        if _warmed:
+            return
+        _warmed = True
+
+    from .cache import analysis_cache
+    from .fingerprint import index_recent_analyses
+    from .frontend import frontend
+
+    started = time.perf_counter()
+    _step('modules', _preload_modules)
+    _step('token counters', _load_token_counters)
+    _step('frontend', frontend.files)
+    if config['SANDBOX']:
+        _step('sandbox', _start_sandbox)
+    cached = _step('analysis cache', analysis_cache.preload, config['CACHE_ENTRIES'])
+    indexed = _step('near duplicates', index_recent_analyses, config['NEAR_DUPLICATE_ENTRIES'])
+    # Requests run on other threads, with connections of their own
+    connections.close_all()
+    logger.info(
+        'Warmed up in %.0f ms (%s cached analyses, %s indexed)',
+        (time.perf_counter() - started) * 1000, cached or 0, indexed or 0,
+    )
+
+
+async def aopen_llm_connections(count):
+    """
+    Build the LLM client of the running loop and open count pooled
+    connections with cheap GET /models requests. Returns how many got a
+    response.
+    """
+    import httpx
+    import openai
+
+    from .llm import get_client
+
+    client = get_client().with_options(max_retries=0)
+
+    async def connect():
+        try:
+            await client.get('/models', cast_to=httpx.Response)
+        except openai.APIStatusError:
+            pass  # Answered, so the connection is open
+        except openai.OpenAIError as e:
+            logger.warning('Could not open an LLM connection: %s', e)
+            return False
+        return True
+
+    if count <= 0:
+        return 0
+    return sum(await asyncio.gather(*(connect() for _ in range(count))))
+
+
+class WarmupLifespan:
+    """
+    ASGI application handling the lifespan protocol for a Django ASGI
+    application (which only speaks HTTP), warming the serving loop up at
+    startup
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.application(scope, receive, send)
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        config = get_warmup_settings()
+        if not config['ENABLED']:
+            return
+        started = time.perf_counter()
+        try:
+            opened = await aopen_llm_connections(config['LLM_CONNECTIONS'])
+        except Exception:
+            logger.exception('Could not warm up the LLM client')
+            return
+        logger.info('Opened %d LLM connections in %.0f ms', opened, (time.perf_counter() - started) * 1000)